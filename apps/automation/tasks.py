@@ -4,9 +4,7 @@ from django.conf import settings
 from django.utils import timezone
 from datetime import datetime, timedelta
 from apps.orders.models import Order
-from apps.products.models import Product
 from apps.notifications.services import EmailService
-from apps.inventory.models import StockLevel, StockAlert
 from apps.marketing.models import Coupon, Campaign
 from apps.analytics.services import AnalyticsService
 
@@ -35,37 +33,14 @@ def send_order_shipped_email(order_id):
 
 @shared_task
 def check_low_stock():
-    """Vérifie les stocks bas et envoie des alertes"""
-    low_stock_products = []
-    
-    for stock_level in StockLevel.objects.filter(is_low_stock=True):
-        # Vérifier si une alerte existe déjà
-        existing_alert = StockAlert.objects.filter(
-            product=stock_level.product,
-            warehouse=stock_level.warehouse,
-            alert_type='low_stock',
-            is_active=True
-        ).exists()
-        
-        if not existing_alert:
-            # Créer une nouvelle alerte
-            StockAlert.objects.create(
-                product=stock_level.product,
-                warehouse=stock_level.warehouse,
-                stock_level=stock_level,
-                alert_type='low_stock',
-                alert_level='warning',
-                message=f"Stock bas pour {stock_level.product.name} dans {stock_level.warehouse.name}",
-                current_stock=stock_level.current_stock,
-                threshold=stock_level.min_stock_level
-            )
-            
-            # Envoyer un email d'alerte
-            EmailService.send_stock_alert(stock_level.product)
-            
-            low_stock_products.append(stock_level.product.name)
+    """Vérifie les stocks bas et envoie un récapitulatif des nouvelles alertes"""
+    from apps.inventory.services import StockAlertService
+    
+    alerts, resolved = StockAlertService.detect_low_stock()
+    if alerts:
+        EmailService.send_stock_digest(alerts)
     
-    return f"Vérification des stocks terminée. {len(low_stock_products)} produits en stock bas"
+    return f"Vérification des stocks terminée. {len(alerts)} nouvelles alertes, {resolved} résolues"
 
 
 @shared_task
@@ -149,13 +124,110 @@ def cleanup_expired_coupons():
 @shared_task
 def update_product_recommendations():
     """Met à jour les recommandations de produits"""
-    from apps.recommendations.services import RecommendationService, SimilarityService
+    from apps.recommendations.services import SimilarityService
+    
+    # Plus proches voisins de chaque produit, calculés par blocs
+    written = SimilarityService.rebuild_similarities()
+    
+    return f"Recommandations de produits mises à jour: {written} similarités"
+
+
+@shared_task
+def train_recommendation_model():
+    """Réentraîne le modèle collaboratif item-item ; les workers rechargent le fichier remplacé"""
+    from django.conf import settings
+    from apps.recommendations.collaborative import ItemSimilarityModel
+    
+    model = ItemSimilarityModel.train()
+    model.save(getattr(settings, 'RECOMMENDATION_ITEM_MODEL', 'item_similarity.bin'))
+    
+    return f"Modèle collaboratif entraîné: {len(model)} produits"
+
+
+@shared_task
+def update_frequently_bought_together(full=False):
+    """Met à jour les produits achetés ensemble depuis les nouvelles commandes"""
+    from apps.recommendations.services import FrequentlyBoughtTogetherService
+    
+    written = FrequentlyBoughtTogetherService.rebuild(full=full)
+    
+    return f"Produits achetés ensemble mis à jour: {written} compagnons"
+
+
+@shared_task
+def process_search_index_changes(batch_size=1000):
+    """Indexe les modifications de catalogue en attente"""
+    from apps.search.services import SearchIndexingService
+    
+    processed = 0
+    while True:
+        count = SearchIndexingService.process_pending_changes(batch_size=batch_size)
+        if not count:
+            break
+        processed += count
+    pruned = SearchIndexingService.prune_index_updates()
+    
+    return f"Modifications indexées: {processed}, entrées de journal supprimées: {pruned}"
+
+
+@shared_task
+def release_expired_stock_reservations(batch_size=500):
+    """Libère par lots les réservations de stock expirées"""
+    from apps.inventory.services import StockReservationService
+    
+    released = 0
+    while True:
+        count = StockReservationService.release_expired(batch_size=batch_size)
+        if not count:
+            break
+        released += count
+    
+    return f"Réservations libérées: {released}"
+
+
+@shared_task
+def allocate_pending_orders(batch_size=500):
+    """Répartit entre entrepôts et réserve le stock des commandes en attente sans réservation"""
+    from apps.inventory.services import StockReservationService
     
-    # Mettre à jour les similarités de produits
-    for product in Product.objects.filter(status='published'):
-        SimilarityService.update_product_similarities(product)
+    allocated, unserved = StockReservationService.reserve_pending_orders(batch_size=batch_size)
+    return f"Commandes réservées: {allocated}, sans stock suffisant: {unserved}"
+
+
+@shared_task
+def update_demand_forecasts(batch_size=2000):
+    """Prévoit la demande et recalcule les points et quantités de commande des niveaux de stock"""
+    from apps.inventory.forecasting import ReorderService
+    
+    updated = ReorderService.recommend(batch_size=batch_size)
+    return f"Niveaux de stock prévus: {updated}"
+
+
+@shared_task
+def snapshot_stock_ledger(batch_size=1000):
+    """Arrête le stock des couples produit/entrepôt modifiés depuis le dernier instantané"""
+    from apps.inventory.services import StockLedgerService
+    
+    taken = StockLedgerService.take_snapshots(batch_size=batch_size)
+    return f"Instantanés de stock: {taken}"
+
+
+@shared_task
+def purge_idempotency_keys():
+    """Supprime les clés d'idempotence expirées"""
+    from apps.core.models import IdempotencyKey
+    
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).delete()
+    return f"Clés d'idempotence supprimées: {deleted}"
+
+
+@shared_task
+def process_stripe_events(batch_size=100):
+    """Applique les événements Stripe en attente (dont les nouveaux essais)"""
+    from apps.payments.services import StripeWebhookService
     
-    return "Recommandations de produits mises à jour"
+    processed = StripeWebhookService.process_all(batch_size=batch_size)
+    return f"Événements Stripe traités: {processed}"
 
 
 @shared_task
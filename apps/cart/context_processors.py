@@ -1,28 +1,15 @@
-from .models import Cart
+from functools import cache
+
+from .services import CartService
 
 
 def cart(request):
-    """Processeur de contexte pour le panier"""
-    cart = None
-    cart_items_count = 0
-    cart_total = 0
-    
-    if request.user.is_authenticated:
-        # Utilisateur connecté
-        cart, created = Cart.objects.get_or_create(user=request.user)
-    else:
-        # Utilisateur anonyme - utiliser la session
-        session_key = request.session.session_key
-        if session_key:
-            cart, created = Cart.objects.get_or_create(session_key=session_key)
-    
-    if cart:
-        cart_items_count = cart.total_items
-        cart_total = cart.total_price
-    
+    """Processeur de contexte pour le panier (évalué seulement si le gabarit l'utilise)"""
+    # Les gabarits appellent les variables exécutables : aucune requête tant qu'elles ne sont pas affichées
+    get_summary = cache(lambda: CartService.get_summary(request))
+
     return {
-        'cart': cart,
-        'cart_items_count': cart_items_count,
-        'cart_total': cart_total,
+        'cart': cache(lambda: CartService.get_cart(request)),
+        'cart_items_count': lambda: get_summary().total_items,
+        'cart_total': lambda: get_summary().total_price,
     }
-
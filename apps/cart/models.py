@@ -1,4 +1,8 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
 from apps.accounts.models import User
@@ -25,15 +29,35 @@ class Cart(models.Model):
             return f"Panier de {self.user.get_full_name()}"
         return f"Panier session {self.session_key}"
     
+    def _prefetched_items(self):
+        return getattr(self, '_prefetched_objects_cache', {}).get('items')
+    
+    def get_totals(self):
+        """Nombre d'articles et montant, en une requête d'agrégation"""
+        return self.items.aggregate(
+            total_items=Coalesce(Sum('quantity'), 0),
+            total_price=Coalesce(
+                Sum(F('quantity') * F('product__price'), output_field=models.DecimalField()),
+                Decimal('0'),
+                output_field=models.DecimalField()
+            ),
+        )
+    
     @property
     def total_items(self):
         """Nombre total d'articles dans le panier"""
-        return sum(item.quantity for item in self.items.all())
+        items = self._prefetched_items()
+        if items is not None:
+            return sum(item.quantity for item in items)
+        return self.get_totals()['total_items']
     
     @property
     def total_price(self):
         """Prix total du panier"""
-        return sum(item.total_price for item in self.items.all())
+        items = self._prefetched_items()
+        if items is not None:
+            return sum((item.total_price for item in items), Decimal('0'))
+        return self.get_totals()['total_price']
     
     @property
     def is_empty(self):
@@ -0,0 +1,53 @@
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Cart
+
+
+CartSummary = namedtuple('CartSummary', ['cart_id', 'total_items', 'total_price'])
+
+EMPTY_SUMMARY = CartSummary(None, 0, Decimal('0'))
+
+
+def _totals():
+    """Agrégats du nombre d'articles et du montant, sur la relation des articles du panier"""
+    return {
+        'summary_items': Coalesce(Sum('items__quantity'), 0),
+        'summary_total': Coalesce(
+            Sum(F('items__quantity') * F('items__product__price'), output_field=DecimalField()),
+            Decimal('0'),
+            output_field=DecimalField()
+        ),
+    }
+
+
+class CartService:
+    """Service de lecture des paniers"""
+
+    @staticmethod
+    def get_cart(request):
+        """Panier de la requête s'il existe (n'en crée jamais)"""
+        if request.user.is_authenticated:
+            return Cart.objects.filter(user=request.user).first()
+        session_key = request.session.session_key
+        if session_key:
+            return Cart.objects.filter(session_key=session_key).first()
+        return None
+
+    @staticmethod
+    def get_summary(request):
+        """Nombre d'articles et montant du panier de la requête, en une requête"""
+        if request.user.is_authenticated:
+            carts = Cart.objects.filter(user=request.user)
+        elif request.session.session_key:
+            carts = Cart.objects.filter(session_key=request.session.session_key)
+        else:
+            return EMPTY_SUMMARY
+
+        row = carts.annotate(**_totals()).values_list('id', 'summary_items', 'summary_total').first()
+        if row is None:
+            return EMPTY_SUMMARY
+        return CartSummary(*row)
@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import RequestFactory, TestCase
+
+from apps.products.models import Category, Product
+from .context_processors import cart as cart_context
+from .models import Cart, CartItem
+from .services import EMPTY_SUMMARY, CartService
+
+
+User = get_user_model()
+
+
+class CartSummaryTests(TestCase):
+    """Résumé du panier lu en une requête agrégée, sans créer de panier"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='client@example.com', username='client', password='secret', first_name='Client', last_name='Test'
+        )
+        category = Category.objects.create(name='Montres', slug='montres')
+        cls.watch, cls.ring = (
+            Product.objects.create(
+                name=slug, slug=slug, description='-', sku=slug, category=category, price=price, status='published'
+            )
+            for slug, price in [('montre', Decimal('120.50')), ('bague', Decimal('40'))]
+        )
+
+    def request(self, user=None, session_key=None):
+        request = RequestFactory().get('/')
+        request.user = user or AnonymousUser()
+        request.session = SessionStore(session_key)
+        return request
+
+    def test_summary_is_one_aggregate_query(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.watch, quantity=2)
+        CartItem.objects.create(cart=cart, product=self.ring, quantity=1)
+        with self.assertNumQueries(1):
+            summary = CartService.get_summary(self.request(self.user))
+        self.assertEqual(summary, (cart.pk, 3, Decimal('281.00')))
+
+    def test_reading_never_creates_a_cart(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(CartService.get_summary(self.request()), EMPTY_SUMMARY)
+        self.assertEqual(CartService.get_summary(self.request(self.user)), EMPTY_SUMMARY)
+        self.assertIsNone(CartService.get_cart(self.request(self.user)))
+        self.assertFalse(Cart.objects.exists())
+
+    def test_context_processor_queries_once_and_only_when_used(self):
+        Cart.objects.create(user=self.user)
+        with self.assertNumQueries(0):
+            context = cart_context(self.request(self.user))
+        with self.assertNumQueries(1):
+            self.assertEqual(context['cart_items_count'](), 0)
+            self.assertEqual(context['cart_total'](), Decimal('0'))
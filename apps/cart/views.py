@@ -11,6 +11,7 @@ from django.utils.translation import gettext_lazy as _
 from .models import Cart, CartItem, Wishlist, WishlistItem
 from .serializers import CartSerializer, CartItemSerializer, WishlistSerializer, WishlistItemSerializer
 from apps.products.models import Product
+from apps.recommendations.services import BehaviorTrackingService, FrequentlyBoughtTogetherService
 
 
 class CartView(generics.RetrieveAPIView):
@@ -107,6 +108,7 @@ def add_to_cart_view(request, product_id):
         # Mettre à jour la quantité si l'article existe déjà
         cart_item.quantity += quantity
         cart_item.save()
+    BehaviorTrackingService.track_add_to_cart(request.user, request.session.session_key, product)
     
     serializer = CartItemSerializer(cart_item)
     return Response({
@@ -270,6 +272,9 @@ class CartPageView(LoginRequiredMixin, TemplateView):
         cart, created = Cart.objects.get_or_create(user=self.request.user)
         context['cart'] = cart
         context['cart_items'] = cart.items.select_related('product').all()
+        context['bought_together'] = FrequentlyBoughtTogetherService.get_products(
+            [item.product_id for item in context['cart_items']], limit=4
+        )
         return context
 
 
@@ -319,6 +324,7 @@ def add_to_cart_page_view(request, product_id):
         messages.success(request, f'Quantité mise à jour pour {product.name}.')
     else:
         messages.success(request, f'{product.name} ajouté au panier.')
+    BehaviorTrackingService.track_add_to_cart(request.user, request.session.session_key, product)
     
     return redirect('cart:cart')
 
@@ -0,0 +1,138 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Tampon en mémoire vidé par lots dans un thread d'arrière-plan"""
+
+    # Erreurs de connexion : le lot est retenté sans limite, max_pending borne la mémoire
+    TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+    def __init__(self, flush_callback, max_size=500, interval=5.0, max_pending=None, max_attempts=3, name='buffer'):
+        self.flush_callback = flush_callback
+        self.max_size = max_size
+        self.interval = interval
+        self.max_pending = max_pending or max_size * 20
+        self.max_attempts = max_attempts
+        self.name = name
+        self._items = []
+        self._attempts = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def add(self, item):
+        """Ajoute un élément ; n'écrit jamais dans le thread appelant"""
+        with self._lock:
+            self._ensure_worker()
+            self._items.append(item)
+            size = len(self._items)
+            if size > self.max_pending:
+                # Base indisponible : on abandonne les plus anciens plutôt que de saturer la mémoire
+                dropped = size - self.max_pending
+                del self._items[:dropped]
+                logger.warning(f"{self.name}: {dropped} éléments abandonnés, tampon plein")
+        if size >= self.max_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Écrit les éléments en attente, retourne le nombre écrit
+
+        Un lot en échec et ceux qui le suivent sont remis en tête du tampon pour le prochain passage ;
+        le rappel doit donc écrire chaque lot entièrement ou pas du tout. Après max_attempts échecs
+        hors erreur de connexion, le lot est scindé pour écrire les éléments valides et abandonner
+        les autres, afin qu'un élément invalide ne bloque pas la file.
+        """
+        with self._flush_lock:
+            with self._lock:
+                items, self._items = self._items, []
+            written = 0
+            for start in range(0, len(items), self.max_size):
+                batch = items[start:start + self.max_size]
+                try:
+                    self.flush_callback(batch)
+                except Exception as error:
+                    if not isinstance(error, self.TRANSIENT_ERRORS):
+                        self._attempts += 1
+                    if self._attempts < self.max_attempts:
+                        logger.exception(f"{self.name}: échec de l'écriture de {len(batch)} éléments, remis en attente")
+                        self._requeue(items[start:])
+                        return written
+                    self._attempts = 0
+                    written += self._split(batch)
+                else:
+                    self._attempts = 0
+                    written += len(batch)
+            return written
+
+    def _split(self, batch):
+        """Écrit un lot en échec par moitiés, abandonne les éléments qui échouent seuls"""
+        if len(batch) == 1:
+            logger.error(f"{self.name}: élément abandonné après {self.max_attempts} échecs : {batch[0]!r}")
+            return 0
+        written = 0
+        middle = len(batch) // 2
+        for half in (batch[:middle], batch[middle:]):
+            try:
+                self.flush_callback(half)
+            except Exception:
+                written += self._split(half)
+            else:
+                written += len(half)
+        return written
+
+    def _requeue(self, items):
+        """Remet des éléments non écrits avant les nouveaux, dans la limite de max_pending"""
+        with self._lock:
+            self._items = items + self._items
+            size = len(self._items)
+            if size > self.max_pending:
+                dropped = size - self.max_pending
+                del self._items[:dropped]
+                logger.warning(f"{self.name}: {dropped} éléments abandonnés, tampon plein")
+
+    def __len__(self):
+        return len(self._items)
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        if self._pid is not None and self._pid != pid:
+            # Processus forké : les éléments hérités seront écrits par le parent
+            self._items = []
+        if self._pid is None:
+            atexit.register(self._flush_at_exit)
+        self._pid = pid
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _flush_at_exit(self):
+        """Dernier vidage à l'arrêt, désactivé sous les tests où la base est déjà détruite"""
+        if not self._items or not getattr(settings, 'WRITE_BEHIND_FLUSH_AT_EXIT', True):
+            return
+        try:
+            connection.ensure_connection()
+        except DatabaseError:
+            logger.warning(f"{self.name}: base indisponible à l'arrêt, {len(self._items)} éléments non écrits")
+            return
+        self.flush()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
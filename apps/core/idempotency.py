@@ -0,0 +1,171 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.http.request import RawPostDataException
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def _ttl():
+    return timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def _cache_key(user_id, endpoint, key):
+    digest = hashlib.sha256(f'{user_id}:{endpoint}:{key}'.encode()).hexdigest()
+    return f'idempotency:{digest}'
+
+
+def provider_idempotency_key(request, scope):
+    """Clé d'idempotence à transmettre au prestataire, dérivée de l'en-tête du client (None sans en-tête)
+
+    Stable entre les nouveaux essais du client : une reprise après un premier appel interrompu
+    retrouve l'objet déjà créé chez le prestataire au lieu d'en créer un second.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key or not request.user.is_authenticated:
+        return None
+    digest = hashlib.sha256(f'{request.user.pk}:{request.path}:{key}'.encode()).hexdigest()
+    return f'{scope}:{digest}'
+
+
+def _request_hash(request):
+    try:
+        body = request.body
+    except RawPostDataException:
+        # Corps multipart déjà consommé par l'analyse du formulaire
+        body = json.dumps(request.data, cls=DjangoJSONEncoder, sort_keys=True, default=str).encode()
+    return hashlib.sha256(body).hexdigest()
+
+
+def _replay(request_hash, stored):
+    """Réponse enregistrée, ou 422 si la clé a servi pour une autre requête"""
+    stored_hash, response_status, response_body = stored
+    if stored_hash != request_hash:
+        return Response(
+            {'error': _('Cette clé d\'idempotence a déjà été utilisée pour une autre requête.')},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(response_body, status=response_status)
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def _claim(user, endpoint, key, request_hash):
+    """Prend la clé : (True, None) si elle est à nous, sinon (False, enregistrement existant)"""
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                user=user, endpoint=endpoint, key=key, request_hash=request_hash, expires_at=now + _ttl()
+            )
+        return True, None
+    except IntegrityError:
+        record = IdempotencyKey.objects.filter(user=user, endpoint=endpoint, key=key).first()
+    if record is None:
+        return _claim(user, endpoint, key, request_hash)
+
+    lock_timeout = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+    if record.status == 'in_progress' and record.locked_at < now - lock_timeout:
+        # Traitement interrompu (processus tué) : on reprend la clé
+        taken = IdempotencyKey.objects.filter(
+            pk=record.pk, status='in_progress', locked_at=record.locked_at
+        ).update(locked_at=now, request_hash=request_hash, expires_at=now + _ttl())
+        if taken:
+            return True, None
+    return False, record
+
+
+def _wait_for(record, cache_key):
+    """Attend la fin du traitement concurrent de la même clé"""
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 10)
+    delay = 0.02
+    while time.monotonic() < deadline:
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return stored
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None:
+            return None
+        if record.status == 'completed':
+            return record.request_hash, record.response_status, record.response_body
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+    return False
+
+
+def idempotent(view):
+    """Rejoue la réponse d'une requête POST déjà traitée avec le même en-tête Idempotency-Key"""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or request.method != 'POST' or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': _('Clé d\'idempotence trop longue.')}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        user = request.user
+        endpoint = request.path
+        request_hash = _request_hash(request)
+        cache_key = _cache_key(user.pk, endpoint, key)
+
+        # Réponse déjà connue : servie depuis le cache, sans requête SQL
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return _replay(request_hash, stored)
+
+        claimed, record = _claim(user, endpoint, key, request_hash)
+        if not claimed:
+            if record.status == 'completed':
+                stored = (record.request_hash, record.response_status, record.response_body)
+                cache.set(cache_key, stored, int(_ttl().total_seconds()))
+                return _replay(request_hash, stored)
+            stored = _wait_for(record, cache_key)
+            if stored is None:
+                # Le traitement concurrent a échoué : on rejoue la requête
+                return wrapper(request, *args, **kwargs)
+            if stored is False:
+                return Response(
+                    {'error': _('Une requête identique est en cours de traitement.')},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return _replay(request_hash, stored)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            IdempotencyKey.objects.filter(user=user, endpoint=endpoint, key=key).delete()
+            raise
+
+        if not isinstance(response, Response) or response.status_code >= 500:
+            # Erreur serveur ou réponse non rejouable : la clé est libérée pour un nouvel essai
+            IdempotencyKey.objects.filter(user=user, endpoint=endpoint, key=key).delete()
+            return response
+
+        # Forme JSON de la réponse, identique à celle relue en base
+        body = json.loads(json.dumps(response.data, cls=DjangoJSONEncoder))
+        IdempotencyKey.objects.filter(user=user, endpoint=endpoint, key=key).update(
+            status='completed', response_status=response.status_code, response_body=body
+        )
+        cache.set(cache_key, (request_hash, response.status_code, body), int(_ttl().total_seconds()))
+        return response
+
+    return wrapper
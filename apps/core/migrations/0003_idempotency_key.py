@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:02
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0002_siteinformation_hero_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, verbose_name='clé')),
+                ('endpoint', models.CharField(max_length=255, verbose_name="point d'accès")),
+                ('request_hash', models.CharField(max_length=64, verbose_name='empreinte de la requête')),
+                ('status', models.CharField(choices=[('in_progress', 'En cours'), ('completed', 'Terminée')], default='in_progress', max_length=20, verbose_name='statut')),
+                ('response_status', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='code de réponse')),
+                ('response_body', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='réponse')),
+                ('locked_at', models.DateTimeField(auto_now_add=True, verbose_name='verrouillée le')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='créé le')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='expire le')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': "Clé d'idempotence",
+                'verbose_name_plural': "Clés d'idempotence",
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('user', 'endpoint', 'key'), name='unique_idempotency_key'),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 
 class SiteInformation(models.Model):
     """Modèle pour gérer les informations générales du site"""
@@ -194,3 +195,38 @@ class SiteInformation(models.Model):
             }
         )
         return site_info
+
+
+class IdempotencyKey(models.Model):
+    """Clés d'idempotence des requêtes POST (commande, paiement) et réponses rejouées"""
+    
+    STATUS_CHOICES = [
+        ('in_progress', _('En cours')),
+        ('completed', _('Terminée')),
+    ]
+    
+    key = models.CharField(_('clé'), max_length=255)
+    user = models.ForeignKey(
+        'accounts.User', on_delete=models.CASCADE, null=True, blank=True, related_name='idempotency_keys'
+    )
+    endpoint = models.CharField(_('point d\'accès'), max_length=255)
+    request_hash = models.CharField(_('empreinte de la requête'), max_length=64)
+    
+    status = models.CharField(_('statut'), max_length=20, choices=STATUS_CHOICES, default='in_progress')
+    response_status = models.PositiveSmallIntegerField(_('code de réponse'), null=True, blank=True)
+    response_body = models.JSONField(_('réponse'), null=True, blank=True, encoder=DjangoJSONEncoder)
+    
+    locked_at = models.DateTimeField(_('verrouillée le'), auto_now_add=True)
+    created_at = models.DateTimeField(_('créé le'), auto_now_add=True)
+    expires_at = models.DateTimeField(_('expire le'), db_index=True)
+    
+    class Meta:
+        verbose_name = _('Clé d\'idempotence')
+        verbose_name_plural = _('Clés d\'idempotence')
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'endpoint', 'key'], name='unique_idempotency_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.endpoint} - {self.key}"
@@ -0,0 +1,222 @@
+import base64
+import datetime
+import decimal
+import hashlib
+import json
+import uuid
+from functools import reduce
+from operator import or_
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class InvalidCursor(Exception):
+    """Curseur illisible ou produit pour un autre tri"""
+
+
+class KeysetPage:
+    """Page de résultats paginée par curseur"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+def _ordering_of(queryset):
+    """Tri de la requête (explicite, sinon celui du modèle), départagé par la clé primaire"""
+    ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering) or ['-pk']
+    fields = []
+    for item in ordering:
+        if not isinstance(item, str) or item == '?':
+            raise ValueError(f'Tri non supporté pour la pagination par curseur : {item!r}')
+        descending = item.startswith('-')
+        name = item.lstrip('-')
+        fields.append((queryset.model._meta.pk.name if name == 'pk' else name, descending))
+    pk_name = queryset.model._meta.pk.name
+    if not any(name == pk_name for name, _ in fields):
+        fields.append((pk_name, fields[0][1]))
+    return fields
+
+
+def _signature(fields):
+    return ','.join(('-' if descending else '') + name for name, descending in fields)
+
+
+def _serialize(value):
+    # Précision complète : isoformat conserve les microsecondes
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f'Valeur non sérialisable dans un curseur : {value!r}')
+
+
+def encode_cursor(fields, values, reverse=False):
+    payload = {'o': _signature(fields), 'p': values, 'r': reverse}
+    return base64.urlsafe_b64encode(
+        json.dumps(payload, default=_serialize, separators=(',', ':')).encode()
+    ).decode().rstrip('=')
+
+
+def decode_cursor(model, fields, cursor):
+    """Position (valeurs typées) et sens d'un curseur"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if payload['o'] != _signature(fields) or len(payload['p']) != len(fields):
+            raise InvalidCursor(cursor)
+        values = [
+            model._meta.get_field(name).to_python(value)
+            for (name, _), value in zip(fields, payload['p'])
+        ]
+        return values, bool(payload['r'])
+    except (ValueError, KeyError, TypeError, ValidationError) as error:
+        raise InvalidCursor(cursor) from error
+
+
+def _after(fields, values):
+    """Condition « strictement après la position » pour un tri multi-colonnes"""
+    clauses = []
+    equal = {}
+    for (name, descending), value in zip(fields, values):
+        clauses.append(Q(**equal, **{f"{name}__{'lt' if descending else 'gt'}": value}))
+        equal[name] = value
+    return reduce(or_, clauses)
+
+
+def paginate_keyset(queryset, cursor=None, page_size=20):
+    """Page suivant (ou précédant) le curseur, sans OFFSET ni COUNT"""
+    fields = _ordering_of(queryset)
+    position, reverse = (None, False)
+    if cursor:
+        position, reverse = decode_cursor(queryset.model, fields, cursor)
+
+    scan_fields = [(name, descending != reverse) for name, descending in fields]
+    page_queryset = queryset.order_by(*[('-' if descending else '') + name for name, descending in scan_fields])
+    if position is not None:
+        page_queryset = page_queryset.filter(_after(scan_fields, position))
+
+    rows = list(page_queryset[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+    if not rows:
+        return KeysetPage(rows)
+
+    def values_of(row):
+        return [getattr(row, name) for name, _ in fields]
+
+    # En marche avant, une page suivante existe s'il reste des lignes ; en arrière, dès qu'on est parti d'un curseur
+    has_next = position is not None if reverse else has_more
+    has_previous = has_more if reverse else position is not None
+    next_cursor = encode_cursor(fields, values_of(rows[-1])) if has_next else None
+    previous_cursor = encode_cursor(fields, values_of(rows[0]), reverse=True) if has_previous else None
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def cached_count(queryset, timeout=60):
+    """COUNT(*) mis en cache quelques instants, par requête SQL"""
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    key = 'count:' + hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.order_by().count()
+        cache.set(key, count, timeout)
+    return count
+
+
+class KeysetPagination(BasePagination):
+    """Pagination DRF par curseur opaque sur le tri de la vue, départagé par l'identifiant"""
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    include_count = True
+    count_cache_timeout = 60
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.page = paginate_keyset(
+                queryset, request.query_params.get(self.cursor_query_param), self.get_page_size(request)
+            )
+        except InvalidCursor:
+            raise NotFound(_('Curseur invalide.'))
+        self.count = cached_count(queryset, self.count_cache_timeout) if self.include_count else None
+        return list(self.page)
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE or 20
+        try:
+            requested = int(request.query_params.get(self.page_size_query_param, page_size))
+        except ValueError:
+            return page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def cursor_url(request, cursor, param='cursor'):
+    """URL de la page courante avec un autre curseur (autres paramètres conservés)"""
+    url = request.get_full_path()
+    if cursor is None:
+        return remove_query_param(url, param)
+    return replace_query_param(url, param, cursor)
@@ -0,0 +1,279 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .buffers import WriteBehindBuffer
+from .idempotency import REPLAY_HEADER, _request_hash, idempotent, provider_idempotency_key
+from .models import IdempotencyKey
+from .pagination import InvalidCursor, _ordering_of, decode_cursor, encode_cursor, paginate_keyset
+from apps.products.models import Category, Product
+
+
+User = get_user_model()
+
+
+class WriteBehindBufferTests(SimpleTestCase):
+    """Vidage du tampon d'écriture différée"""
+
+    def make_buffer(self, callback, **kwargs):
+        # Sans thread d'écriture : seuls les vidages explicites du test écrivent
+        buffer = WriteBehindBuffer(callback, interval=3600, name='test', **kwargs)
+        buffer._ensure_worker = lambda: None
+        return buffer
+
+    def test_failed_batches_are_requeued_in_order(self):
+        written, failures = [], [1]
+
+        def callback(batch):
+            if failures:
+                failures.pop()
+                raise RuntimeError('base indisponible')
+            written.extend(batch)
+
+        buffer = self.make_buffer(callback, max_size=2)
+        for item in range(5):
+            buffer.add(item)
+        with self.assertLogs('apps.core.buffers', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(len(buffer), 5)
+
+        buffer.add(5)
+        self.assertEqual(buffer.flush(), 6)
+        self.assertEqual(written, [0, 1, 2, 3, 4, 5])
+        self.assertEqual(len(buffer), 0)
+
+    def test_requeue_keeps_at_most_max_pending(self):
+        def callback(batch):
+            raise RuntimeError('base indisponible')
+
+        buffer = self.make_buffer(callback, max_size=100, max_pending=10)
+        # Vidage final à l'arrêt : rien à écrire
+        self.addCleanup(lambda: buffer._items.clear())
+        for item in range(8):
+            buffer.add(item)
+        with self.assertLogs('apps.core.buffers', 'ERROR'):
+            buffer.flush()
+        for item in range(8, 12):
+            buffer.add(item)
+        # Les plus anciens sont abandonnés en premier
+        self.assertEqual(buffer._items, list(range(2, 12)))
+
+    def test_poison_item_is_dropped_after_max_attempts(self):
+        written = []
+
+        def callback(batch):
+            if 'invalide' in batch:
+                raise IntegrityError('contrainte violée')
+            written.extend(batch)
+
+        buffer = self.make_buffer(callback, max_size=4, max_attempts=2)
+        for item in [0, 1, 'invalide', 3, 4, 5]:
+            buffer.add(item)
+        with self.assertLogs('apps.core.buffers', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(len(buffer), 6)
+
+        # Deuxième échec : le lot est scindé, seul l'élément invalide est abandonné
+        with self.assertLogs('apps.core.buffers', 'ERROR') as logs:
+            self.assertEqual(buffer.flush(), 5)
+        self.assertIn("'invalide'", logs.output[-1])
+        self.assertEqual(written, [0, 1, 3, 4, 5])
+        self.assertEqual(len(buffer), 0)
+
+    def test_connection_errors_do_not_count_as_attempts(self):
+        def callback(batch):
+            raise OperationalError('base indisponible')
+
+        buffer = self.make_buffer(callback, max_size=10, max_attempts=1)
+        self.addCleanup(lambda: buffer._items.clear())
+        for item in range(3):
+            buffer.add(item)
+        for _ in range(3):
+            with self.assertLogs('apps.core.buffers', 'ERROR'):
+                buffer.flush()
+        self.assertEqual(buffer._items, [0, 1, 2])
+
+    @override_settings(WRITE_BEHIND_FLUSH_AT_EXIT=False)
+    def test_exit_flush_can_be_disabled(self):
+        written = []
+        buffer = self.make_buffer(written.extend)
+        self.addCleanup(lambda: buffer._items.clear())
+        buffer.add(1)
+        buffer._flush_at_exit()
+        self.assertEqual(written, [])
+
+
+class IdempotencyTests(TestCase):
+    """Rejeu des requêtes POST portant un en-tête Idempotency-Key"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='client@example.com', username='client', password='secret', first_name='Client', last_name='Test'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+        @api_view(['POST'])
+        @idempotent
+        def view(request):
+            self.calls.append(request.data)
+            return Response({'created': len(self.calls)}, status=201)
+
+        self.view = view
+
+    def post(self, data, key='cle-1'):
+        request = APIRequestFactory().post('/commande/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        force_authenticate(request, user=self.user)
+        return self.view(request)
+
+    def record(self, **fields):
+        return IdempotencyKey.objects.create(
+            user=self.user, endpoint='/commande/', key='cle-1', request_hash='-',
+            expires_at=timezone.now() + timedelta(hours=1), **fields
+        )
+
+    def test_same_request_is_replayed(self):
+        first = self.post({'order': 1})
+        second = self.post({'order': 1})
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual((second.status_code, second.data), (201, first.data))
+        self.assertEqual(second[REPLAY_HEADER], 'true')
+
+        # Cache vidé : la réponse est relue en base
+        cache.clear()
+        self.assertEqual(self.post({'order': 1}).data, first.data)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_reused_key_with_other_body_is_rejected(self):
+        self.post({'order': 1})
+        self.assertEqual(self.post({'order': 2}).status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_in_flight_key_is_awaited(self):
+        record = self.record()
+        request_hash = _request_hash(APIRequestFactory().post('/commande/', {'order': 1}, format='json'))
+
+        def finish(delay):
+            # Le traitement concurrent se termine pendant l'attente
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status='completed', request_hash=request_hash, response_status=201, response_body={'created': 7}
+            )
+
+        with mock.patch('apps.core.idempotency.time.sleep', side_effect=finish):
+            response = self.post({'order': 1})
+        self.assertEqual((response.status_code, response.data), (201, {'created': 7}))
+        self.assertEqual(self.calls, [])
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_in_flight_key_times_out_with_conflict(self):
+        self.record()
+        self.assertEqual(self.post({'order': 1}).status_code, 409)
+        self.assertEqual(self.calls, [])
+
+    def test_stale_lock_is_taken_over(self):
+        record = self.record()
+        IdempotencyKey.objects.filter(pk=record.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.post({'order': 1}).status_code, 201)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(IdempotencyKey.objects.get(pk=record.pk).status, 'completed')
+
+    def test_happy_path_cost(self):
+        # Prise de la clé (point de sauvegarde compris) puis enregistrement de la réponse
+        with self.assertNumQueries(4):
+            self.post({'order': 1})
+        # Rejeu servi depuis le cache, sans requête SQL
+        with self.assertNumQueries(0):
+            self.post({'order': 1})
+
+    def test_provider_key_is_stable_per_user_and_key(self):
+        def key_for(header, user=self.user):
+            request = APIRequestFactory().post('/commande/', HTTP_IDEMPOTENCY_KEY=header)
+            request.user = user
+            return provider_idempotency_key(request, 'paiement')
+
+        self.assertEqual(key_for('cle-1'), key_for('cle-1'))
+        self.assertNotEqual(key_for('cle-1'), key_for('cle-2'))
+        self.assertTrue(key_for('cle-1').startswith('paiement:'))
+
+
+class KeysetPaginationTests(TestCase):
+    """Pagination par curseur : position exacte, pages précédentes, valeurs ex aequo"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Bagues', slug='bagues')
+        # Trois prix seulement pour sept produits : l'identifiant départage les ex aequo
+        cls.products = [
+            Product.objects.create(
+                name=f'Bague {number}', slug=f'bague-{number}', description='-', sku=f'BAGUE-{number}',
+                category=category, price=10 * (number % 3), status='published'
+            )
+            for number in range(7)
+        ]
+
+    def queryset(self):
+        return Product.objects.order_by('price')
+
+    def walk(self, page_size):
+        pages, cursor = [], None
+        while True:
+            page = paginate_keyset(self.queryset(), cursor, page_size)
+            pages.append(page)
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_cursor_round_trip(self):
+        fields = _ordering_of(self.queryset())
+        self.assertEqual(fields, [('price', False), ('id', False)])
+        product = self.products[4]
+        cursor = encode_cursor(fields, [product.price, product.pk], reverse=True)
+        self.assertEqual(decode_cursor(Product, fields, cursor), ([product.price, product.pk], True))
+
+    def test_cursor_from_another_ordering_is_rejected(self):
+        cursor = encode_cursor(_ordering_of(Product.objects.order_by('-name')), ['Bague 1', 1])
+        with self.assertRaises(InvalidCursor):
+            paginate_keyset(self.queryset(), cursor)
+        with self.assertRaises(InvalidCursor):
+            paginate_keyset(self.queryset(), 'illisible')
+
+    def test_forward_pages_cover_ties_once(self):
+        pages = self.walk(page_size=2)
+        seen = [product.pk for page in pages for product in page]
+        self.assertEqual(seen, [product.pk for product in self.queryset()])
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertFalse(pages[0].has_previous())
+
+    def test_previous_pages_mirror_forward_pages(self):
+        pages = self.walk(page_size=3)
+        for index in range(len(pages) - 1, 0, -1):
+            previous = paginate_keyset(self.queryset(), pages[index].previous_cursor, 3)
+            self.assertEqual(list(previous), list(pages[index - 1]))
+            self.assertTrue(previous.has_next())
+        first = paginate_keyset(self.queryset(), pages[1].previous_cursor, 3)
+        self.assertFalse(first.has_previous())
+
+    def test_api_product_list_pages_with_cursor(self):
+        url = reverse('products:product-list-api')
+        response = self.client.get(url, {'ordering': 'price', 'page_size': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 7)
+        names = [product['name'] for product in response.json()['results']]
+
+        following = self.client.get(response.json()['next']).json()
+        names += [product['name'] for product in following['results']]
+        self.assertIsNone(following['next'])
+        self.assertEqual(sorted(names), sorted(product.name for product in self.products))
+        self.assertEqual(self.client.get(url, {'cursor': 'illisible'}).status_code, 404)
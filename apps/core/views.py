@@ -15,10 +15,9 @@ class HomeView(TemplateView):
         context = super().get_context_data(**kwargs)
         
         # Produits en vedette
-        context['featured_products'] = Product.objects.filter(
-            status='published',
+        context['featured_products'] = Product.objects.published().filter(
             is_featured=True
-        ).select_related('category', 'brand').prefetch_related('images')[:8]
+        ).for_listing()[:8]
         
         # Nouvelles catégories
         context['categories'] = Category.objects.filter(
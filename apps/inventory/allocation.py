@@ -0,0 +1,104 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.i18n.models import ShippingZone
+from .models import ZONE_RANKINGS_CACHE_KEY, Warehouse, WarehouseRoute
+
+
+class FulfillmentAllocator:
+    """Choix des entrepôts d'une commande : le moins d'expéditions possible, puis le coût vers la zone"""
+
+    @staticmethod
+    def rankings():
+        """Entrepôts actifs classés pour chaque zone de livraison, précalculés et mis en cache"""
+        rankings = cache.get(ZONE_RANKINGS_CACHE_KEY)
+        if rankings is not None:
+            return rankings
+
+        warehouses = list(Warehouse.objects.filter(is_active=True).values_list(
+            'id', 'is_default', 'current_capacity', 'max_capacity'
+        ))
+        # Entrepôt saturé : servi en dernier recours
+        saturated = {
+            warehouse_id for warehouse_id, _default, current, maximum in warehouses
+            if maximum is not None and current >= maximum
+        }
+        fallback = [
+            warehouse_id for warehouse_id, is_default, _current, _maximum in sorted(
+                warehouses, key=lambda row: (row[0] in saturated, not row[1], row[0])
+            )
+        ]
+
+        routes = defaultdict(list)
+        for zone_id, warehouse_id, cost, delivery_days in WarehouseRoute.objects.filter(
+            is_active=True, warehouse__is_active=True, shipping_zone__is_active=True
+        ).values_list('shipping_zone_id', 'warehouse_id', 'cost', 'delivery_days'):
+            routes[zone_id].append((warehouse_id in saturated, cost, delivery_days, warehouse_id))
+        zones = {}
+        for zone_id, zone_routes in routes.items():
+            routed = [warehouse_id for *_key, warehouse_id in sorted(zone_routes)]
+            # Entrepôts sans route vers la zone : après les autres, dans l'ordre par défaut
+            zones[zone_id] = routed + [warehouse_id for warehouse_id in fallback if warehouse_id not in routed]
+
+        countries = {}
+        for zone_id, code, name in ShippingZone.countries.through.objects.filter(
+            shippingzone__is_active=True
+        ).values_list('shippingzone_id', 'country__code', 'country__name'):
+            countries[code.lower()] = zone_id
+            countries[name.lower()] = zone_id
+
+        rankings = {
+            'zones': zones,
+            'default': fallback,
+            'countries': countries,
+            'default_zone': ShippingZone.objects.filter(is_default=True, is_active=True).values_list(
+                'id', flat=True
+            ).first(),
+        }
+        cache.set(ZONE_RANKINGS_CACHE_KEY, rankings, getattr(settings, 'ZONE_RANKINGS_CACHE_SECONDS', 300))
+        return rankings
+
+    @staticmethod
+    def ranking_for(country, rankings=None):
+        """Entrepôts dans l'ordre de préférence pour un pays de livraison (nom ou code ISO)"""
+        rankings = rankings or FulfillmentAllocator.rankings()
+        zone_id = rankings['countries'].get((country or '').strip().lower(), rankings['default_zone'])
+        return rankings['zones'].get(zone_id, rankings['default'])
+
+    @staticmethod
+    def plan(quantities, available, ranking):
+        """Répartit {produit: quantité} entre entrepôts ; retourne (répartition, produit manquant)"""
+        # Un seul entrepôt capable de tout servir : le mieux classé
+        for warehouse_id in ranking:
+            if all(available.get((product_id, warehouse_id), 0) >= quantity for product_id, quantity in quantities.items()):
+                return {product_id: [(warehouse_id, quantity)] for product_id, quantity in quantities.items()}, None
+
+        # Sinon couverture gloutonne : l'entrepôt qui sert le plus de lignes entières, puis d'unités
+        remaining = dict(quantities)
+        candidates = list(ranking)
+        allocation = defaultdict(list)
+        while remaining:
+            best, best_key = None, (0, 0)
+            for warehouse_id in candidates:
+                full = units = 0
+                for product_id, quantity in remaining.items():
+                    stock = available.get((product_id, warehouse_id), 0)
+                    full += stock >= quantity
+                    units += min(stock, quantity)
+                # Égalité : l'ordre du classement (coût, délai) départage
+                if (full, units) > best_key:
+                    best, best_key = warehouse_id, (full, units)
+            if best is None:
+                return None, next(iter(remaining))
+
+            candidates.remove(best)
+            for product_id in list(remaining):
+                taken = min(available.get((product_id, best), 0), remaining[product_id])
+                if taken:
+                    allocation[product_id].append((best, taken))
+                    remaining[product_id] -= taken
+                    if not remaining[product_id]:
+                        del remaining[product_id]
+        return dict(allocation), None
@@ -5,4 +5,6 @@ class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.inventory'
     verbose_name = 'Inventaire'
-
+    
+    def ready(self):
+        from . import signals  # noqa: F401
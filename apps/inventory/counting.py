@@ -0,0 +1,236 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from apps.products.models import Product
+from .models import InventoryCount, InventoryCountItem, StockLevel, StockMovement
+from .services import StockLedgerService
+
+
+class InventoryCountError(Exception):
+    """Inventaire impossible à importer ou à clôturer (statut, fichier)"""
+
+
+def read_count_file(lines, file_format='csv'):
+    """Lit un fichier de scanner ligne à ligne et produit des couples (sku, quantité)
+
+    CSV avec en-tête (colonnes sku et quantity) ou JSONL ({"sku": ..., "quantity": ...}) ;
+    sans quantité, une ligne compte pour un scan. Quantité illisible : None.
+    """
+    if file_format == 'jsonl':
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                yield str(row['sku']).strip(), _quantity(row.get('quantity', 1))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                yield None, None
+        return
+
+    if file_format != 'csv':
+        raise InventoryCountError(_('Format de fichier inconnu : {}.').format(file_format))
+    reader = csv.reader(lines)
+    header = [column.strip().lower() for column in next(reader, [])]
+    if 'sku' not in header:
+        raise InventoryCountError(_('Colonne sku absente de l\'en-tête.'))
+    sku_column = header.index('sku')
+    quantity_column = header.index('quantity') if 'quantity' in header else None
+    for row in reader:
+        if not row:
+            continue
+        try:
+            quantity = 1 if quantity_column is None else _quantity(row[quantity_column])
+            yield row[sku_column].strip(), quantity
+        except IndexError:
+            yield None, None
+
+
+def _quantity(value):
+    """Quantité entière positive ou nulle, None si illisible"""
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        return None
+    return quantity if quantity >= 0 else None
+
+
+class InventoryCountService:
+    """Inventaires physiques : ouverture, import des comptages en flux et clôture avec ajustements"""
+
+    @staticmethod
+    @transaction.atomic
+    def start(inventory_count, batch_size=2000):
+        """Ouvre l'inventaire : un élément par niveau de stock de l'entrepôt, quantité attendue figée"""
+        levels = StockLevel.objects.filter(warehouse_id=inventory_count.warehouse_id).values_list(
+            'product_id', 'current_stock'
+        ).iterator(chunk_size=batch_size)
+        while True:
+            chunk = list(islice(levels, batch_size))
+            if not chunk:
+                break
+            InventoryCountItem.objects.bulk_create([
+                InventoryCountItem(inventory_count=inventory_count, product_id=product_id, expected_quantity=stock)
+                for product_id, stock in chunk
+            ], ignore_conflicts=True)
+
+        inventory_count.status = 'in_progress'
+        inventory_count.started_at = timezone.now()
+        inventory_count.save(update_fields=['status', 'started_at', 'updated_at'])
+        InventoryCountService._update_totals(inventory_count)
+
+    @staticmethod
+    @transaction.atomic
+    def import_counts(inventory_count, rows, user=None, replace=False, batch_size=5000):
+        """Importe des comptages (sku, quantité) par lots en mémoire constante ; retourne les statistiques
+
+        Les quantités d'un même SKU s'additionnent (plusieurs scans, plusieurs fichiers) ;
+        replace efface d'abord les comptages déjà importés.
+        """
+        if inventory_count.status in ('completed', 'cancelled'):
+            raise InventoryCountError(_('L\'inventaire {} est clos.').format(inventory_count.name))
+        if inventory_count.status == 'planned':
+            InventoryCountService.start(inventory_count)
+
+        items = InventoryCountItem.objects.filter(inventory_count=inventory_count)
+        if replace:
+            items.update(
+                counted_quantity=None, difference=0, is_counted=False, has_discrepancy=False,
+                counted_by=None, counted_at=None
+            )
+        skus = dict(Product.objects.values_list('sku', 'id').iterator())
+        known = set(items.values_list('product_id', flat=True))
+        stats = {'lines': 0, 'counted': 0, 'unknown': 0, 'rejected': 0}
+        counted_at = timezone.now()
+
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                break
+            quantities = defaultdict(int)
+            for sku, quantity in chunk:
+                if quantity is None or not sku:
+                    stats['rejected'] += 1
+                elif sku not in skus:
+                    stats['unknown'] += 1
+                else:
+                    quantities[skus[sku]] += quantity
+            stats['lines'] += len(chunk)
+            stats['counted'] += sum(quantities.values())
+
+            # Produits trouvés hors de la liste initiale : attendus au stock actuel du niveau, ou à zéro
+            missing = [product_id for product_id in quantities if product_id not in known]
+            if missing:
+                expected = dict(StockLevel.objects.filter(
+                    warehouse_id=inventory_count.warehouse_id, product_id__in=missing
+                ).values_list('product_id', 'current_stock'))
+                InventoryCountItem.objects.bulk_create([
+                    InventoryCountItem(
+                        inventory_count=inventory_count, product_id=product_id,
+                        expected_quantity=expected.get(product_id, 0)
+                    )
+                    for product_id in missing
+                ], ignore_conflicts=True)
+                known.update(missing)
+            InventoryCountService._add_counts(inventory_count, quantities, user, counted_at)
+
+        # Écarts calculés en une requête plutôt qu'élément par élément dans save()
+        items.filter(counted_quantity__isnull=False).update(
+            difference=F('counted_quantity') - F('expected_quantity'),
+            is_counted=True,
+            has_discrepancy=Case(
+                When(counted_quantity=F('expected_quantity'), then=Value(False)), default=Value(True)
+            )
+        )
+        InventoryCountService._update_totals(inventory_count)
+        return stats
+
+    @staticmethod
+    def _add_counts(inventory_count, quantities, user, counted_at):
+        """Ajoute les quantités comptées d'un lot en une requête préparée"""
+        if not quantities:
+            return
+        table = connection.ops.quote_name(InventoryCountItem._meta.db_table)
+        quantity, counted_by, counted_at_column, count_column, product_column = (
+            connection.ops.quote_name(column) for column in (
+                'counted_quantity', 'counted_by_id', 'counted_at', 'inventory_count_id', 'product_id'
+            )
+        )
+        counted_at = InventoryCountItem._meta.get_field('counted_at').get_db_prep_save(counted_at, connection)
+        user_id = user.pk if user else None
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {table} SET {quantity} = COALESCE({quantity}, 0) + %s, {counted_by} = %s, '
+                f'{counted_at_column} = %s WHERE {count_column} = %s AND {product_column} = %s',
+                [
+                    (counted, user_id, counted_at, inventory_count.pk, product_id)
+                    for product_id, counted in quantities.items()
+                ]
+            )
+
+    @staticmethod
+    def _update_totals(inventory_count):
+        """Met à jour les totaux de l'inventaire en une agrégation"""
+        totals = InventoryCountItem.objects.filter(inventory_count=inventory_count).aggregate(
+            total_products=Count('id'),
+            counted_products=Count('id', filter=Q(is_counted=True)),
+            discrepancies=Count('id', filter=Q(has_discrepancy=True))
+        )
+        InventoryCount.objects.filter(pk=inventory_count.pk).update(**totals)
+        for field, value in totals.items():
+            setattr(inventory_count, field, value)
+
+    @staticmethod
+    @transaction.atomic
+    def complete(inventory_count, user=None, adjust=True, batch_size=1000):
+        """Clôture l'inventaire ; avec adjust, un mouvement d'ajustement par écart, insérés par lots"""
+        inventory_count.status = InventoryCount.objects.select_for_update().values_list(
+            'status', flat=True
+        ).get(pk=inventory_count.pk)
+        if inventory_count.status != 'in_progress':
+            raise InventoryCountError(_('L\'inventaire {} n\'est pas en cours.').format(inventory_count.name))
+
+        items = InventoryCountItem.objects.filter(inventory_count=inventory_count)
+        adjusted = 0
+        if adjust:
+            # L'écart s'applique au stock actuel : les mouvements passés pendant le comptage sont conservés ;
+            # une perte peut dépasser le stock non réservé
+            discrepancies = items.filter(has_discrepancy=True).order_by('product_id').values_list(
+                'product_id', 'difference'
+            ).iterator(chunk_size=batch_size)
+            while True:
+                chunk = list(islice(discrepancies, batch_size))
+                if not chunk:
+                    break
+                StockLedgerService.record_many([
+                    StockMovement(
+                        product_id=product_id,
+                        warehouse_id=inventory_count.warehouse_id,
+                        movement_type='adjustment',
+                        reason='adjustment',
+                        quantity=abs(difference),
+                        delta=difference,
+                        reference_number=f'INV-{inventory_count.pk}',
+                        notes=inventory_count.name,
+                        created_by=user
+                    )
+                    for product_id, difference in chunk
+                ], from_count=True)
+                adjusted += len(chunk)
+
+        now = timezone.now()
+        StockLevel.objects.filter(
+            warehouse_id=inventory_count.warehouse_id,
+            product_id__in=items.filter(is_counted=True).values('product_id')
+        ).update(last_count=now)
+        inventory_count.status = 'completed'
+        inventory_count.completed_at = now
+        inventory_count.save(update_fields=['status', 'completed_at', 'updated_at'])
+        return adjusted
@@ -0,0 +1,228 @@
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+from statistics import NormalDist
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.orders.models import OrderItem
+from .models import PurchaseOrder, PurchaseOrderItem, StockLevel, StockMovement, SupplierProduct
+
+
+OPEN_PURCHASE_STATUSES = ('draft', 'sent', 'confirmed', 'partial')
+
+
+def forecast_demand(history, lead_times, review_days=7, service_level=0.95, smoothing=0.05):
+    """Prévision vectorisée d'un bloc de séries journalières (séries x jours)
+
+    Retourne la demande journalière, le stock de sécurité, le point et la quantité de commande.
+    """
+    series, days = history.shape
+    lead_times = np.asarray(lead_times, dtype=np.float64)
+
+    # Niveau : moyenne exponentielle des 180 derniers jours, en un produit matrice-vecteur
+    window = min(days, 180)
+    weights = smoothing * (1 - smoothing) ** np.arange(window - 1, -1, -1, dtype=np.float64)
+    rate = history[:, -window:] @ (weights / weights.sum())
+
+    # Variabilité sur les 90 derniers jours
+    recent = history[:, -min(days, 90):]
+    sigma = recent.std(axis=1, ddof=1) if recent.shape[1] > 1 else np.zeros(series)
+
+    # Saisonnalité annuelle : demande de la même période l'an dernier rapportée à la moyenne de l'année
+    horizon = np.minimum(lead_times + review_days, 365).astype(np.int64)
+    season = np.ones(series)
+    if days >= 365:
+        cumulative = np.zeros((series, days + 1))
+        np.cumsum(history, axis=1, out=cumulative[:, 1:])
+        start = days - 365
+        same_period = np.take_along_axis(cumulative, (start + horizon)[:, None], axis=1)[:, 0] - cumulative[:, start]
+        baseline = (cumulative[:, days] - cumulative[:, start]) / 365
+        with np.errstate(divide='ignore', invalid='ignore'):
+            season = np.where(baseline > 0, same_period / horizon / baseline, 1.0)
+        season = np.clip(season, 0.5, 2.0)
+
+    demand = rate * season
+    safety_stock = NormalDist().inv_cdf(service_level) * sigma * np.sqrt(lead_times)
+    reorder_point = np.ceil(demand * lead_times + safety_stock)
+    reorder_quantity = np.ceil(demand * review_days)
+    return demand, safety_stock, reorder_point, reorder_quantity
+
+
+class ReorderService:
+    """Points de commande calculés depuis l'historique des ventes et brouillons de commandes d'achat"""
+
+    @staticmethod
+    def recommend(history_days=None, batch_size=2000):
+        """Met à jour la prévision et les seuils de commande de tous les niveaux de stock, par blocs"""
+        history_days = history_days or getattr(settings, 'FORECAST_HISTORY_DAYS', 730)
+        review_days = getattr(settings, 'FORECAST_REVIEW_DAYS', 7)
+        service_level = getattr(settings, 'FORECAST_SERVICE_LEVEL', 0.95)
+        start = timezone.localdate() - timedelta(days=history_days)
+        now = timezone.now()
+
+        levels = StockLevel.objects.filter(
+            warehouse__is_active=True, product__track_inventory=True
+        ).order_by('product_id', '-warehouse__is_default', 'warehouse_id').values_list(
+            'id', 'product_id', 'warehouse_id'
+        ).iterator(chunk_size=batch_size)
+        # Produit sans fournisseur référencé : délai par défaut, pas de quantité minimum
+        unknown = (None, getattr(settings, 'FORECAST_DEFAULT_LEAD_TIME_DAYS', 7), 1, None)
+        updated, carry = 0, []
+        while True:
+            block, carry = carry + list(islice(levels, batch_size)), []
+            if not block:
+                return updated
+            # Ne pas couper les niveaux d'un même produit entre deux blocs
+            for level in levels:
+                if level[1] != block[-1][1]:
+                    carry = [level]
+                    break
+                block.append(level)
+
+            history = ReorderService._history(block, start, history_days)
+            suppliers = ReorderService._preferred_suppliers({product_id for _id, product_id, _w in block})
+            lead_times = [suppliers.get(product_id, unknown)[1] for _id, product_id, _w in block]
+            minimums = np.array([suppliers.get(product_id, unknown)[2] for _id, product_id, _w in block])
+
+            demand, safety_stock, reorder_point, reorder_quantity = forecast_demand(
+                history, lead_times, review_days=review_days, service_level=service_level
+            )
+            reorder_quantity = np.where(demand > 0, np.maximum(reorder_quantity, minimums), 0)
+            ReorderService._save(now, [
+                (
+                    Decimal(f'{demand[index]:.3f}'),
+                    math.ceil(safety_stock[index]),
+                    int(reorder_point[index]),
+                    int(reorder_quantity[index]),
+                    level_id
+                )
+                for index, (level_id, _product_id, _warehouse_id) in enumerate(block)
+            ])
+            updated += len(block)
+
+    @staticmethod
+    def _save(forecast_at, rows, batch_size=500):
+        """Écrit les prévisions d'un bloc par lots de bulk_update"""
+        StockLevel.objects.bulk_update([
+            StockLevel(
+                id=level_id, forecast_at=forecast_at, daily_demand=daily_demand, safety_stock=safety_stock,
+                reorder_point=reorder_point, reorder_quantity=reorder_quantity
+            )
+            for daily_demand, safety_stock, reorder_point, reorder_quantity, level_id in rows
+        ], ['forecast_at', 'daily_demand', 'safety_stock', 'reorder_point', 'reorder_quantity'], batch_size=batch_size)
+
+    @staticmethod
+    def _history(block, start, days):
+        """Demande journalière du bloc (niveaux x jours), lue en deux requêtes agrégées"""
+        index = {(product_id, warehouse_id): position for position, (_id, product_id, warehouse_id) in enumerate(block)}
+        # Commandes antérieures au journal : attribuées au premier niveau du produit (entrepôt par défaut d'abord)
+        first_level = {}
+        for position, (_id, product_id, _warehouse_id) in enumerate(block):
+            first_level.setdefault(product_id, position)
+
+        # Borne en date et heure : comparaison directe sur la colonne, sans conversion ligne à ligne
+        since = timezone.make_aware(datetime.combine(start, time.min))
+        rows = []
+        for product_id, warehouse_id, day, quantity in StockMovement.objects.filter(
+            product_id__in=list(first_level), reason='sale', delta__lt=0, timestamp__gte=since
+        ).annotate(day=TruncDate('timestamp')).values_list('product_id', 'warehouse_id', 'day').annotate(
+            quantity=-Sum('delta')
+        ).order_by():
+            if (product_id, warehouse_id) in index:
+                rows.append((index[(product_id, warehouse_id)], (day - start).days, quantity))
+
+        for product_id, day, quantity in OrderItem.objects.filter(
+            product_id__in=list(first_level), order__created_at__gte=since
+        ).exclude(order__status__in=['cancelled', 'refunded']).filter(
+            ~Exists(StockMovement.objects.filter(order=OuterRef('order_id'), reason='sale'))
+        ).annotate(day=TruncDate('order__created_at')).values_list('product_id', 'day').annotate(
+            quantity=Sum('quantity')
+        ).order_by():
+            rows.append((first_level[product_id], (day - start).days, quantity))
+
+        history = np.zeros(len(block) * days)
+        if rows:
+            positions, day_offsets, quantities = np.array(rows, dtype=np.float64).T
+            keep = (day_offsets >= 0) & (day_offsets < days)
+            history = np.bincount(
+                (positions[keep] * days + day_offsets[keep]).astype(np.int64),
+                weights=quantities[keep],
+                minlength=len(block) * days
+            )
+        return history.reshape(len(block), days)
+
+    @staticmethod
+    def _preferred_suppliers(product_ids):
+        """{produit: (fournisseur, délai en jours, quantité minimum, coût unitaire)} : préféré, sinon le moins cher"""
+        suppliers = {}
+        for product_id, supplier_id, delivery_days, supplier_days, minimum, unit_cost in SupplierProduct.objects.filter(
+            product_id__in=product_ids, supplier__is_active=True
+        ).order_by('product_id', '-is_preferred', 'unit_cost').values_list(
+            'product_id', 'supplier_id', 'delivery_time_days', 'supplier__delivery_time_days', 'minimum_quantity', 'unit_cost'
+        ):
+            suppliers.setdefault(product_id, (supplier_id, delivery_days or supplier_days, minimum, unit_cost))
+        return suppliers
+
+    @staticmethod
+    @transaction.atomic
+    def draft_purchase_orders(user):
+        """Brouillons de commandes d'achat, par fournisseur et entrepôt, des niveaux sous leur point de commande"""
+        incoming = defaultdict(int)
+        for product_id, warehouse_id, quantity in PurchaseOrderItem.objects.filter(
+            purchase_order__status__in=OPEN_PURCHASE_STATUSES
+        ).values_list('product_id', 'purchase_order__warehouse_id').annotate(
+            quantity=Sum(F('quantity_ordered') - F('quantity_received'))
+        ).order_by():
+            incoming[(product_id, warehouse_id)] = quantity
+
+        candidates = list(StockLevel.objects.filter(
+            warehouse__is_active=True, product__track_inventory=True, reorder_point__gt=0,
+            available_stock__lte=F('reorder_point')
+        ).values_list('product_id', 'warehouse_id', 'available_stock', 'reorder_point', 'reorder_quantity'))
+        suppliers = ReorderService._preferred_suppliers({row[0] for row in candidates})
+
+        lines = defaultdict(list)
+        for product_id, warehouse_id, available, reorder_point, reorder_quantity in candidates:
+            # Position : disponible plus commandes d'achat en cours
+            position = available + incoming[(product_id, warehouse_id)]
+            if product_id not in suppliers or position > reorder_point:
+                continue
+            supplier_id, delivery_days, minimum, unit_cost = suppliers[product_id]
+            quantity = max(reorder_point + reorder_quantity - position, minimum)
+            lines[(supplier_id, warehouse_id)].append((product_id, quantity, unit_cost, delivery_days))
+
+        purchase_orders = []
+        for (supplier_id, warehouse_id), items in sorted(lines.items()):
+            subtotal = sum(quantity * unit_cost for _product_id, quantity, unit_cost, _days in items)
+            expected_delivery = timezone.now() + timedelta(days=max(days for *_line, days in items))
+            purchase_order = PurchaseOrder(
+                supplier_id=supplier_id,
+                warehouse_id=warehouse_id,
+                created_by=user,
+                subtotal=subtotal,
+                total_amount=subtotal,
+                expected_delivery=expected_delivery,
+                notes='Brouillon généré depuis la prévision de la demande'
+            )
+            purchase_order.save()
+            PurchaseOrderItem.objects.bulk_create([
+                PurchaseOrderItem(
+                    purchase_order=purchase_order,
+                    product_id=product_id,
+                    quantity_ordered=quantity,
+                    unit_cost=unit_cost,
+                    total_cost=quantity * unit_cost,
+                    expected_delivery=expected_delivery
+                )
+                for product_id, quantity, unit_cost, _days in items
+            ])
+            purchase_orders.append(purchase_order)
+        return purchase_orders
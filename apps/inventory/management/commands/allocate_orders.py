@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.inventory.services import StockReservationService
+
+
+class Command(BaseCommand):
+    help = 'Répartit entre entrepôts et réserve le stock des commandes en attente sans réservation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        allocated, unserved = StockReservationService.reserve_pending_orders(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{allocated} commandes réservées, {unserved} sans stock suffisant'))
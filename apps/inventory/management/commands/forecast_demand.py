@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.inventory.forecasting import ReorderService
+
+
+class Command(BaseCommand):
+    help = 'Prévoit la demande et recalcule les points de commande, puis prépare les commandes d\'achat'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--draft-orders', metavar='EMAIL', help='Crée les brouillons de commandes d\'achat au nom de cet utilisateur')
+
+    def handle(self, *args, **options):
+        updated = ReorderService.recommend(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{updated} niveaux de stock prévus'))
+
+        if options['draft_orders']:
+            try:
+                user = get_user_model().objects.get(email=options['draft_orders'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'Utilisateur introuvable : {options["draft_orders"]}')
+            purchase_orders = ReorderService.draft_purchase_orders(user)
+            self.stdout.write(self.style.SUCCESS(f'{len(purchase_orders)} brouillons de commandes d\'achat créés'))
@@ -0,0 +1,55 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.inventory.counting import InventoryCountError, InventoryCountService, read_count_file
+from apps.inventory.models import InventoryCount
+from apps.inventory.services import InsufficientStock
+
+
+class Command(BaseCommand):
+    help = 'Importe un fichier de scanner (CSV ou JSONL) dans un inventaire et calcule les écarts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('inventory_count', type=int, help='Identifiant de l\'inventaire')
+        parser.add_argument('path', help='Fichier de comptage, - pour l\'entrée standard')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Par défaut : d\'après l\'extension')
+        parser.add_argument('--user', metavar='EMAIL', help='Utilisateur auteur du comptage')
+        parser.add_argument('--replace', action='store_true', help='Efface les comptages déjà importés')
+        parser.add_argument('--complete', action='store_true', help='Clôture l\'inventaire après l\'import')
+        parser.add_argument('--no-adjust', action='store_true', help='Clôture sans mouvements d\'ajustement')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            inventory_count = InventoryCount.objects.get(pk=options['inventory_count'])
+        except InventoryCount.DoesNotExist:
+            raise CommandError(f'Inventaire introuvable : {options["inventory_count"]}')
+        user = None
+        if options['user']:
+            user = get_user_model().objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f'Utilisateur introuvable : {options["user"]}')
+
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        try:
+            stats = InventoryCountService.import_counts(
+                inventory_count, read_count_file(stream, file_format), user=user,
+                replace=options['replace'], batch_size=options['batch_size']
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{stats["lines"]} lignes lues, {stats["counted"]} unités comptées, '
+                f'{stats["unknown"]} SKU inconnus, {stats["rejected"]} lignes rejetées ; '
+                f'{inventory_count.counted_products}/{inventory_count.total_products} produits comptés, '
+                f'{inventory_count.discrepancies} écarts'
+            ))
+            if options['complete']:
+                adjusted = InventoryCountService.complete(inventory_count, user=user, adjust=not options['no_adjust'])
+                self.stdout.write(self.style.SUCCESS(f'Inventaire clôturé, {adjusted} ajustements de stock'))
+        except (InventoryCountError, InsufficientStock) as e:
+            raise CommandError(str(e))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
@@ -0,0 +1,110 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from apps.inventory.models import StockLevel, StockMovement
+from apps.products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Compare les niveaux de stock au journal des mouvements et corrige les écarts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Affiche les écarts sans les corriger')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        
+        # Deux flux triés sur (produit, entrepôt) parcourus en parallèle : mémoire constante
+        ledger = StockMovement.objects.values_list('product_id', 'warehouse_id').annotate(
+            total=Sum('delta')
+        ).order_by('product_id', 'warehouse_id').iterator(chunk_size=batch_size)
+        levels = StockLevel.objects.values_list('id', 'product_id', 'warehouse_id', 'current_stock').order_by(
+            'product_id', 'warehouse_id'
+        ).iterator(chunk_size=batch_size)
+        
+        drifted = []
+        orphans = []
+        checked = 0
+        entry = next(ledger, None)
+        for level_id, product_id, warehouse_id, current_stock in levels:
+            checked += 1
+            while entry is not None and entry[:2] < (product_id, warehouse_id):
+                # Mouvements sans niveau de stock
+                orphans.append(entry)
+                entry = next(ledger, None)
+            expected = 0
+            if entry is not None and entry[:2] == (product_id, warehouse_id):
+                expected = entry[2]
+                entry = next(ledger, None)
+            if current_stock != expected:
+                drifted.append(level_id)
+        while entry is not None:
+            orphans.append(entry)
+            entry = next(ledger, None)
+        orphans = [orphan for orphan in orphans if orphan[2]]
+        
+        self.stdout.write(
+            f'{checked} niveaux de stock vérifiés, {len(drifted)} en écart, '
+            f'{len(orphans)} sans niveau de stock'
+        )
+        
+        products = self.drifted_products(batch_size)
+        self.stdout.write(f'{len(products)} produits dont la quantité diffère du stock des entrepôts')
+        
+        if options['dry_run'] or not (drifted or orphans or products):
+            return
+        
+        with transaction.atomic():
+            StockLevel.objects.bulk_create([
+                StockLevel(product_id=product_id, warehouse_id=warehouse_id) for product_id, warehouse_id, _total in orphans
+            ], ignore_conflicts=True, batch_size=batch_size)
+            drifted += list(StockLevel.objects.filter(
+                product_id__in={product_id for product_id, _w, _t in orphans}
+            ).values_list('id', flat=True))
+            
+            # Recalcul dans la requête de mise à jour : les mouvements concurrents ne sont pas perdus
+            ledger_total = Coalesce(Subquery(
+                StockMovement.objects.filter(
+                    product_id=OuterRef('product_id'), warehouse_id=OuterRef('warehouse_id')
+                ).values('product_id', 'warehouse_id').annotate(total=Sum('delta')).values('total')
+            ), Value(0), output_field=IntegerField())
+            for start in range(0, len(drifted), batch_size):
+                StockLevel.objects.filter(pk__in=drifted[start:start + batch_size]).update(
+                    current_stock=ledger_total,
+                    available_stock=Greatest(ledger_total - F('reserved_stock'), Value(0))
+                )
+            
+            products = self.drifted_products(batch_size)
+            warehouse_total = Coalesce(Subquery(
+                StockLevel.objects.filter(product_id=OuterRef('pk')).values('product_id').annotate(
+                    total=Sum('current_stock')
+                ).values('total')
+            ), Value(0), output_field=IntegerField())
+            for start in range(0, len(products), batch_size):
+                Product.objects.filter(pk__in=products[start:start + batch_size]).update(quantity=warehouse_total)
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(drifted)} niveaux de stock et {len(products)} produits corrigés'
+        ))
+
+    def drifted_products(self, batch_size):
+        """Produits dont Product.quantity n'est pas la somme du stock physique des entrepôts"""
+        drifted = []
+        totals = StockLevel.objects.values_list('product_id').annotate(total=Sum('current_stock')).order_by(
+            'product_id'
+        ).iterator(chunk_size=batch_size)
+        chunk = []
+        for row in totals:
+            chunk.append(row)
+            if len(chunk) == batch_size:
+                drifted += self.compare_products(chunk)
+                chunk = []
+        return drifted + self.compare_products(chunk)
+
+    def compare_products(self, chunk):
+        quantities = dict(Product.objects.filter(pk__in=[product_id for product_id, _total in chunk]).values_list(
+            'id', 'quantity'
+        ))
+        return [product_id for product_id, total in chunk if quantities.get(product_id) != total]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:58
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+        ('products', '0003_category_closure'),
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='quantité')),
+                ('status', models.CharField(choices=[('active', 'Active'), ('confirmed', 'Confirmée'), ('released', 'Libérée'), ('expired', 'Expirée')], default='active', max_length=20, verbose_name='statut')),
+                ('expires_at', models.DateTimeField(verbose_name='expire le')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='créé le')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='modifié le')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='orders.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='products.product')),
+                ('stock_level', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='inventory.stocklevel')),
+            ],
+            options={
+                'verbose_name': 'Réservation de stock',
+                'verbose_name_plural': 'Réservations de stock',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='inventory_s_status_c656ef_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def open_stock_ledger(apps, schema_editor):
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    StockLevel = apps.get_model('inventory', 'StockLevel')
+    # Variation signée des mouvements existants, déduite du type
+    StockMovement.objects.filter(movement_type__in=['in', 'return']).update(delta=models.F('quantity'))
+    StockMovement.objects.filter(movement_type__in=['out', 'damage', 'expired']).update(delta=-models.F('quantity'))
+
+    # Solde d'ouverture : le journal repart du stock actuel des niveaux
+    totals = {
+        (row['product_id'], row['warehouse_id']): row['total']
+        for row in StockMovement.objects.values('product_id', 'warehouse_id').annotate(
+            total=models.Sum('delta')
+        ).order_by()
+    }
+    openings = []
+    for level in StockLevel.objects.only('product_id', 'warehouse_id', 'current_stock', 'average_cost').iterator():
+        difference = level.current_stock - totals.get((level.product_id, level.warehouse_id), 0)
+        if difference:
+            openings.append(StockMovement(
+                product_id=level.product_id,
+                warehouse_id=level.warehouse_id,
+                movement_type='adjustment',
+                reason='adjustment',
+                quantity=abs(difference),
+                delta=difference,
+                unit_cost=level.average_cost or None,
+                notes='Solde d\'ouverture du journal'
+            ))
+    StockMovement.objects.bulk_create(openings, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_category_closure'),
+        ('inventory', '0002_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='delta',
+            field=models.IntegerField(default=0, verbose_name='variation'),
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='quantité')),
+                ('last_movement_id', models.PositiveBigIntegerField(verbose_name='dernier mouvement')),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='arrêté le')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='products.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='inventory.warehouse')),
+            ],
+            options={
+                'verbose_name': 'Instantané de stock',
+                'verbose_name_plural': 'Instantanés de stock',
+                'ordering': ['-taken_at'],
+                'indexes': [models.Index(fields=['product', 'warehouse', 'taken_at'], name='inventory_s_product_900bf0_idx')],
+            },
+        ),
+        migrations.RunPython(open_stock_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:17
+
+from django.db import migrations, models
+
+
+def deactivate_duplicate_alerts(apps, schema_editor):
+    StockAlert = apps.get_model('inventory', 'StockAlert')
+    seen = set()
+    duplicates = []
+    for alert_id, stock_level_id, alert_type in StockAlert.objects.filter(is_active=True).order_by(
+        '-created_at', '-id'
+    ).values_list('id', 'stock_level_id', 'alert_type').iterator():
+        if (stock_level_id, alert_type) in seen:
+            duplicates.append(alert_id)
+        seen.add((stock_level_id, alert_type))
+    StockAlert.objects.filter(id__in=duplicates).update(is_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stocklevel',
+            index=models.Index(condition=models.Q(('available_stock__lte', models.F('min_stock_level'))), fields=['warehouse'], name='stock_level_low_idx'),
+        ),
+        migrations.RunPython(deactivate_duplicate_alerts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stockalert',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('stock_level', 'alert_type'), name='unique_active_stock_alert'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('i18n', '0001_initial'),
+        ('inventory', '0004_low_stock_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WarehouseRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name="coût d'expédition")),
+                ('delivery_days', models.PositiveIntegerField(default=1, verbose_name='délai (jours)')),
+                ('is_active', models.BooleanField(default=True, verbose_name='actif')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='créé le')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='modifié le')),
+                ('shipping_zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='warehouse_routes', to='i18n.shippingzone')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routes', to='inventory.warehouse')),
+            ],
+            options={
+                'verbose_name': "Route d'expédition",
+                'verbose_name_plural': "Routes d'expédition",
+                'ordering': ['shipping_zone', 'cost', 'delivery_days'],
+                'unique_together': {('warehouse', 'shipping_zone')},
+            },
+        ),
+    ]
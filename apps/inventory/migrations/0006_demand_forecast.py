@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_category_closure'),
+        ('inventory', '0005_warehouse_route'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocklevel',
+            name='daily_demand',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=10, verbose_name='demande journalière'),
+        ),
+        migrations.AddField(
+            model_name='stocklevel',
+            name='forecast_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='prévision du'),
+        ),
+        migrations.AddField(
+            model_name='stocklevel',
+            name='safety_stock',
+            field=models.PositiveIntegerField(default=0, verbose_name='stock de sécurité'),
+        ),
+        migrations.CreateModel(
+            name='SupplierProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('supplier_sku', models.CharField(blank=True, max_length=100, verbose_name='référence fournisseur')),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='coût unitaire')),
+                ('minimum_quantity', models.PositiveIntegerField(default=1, verbose_name='quantité minimum')),
+                ('delivery_time_days', models.PositiveIntegerField(blank=True, null=True, verbose_name='délai de livraison (jours)')),
+                ('is_preferred', models.BooleanField(default=False, verbose_name='fournisseur préféré')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='créé le')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='modifié le')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='supplier_products', to='products.product')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='supplier_products', to='inventory.supplier')),
+            ],
+            options={
+                'verbose_name': 'Produit fournisseur',
+                'verbose_name_plural': 'Produits fournisseur',
+                'ordering': ['product', '-is_preferred', 'unit_cost'],
+                'unique_together': {('supplier', 'product')},
+            },
+        ),
+    ]
@@ -1,11 +1,14 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
 User = get_user_model()
 
+ZONE_RANKINGS_CACHE_KEY = 'inventory:zone_rankings'
+
 
 class Warehouse(models.Model):
     """Entrepôts pour la gestion multi-entrepôts"""
@@ -48,6 +51,29 @@ class Warehouse(models.Model):
         super().save(*args, **kwargs)
 
 
+class WarehouseRoute(models.Model):
+    """Coût et délai d'expédition d'un entrepôt vers une zone de livraison"""
+    
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='routes')
+    shipping_zone = models.ForeignKey('i18n.ShippingZone', on_delete=models.CASCADE, related_name='warehouse_routes')
+    
+    cost = models.DecimalField(_('coût d\'expédition'), max_digits=10, decimal_places=2, default=0)
+    delivery_days = models.PositiveIntegerField(_('délai (jours)'), default=1)
+    is_active = models.BooleanField(_('actif'), default=True)
+    
+    created_at = models.DateTimeField(_('créé le'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('modifié le'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Route d\'expédition')
+        verbose_name_plural = _('Routes d\'expédition')
+        unique_together = ['warehouse', 'shipping_zone']
+        ordering = ['shipping_zone', 'cost', 'delivery_days']
+    
+    def __str__(self):
+        return f"{self.warehouse.name} → {self.shipping_zone.name}"
+
+
 class StockMovement(models.Model):
     """Mouvements de stock"""
     
@@ -73,6 +99,10 @@ class StockMovement(models.Model):
         ('other', _('Autre')),
     ]
     
+    # Sens du mouvement déduit du type ; ajustements et transferts portent une variation explicite
+    INBOUND_TYPES = ('in', 'return')
+    OUTBOUND_TYPES = ('out', 'damage', 'expired')
+    
     product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='stock_movements')
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='stock_movements')
     
@@ -82,6 +112,8 @@ class StockMovement(models.Model):
     quantity = models.IntegerField(_('quantité'), validators=[MinValueValidator(1)])
     unit_cost = models.DecimalField(_('coût unitaire'), max_digits=10, decimal_places=2, null=True, blank=True)
     total_cost = models.DecimalField(_('coût total'), max_digits=12, decimal_places=2, null=True, blank=True)
+    # Variation signée du stock physique (négative pour les sorties)
+    delta = models.IntegerField(_('variation'), default=0)
     
     # Références
     reference_number = models.CharField(_('numéro de référence'), max_length=100, blank=True)
@@ -106,11 +138,27 @@ class StockMovement(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.get_movement_type_display()} ({self.quantity})"
     
-    def save(self, *args, **kwargs):
-        # Calculer le coût total
+    def set_totals(self):
+        """Calcule le coût total et la variation signée"""
         if self.unit_cost and self.quantity:
             self.total_cost = self.unit_cost * self.quantity
-        super().save(*args, **kwargs)
+        if not self.delta:
+            if self.movement_type in self.INBOUND_TYPES:
+                self.delta = self.quantity
+            elif self.movement_type in self.OUTBOUND_TYPES:
+                self.delta = -self.quantity
+    
+    def save(self, *args, **kwargs):
+        self.set_totals()
+        if not self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        
+        # Le journal fait foi : le niveau de stock suit dans la même transaction
+        from .services import StockLedgerService
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            StockLedgerService.apply([self])
 
 
 class StockLevel(models.Model):
@@ -134,6 +182,11 @@ class StockLevel(models.Model):
     average_cost = models.DecimalField(_('coût moyen'), max_digits=10, decimal_places=2, default=0)
     last_cost = models.DecimalField(_('dernier coût'), max_digits=10, decimal_places=2, null=True, blank=True)
     
+    # Prévision de la demande (calculée par ReorderService)
+    daily_demand = models.DecimalField(_('demande journalière'), max_digits=10, decimal_places=3, default=0)
+    safety_stock = models.PositiveIntegerField(_('stock de sécurité'), default=0)
+    forecast_at = models.DateTimeField(_('prévision du'), null=True, blank=True)
+    
     # Dates
     last_movement = models.DateTimeField(_('dernier mouvement'), null=True, blank=True)
     last_count = models.DateTimeField(_('dernier inventaire'), null=True, blank=True)
@@ -146,6 +199,14 @@ class StockLevel(models.Model):
         verbose_name_plural = _('Niveaux de stock')
         unique_together = ['product', 'warehouse']
         ordering = ['product__name', 'warehouse__name']
+        indexes = [
+            # Index partiel : ne contient que les lignes en stock bas, quelle que soit la taille de la matrice
+            models.Index(
+                fields=['warehouse'],
+                condition=models.Q(available_stock__lte=models.F('min_stock_level')),
+                name='stock_level_low_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.product.name} - {self.warehouse.name} ({self.current_stock})"
@@ -166,6 +227,63 @@ class StockLevel(models.Model):
         return self.available_stock <= self.reorder_point
 
 
+class StockSnapshot(models.Model):
+    """Stock physique d'un produit dans un entrepôt, arrêté à un mouvement du journal"""
+
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='stock_snapshots')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='stock_snapshots')
+
+    quantity = models.IntegerField(_('quantité'))
+    # Tous les mouvements d'identifiant inférieur ou égal sont inclus dans la quantité
+    last_movement_id = models.PositiveBigIntegerField(_('dernier mouvement'))
+    taken_at = models.DateTimeField(_('arrêté le'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('Instantané de stock')
+        verbose_name_plural = _('Instantanés de stock')
+        ordering = ['-taken_at']
+        indexes = [
+            models.Index(fields=['product', 'warehouse', 'taken_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} - {self.warehouse.name} ({self.quantity})"
+
+
+class StockReservation(models.Model):
+    """Réservations de stock d'une commande en attente de paiement"""
+
+    STATUS_CHOICES = [
+        ('active', _('Active')),
+        ('confirmed', _('Confirmée')),
+        ('released', _('Libérée')),
+        ('expired', _('Expirée')),
+    ]
+
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='stock_reservations')
+    # Vide pour les produits sans niveau de stock : la réservation porte alors sur Product.quantity
+    stock_level = models.ForeignKey(StockLevel, on_delete=models.CASCADE, null=True, blank=True, related_name='reservations')
+    order = models.ForeignKey('orders.Order', on_delete=models.CASCADE, null=True, blank=True, related_name='stock_reservations')
+
+    quantity = models.PositiveIntegerField(_('quantité'), validators=[MinValueValidator(1)])
+    status = models.CharField(_('statut'), max_length=20, choices=STATUS_CHOICES, default='active')
+
+    expires_at = models.DateTimeField(_('expire le'))
+    created_at = models.DateTimeField(_('créé le'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('modifié le'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Réservation de stock')
+        verbose_name_plural = _('Réservations de stock')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} x{self.quantity} ({self.get_status_display()})"
+
+
 class StockAlert(models.Model):
     """Alertes de stock"""
     
@@ -210,6 +328,14 @@ class StockAlert(models.Model):
             models.Index(fields=['alert_type', 'is_active']),
             models.Index(fields=['alert_level', 'is_resolved']),
         ]
+        constraints = [
+            # Une seule alerte active par niveau de stock et type : sert aussi l'anti-jointure de détection
+            models.UniqueConstraint(
+                fields=['stock_level', 'alert_type'],
+                condition=models.Q(is_active=True),
+                name='unique_active_stock_alert'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.product.name} - {self.get_alert_type_display()}"
@@ -334,6 +460,32 @@ class Supplier(models.Model):
         return f"{self.name} ({self.code})"
 
 
+class SupplierProduct(models.Model):
+    """Produits proposés par un fournisseur"""
+    
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='supplier_products')
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='supplier_products')
+    
+    supplier_sku = models.CharField(_('référence fournisseur'), max_length=100, blank=True)
+    unit_cost = models.DecimalField(_('coût unitaire'), max_digits=10, decimal_places=2)
+    minimum_quantity = models.PositiveIntegerField(_('quantité minimum'), default=1)
+    # Vide : délai de livraison du fournisseur
+    delivery_time_days = models.PositiveIntegerField(_('délai de livraison (jours)'), null=True, blank=True)
+    is_preferred = models.BooleanField(_('fournisseur préféré'), default=False)
+    
+    created_at = models.DateTimeField(_('créé le'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('modifié le'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Produit fournisseur')
+        verbose_name_plural = _('Produits fournisseur')
+        unique_together = ['supplier', 'product']
+        ordering = ['product', '-is_preferred', 'unit_cost']
+    
+    def __str__(self):
+        return f"{self.product.name} - {self.supplier.name}"
+
+
 class PurchaseOrder(models.Model):
     """Commandes d'achat"""
     
@@ -0,0 +1,606 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case, DecimalField, Exists, ExpressionWrapper, F, IntegerField, Max, OuterRef, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from apps.orders.models import Order, OrderItem
+from apps.products.models import Product
+from .allocation import FulfillmentAllocator
+from .models import StockAlert, StockLevel, StockMovement, StockReservation, StockSnapshot
+
+
+class InsufficientStock(Exception):
+    """Stock disponible insuffisant pour une ligne de commande"""
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+        super().__init__(
+            _('Stock insuffisant pour {} (quantité demandée : {}).').format(product.name, quantity)
+        )
+
+
+class _Shortfall(Exception):
+    """Une ligne d'un lot n'a pas pu être servie"""
+
+
+class StockReservationService:
+    """Réservation du stock des commandes par mises à jour conditionnelles"""
+
+    @staticmethod
+    def reservation_ttl():
+        return timedelta(minutes=getattr(settings, 'STOCK_RESERVATION_TTL_MINUTES', 15))
+
+    @staticmethod
+    @transaction.atomic
+    def reserve(order, lines, ttl=None, ranking=None):
+        """Réserve le stock de toutes les lignes (produit, quantité) ou d'aucune, réparti entre entrepôts"""
+        quantities = defaultdict(int)
+        products = {}
+        for product, quantity in lines:
+            if product.track_inventory:
+                quantities[product.pk] += quantity
+                products[product.pk] = product
+        if ranking is None:
+            ranking = FulfillmentAllocator.ranking_for(StockReservationService._country(order))
+
+        # Lecture sans verrou puis mise à jour conditionnelle ; relecture verrouillée si un concurrent est passé avant
+        for lock in (False, True):
+            available, level_ids = StockReservationService._availability(list(quantities), lock=lock)
+            takes, short = StockReservationService._allocate(quantities, available, level_ids, ranking)
+            if takes is None:
+                raise InsufficientStock(products[short], quantities[short])
+            if StockReservationService._take_all(takes, level_ids):
+                break
+        else:
+            # Seuls les produits sans niveau de stock peuvent encore manquer
+            stock = dict(Product.objects.filter(pk__in=list(quantities)).values_list('id', 'quantity'))
+            short = next(
+                (product_id for product_id, warehouse_id, quantity in takes
+                 if warehouse_id is None and stock.get(product_id, 0) < quantity),
+                takes[0][0]
+            )
+            raise InsufficientStock(products[short], quantities[short])
+
+        expires_at = timezone.now() + (ttl or StockReservationService.reservation_ttl())
+        return StockReservation.objects.bulk_create(
+            StockReservationService._reservations(order, takes, level_ids, expires_at)
+        )
+
+    @staticmethod
+    def reserve_orders(orders, ttl=None):
+        """Réserve le stock d'un lot de commandes en un nombre fixe de requêtes ; retourne les commandes non servies"""
+        orders = list(orders)
+        lines = defaultdict(lambda: defaultdict(int))
+        for order_id, product_id, quantity in OrderItem.objects.filter(
+            order__in=orders, product__track_inventory=True
+        ).values_list('order_id', 'product_id', 'quantity'):
+            lines[order_id][product_id] += quantity
+
+        product_ids = {product_id for quantities in lines.values() for product_id in quantities}
+        available, level_ids = StockReservationService._availability(list(product_ids))
+        stocked = {product_id for product_id, _warehouse_id in level_ids}
+        bare_stock = dict(Product.objects.filter(pk__in=product_ids - stocked).values_list('id', 'quantity'))
+        rankings = FulfillmentAllocator.rankings()
+
+        # Répartition en mémoire, commande par commande (les plus anciennes d'abord)
+        plans = {}
+        unserved = []
+        for order in orders:
+            quantities = lines.get(order.pk)
+            if not quantities:
+                continue
+            ranking = FulfillmentAllocator.ranking_for(StockReservationService._country(order), rankings)
+            takes, _short = StockReservationService._allocate(quantities, available, level_ids, ranking)
+            if takes is None or any(
+                warehouse_id is None and bare_stock.get(product_id, 0) < quantity
+                for product_id, warehouse_id, quantity in takes
+            ):
+                unserved.append(order)
+                continue
+            for product_id, warehouse_id, quantity in takes:
+                if warehouse_id is None:
+                    bare_stock[product_id] -= quantity
+                else:
+                    available[(product_id, warehouse_id)] -= quantity
+            plans[order] = takes
+
+        if not plans:
+            return unserved
+        expires_at = timezone.now() + (ttl or StockReservationService.reservation_ttl())
+        with transaction.atomic():
+            # Une mise à jour conditionnelle pour tout le lot
+            if StockReservationService._take_all(
+                [take for takes in plans.values() for take in takes], level_ids
+            ):
+                StockReservation.objects.bulk_create([
+                    reservation
+                    for order, takes in plans.items()
+                    for reservation in StockReservationService._reservations(order, takes, level_ids, expires_at)
+                ], batch_size=1000)
+                return unserved
+
+        # Stock pris entre-temps par une commande concurrente : réservation commande par commande
+        products = Product.objects.in_bulk(list(product_ids))
+        for order in plans:
+            try:
+                StockReservationService.reserve(
+                    order, [(products[product_id], quantity) for product_id, quantity in lines[order.pk].items()], ttl=ttl
+                )
+            except InsufficientStock:
+                unserved.append(order)
+        return unserved
+
+    @staticmethod
+    def reserve_pending_orders(batch_size=500):
+        """Réserve par lots les commandes en attente qui n'ont encore aucune réservation"""
+        # Commandes sans produit suivi en stock : rien à réserver, elles ne sont ni comptées ni relues
+        pending = Order.objects.filter(status='pending').filter(
+            ~Exists(StockReservation.objects.filter(order=OuterRef('pk'))),
+            Exists(OrderItem.objects.filter(order=OuterRef('pk'), product__track_inventory=True))
+        ).select_related('shipping_address').order_by('pk')
+        allocated = unserved = 0
+        last_pk = 0
+        while True:
+            orders = list(pending.filter(pk__gt=last_pk)[:batch_size])
+            if not orders:
+                return allocated, unserved
+            missing = len(StockReservationService.reserve_orders(orders))
+            allocated += len(orders) - missing
+            unserved += missing
+            last_pk = orders[-1].pk
+
+    @staticmethod
+    def shipments(order):
+        """Expéditions d'une commande : {entrepôt: [(produit, quantité)]} d'après ses réservations"""
+        shipments = defaultdict(list)
+        for reservation in order.stock_reservations.filter(status__in=['active', 'confirmed']).select_related(
+            'product', 'stock_level__warehouse'
+        ):
+            warehouse = reservation.stock_level.warehouse if reservation.stock_level else None
+            shipments[warehouse].append((reservation.product, reservation.quantity))
+        return dict(shipments)
+
+    @staticmethod
+    def _country(order):
+        return order.shipping_address.country if order.shipping_address_id else ''
+
+    @staticmethod
+    def _availability(product_ids, lock=False):
+        """Disponible par (produit, entrepôt actif) et identifiants des niveaux de stock"""
+        levels = StockLevel.objects.filter(product_id__in=product_ids, warehouse__is_active=True)
+        if lock:
+            levels = levels.select_for_update().order_by('pk')
+        available = {}
+        level_ids = {}
+        for level_id, product_id, warehouse_id, stock in levels.values_list(
+            'id', 'product_id', 'warehouse_id', 'available_stock'
+        ):
+            available[(product_id, warehouse_id)] = stock
+            level_ids[(product_id, warehouse_id)] = level_id
+        return available, level_ids
+
+    @staticmethod
+    def _allocate(quantities, available, level_ids, ranking):
+        """Prélèvements (produit, entrepôt ou None, quantité), ou (None, produit manquant)"""
+        stocked = {product_id for product_id, _warehouse_id in level_ids}
+        plan, short = FulfillmentAllocator.plan(
+            {product_id: quantity for product_id, quantity in quantities.items() if product_id in stocked},
+            available, ranking
+        )
+        if plan is None:
+            return None, short
+        takes = [
+            (product_id, warehouse_id, quantity)
+            for product_id, parts in plan.items() for warehouse_id, quantity in parts
+        ]
+        # Produits sans niveau de stock : prélevés sur Product.quantity
+        takes += [
+            (product_id, None, quantity) for product_id, quantity in quantities.items() if product_id not in stocked
+        ]
+        return takes, None
+
+    @staticmethod
+    def _take_all(takes, level_ids):
+        """Applique les prélèvements en un nombre fixe de requêtes, tous ou aucun"""
+        levels = defaultdict(int)
+        bare = defaultdict(int)
+        for product_id, warehouse_id, quantity in takes:
+            if warehouse_id is None:
+                bare[product_id] += quantity
+            else:
+                levels[level_ids[(product_id, warehouse_id)]] += quantity
+        try:
+            with transaction.atomic():
+                if levels:
+                    StockReservationService._decrement(
+                        StockLevel, levels, 'available_stock', reserved_field='reserved_stock'
+                    )
+                if bare:
+                    StockReservationService._decrement(Product, bare, 'quantity')
+        except _Shortfall:
+            return False
+        return True
+
+    @staticmethod
+    def _reservations(order, takes, level_ids, expires_at):
+        return [
+            StockReservation(
+                product_id=product_id,
+                stock_level_id=level_ids[(product_id, warehouse_id)] if warehouse_id is not None else None,
+                order=order,
+                quantity=quantity,
+                expires_at=expires_at
+            )
+            for product_id, warehouse_id, quantity in sorted(takes, key=lambda take: (take[0], take[1] or 0))
+        ]
+
+    @staticmethod
+    def _decrement(model, quantities, field, reserved_field=None):
+        """Décrémente un champ de plusieurs lignes (et incrémente le réservé) en une mise à jour conditionnelle"""
+        # Verrous pris dans l'ordre des clés primaires avant la mise à jour
+        list(model.objects.select_for_update().filter(pk__in=list(quantities)).order_by('pk').values_list('pk'))
+        wanted = Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+            output_field=IntegerField()
+        )
+        values = {field: F(field) - wanted}
+        if reserved_field:
+            values[reserved_field] = F(reserved_field) + wanted
+        if any(f.name == 'updated_at' for f in model._meta.concrete_fields):
+            values['updated_at'] = timezone.now()
+        updated = model.objects.filter(pk__in=list(quantities), **{f'{field}__gte': wanted}).update(**values)
+        if updated != len(quantities):
+            raise _Shortfall()
+
+    @staticmethod
+    @transaction.atomic
+    def confirm(order):
+        """Transforme les réservations actives d'une commande payée en sorties de stock
+
+        Réservations expirées avant le paiement : le stock est repris d'abord, ou InsufficientStock est levée.
+        Attend les verrous de release_expired : les lignes qu'il libère sont relues comme expirées.
+        """
+        reservations = list(
+            StockReservation.objects.select_for_update().filter(
+                order=order, status='active'
+            ).order_by('product_id', 'id')
+        )
+        if StockReservation.objects.filter(order=order, status='expired').exists():
+            reservations += StockReservationService._reserve_missing(order)
+        totals = StockReservationService._totals_by_level(reservations)
+        if totals:
+            levels = {
+                level_id: (product_id, warehouse_id)
+                for level_id, product_id, warehouse_id in StockLevel.objects.filter(
+                    pk__in=[level_id for level_id, _quantity in totals]
+                ).values_list('id', 'product_id', 'warehouse_id')
+            }
+            # Sorties du journal prises sur le stock réservé
+            StockLedgerService.record_many([
+                StockMovement(
+                    product_id=levels[stock_level_id][0],
+                    warehouse_id=levels[stock_level_id][1],
+                    movement_type='out',
+                    reason='sale',
+                    quantity=quantity,
+                    order=order,
+                    reference_number=order.order_number
+                )
+                for stock_level_id, quantity in totals
+            ], from_reserved=True)
+        StockReservation.objects.filter(pk__in=[r.pk for r in reservations]).update(
+            status='confirmed', updated_at=timezone.now()
+        )
+        return len(reservations)
+
+    @staticmethod
+    def _reserve_missing(order):
+        """Réserve à nouveau les quantités de la commande qui ne sont plus couvertes par une réservation"""
+        held = defaultdict(int)
+        for product_id, quantity in StockReservation.objects.filter(
+            order=order, status__in=['active', 'confirmed']
+        ).values_list('product_id', 'quantity'):
+            held[product_id] += quantity
+        wanted = defaultdict(int)
+        products = {}
+        for item in order.items.filter(product__track_inventory=True).select_related('product'):
+            wanted[item.product_id] += item.quantity
+            products[item.product_id] = item.product
+        lines = [
+            (products[product_id], quantity - held[product_id])
+            for product_id, quantity in wanted.items() if quantity > held[product_id]
+        ]
+        return StockReservationService.reserve(order, lines) if lines else []
+
+    @staticmethod
+    @transaction.atomic
+    def release(order):
+        """Libère les réservations actives d'une commande (annulation, échec de paiement)"""
+        reservations = list(
+            StockReservation.objects.select_for_update().filter(
+                order=order, status='active'
+            ).order_by('product_id', 'id')
+        )
+        return StockReservationService._release(reservations, 'released')
+
+    @staticmethod
+    def release_expired(batch_size=500):
+        """Libère un lot de réservations expirées, retourne leur nombre"""
+        # Lignes verrouillées par confirm/release ignorées : elles ne sont plus à expirer après leur commit
+        with transaction.atomic():
+            reservations = list(
+                StockReservation.objects.select_for_update(skip_locked=True).filter(
+                    status='active', expires_at__lte=timezone.now()
+                ).order_by('id')[:batch_size]
+            )
+            return StockReservationService._release(reservations, 'expired')
+
+    @staticmethod
+    def _release(reservations, status):
+        """Rend le stock réservé : une mise à jour par niveau de stock ou produit"""
+        if not reservations:
+            return 0
+
+        for stock_level_id, quantity in StockReservationService._totals_by_level(reservations):
+            StockLevel.objects.filter(pk=stock_level_id).update(
+                reserved_stock=F('reserved_stock') - quantity,
+                available_stock=F('available_stock') + quantity,
+                updated_at=timezone.now()
+            )
+
+        product_quantities = defaultdict(int)
+        for reservation in reservations:
+            if reservation.stock_level_id is None:
+                product_quantities[reservation.product_id] += reservation.quantity
+        for product_id in sorted(product_quantities):
+            Product.objects.filter(pk=product_id).update(quantity=F('quantity') + product_quantities[product_id])
+
+        StockReservation.objects.filter(pk__in=[r.pk for r in reservations]).update(
+            status=status, updated_at=timezone.now()
+        )
+        return len(reservations)
+
+    @staticmethod
+    def _totals_by_level(reservations):
+        totals = defaultdict(int)
+        for reservation in reservations:
+            if reservation.stock_level_id is not None:
+                totals[reservation.stock_level_id] += reservation.quantity
+        return sorted(totals.items())
+
+
+class StockLedgerService:
+    """Journal des mouvements de stock : chaque mouvement met à jour le niveau de stock correspondant"""
+
+    @staticmethod
+    def record(product, warehouse, movement_type, reason, quantity, **fields):
+        """Enregistre un mouvement ; quantité signée pour les ajustements et transferts"""
+        movement = StockMovement(
+            product=product,
+            warehouse=warehouse,
+            movement_type=movement_type,
+            reason=reason,
+            quantity=abs(quantity),
+            delta=0 if movement_type in StockMovement.INBOUND_TYPES + StockMovement.OUTBOUND_TYPES else quantity,
+            **fields
+        )
+        movement.save()
+        return movement
+
+    @staticmethod
+    @transaction.atomic
+    def record_many(movements, from_reserved=False, from_count=False):
+        """Insère des mouvements en une requête et les applique aux niveaux de stock"""
+        for movement in movements:
+            movement.set_totals()
+        movements = StockMovement.objects.bulk_create(movements)
+        StockLedgerService.apply(movements, from_reserved=from_reserved, from_count=from_count)
+        return movements
+
+    @staticmethod
+    @transaction.atomic
+    def transfer(product, source, destination, quantity, **fields):
+        """Transfert entre entrepôts : une sortie et une entrée au coût moyen de la source"""
+        unit_cost = StockLevel.objects.filter(product=product, warehouse=source).values_list(
+            'average_cost', flat=True
+        ).first()
+        return StockLedgerService.record_many([
+            StockMovement(
+                product=product, warehouse=warehouse, movement_type='transfer', reason='transfer',
+                quantity=quantity, delta=delta, unit_cost=unit_cost, **fields
+            )
+            for warehouse, delta in ((source, -quantity), (destination, quantity))
+        ])
+
+    @staticmethod
+    def apply(movements, from_reserved=False, from_count=False):
+        """Applique des mouvements déjà insérés : une mise à jour atomique par niveau de stock
+
+        from_count : écarts d'inventaire physique, limités par le stock physique seul ; le disponible
+        est ramené à zéro au plus bas même si des réservations dépassent alors le stock restant.
+        """
+        changes = defaultdict(lambda: {'delta': 0, 'in_quantity': 0, 'in_cost': Decimal('0'), 'last_cost': None})
+        last_movement = max(movement.timestamp for movement in movements)
+        for movement in movements:
+            change = changes[(movement.product_id, movement.warehouse_id)]
+            change['delta'] += movement.delta
+            if movement.delta > 0 and movement.unit_cost is not None:
+                # Entrées valorisées : coût moyen pondéré
+                change['in_quantity'] += movement.delta
+                change['in_cost'] += movement.unit_cost * movement.delta
+                change['last_cost'] = movement.unit_cost
+
+        levels = StockLedgerService._levels(list(changes))
+        # Ordre déterministe des verrous
+        for key in sorted(changes, key=levels.get):
+            change = changes[key]
+            delta = change['delta']
+            values = {}
+            if change['in_quantity']:
+                # Assigné avant current_stock : calculé sur l'ancien stock
+                values['average_cost'] = ExpressionWrapper(
+                    (F('current_stock') * F('average_cost') + Value(change['in_cost']))
+                    / (F('current_stock') + Value(change['in_quantity'])),
+                    output_field=DecimalField(max_digits=10, decimal_places=2)
+                )
+                values['last_cost'] = change['last_cost']
+            values['current_stock'] = F('current_stock') + delta
+            guard = {'current_stock__gte': -delta} if delta < 0 else {}
+            if from_reserved:
+                values['reserved_stock'] = F('reserved_stock') + delta
+                if delta < 0:
+                    guard['reserved_stock__gte'] = -delta
+            elif from_count:
+                values['available_stock'] = Greatest(F('available_stock') + delta, Value(0))
+            else:
+                values['available_stock'] = F('available_stock') + delta
+                if delta < 0:
+                    guard['available_stock__gte'] = -delta
+            values['last_movement'] = last_movement
+            values['updated_at'] = timezone.now()
+
+            if not StockLevel.objects.filter(pk=levels[key], **guard).update(**values):
+                # Annule les mouvements déjà appliqués (rollback de la transaction)
+                raise InsufficientStock(Product.objects.get(pk=key[0]), -delta)
+
+        # Product.quantity : somme du stock physique des entrepôts
+        product_deltas = defaultdict(int)
+        for (product_id, _warehouse_id), change in changes.items():
+            product_deltas[product_id] += change['delta']
+        for product_id in sorted(product_deltas):
+            if product_deltas[product_id]:
+                Product.objects.filter(pk=product_id).update(
+                    quantity=Greatest(F('quantity') + product_deltas[product_id], Value(0))
+                )
+
+    @staticmethod
+    def _levels(keys):
+        """Identifiants des niveaux de stock (produit, entrepôt), créés au besoin"""
+        product_ids = {product_id for product_id, _warehouse_id in keys}
+        levels = {
+            (product_id, warehouse_id): level_id
+            for level_id, product_id, warehouse_id in StockLevel.objects.filter(
+                product_id__in=product_ids
+            ).values_list('id', 'product_id', 'warehouse_id')
+        }
+        missing = [key for key in keys if key not in levels]
+        if missing:
+            StockLevel.objects.bulk_create([
+                StockLevel(product_id=product_id, warehouse_id=warehouse_id) for product_id, warehouse_id in missing
+            ], ignore_conflicts=True)
+            return StockLedgerService._levels(keys)
+        return levels
+
+    @staticmethod
+    def stock_at(product, warehouse, at=None):
+        """Stock physique à une date : dernier instantané antérieur plus les mouvements suivants"""
+        at = at or timezone.now()
+        movements = StockMovement.objects.filter(product=product, warehouse=warehouse, timestamp__lte=at)
+        snapshot = StockSnapshot.objects.filter(
+            product=product, warehouse=warehouse, taken_at__lte=at
+        ).order_by('-taken_at').first()
+        quantity = 0
+        if snapshot is not None:
+            quantity = snapshot.quantity
+            movements = movements.filter(id__gt=snapshot.last_movement_id)
+        return quantity + (movements.aggregate(total=Sum('delta'))['total'] or 0)
+
+    @staticmethod
+    def take_snapshots(batch_size=1000):
+        """Arrête le stock des couples (produit, entrepôt) modifiés depuis le dernier instantané"""
+        # Marge pour les transactions encore ouvertes dont l'identifiant est antérieur
+        cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'STOCK_SNAPSHOT_SETTLE_SECONDS', 60))
+        cursor = StockMovement.objects.filter(timestamp__lte=cutoff).aggregate(last=Max('id'))['last']
+        previous = StockSnapshot.objects.aggregate(last=Max('last_movement_id'))['last'] or 0
+        if cursor is None or cursor <= previous:
+            return 0
+
+        changes = StockMovement.objects.filter(id__gt=previous, id__lte=cursor).values_list(
+            'product_id', 'warehouse_id'
+        ).annotate(total=Sum('delta')).order_by('product_id', 'warehouse_id').iterator(chunk_size=batch_size)
+        taken = 0
+        while True:
+            chunk = list(islice(changes, batch_size))
+            if not chunk:
+                return taken
+            bases = StockLedgerService._latest_snapshots({product_id for product_id, _w, _t in chunk})
+            StockSnapshot.objects.bulk_create([
+                StockSnapshot(
+                    product_id=product_id,
+                    warehouse_id=warehouse_id,
+                    quantity=bases.get((product_id, warehouse_id), 0) + total,
+                    last_movement_id=cursor,
+                    taken_at=cutoff
+                )
+                for product_id, warehouse_id, total in chunk
+            ])
+            taken += len(chunk)
+
+    @staticmethod
+    def _latest_snapshots(product_ids):
+        latest = StockSnapshot.objects.filter(
+            product_id=OuterRef('product_id'), warehouse_id=OuterRef('warehouse_id')
+        ).order_by('-taken_at', '-id').values('id')[:1]
+        return {
+            (product_id, warehouse_id): quantity
+            for product_id, warehouse_id, quantity in StockSnapshot.objects.filter(
+                product_id__in=product_ids, id=Subquery(latest)
+            ).values_list('product_id', 'warehouse_id', 'quantity')
+        }
+
+
+class StockAlertService:
+    """Détection ensembliste des stocks bas"""
+
+    @staticmethod
+    @transaction.atomic
+    def detect_low_stock():
+        """Crée les alertes des niveaux passés sous leur minimum, résout celles revenues au-dessus"""
+        now = timezone.now()
+        active = StockAlert.objects.filter(stock_level=OuterRef('pk'), alert_type='low_stock', is_active=True)
+
+        # Alertes dont le niveau est remonté : résolues, une nouvelle baisse en recréera une
+        resolved = StockAlert.objects.filter(alert_type='low_stock', is_active=True, stock_level__isnull=False).exclude(
+            stock_level__in=StockLevel.objects.filter(available_stock__lte=F('min_stock_level'))
+        ).update(is_active=False, is_resolved=True, resolved_at=now)
+
+        # Niveaux en stock bas sans alerte active, lus par l'index partiel
+        low = StockLevel.objects.filter(
+            available_stock__lte=F('min_stock_level'), warehouse__is_active=True
+        ).filter(~Exists(active)).values_list(
+            'id', 'product_id', 'warehouse_id', 'available_stock', 'min_stock_level',
+            'product__name', 'warehouse__name'
+        )
+        StockAlert.objects.bulk_create([
+            StockAlert(
+                product_id=product_id,
+                warehouse_id=warehouse_id,
+                stock_level_id=level_id,
+                alert_type='low_stock',
+                alert_level='critical' if available == 0 else 'warning',
+                message=f"Stock bas pour {product_name} dans {warehouse_name}",
+                current_stock=available,
+                threshold=threshold
+            )
+            for level_id, product_id, warehouse_id, available, threshold, product_name, warehouse_name in low
+        ], ignore_conflicts=True)
+
+        # Critiques d'abord : le tri alphabétique des niveaux placerait « warning » devant « critical »
+        severity = Case(
+            When(alert_level='critical', then=Value(0)), When(alert_level='warning', then=Value(1)),
+            default=Value(2), output_field=IntegerField()
+        )
+        created = list(StockAlert.objects.filter(
+            alert_type='low_stock', is_active=True, created_at__gte=now
+        ).select_related('product', 'warehouse').order_by(severity, 'product__name'))
+        return created, resolved
@@ -0,0 +1,19 @@
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from apps.i18n.models import Country, ShippingZone
+from .models import ZONE_RANKINGS_CACHE_KEY, Warehouse, WarehouseRoute
+
+
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+@receiver(post_save, sender=WarehouseRoute)
+@receiver(post_delete, sender=WarehouseRoute)
+@receiver(post_save, sender=ShippingZone)
+@receiver(post_delete, sender=ShippingZone)
+@receiver(post_save, sender=Country)
+@receiver(m2m_changed, sender=ShippingZone.countries.through)
+def invalidate_zone_rankings(sender, raw=False, **kwargs):
+    """Invalide le classement des entrepôts par zone de livraison"""
+    if not raw:
+        cache.delete(ZONE_RANKINGS_CACHE_KEY)
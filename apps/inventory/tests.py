@@ -0,0 +1,480 @@
+import io
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+
+from apps.orders.models import Order, OrderItem
+from apps.payments.services import OrderPaymentService
+from apps.products.models import Category, Product
+from .counting import InventoryCountError, InventoryCountService, read_count_file
+from .forecasting import ReorderService, forecast_demand
+from .models import (
+    InventoryCount, PurchaseOrderItem, StockAlert, StockLevel, StockMovement, StockReservation, StockSnapshot,
+    Supplier, SupplierProduct, Warehouse
+)
+from .services import InsufficientStock, StockAlertService, StockLedgerService, StockReservationService
+
+
+User = get_user_model()
+
+
+class ExpiredReservationPaymentTests(TestCase):
+    """Paiement reçu après l'expiration de la réservation du stock"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='client@example.com', username='client', password='secret', first_name='Client', last_name='Test'
+        )
+        category = Category.objects.create(name='Montres', slug='montres')
+        cls.product = Product.objects.create(
+            name='Montre', slug='montre', description='-', sku='MONTRE', category=category, price=100,
+            status='published', track_inventory=True
+        )
+        cls.warehouse = Warehouse.objects.create(
+            code='PAR', name='Paris', address='1 rue', city='Paris', postal_code='75001', is_default=True
+        )
+
+    def setUp(self):
+        self.level = StockLevel.objects.create(product=self.product, warehouse=self.warehouse, current_stock=3)
+        self.order = self.place_order(2)
+
+    def place_order(self, quantity):
+        order = Order.objects.create(user=self.user, subtotal=0, total_amount=0)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, unit_price=100)
+        StockReservationService.reserve(order, [(self.product, quantity)])
+        return order
+
+    def expire(self):
+        StockReservation.objects.filter(status='active').update(expires_at=timezone.now() - timedelta(minutes=1))
+        StockReservationService.release_expired()
+
+    def assertStock(self, current, reserved, available):
+        self.level.refresh_from_db()
+        self.assertEqual(
+            (self.level.current_stock, self.level.reserved_stock, self.level.available_stock),
+            (current, reserved, available)
+        )
+
+    def test_confirm_takes_stock_again_after_expiry(self):
+        self.expire()
+        self.assertStock(3, 0, 3)
+
+        self.assertTrue(OrderPaymentService.mark_paid(self.order))
+        self.assertStock(1, 0, 1)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.payment_status), ('confirmed', 'paid'))
+
+    def test_confirm_refuses_when_stock_was_sold_meanwhile(self):
+        self.expire()
+        other = self.place_order(2)
+        with self.assertRaises(InsufficientStock):
+            StockReservationService.confirm(self.order)
+
+        with self.assertLogs('apps.payments.services', 'WARNING'):
+            self.assertFalse(OrderPaymentService.mark_paid(self.order))
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.payment_status), ('pending', 'paid'))
+        self.assertTrue(self.order.status_history.filter(notes__startswith='Paiement reçu, stock insuffisant').exists())
+
+        # Le stock de l'autre commande reste intact : pas de survente
+        self.assertTrue(OrderPaymentService.mark_paid(other))
+        self.assertStock(1, 0, 1)
+
+    def test_confirm_is_idempotent(self):
+        OrderPaymentService.mark_paid(self.order)
+        OrderPaymentService.mark_paid(self.order)
+        self.assertStock(1, 0, 1)
+
+
+    def test_release_after_confirm_leaves_stock_sold(self):
+        OrderPaymentService.mark_paid(self.order)
+        self.assertEqual(StockReservationService.release(self.order), 0)
+        self.expire()
+        self.assertStock(1, 0, 1)
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class ConcurrentExpiryPaymentTests(TransactionTestCase):
+    """Paiement confirmé pendant que release_expired tient les réservations verrouillées"""
+
+    def setUp(self):
+        user = User.objects.create_user(
+            email='client@example.com', username='client', password='secret', first_name='Client', last_name='Test'
+        )
+        category = Category.objects.create(name='Montres', slug='montres')
+        self.product = Product.objects.create(
+            name='Montre', slug='montre', description='-', sku='MONTRE', category=category, price=100,
+            status='published', track_inventory=True
+        )
+        warehouse = Warehouse.objects.create(
+            code='PAR', name='Paris', address='1 rue', city='Paris', postal_code='75001', is_default=True
+        )
+        self.level = StockLevel.objects.create(product=self.product, warehouse=warehouse, current_stock=3)
+        self.order = Order.objects.create(user=user, subtotal=0, total_amount=0)
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=2, unit_price=100)
+        StockReservationService.reserve(self.order, [(self.product, 2)])
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+    def test_payment_waits_for_expiry_then_takes_stock_again(self):
+        held, go = threading.Event(), threading.Event()
+        paid = []
+
+        def expire():
+            try:
+                with transaction.atomic():
+                    StockReservationService.release_expired()
+                    held.set()
+                    go.wait(5)
+            finally:
+                connection.close()
+
+        def pay():
+            try:
+                paid.append(OrderPaymentService.mark_paid(Order.objects.get(pk=self.order.pk)))
+            finally:
+                connection.close()
+
+        expiry = threading.Thread(target=expire)
+        expiry.start()
+        held.wait(5)
+        payment = threading.Thread(target=pay)
+        payment.start()
+        time.sleep(0.2)
+        # confirm attend le verrou au lieu de sauter les réservations
+        self.assertTrue(payment.is_alive())
+        go.set()
+        expiry.join()
+        payment.join()
+
+        self.assertEqual(paid, [True])
+        self.level.refresh_from_db()
+        self.assertEqual((self.level.current_stock, self.level.reserved_stock, self.level.available_stock), (1, 0, 1))
+
+
+class ReservePendingOrdersTests(TestCase):
+    """Réservation par lots des commandes en attente"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='client@example.com', username='client', password='secret', first_name='Client', last_name='Test'
+        )
+        category = Category.objects.create(name='Montres', slug='montres')
+        cls.tracked, cls.untracked = (
+            Product.objects.create(
+                name=name, slug=name, description='-', sku=name, category=category, price=10,
+                status='published', track_inventory=track_inventory
+            )
+            for name, track_inventory in (('suivi', True), ('libre', False))
+        )
+        warehouse = Warehouse.objects.create(
+            code='PAR', name='Paris', address='1 rue', city='Paris', postal_code='75001', is_default=True
+        )
+        StockLevel.objects.create(product=cls.tracked, warehouse=warehouse, current_stock=5)
+
+    def order(self, product):
+        order = Order.objects.create(user=self.user, subtotal=0, total_amount=0)
+        OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=10)
+        return order
+
+    def test_orders_without_tracked_items_are_skipped(self):
+        self.order(self.untracked)
+        tracked = self.order(self.tracked)
+        self.assertEqual(StockReservationService.reserve_pending_orders(), (1, 0))
+        self.assertEqual(list(StockReservation.objects.values_list('order_id', flat=True)), [tracked.pk])
+        # Deuxième passage : plus rien à relire
+        self.assertEqual(StockReservationService.reserve_pending_orders(), (0, 0))
+
+
+class InventoryCountTests(TestCase):
+    """Import des fichiers de scanner et clôture d'un inventaire"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='magasin@example.com', username='magasin', password='secret', first_name='Magasin', last_name='Test'
+        )
+        category = Category.objects.create(name='Montres', slug='montres')
+        cls.watch, cls.ring = (
+            Product.objects.create(
+                name=sku, slug=sku.lower(), description='-', sku=sku, category=category, price=10,
+                status='published', track_inventory=True
+            )
+            for sku in ('MONTRE', 'BAGUE')
+        )
+        cls.warehouse = Warehouse.objects.create(
+            code='PAR', name='Paris', address='1 rue', city='Paris', postal_code='75001', is_default=True
+        )
+
+    def setUp(self):
+        self.watch_level = StockLevel.objects.create(product=self.watch, warehouse=self.warehouse, current_stock=5)
+        self.ring_level = StockLevel.objects.create(product=self.ring, warehouse=self.warehouse, current_stock=2)
+        self.inventory = InventoryCount.objects.create(
+            warehouse=self.warehouse, name='Inventaire annuel', planned_date=timezone.now(), created_by=self.user
+        )
+
+    def import_csv(self, content, **options):
+        return InventoryCountService.import_counts(self.inventory, read_count_file(io.StringIO(content)), **options)
+
+    def test_import_sums_scans_and_reports_bad_lines(self):
+        stats = self.import_csv('sku,quantity\nMONTRE,2\nMONTRE,1\nINCONNU,4\nBAGUE,abc\n')
+        self.assertEqual(stats, {'lines': 4, 'counted': 3, 'unknown': 1, 'rejected': 1})
+        item = self.inventory.items.get(product=self.watch)
+        self.assertEqual((item.counted_quantity, item.difference, item.has_discrepancy), (3, -2, True))
+        self.inventory.refresh_from_db()
+        self.assertEqual(
+            (self.inventory.status, self.inventory.counted_products, self.inventory.discrepancies),
+            ('in_progress', 1, 1)
+        )
+
+    def test_jsonl_scans_count_one_each_and_replace_resets(self):
+        self.import_csv('sku\nBAGUE\n')
+        rows = read_count_file(['{"sku": "BAGUE"}', '{"sku": "BAGUE"}', ''], 'jsonl')
+        InventoryCountService.import_counts(self.inventory, rows, replace=True)
+        item = self.inventory.items.get(product=self.ring)
+        self.assertEqual((item.counted_quantity, item.has_discrepancy), (2, False))
+
+    def test_complete_adjusts_stock_by_difference(self):
+        self.import_csv('sku,quantity\nMONTRE,7\nBAGUE,2\n')
+        self.assertEqual(InventoryCountService.complete(self.inventory, user=self.user), 1)
+        self.watch_level.refresh_from_db()
+        self.assertEqual((self.watch_level.current_stock, self.watch_level.available_stock), (7, 7))
+        self.assertEqual(StockMovement.objects.get(reference_number=f'INV-{self.inventory.pk}').delta, 2)
+        with self.assertRaises(InventoryCountError):
+            InventoryCountService.complete(self.inventory)
+
+    def test_shrinkage_beyond_unreserved_stock_can_be_closed(self):
+        order = Order.objects.create(user=self.user, subtotal=0, total_amount=0)
+        StockReservationService.reserve(order, [(self.watch, 3)])
+        self.import_csv('sku,quantity\nMONTRE,0\n')
+        self.assertEqual(InventoryCountService.complete(self.inventory), 1)
+        self.watch_level.refresh_from_db()
+        self.assertEqual(
+            (self.watch_level.current_stock, self.watch_level.reserved_stock, self.watch_level.available_stock),
+            (0, 3, 0)
+        )
+
+    def test_command_imports_and_completes(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'w') as stream:
+            stream.write('sku,quantity\nMONTRE,0\nBAGUE,2\n')
+        out = io.StringIO()
+        call_command('import_inventory_count', str(self.inventory.pk), path, '--complete', stdout=out)
+        self.assertIn('Inventaire clôturé, 1 ajustements de stock', out.getvalue())
+        self.watch_level.refresh_from_db()
+        self.assertEqual(self.watch_level.current_stock, 0)
+
+
+class ForecastDemandTests(TestCase):
+    """Prévision vectorisée : niveau, saisonnalité annuelle, seuils"""
+
+    def test_flat_series_without_variability(self):
+        demand, safety_stock, reorder_point, reorder_quantity = forecast_demand(np.ones((1, 400)), [7])
+        self.assertAlmostEqual(demand[0], 1.0)
+        self.assertEqual(safety_stock[0], 0)
+        self.assertEqual((reorder_point[0], reorder_quantity[0]), (7, 7))
+
+    def test_last_year_peak_raises_demand(self):
+        history = np.ones((2, 730))
+        # Pic l'an dernier sur la période à venir (délai 7 + revue 7 jours) pour la seconde série
+        history[1, 365:379] = 3
+        demand, *_thresholds = forecast_demand(history, [7, 7])
+        self.assertAlmostEqual(demand[0], 1.0)
+        # Rapport au niveau de l'année plafonné à 2
+        self.assertAlmostEqual(demand[1], 2.0)
+
+    def test_short_history_has_no_seasonality(self):
+        history = np.ones((1, 200))
+        history[0, :14] = 3
+        demand, *_thresholds = forecast_demand(history, [7])
+        self.assertLess(demand[0], 1.1)
+
+
+class ReorderServiceTests(TestCase):
+    """Seuils de commande enregistrés et brouillons de commandes d'achat"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='achats@example.com', username='achats', password='secret', first_name='Achats', last_name='Test'
+        )
+        category = Category.objects.create(name='Montres', slug='montres')
+        cls.watch = Product.objects.create(
+            name='Montre', slug='montre', description='-', sku='MONTRE', category=category, price=10,
+            status='published', track_inventory=True
+        )
+        cls.warehouse = Warehouse.objects.create(
+            code='PAR', name='Paris', address='1 rue', city='Paris', postal_code='75001', is_default=True
+        )
+        supplier = Supplier.objects.create(name='Atelier', code='ATL', delivery_time_days=10)
+        SupplierProduct.objects.create(supplier=supplier, product=cls.watch, unit_cost=4, minimum_quantity=50)
+
+    def test_recommend_saves_thresholds_from_sales(self):
+        level = StockLevel.objects.create(product=self.watch, warehouse=self.warehouse, current_stock=100)
+        movements = StockMovement.objects.bulk_create([
+            StockMovement(
+                product=self.watch, warehouse=self.warehouse, movement_type='out', reason='sale', quantity=2, delta=-2
+            )
+            for _day in range(30)
+        ])
+        for day, movement in enumerate(movements):
+            StockMovement.objects.filter(pk=movement.pk).update(timestamp=timezone.now() - timedelta(days=day))
+
+        self.assertEqual(ReorderService.recommend(history_days=60), 1)
+        level.refresh_from_db()
+        self.assertIsNotNone(level.forecast_at)
+        self.assertGreater(level.daily_demand, 0)
+        self.assertGreater(level.reorder_point, 0)
+        # Quantité minimum du fournisseur
+        self.assertEqual(level.reorder_quantity, 50)
+
+    def test_draft_respects_minimum_and_is_not_repeated(self):
+        StockLevel.objects.create(
+            product=self.watch, warehouse=self.warehouse, current_stock=2, reorder_point=10, reorder_quantity=5
+        )
+        purchase_order, = ReorderService.draft_purchase_orders(self.user)
+        line = purchase_order.items.get()
+        self.assertEqual(line.quantity_ordered, 50)
+        self.assertEqual(purchase_order.total_amount, 200)
+
+        # Ligne déjà commandée : la position couvre le point de commande
+        self.assertEqual(ReorderService.draft_purchase_orders(self.user), [])
+        self.assertEqual(PurchaseOrderItem.objects.count(), 1)
+
+    def test_draft_orders_the_gap_above_the_minimum(self):
+        StockLevel.objects.create(
+            product=self.watch, warehouse=self.warehouse, current_stock=0, reorder_point=60, reorder_quantity=20
+        )
+        purchase_order, = ReorderService.draft_purchase_orders(self.user)
+        self.assertEqual(purchase_order.items.get().quantity_ordered, 80)
+
+
+class StockAlertServiceTests(TestCase):
+    """Alertes de stock bas créées et résolues en bloc"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Montres', slug='montres')
+        cls.alpha, cls.zebra = (
+            Product.objects.create(
+                name=name, slug=name.lower(), description='-', sku=name.upper(), category=category, price=10,
+                status='published', track_inventory=True
+            )
+            for name in ('Alpha', 'Zebre')
+        )
+        cls.warehouse = Warehouse.objects.create(
+            code='PAR', name='Paris', address='1 rue', city='Paris', postal_code='75001', is_default=True
+        )
+
+    def test_critical_alerts_come_first_and_recovered_levels_are_resolved(self):
+        alpha_level = StockLevel.objects.create(
+            product=self.alpha, warehouse=self.warehouse, current_stock=1, min_stock_level=3
+        )
+        StockLevel.objects.create(product=self.zebra, warehouse=self.warehouse, current_stock=0, min_stock_level=3)
+        created, resolved = StockAlertService.detect_low_stock()
+        self.assertEqual([(alert.product, alert.alert_level) for alert in created], [
+            (self.zebra, 'critical'), (self.alpha, 'warning')
+        ])
+        self.assertEqual(resolved, 0)
+
+        alpha_level.current_stock = 10
+        alpha_level.save()
+        created, resolved = StockAlertService.detect_low_stock()
+        self.assertEqual((created, resolved), ([], 1))
+        self.assertEqual(
+            list(StockAlert.objects.filter(is_active=True).values_list('product', flat=True)), [self.zebra.pk]
+        )
+
+
+class StockLedgerTests(TestCase):
+    """Journal des mouvements appliqué aux niveaux de stock, instantanés et vérification"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Montres', slug='montres')
+        cls.product = Product.objects.create(
+            name='Montre', slug='montre', description='-', sku='MONTRE', category=category, price=10,
+            status='published', track_inventory=True
+        )
+        cls.warehouse = Warehouse.objects.create(
+            code='PAR', name='Paris', address='1 rue', city='Paris', postal_code='75001', is_default=True
+        )
+
+    def record(self, movement_type, quantity, **fields):
+        return StockLedgerService.record(self.product, self.warehouse, movement_type, 'purchase', quantity, **fields)
+
+    def level(self):
+        return StockLevel.objects.get(product=self.product, warehouse=self.warehouse)
+
+    def test_inbound_movements_update_average_cost(self):
+        self.record('in', 10, unit_cost=4)
+        self.record('in', 30, unit_cost=8)
+        level = self.level()
+        self.assertEqual((level.current_stock, level.available_stock), (40, 40))
+        self.assertEqual((level.average_cost, level.last_cost), (7, 8))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 40)
+
+    def test_outbound_beyond_available_is_refused(self):
+        self.record('in', 3)
+        with self.assertRaises(InsufficientStock):
+            self.record('out', 4)
+        self.assertEqual(StockMovement.objects.count(), 1)
+        self.assertEqual(self.level().current_stock, 3)
+
+    def sale(self, quantity):
+        return StockMovement(
+            product=self.product, warehouse=self.warehouse, movement_type='out', reason='sale', quantity=quantity
+        )
+
+    def test_from_reserved_consumes_reservations(self):
+        self.record('in', 5)
+        StockLevel.objects.filter(pk=self.level().pk).update(reserved_stock=3, available_stock=2)
+        StockLedgerService.record_many([self.sale(3)], from_reserved=True)
+        level = self.level()
+        self.assertEqual((level.current_stock, level.reserved_stock, level.available_stock), (2, 0, 2))
+        # Plus de réservation : une vente réservée est refusée même avec du stock disponible
+        with self.assertRaises(InsufficientStock):
+            StockLedgerService.record_many([self.sale(1)], from_reserved=True)
+
+    def test_snapshots_and_stock_at(self):
+        self.record('in', 10)
+        self.record('out', 4)
+        StockMovement.objects.update(timestamp=timezone.now() - timedelta(hours=2))
+        self.assertEqual(StockLedgerService.take_snapshots(), 1)
+        self.assertEqual(StockSnapshot.objects.get().quantity, 6)
+        # Rien de nouveau : pas d'instantané
+        self.assertEqual(StockLedgerService.take_snapshots(), 0)
+
+        before = timezone.now()
+        self.record('in', 5)
+        self.assertEqual(StockLedgerService.stock_at(self.product, self.warehouse), 11)
+        self.assertEqual(StockLedgerService.stock_at(self.product, self.warehouse, before), 6)
+        self.assertEqual(StockLedgerService.stock_at(self.product, self.warehouse, before - timedelta(days=1)), 0)
+
+    def test_verify_command_repairs_drift(self):
+        self.record('in', 8)
+        StockLevel.objects.filter(pk=self.level().pk).update(current_stock=5, available_stock=5)
+        Product.objects.filter(pk=self.product.pk).update(quantity=1)
+
+        output = io.StringIO()
+        call_command('verify_stock_ledger', '--dry-run', stdout=output)
+        self.assertIn('1 en écart', output.getvalue())
+        self.assertEqual(self.level().current_stock, 5)
+
+        call_command('verify_stock_ledger', stdout=io.StringIO())
+        level = self.level()
+        self.assertEqual((level.current_stock, level.available_stock), (8, 8))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 8)
@@ -129,6 +129,32 @@ class EmailService:
         
         return all(results)
     
+    @staticmethod
+    def send_stock_digest(alerts):
+        """Récapitulatif des nouvelles alertes de stock : un seul email aux administrateurs"""
+        admin_emails = list(User.objects.filter(is_staff=True, is_active=True).exclude(email='').values_list(
+            'email', flat=True
+        ))
+        if not alerts or not admin_emails:
+            return False
+        
+        lines = [
+            f"- {alert.product.name} ({alert.warehouse.name}) : {alert.current_stock} disponibles, seuil {alert.threshold}"
+            for alert in alerts
+        ]
+        try:
+            send_mail(
+                subject=f"{len(alerts)} alertes de stock bas",
+                message="Nouvelles alertes de stock bas :\n\n" + "\n".join(lines)
+                        + f"\n\n{getattr(settings, 'FRONTEND_URL', '')}/admin/inventory/stockalert/",
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                recipient_list=admin_emails
+            )
+        except Exception as e:
+            logger.error(f"Erreur lors de l'envoi du récapitulatif de stock: {str(e)}")
+            return False
+        return True
+    
     @staticmethod
     def send_newsletter(newsletter):
         """Envoi de newsletter"""
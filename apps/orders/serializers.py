@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from .models import Order, OrderItem, OrderStatusHistory, Coupon, OrderCoupon
+from .services import OrderPlacementError, OrderPlacementService
+from apps.products.models import Product
 from apps.products.serializers import ProductListSerializer
 from apps.accounts.serializers import AddressSerializer
 
@@ -56,10 +58,18 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'order_number', 'created_at', 'updated_at')
 
 
+class OrderLineSerializer(serializers.Serializer):
+    """Ligne de commande à créer"""
+    
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    quantity = serializers.IntegerField(min_value=1)
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     """Sérialiseur pour la création de commandes"""
     
-    items = OrderItemSerializer(many=True, write_only=True)
+    # Facultatif quand le panier est fourni dans le contexte
+    items = OrderLineSerializer(many=True, write_only=True, required=False)
     billing_address_id = serializers.IntegerField(write_only=True)
     shipping_address_id = serializers.IntegerField(write_only=True)
     coupon_code = serializers.CharField(write_only=True, required=False, allow_blank=True)
@@ -71,119 +81,27 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             'coupon_code', 'customer_notes'
         )
     
-    def validate_billing_address_id(self, value):
-        """Valider l'adresse de facturation"""
-        from apps.accounts.models import Address
-        
-        try:
-            address = Address.objects.get(id=value, user=self.context['request'].user)
-            return value
-        except Address.DoesNotExist:
-            raise serializers.ValidationError("Adresse de facturation non trouvée.")
-    
-    def validate_shipping_address_id(self, value):
-        """Valider l'adresse de livraison"""
-        from apps.accounts.models import Address
-        
-        try:
-            address = Address.objects.get(id=value, user=self.context['request'].user)
-            return value
-        except Address.DoesNotExist:
-            raise serializers.ValidationError("Adresse de livraison non trouvée.")
-    
-    def validate_items(self, value):
-        """Valider les articles de la commande"""
-        if not value:
-            raise serializers.ValidationError("La commande doit contenir au moins un article.")
-        
-        for item in value:
-            product = item['product']
-            quantity = item['quantity']
-            
-            # Vérifier la disponibilité
-            if not product.is_in_stock:
-                raise serializers.ValidationError(f"Le produit {product.name} n'est pas disponible.")
-            
-            # Vérifier le stock
-            if product.track_inventory and quantity > product.quantity:
-                raise serializers.ValidationError(
-                    f"Quantité demandée ({quantity}) supérieure au stock disponible ({product.quantity}) pour {product.name}."
-                )
-        
-        return value
+    def validate(self, attrs):
+        """Valider la présence d'articles"""
+        if not attrs.get('items') and self.context.get('cart') is None:
+            raise serializers.ValidationError({'items': "La commande doit contenir au moins un article."})
+        return attrs
     
     def create(self, validated_data):
-        """Créer une nouvelle commande"""
-        from decimal import Decimal
-        
-        items_data = validated_data.pop('items')
-        billing_address_id = validated_data.pop('billing_address_id')
-        shipping_address_id = validated_data.pop('shipping_address_id')
-        coupon_code = validated_data.pop('coupon_code', '')
-        
-        # Récupérer les adresses
-        from apps.accounts.models import Address
-        billing_address = Address.objects.get(id=billing_address_id)
-        shipping_address = Address.objects.get(id=shipping_address_id)
-        
-        # Créer la commande
-        order = Order.objects.create(
-            user=self.context['request'].user,
-            billing_address=billing_address,
-            shipping_address=shipping_address,
-            **validated_data
-        )
-        
-        # Créer les articles de commande
-        subtotal = Decimal('0')
-        for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
-            unit_price = product.price
-            
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                unit_price=unit_price
+        """Créer une nouvelle commande (service de passage de commande)"""
+        items_data = validated_data.get('items')
+        try:
+            return OrderPlacementService.place_order(
+                self.context['request'].user,
+                validated_data['billing_address_id'],
+                validated_data['shipping_address_id'],
+                lines=[(item['product'], item['quantity']) for item in items_data] if items_data else None,
+                cart=None if items_data else self.context.get('cart'),
+                coupon_code=validated_data.get('coupon_code', ''),
+                customer_notes=validated_data.get('customer_notes', '')
             )
-            
-            subtotal += unit_price * quantity
-        
-        # Appliquer le coupon si fourni
-        discount_amount = Decimal('0')
-        if coupon_code:
-            try:
-                coupon = Coupon.objects.get(code=coupon_code, is_active=True)
-                if coupon.is_valid():
-                    discount_amount = coupon.calculate_discount(subtotal)
-                    if discount_amount > 0:
-                        OrderCoupon.objects.create(
-                            order=order,
-                            coupon=coupon,
-                            discount_amount=discount_amount
-                        )
-                        coupon.used_count += 1
-                        coupon.save()
-            except Coupon.DoesNotExist:
-                pass  # Coupon invalide, ignorer
-        
-        # Calculer les totaux
-        order.subtotal = subtotal
-        order.discount_amount = discount_amount
-        order.tax_amount = subtotal * Decimal('0.20')  # 20% de TVA
-        order.shipping_cost = Decimal('0')  # Livraison gratuite par défaut
-        order.total_amount = order.subtotal + order.tax_amount + order.shipping_cost - order.discount_amount
-        order.save()
-        
-        # Créer l'historique de statut
-        OrderStatusHistory.objects.create(
-            order=order,
-            status='pending',
-            notes='Commande créée'
-        )
-        
-        return order
+        except OrderPlacementError as e:
+            raise serializers.ValidationError({'non_field_errors': [str(e)]})
 
 
 class CouponSerializer(serializers.ModelSerializer):
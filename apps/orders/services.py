@@ -0,0 +1,131 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils.translation import gettext as _
+
+from apps.accounts.models import Address
+from apps.cart.models import CartItem
+from apps.inventory.services import InsufficientStock, StockReservationService
+from apps.products.models import Product
+from .models import Order, OrderItem, OrderStatusHistory, Coupon, OrderCoupon
+
+
+TAX_RATE = Decimal('0.20')
+
+
+class OrderPlacementError(Exception):
+    """Commande impossible à passer (panier vide, adresse, stock, coupon)"""
+
+
+class OrderPlacementService:
+    """Création des commandes en un nombre fixe de requêtes"""
+
+    @staticmethod
+    def place_order(user, billing_address_id, shipping_address_id, lines=None, cart=None,
+                    coupon_code='', customer_notes='', payment_method=''):
+        """Crée la commande depuis des lignes (produit, quantité) ou depuis le panier, qui est alors vidé"""
+        addresses = Address.objects.in_bulk(
+            [billing_address_id, shipping_address_id]
+        ) if billing_address_id and shipping_address_id else {}
+        billing_address = OrderPlacementService._own_address(addresses, billing_address_id, user)
+        shipping_address = OrderPlacementService._own_address(addresses, shipping_address_id, user)
+        if billing_address is None:
+            raise OrderPlacementError(_('Adresse de facturation non trouvée.'))
+        if shipping_address is None:
+            raise OrderPlacementError(_('Adresse de livraison non trouvée.'))
+
+        if cart is not None:
+            lines = [
+                (cart_item.product, cart_item.quantity)
+                for cart_item in CartItem.objects.filter(cart=cart).select_related('product')
+            ]
+        else:
+            lines = OrderPlacementService._load_products(lines or [])
+        if not lines:
+            raise OrderPlacementError(_('Votre panier est vide.'))
+
+        for product, quantity in lines:
+            if product.status != 'published' or not product.is_in_stock:
+                raise OrderPlacementError(_("Le produit {} n'est pas disponible.").format(product.name))
+
+        subtotal = sum((product.price * quantity for product, quantity in lines), Decimal('0'))
+
+        coupon = None
+        discount_amount = Decimal('0')
+        if coupon_code:
+            coupon = Coupon.objects.filter(code=coupon_code, is_active=True).first()
+            if coupon is not None and coupon.is_valid():
+                discount_amount = coupon.calculate_discount(subtotal)
+            if discount_amount <= 0:
+                coupon = None
+
+        tax_amount = subtotal * TAX_RATE
+        shipping_cost = Decimal('0')  # Livraison gratuite par défaut
+
+        with transaction.atomic():
+            order = Order.objects.create(
+                user=user,
+                billing_address=billing_address,
+                shipping_address=shipping_address,
+                subtotal=subtotal,
+                tax_amount=tax_amount,
+                shipping_cost=shipping_cost,
+                discount_amount=discount_amount,
+                total_amount=subtotal + tax_amount + shipping_cost - discount_amount,
+                payment_method=payment_method or '',
+                customer_notes=customer_notes or ''
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=quantity, unit_price=product.price)
+                for product, quantity in lines
+            ])
+
+            try:
+                StockReservationService.reserve(order, lines)
+            except InsufficientStock as e:
+                raise OrderPlacementError(str(e))
+
+            if coupon is not None:
+                # Incrément gardé : la limite d'utilisation tient face aux commandes concurrentes
+                used = Coupon.objects.filter(pk=coupon.pk, is_active=True).filter(
+                    Q(usage_limit__isnull=True) | Q(used_count__lt=F('usage_limit'))
+                ).update(used_count=F('used_count') + 1)
+                if not used:
+                    raise OrderPlacementError(_("Le coupon {} n'est plus disponible.").format(coupon.code))
+                OrderCoupon.objects.create(order=order, coupon=coupon, discount_amount=discount_amount)
+
+            OrderStatusHistory.objects.create(
+                order=order,
+                status='pending',
+                notes='Commande créée',
+                created_by=user
+            )
+
+            if cart is not None:
+                CartItem.objects.filter(cart=cart).delete()
+
+        return order
+
+    @staticmethod
+    def _own_address(addresses, address_id, user):
+        try:
+            address = addresses.get(int(address_id))
+        except (TypeError, ValueError):
+            return None
+        if address is None or address.user_id != user.pk:
+            return None
+        return address
+
+    @staticmethod
+    def _load_products(lines):
+        """Résout les lignes (produit ou identifiant, quantité) en une requête, quantités regroupées"""
+        quantities = {}
+        for product, quantity in lines:
+            product_id = product.pk if isinstance(product, Product) else product
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        products = Product.objects.in_bulk(list(quantities))
+        missing = [product_id for product_id in quantities if product_id not in products]
+        if missing:
+            raise OrderPlacementError(_('Produit introuvable : {}.').format(missing[0]))
+        return [(products[product_id], quantity) for product_id, quantity in quantities.items()]
@@ -0,0 +1,86 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.accounts.models import Address
+from apps.inventory.models import StockLevel, Warehouse
+from apps.products.models import Category, Product
+from .models import Coupon, Order, OrderCoupon, OrderItem
+from .services import OrderPlacementError, OrderPlacementService
+
+
+User = get_user_model()
+
+
+class OrderPlacementServiceTests(TestCase):
+    """Création des commandes : requêtes, coupon, réservation du stock"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='client@example.com', username='client', password='secret', first_name='Client', last_name='Test'
+        )
+        cls.address = Address.objects.create(
+            user=cls.user, type='billing', first_name='Client', last_name='Test', address_line_1='1 rue',
+            city='Paris', postal_code='75001'
+        )
+        cls.warehouse = Warehouse.objects.create(
+            code='PAR', name='Paris', address='1 rue', city='Paris', postal_code='75001', is_default=True
+        )
+        category = Category.objects.create(name='Montres', slug='montres')
+        cls.products = Product.objects.bulk_create([
+            Product(
+                name=f'Montre {number}', slug=f'montre-{number}', description='-', sku=f'MONTRE-{number}',
+                category=category, price=10, status='published', track_inventory=True, quantity=5
+            )
+            for number in range(50)
+        ])
+        StockLevel.objects.bulk_create([
+            StockLevel(product=product, warehouse=cls.warehouse, current_stock=5, available_stock=5)
+            for product in cls.products
+        ])
+        cls.coupon = Coupon.objects.create(
+            code='BIENVENUE', type='fixed', value=5, usage_limit=1,
+            valid_from=timezone.now() - timedelta(days=1), valid_until=timezone.now() + timedelta(days=1)
+        )
+
+    def place_order(self, lines, **options):
+        return OrderPlacementService.place_order(self.user, self.address.pk, self.address.pk, lines=lines, **options)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        counts = []
+        for size in (1, 50):
+            with CaptureQueriesContext(connection) as queries:
+                order = self.place_order([(product.pk, 1) for product in self.products[:size]])
+            counts.append(len(queries))
+            self.assertEqual(order.items.count(), size)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_coupon_usage_limit_is_guarded(self):
+        order = self.place_order([(self.products[0].pk, 2)], coupon_code='BIENVENUE')
+        self.assertEqual(order.discount_amount, Decimal('5'))
+        self.assertEqual(OrderCoupon.objects.get().order, order)
+
+        # Coupon lu valide, limite atteinte avant l'incrément par une commande concurrente
+        with mock.patch.object(Coupon, 'is_valid', return_value=True):
+            with self.assertRaises(OrderPlacementError):
+                self.place_order([(self.products[1].pk, 1)], coupon_code='BIENVENUE')
+        self.assertEqual(Order.objects.count(), 1)
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.used_count, 1)
+        self.assertEqual(StockLevel.objects.get(product=self.products[1]).reserved_stock, 0)
+
+    def test_insufficient_stock_rolls_back(self):
+        with self.assertRaises(OrderPlacementError):
+            self.place_order([(self.products[0].pk, 1), (self.products[1].pk, 6)], coupon_code='BIENVENUE')
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.used_count, 0)
+        self.assertEqual(StockLevel.objects.get(product=self.products[0]).reserved_stock, 0)
@@ -7,14 +7,19 @@ from django.views.generic import ListView, DetailView, TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.utils.decorators import method_decorator
 from django.utils.translation import gettext_lazy as _
-from .models import Order, OrderItem, OrderStatusHistory, Coupon, OrderCoupon
+from .models import Order, OrderStatusHistory, Coupon, OrderCoupon
 from .serializers import (
     OrderSerializer, OrderCreateSerializer, OrderItemSerializer,
     CouponSerializer, OrderCouponSerializer
 )
 from apps.cart.models import Cart, CartItem
 from apps.accounts.models import Address
+from apps.core.idempotency import idempotent
+from apps.core.pagination import KeysetPagination
+from apps.inventory.services import StockReservationService
+from .services import OrderPlacementError, OrderPlacementService
 
 
 class OrderListView(generics.ListAPIView):
@@ -22,11 +27,12 @@ class OrderListView(generics.ListAPIView):
     
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user).select_related(
             'billing_address', 'shipping_address'
-        ).prefetch_related('items__product', 'status_history')
+        ).prefetch_related('items__product', 'status_history').order_by('-created_at')
 
 
 class OrderDetailView(generics.RetrieveAPIView):
@@ -41,6 +47,7 @@ class OrderDetailView(generics.RetrieveAPIView):
         ).prefetch_related('items__product', 'status_history')
 
 
+@method_decorator(idempotent, name='create')
 class OrderCreateView(generics.CreateAPIView):
     """Vue pour créer une commande depuis le panier"""
     
@@ -48,44 +55,22 @@ class OrderCreateView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
     
     def create(self, request, *args, **kwargs):
-        # Vérifier que le panier n'est pas vide
-        try:
-            cart = Cart.objects.get(user=request.user)
-        except Cart.DoesNotExist:
-            return Response(
-                {'error': _('Votre panier est vide.')}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if cart.is_empty:
-            return Response(
-                {'error': _('Votre panier est vide.')}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Préparer les données pour la commande
+        # Sans lignes explicites, la commande reprend le panier (vidé après création)
         order_data = {
             'billing_address_id': request.data.get('billing_address_id'),
             'shipping_address_id': request.data.get('shipping_address_id'),
             'customer_notes': request.data.get('customer_notes', ''),
             'coupon_code': request.data.get('coupon_code', ''),
-            'items': []
         }
+        if request.data.get('items'):
+            order_data['items'] = request.data.get('items')
         
-        # Convertir les articles du panier
-        for cart_item in cart.items.all():
-            order_data['items'].append({
-                'product': cart_item.product,
-                'quantity': cart_item.quantity
-            })
-        
-        serializer = self.get_serializer(data=order_data)
+        context = self.get_serializer_context()
+        context['cart'] = Cart.objects.filter(user=request.user).first()
+        serializer = self.get_serializer_class()(data=order_data, context=context)
         serializer.is_valid(raise_exception=True)
         order = serializer.save()
         
-        # Vider le panier après création de la commande
-        cart.items.all().delete()
-        
         return Response({
             'order': OrderSerializer(order).data,
             'message': _('Commande créée avec succès!')
@@ -94,25 +79,17 @@ class OrderCreateView(generics.CreateAPIView):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def create_order_from_cart_view(request):
     """Vue pour créer une commande directement depuis le panier"""
     
-    # Vérifier que le panier n'est pas vide
-    try:
-        cart = Cart.objects.get(user=request.user)
-    except Cart.DoesNotExist:
-        return Response(
-            {'error': _('Votre panier est vide.')}, 
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    if cart.is_empty:
+    cart = Cart.objects.filter(user=request.user).first()
+    if cart is None:
         return Response(
             {'error': _('Votre panier est vide.')}, 
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Récupérer les adresses
     billing_address_id = request.data.get('billing_address_id')
     shipping_address_id = request.data.get('shipping_address_id')
     
@@ -122,37 +99,22 @@ def create_order_from_cart_view(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Créer la commande
-    from .serializers import OrderCreateSerializer
-    
-    order_data = {
-        'billing_address_id': billing_address_id,
-        'shipping_address_id': shipping_address_id,
-        'customer_notes': request.data.get('customer_notes', ''),
-        'coupon_code': request.data.get('coupon_code', ''),
-        'items': []
-    }
-    
-    # Convertir les articles du panier
-    for cart_item in cart.items.all():
-        order_data['items'].append({
-            'product': cart_item.product,
-            'quantity': cart_item.quantity
-        })
-    
-    serializer = OrderCreateSerializer(data=order_data, context={'request': request})
-    if serializer.is_valid():
-        order = serializer.save()
-        
-        # Vider le panier après création de la commande
-        cart.items.all().delete()
-        
-        return Response({
-            'order': OrderSerializer(order).data,
-            'message': _('Commande créée avec succès!')
-        }, status=status.HTTP_201_CREATED)
+    try:
+        order = OrderPlacementService.place_order(
+            request.user,
+            billing_address_id,
+            shipping_address_id,
+            cart=cart,
+            coupon_code=request.data.get('coupon_code', ''),
+            customer_notes=request.data.get('customer_notes', '')
+        )
+    except OrderPlacementError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'order': OrderSerializer(order).data,
+        'message': _('Commande créée avec succès!')
+    }, status=status.HTTP_201_CREATED)
 
 
 @api_view(['POST'])
@@ -170,6 +132,7 @@ def cancel_order_view(request, order_id):
     
     order.status = 'cancelled'
     order.save()
+    StockReservationService.release(order)
     
     # Ajouter à l'historique
     OrderStatusHistory.objects.create(
@@ -317,49 +280,24 @@ class CheckoutView(LoginRequiredMixin, TemplateView):
     
     def post(self, request, *args, **kwargs):
         """Traiter la commande"""
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        
-        if not cart.items.exists():
+        cart = Cart.objects.filter(user=request.user).first()
+        if cart is None:
             messages.error(request, 'Votre panier est vide.')
             return redirect('cart:cart')
         
-        # Récupérer les données du formulaire
-        shipping_address_id = request.POST.get('shipping_address')
-        billing_address_id = request.POST.get('billing_address')
-        payment_method = request.POST.get('payment_method')
-        
         try:
-            shipping_address = Address.objects.get(id=shipping_address_id, user=request.user)
-            billing_address = Address.objects.get(id=billing_address_id, user=request.user)
-        except Address.DoesNotExist:
-            messages.error(request, 'Adresse invalide.')
-            return redirect('orders:checkout')
-        
-        # Créer la commande
-        order = Order.objects.create(
-            user=request.user,
-            shipping_address=shipping_address,
-            billing_address=billing_address,
-            payment_method=payment_method,
-            status='pending'
-        )
-        
-        # Ajouter les articles de la commande
-        total = 0
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
+            order = OrderPlacementService.place_order(
+                request.user,
+                request.POST.get('billing_address'),
+                request.POST.get('shipping_address'),
+                cart=cart,
+                coupon_code=request.POST.get('coupon_code', ''),
+                customer_notes=request.POST.get('customer_notes', ''),
+                payment_method=request.POST.get('payment_method', '')
             )
-            total += cart_item.product.price * cart_item.quantity
-        
-        order.total_amount = total
-        order.save()
-        
-        # Vider le panier
-        cart.items.all().delete()
+        except OrderPlacementError as e:
+            messages.error(request, str(e))
+            return redirect('orders:checkout')
         
         messages.success(request, 'Commande créée avec succès !')
         return redirect('orders:order-detail', pk=order.pk)
@@ -373,6 +311,7 @@ def cancel_order_view(request, order_id):
     if order.status in ['pending', 'processing']:
         order.status = 'cancelled'
         order.save()
+        StockReservationService.release(order)
         
         # Ajouter un historique
         OrderStatusHistory.objects.create(
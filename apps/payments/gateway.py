@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    import stripe
+except ImportError:
+    stripe = None
+
+
+DEFAULT_PAYMENT_GATEWAY = 'apps.payments.gateway.StripeGateway'
+
+
+class PaymentGatewayError(Exception):
+    """Erreur du prestataire de paiement (configuration, réseau, refus)"""
+
+
+class BasePaymentGateway:
+    """Interface des prestataires de paiement utilisée par les vues et les services"""
+
+    def create_payment_intent(self, idempotency_key=None, **params):
+        raise NotImplementedError
+
+    def retrieve_payment_intent(self, payment_intent_id):
+        raise NotImplementedError
+
+    def create_refund(self, **params):
+        raise NotImplementedError
+
+    def list_payment_methods(self, customer_id):
+        raise NotImplementedError
+
+    def list_events(self, created_gte, event_type=None):
+        raise NotImplementedError
+
+
+class StripeGateway(BasePaymentGateway):
+    """Stripe avec délais d'attente explicites, nouveaux essais et connexions persistantes"""
+
+    def __init__(self):
+        if stripe is None:
+            raise PaymentGatewayError('Stripe n\'est pas configuré')
+        self.api_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
+
+        # Une session HTTP keep-alive par thread ; délai de connexion court, délai de lecture borné
+        stripe.default_http_client = stripe.RequestsClient(timeout=(
+            getattr(settings, 'STRIPE_CONNECT_TIMEOUT', 3),
+            getattr(settings, 'STRIPE_READ_TIMEOUT', 10),
+        ))
+        # Nouveaux essais avec backoff exponentiel et gigue (clé d'idempotence ajoutée par Stripe)
+        stripe.max_network_retries = getattr(settings, 'STRIPE_MAX_NETWORK_RETRIES', 2)
+        # Serveur local (stripe-mock par exemple) pour les tests et mesures
+        api_base = getattr(settings, 'STRIPE_API_BASE', '')
+        if api_base:
+            stripe.api_base = api_base
+
+    def _call(self, method, *args, **params):
+        try:
+            return method(*args, api_key=self.api_key, **params)
+        except stripe.error.StripeError as e:
+            raise PaymentGatewayError(str(e)) from e
+
+    def create_payment_intent(self, idempotency_key=None, **params):
+        if idempotency_key:
+            # Clé du client : un nouvel essai après une coupure renvoie le même PaymentIntent
+            params['idempotency_key'] = idempotency_key
+        return self._call(stripe.PaymentIntent.create, **params)
+
+    def retrieve_payment_intent(self, payment_intent_id):
+        return self._call(stripe.PaymentIntent.retrieve, payment_intent_id)
+
+    def create_refund(self, **params):
+        return self._call(stripe.Refund.create, **params)
+
+    def list_payment_methods(self, customer_id):
+        methods = self._call(stripe.PaymentMethod.list, customer=customer_id, type='card', limit=100)
+        return [method.to_dict_recursive() for method in methods.auto_paging_iter()]
+
+    def list_events(self, created_gte, event_type=None):
+        params = {'created': {'gte': created_gte}, 'limit': 100}
+        if event_type:
+            params['type'] = event_type
+        events = self._call(stripe.Event.list, **params)
+        return (event.to_dict_recursive() for event in events.auto_paging_iter())
+
+
+_gateway = None
+
+
+def get_payment_gateway():
+    """Retourne le prestataire de paiement configuré (PAYMENT_GATEWAY)"""
+    global _gateway
+    if _gateway is None:
+        _gateway = import_string(getattr(settings, 'PAYMENT_GATEWAY', DEFAULT_PAYMENT_GATEWAY))()
+    return _gateway
@@ -0,0 +1,59 @@
+from datetime import datetime, time, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+from apps.payments.gateway import PaymentGatewayError, get_payment_gateway
+from apps.payments.models import StripeEvent
+from apps.payments.services import StripeWebhookService
+
+
+class Command(BaseCommand):
+    help = 'Rejoue des événements webhook Stripe (enregistrés, ou récupérés auprès de Stripe)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', help='Identifiants des événements à rejouer')
+        parser.add_argument('--failed', action='store_true', help='Rejoue les événements en échec')
+        parser.add_argument('--since', help='Rejoue les événements créés depuis cette date (AAAA-MM-JJ)')
+        parser.add_argument('--type', help='Limite à un type d\'événement (ex : payment_intent.succeeded)')
+        parser.add_argument('--from-stripe', action='store_true',
+                            help='Récupère d\'abord auprès de Stripe les événements manquants depuis --since')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.combine(datetime.strptime(options['since'], '%Y-%m-%d').date(), time.min, dt_timezone.utc)
+            except ValueError:
+                raise CommandError('--since attend une date AAAA-MM-JJ')
+        
+        if options['from_stripe']:
+            if since is None:
+                raise CommandError('--from-stripe nécessite --since')
+            fetched = self.fetch_from_stripe(since, options['type'])
+            self.stdout.write(f'{fetched} événements récupérés auprès de Stripe')
+        
+        events = StripeEvent.objects.all()
+        if options['event_ids']:
+            events = events.filter(event_id__in=options['event_ids'])
+        elif options['failed']:
+            events = events.filter(status='failed')
+        elif since is None:
+            raise CommandError('Indiquez des identifiants, --failed ou --since')
+        if since is not None:
+            events = events.filter(stripe_created__gte=since)
+        if options['type']:
+            events = events.filter(type=options['type'])
+        
+        replayed = StripeWebhookService.replay(events)
+        processed = StripeWebhookService.process_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{replayed} événements rejoués, {processed} traités'))
+
+    def fetch_from_stripe(self, since, event_type=None):
+        try:
+            events = get_payment_gateway().list_events(int(since.timestamp()), event_type)
+            fetched = 0
+            for event in events:
+                StripeWebhookService.record_event(event)
+                fetched += 1
+        except PaymentGatewayError as e:
+            raise CommandError(str(e))
+        return fetched
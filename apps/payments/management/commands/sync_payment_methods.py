@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.accounts.models import User
+from apps.payments.gateway import PaymentGatewayError, get_payment_gateway
+from apps.payments.services import PaymentMethodService
+
+
+class Command(BaseCommand):
+    help = 'Recopie depuis Stripe les cartes enregistrées des clients (reprise de la copie locale)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('emails', nargs='*', help='Limite aux utilisateurs indiqués')
+
+    def handle(self, *args, **options):
+        users = User.objects.exclude(stripe_customer_id='')
+        if options['emails']:
+            users = users.filter(email__in=options['emails'])
+        
+        gateway = get_payment_gateway()
+        synced = 0
+        methods = 0
+        for user in users.iterator():
+            try:
+                methods += PaymentMethodService.sync_customer(user, gateway=gateway)
+            except PaymentGatewayError as e:
+                raise CommandError(f'{user.email} : {e}')
+            synced += 1
+        
+        self.stdout.write(self.style.SUCCESS(f'{synced} clients synchronisés, {methods} cartes'))
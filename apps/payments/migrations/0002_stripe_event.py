@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:04
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=100, unique=True, verbose_name='event id')),
+                ('type', models.CharField(max_length=100, verbose_name='type')),
+                ('object_id', models.CharField(blank=True, max_length=100, verbose_name='object id')),
+                ('payload', models.JSONField(verbose_name='payload')),
+                ('stripe_created', models.DateTimeField(verbose_name='stripe created')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('ignored', 'Ignored'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='attempts')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='next attempt at')),
+                ('last_error', models.TextField(blank=True, verbose_name='last error')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='received at')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='processed at')),
+            ],
+            options={
+                'verbose_name': 'Stripe Event',
+                'verbose_name_plural': 'Stripe Events',
+                'db_table': 'stripe_events',
+                'ordering': ['stripe_created', 'id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='stripe_even_status_e9066e_idx'), models.Index(fields=['object_id'], name='stripe_even_object__a48b6b_idx')],
+            },
+        ),
+    ]
@@ -1,10 +1,15 @@
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from decimal import Decimal
 from apps.accounts.models import User
 from apps.orders.models import Order
 
 
+# Client dont les cartes ont été recopiées depuis Stripe au moins une fois
+PAYMENT_METHODS_SYNCED_CACHE_KEY = 'payments:methods_synced:{}'
+
+
 class Payment(models.Model):
     """Paiements"""
     
@@ -161,3 +166,43 @@ class PaymentMethod(models.Model):
             ).exclude(pk=self.pk).update(is_default=False)
         super().save(*args, **kwargs)
 
+
+
+class StripeEvent(models.Model):
+    """Événements webhook Stripe reçus, appliqués de façon asynchrone"""
+    
+    STATUS_CHOICES = [
+        ('pending', _('Pending')),
+        ('processed', _('Processed')),
+        ('ignored', _('Ignored')),
+        ('failed', _('Failed')),
+    ]
+    
+    event_id = models.CharField(_('event id'), max_length=100, unique=True)
+    type = models.CharField(_('type'), max_length=100)
+    # Objet Stripe concerné (PaymentIntent, Charge...) pour regrouper ses événements
+    object_id = models.CharField(_('object id'), max_length=100, blank=True)
+    payload = models.JSONField(_('payload'))
+    stripe_created = models.DateTimeField(_('stripe created'))
+    
+    status = models.CharField(_('status'), max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    next_attempt_at = models.DateTimeField(_('next attempt at'), default=timezone.now)
+    last_error = models.TextField(_('last error'), blank=True)
+    
+    # Métadonnées
+    received_at = models.DateTimeField(_('received at'), auto_now_add=True)
+    processed_at = models.DateTimeField(_('processed at'), null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('Stripe Event')
+        verbose_name_plural = _('Stripe Events')
+        db_table = 'stripe_events'
+        ordering = ['stripe_created', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['object_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.type} - {self.event_id}"
@@ -0,0 +1,310 @@
+import json
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.core.buffers import WriteBehindBuffer
+from apps.inventory.services import InsufficientStock, StockReservationService
+from apps.orders.models import OrderStatusHistory
+from .gateway import get_payment_gateway
+from .models import PAYMENT_METHODS_SYNCED_CACHE_KEY, Payment, PaymentMethod, StripeEvent
+
+logger = logging.getLogger(__name__)
+
+
+# Statut de paiement visé par chaque type d'événement traité
+EVENT_STATUSES = {
+    'payment_intent.processing': 'processing',
+    'payment_intent.succeeded': 'succeeded',
+    'payment_intent.payment_failed': 'failed',
+    'payment_intent.canceled': 'cancelled',
+}
+
+# Événements qui tiennent à jour la copie locale des cartes enregistrées
+PAYMENT_METHOD_EVENTS = (
+    'payment_method.attached',
+    'payment_method.updated',
+    'payment_method.automatically_updated',
+    'payment_method.detached',
+)
+
+# Statuts définitifs : un événement tardif ne les fait pas régresser
+FINAL_STATUSES = ('succeeded', 'refunded')
+
+
+class PaymentMethodService:
+    """Copie locale des cartes Stripe, lue par les vues sans appel au prestataire"""
+
+    @staticmethod
+    def upsert_from_stripe(user, data):
+        """Crée ou met à jour la carte décrite par un objet PaymentMethod Stripe"""
+        card = data.get('card') or {}
+        payment_method, _created = PaymentMethod.objects.update_or_create(
+            stripe_payment_method_id=data['id'],
+            defaults={
+                'user': user,
+                'type': 'card',
+                'external_id': data['id'],
+                'card_last_four': card.get('last4', ''),
+                'card_brand': card.get('brand', ''),
+                'card_exp_month': card.get('exp_month'),
+                'card_exp_year': card.get('exp_year'),
+            }
+        )
+        return payment_method
+
+    @staticmethod
+    def remove(stripe_payment_method_id):
+        return PaymentMethod.objects.filter(stripe_payment_method_id=stripe_payment_method_id).delete()[0]
+
+    @staticmethod
+    def set_default(user, stripe_payment_method_id):
+        PaymentMethod.objects.filter(user=user, is_default=True).exclude(
+            stripe_payment_method_id=stripe_payment_method_id or ''
+        ).update(is_default=False)
+        if stripe_payment_method_id:
+            PaymentMethod.objects.filter(
+                user=user, stripe_payment_method_id=stripe_payment_method_id
+            ).update(is_default=True)
+
+    @staticmethod
+    @transaction.atomic
+    def sync_customer(user, gateway=None):
+        """Recopie les cartes du client depuis Stripe (reprise, rattrapage) ; retourne leur nombre"""
+        if not user.stripe_customer_id:
+            return 0
+        methods = (gateway or get_payment_gateway()).list_payment_methods(user.stripe_customer_id)
+        for data in methods:
+            PaymentMethodService.upsert_from_stripe(user, data)
+        PaymentMethod.objects.filter(user=user, type='card').exclude(
+            stripe_payment_method_id__in=[data['id'] for data in methods]
+        ).delete()
+        # Les webhooks tiennent ensuite la copie à jour
+        transaction.on_commit(lambda: cache.set(PAYMENT_METHODS_SYNCED_CACHE_KEY.format(user.pk), True, None))
+        return len(methods)
+
+    @staticmethod
+    def get_cards(user):
+        """Cartes du client depuis la copie locale ; recopiées depuis Stripe si elle n'a jamais été remplie"""
+        cards = list(PaymentMethod.objects.filter(user=user, type='card'))
+        if not cards and user.stripe_customer_id and not cache.get(PAYMENT_METHODS_SYNCED_CACHE_KEY.format(user.pk)):
+            PaymentMethodService.sync_customer(user)
+            cards = list(PaymentMethod.objects.filter(user=user, type='card'))
+        return cards
+
+
+class OrderPaymentService:
+    """Effets d'un paiement réussi sur la commande"""
+
+    @staticmethod
+    @transaction.atomic
+    def mark_paid(order):
+        """Commande payée : stock réservé sorti puis commande confirmée ; retourne False si le stock manque"""
+        order.payment_status = 'paid'
+        try:
+            StockReservationService.confirm(order)
+        except InsufficientStock as e:
+            # Réservation expirée et stock parti entre-temps : commande payée laissée en attente
+            logger.warning(f"Commande {order.order_number} payée sans stock : {e}")
+            OrderStatusHistory.objects.create(
+                order=order, status=order.status, notes=f'Paiement reçu, stock insuffisant : {e}'
+            )
+            order.save(update_fields=['payment_status', 'updated_at'])
+            return False
+        if order.status == 'pending':
+            order.status = 'confirmed'
+            OrderStatusHistory.objects.create(order=order, status='confirmed', notes='Paiement confirmé')
+        order.save(update_fields=['payment_status', 'status', 'updated_at'])
+        return True
+
+
+class StripeWebhookService:
+    """Réception et application asynchrone des webhooks Stripe"""
+
+    @staticmethod
+    def record_event(payload):
+        """Enregistre l'événement brut (ignoré s'il est déjà connu) ; retourne son identifiant"""
+        event = json.loads(payload) if isinstance(payload, (bytes, str)) else payload
+        data_object = event.get('data', {}).get('object', {})
+        StripeEvent.objects.bulk_create([
+            StripeEvent(
+                event_id=event['id'],
+                type=event['type'],
+                object_id=data_object.get('id', ''),
+                payload=event,
+                stripe_created=datetime.fromtimestamp(event['created'], tz=dt_timezone.utc)
+            )
+        ], ignore_conflicts=True)
+        return event['id']
+
+    @staticmethod
+    def process_pending(batch_size=100):
+        """Applique un lot d'événements en attente, dans l'ordre de création Stripe"""
+        now = timezone.now()
+        with transaction.atomic():
+            events = list(
+                StripeEvent.objects.select_for_update(skip_locked=True).filter(
+                    status='pending', next_attempt_at__lte=now
+                ).order_by('stripe_created', 'id')[:batch_size]
+            )
+            if not events:
+                return 0
+
+            payments = {
+                payment.stripe_payment_intent_id: payment
+                for payment in Payment.objects.select_related('order').filter(
+                    stripe_payment_intent_id__in={event.object_id for event in events if event.object_id}
+                )
+            }
+            customers = StripeWebhookService._customers(events)
+            detached = StripeWebhookService._detached(events)
+            max_attempts = getattr(settings, 'STRIPE_EVENT_MAX_ATTEMPTS', 8)
+            for event in events:
+                event.attempts += 1
+                try:
+                    with transaction.atomic():
+                        if event.type in PAYMENT_METHOD_EVENTS or event.type == 'customer.updated':
+                            event.status = StripeWebhookService._apply_customer(event, customers, detached)
+                        else:
+                            event.status = StripeWebhookService._apply(event, payments)
+                    event.last_error = ''
+                except Exception as e:
+                    logger.exception(f"Échec du traitement de l'événement Stripe {event.event_id}")
+                    event.status = 'pending'
+                    event.last_error = str(e)
+                    # État en mémoire douteux : les événements suivants de ce paiement attendront
+                    payments.pop(event.object_id, None)
+
+                if event.status == 'pending':
+                    if event.attempts >= max_attempts:
+                        event.status = 'failed'
+                    else:
+                        # Paiement pas encore enregistré ou erreur : nouvel essai plus tard
+                        event.next_attempt_at = now + timedelta(seconds=30 * 2 ** (event.attempts - 1))
+                if event.status != 'pending':
+                    event.processed_at = now
+
+            StripeEvent.objects.bulk_update(
+                events, ['status', 'attempts', 'last_error', 'next_attempt_at', 'processed_at']
+            )
+        return len(events)
+
+    @staticmethod
+    def process_all(batch_size=100):
+        """Traite les événements en attente jusqu'à épuisement, retourne leur nombre"""
+        processed = 0
+        while True:
+            count = StripeWebhookService.process_pending(batch_size=batch_size)
+            if not count:
+                return processed
+            processed += count
+
+    @staticmethod
+    def _apply(event, payments):
+        """Applique un événement ; retourne le nouveau statut de l'événement"""
+        target = EVENT_STATUSES.get(event.type)
+        if target is None:
+            return 'ignored'
+        payment = payments.get(event.object_id)
+        if payment is None:
+            # Webhook arrivé avant l'enregistrement du paiement
+            return 'pending'
+
+        created = int(event.stripe_created.timestamp())
+        last_created = payment.metadata.get('stripe_event_created', 0)
+        if payment.status == target:
+            return 'processed'
+        if payment.status in FINAL_STATUSES or created < last_created:
+            # Événement plus ancien que l'état déjà appliqué
+            return 'ignored'
+
+        data_object = event.payload['data']['object']
+        order = payment.order
+        payment.status = target
+        payment.metadata['stripe_event_created'] = created
+        update_fields = ['status', 'metadata', 'updated_at']
+
+        if target == 'succeeded':
+            payment.transaction_id = data_object.get('latest_charge') or payment.transaction_id
+            update_fields.append('transaction_id')
+            OrderPaymentService.mark_paid(order)
+        elif target == 'failed':
+            payment.failure_reason = (data_object.get('last_payment_error') or {}).get('message', '')
+            update_fields.append('failure_reason')
+            order.payment_status = 'failed'
+            order.save(update_fields=['payment_status', 'updated_at'])
+
+        payment.save(update_fields=update_fields)
+        return 'processed'
+
+    @staticmethod
+    def _customers(events):
+        """Utilisateurs des clients Stripe concernés par le lot, en une requête"""
+        customer_ids = set()
+        for event in events:
+            data_object = event.payload['data']['object']
+            if event.type == 'customer.updated':
+                customer_ids.add(data_object.get('id'))
+            elif event.type in PAYMENT_METHOD_EVENTS:
+                customer_ids.add(data_object.get('customer'))
+        customer_ids.discard(None)
+        if not customer_ids:
+            return {}
+        return {user.stripe_customer_id: user for user in User.objects.filter(stripe_customer_id__in=customer_ids)}
+
+    @staticmethod
+    def _detached(events):
+        """Date du dernier détachement déjà appliqué de chaque carte du lot"""
+        object_ids = {event.object_id for event in events if event.type in PAYMENT_METHOD_EVENTS}
+        if not object_ids:
+            return {}
+        detached = {}
+        for object_id, stripe_created in StripeEvent.objects.filter(
+            type='payment_method.detached', status='processed', object_id__in=object_ids
+        ).values_list('object_id', 'stripe_created'):
+            detached[object_id] = max(stripe_created, detached.get(object_id, stripe_created))
+        return detached
+
+    @staticmethod
+    def _apply_customer(event, customers, detached):
+        """Applique un événement de carte ou de client à la copie locale des cartes"""
+        data_object = event.payload['data']['object']
+        if event.type == 'customer.updated':
+            user = customers.get(data_object.get('id'))
+            if user is None:
+                return 'ignored'
+            default = (data_object.get('invoice_settings') or {}).get('default_payment_method')
+            PaymentMethodService.set_default(user, default)
+            return 'processed'
+
+        if event.type == 'payment_method.detached':
+            PaymentMethodService.remove(event.object_id)
+            detached[event.object_id] = max(event.stripe_created, detached.get(event.object_id, event.stripe_created))
+            return 'processed'
+
+        user = customers.get(data_object.get('customer'))
+        detached_at = detached.get(event.object_id)
+        if user is None or (detached_at is not None and event.stripe_created <= detached_at):
+            # Client inconnu, ou carte détachée depuis : l'événement ne doit pas la recréer
+            return 'ignored'
+        PaymentMethodService.upsert_from_stripe(user, data_object)
+        return 'processed'
+
+    @staticmethod
+    def replay(queryset):
+        """Remet des événements en attente pour les appliquer à nouveau"""
+        return queryset.update(status='pending', next_attempt_at=timezone.now(), last_error='', processed_at=None)
+
+
+# Traitement en arrière-plan des événements reçus par le webhook
+stripe_event_queue = WriteBehindBuffer(
+    lambda event_ids: StripeWebhookService.process_all(),
+    max_size=100,
+    interval=getattr(settings, 'STRIPE_WEBHOOK_PROCESS_SECONDS', 1),
+    name='stripe-events'
+)
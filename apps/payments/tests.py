@@ -0,0 +1,242 @@
+import hashlib
+import hmac
+import itertools
+import json
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.automation.tasks import process_stripe_events
+from apps.core.models import IdempotencyKey
+from apps.orders.models import Order
+from .gateway import BasePaymentGateway
+from .models import Payment, StripeEvent
+from .services import StripeWebhookService
+
+
+User = get_user_model()
+
+WEBHOOK_SECRET = 'whsec_test'
+
+
+class FakeStripe:
+    """Générateur local d'événements Stripe signés comme par Stripe"""
+
+    def __init__(self, secret=WEBHOOK_SECRET):
+        self.secret = secret
+        self.sequence = itertools.count(1)
+        self.clock = int(time.time())
+
+    def event(self, event_type, object_id, created=None, **fields):
+        """Événement de PaymentIntent ; horodatage croissant sauf s'il est imposé"""
+        number = next(self.sequence)
+        return {
+            'id': f'evt_test_{number}',
+            'object': 'event',
+            'type': event_type,
+            'created': created if created is not None else self.clock + number,
+            'livemode': False,
+            'data': {'object': {'id': object_id, 'object': 'payment_intent', **fields}},
+        }
+
+    def card(self, customer_id, last4='4242', brand='visa'):
+        """Objet PaymentMethod de type carte"""
+        return {
+            'id': f'pm_test_{next(self.sequence)}',
+            'object': 'payment_method',
+            'type': 'card',
+            'customer': customer_id,
+            'card': {'brand': brand, 'last4': last4, 'exp_month': 12, 'exp_year': 2030},
+        }
+
+    def sign(self, payload, timestamp=None):
+        timestamp = timestamp or int(time.time())
+        signature = hmac.new(self.secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+        return f't={timestamp},v1={signature}'
+
+    def deliver(self, client, event, secret=None):
+        """Envoie l'événement au webhook, signé avec le secret donné"""
+        payload = json.dumps(event)
+        signer = FakeStripe(secret) if secret else self
+        return client.post(
+            reverse('payments:stripe-webhook'), payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=signer.sign(payload)
+        )
+
+
+class FakeGateway(BasePaymentGateway):
+    """Prestataire local : cartes des clients en mémoire, appels comptés"""
+
+    def __init__(self, cards=None):
+        self.cards = cards or {}
+        self.calls = 0
+        self.intents = []
+
+    def list_payment_methods(self, customer_id):
+        self.calls += 1
+        return self.cards.get(customer_id, [])
+
+    def create_payment_intent(self, idempotency_key=None, **params):
+        self.intents.append((idempotency_key, params))
+        number = len(self.intents)
+        return mock.Mock(id=f'pi_test_{number}', client_secret=f'pi_test_{number}_secret')
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTests(TestCase):
+    """Réception (rapide, dédupliquée) puis application asynchrone des webhooks Stripe"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='client@example.com', username='client', password='secret', first_name='Client', last_name='Test'
+        )
+
+    def setUp(self):
+        self.stripe = FakeStripe()
+        # Le traitement en arrière-plan est déclenché explicitement par les tests
+        patcher = mock.patch('apps.payments.views.stripe_event_queue')
+        self.queue = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_payment(self, intent_id='pi_test'):
+        order = Order.objects.create(user=self.user, subtotal=100, total_amount=100)
+        return Payment.objects.create(
+            order=order, user=self.user, amount=100, method='stripe', stripe_payment_intent_id=intent_id
+        )
+
+    def test_duplicate_deliveries_are_recorded_once(self):
+        event = self.stripe.event('payment_intent.succeeded', 'pi_test')
+        for _delivery in range(3):
+            response = self.stripe.deliver(self.client, event)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(StripeEvent.objects.filter(event_id=event['id']).count(), 1)
+        self.assertEqual(self.queue.add.call_count, 3)
+
+    def test_invalid_signature_is_rejected(self):
+        event = self.stripe.event('payment_intent.succeeded', 'pi_test')
+        response = self.stripe.deliver(self.client, event, secret='whsec_other')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_out_of_order_events_keep_latest_status(self):
+        payment = self.create_payment()
+        processing = self.stripe.event('payment_intent.processing', 'pi_test')
+        succeeded = self.stripe.event('payment_intent.succeeded', 'pi_test', latest_charge='ch_test')
+        self.stripe.deliver(self.client, succeeded)
+        self.stripe.deliver(self.client, processing)
+
+        StripeWebhookService.process_all()
+        payment.refresh_from_db()
+        payment.order.refresh_from_db()
+        self.assertEqual((payment.status, payment.transaction_id), ('succeeded', 'ch_test'))
+        self.assertEqual((payment.order.status, payment.order.payment_status), ('confirmed', 'paid'))
+        self.assertFalse(StripeEvent.objects.filter(status='pending').exists())
+
+    def test_early_event_is_retried_by_scheduled_task(self):
+        event = self.stripe.event('payment_intent.succeeded', 'pi_late')
+        self.stripe.deliver(self.client, event)
+
+        # Paiement pas encore enregistré : l'événement attend un nouvel essai
+        StripeWebhookService.process_all()
+        stored = StripeEvent.objects.get(event_id=event['id'])
+        self.assertEqual((stored.status, stored.attempts), ('pending', 1))
+        self.assertGreater(stored.next_attempt_at, timezone.now())
+
+        payment = self.create_payment('pi_late')
+        # Aucun autre webhook n'arrive : la tâche périodique applique l'événement à échéance
+        process_stripe_events()
+        self.assertEqual(StripeEvent.objects.get(pk=stored.pk).status, 'pending')
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(minutes=1)):
+            process_stripe_events()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'succeeded')
+        self.assertEqual(StripeEvent.objects.get(pk=stored.pk).status, 'processed')
+
+
+class PaymentMethodsViewTests(TestCase):
+    """Cartes enregistrées servies depuis la copie locale"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='client@example.com', username='client', password='secret', first_name='Client', last_name='Test',
+            stripe_customer_id='cus_test'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.stripe = FakeStripe()
+        self.gateway = FakeGateway()
+        patcher = mock.patch('apps.payments.services.get_payment_gateway', return_value=self.gateway)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+
+    def get_cards(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse('payments:stripe-payment-methods'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['payment_methods']
+
+    def test_empty_copy_is_filled_from_gateway_once(self):
+        self.gateway.cards['cus_test'] = [self.stripe.card('cus_test', last4='1111')]
+        cards = self.get_cards()
+        self.assertEqual([(card['card_brand'], card['card_last_four']) for card in cards], [('visa', '1111')])
+        self.assertEqual(
+            set(cards[0]),
+            {'id', 'type', 'is_default', 'card_last_four', 'card_brand', 'card_exp_month', 'card_exp_year', 'created_at'}
+        )
+        self.get_cards()
+        self.assertEqual(self.gateway.calls, 1)
+
+    def test_customer_without_cards_is_not_synced_on_every_request(self):
+        self.assertEqual(self.get_cards(), [])
+        self.assertEqual(self.get_cards(), [])
+        self.assertEqual(self.gateway.calls, 1)
+
+
+class CreatePaymentIntentViewTests(TestCase):
+    """Clé d'idempotence du client transmise au prestataire"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='client@example.com', username='client', password='secret', first_name='Client', last_name='Test'
+        )
+        cls.order = Order.objects.create(user=cls.user, subtotal=20, total_amount=20)
+
+    def setUp(self):
+        cache.clear()
+        self.gateway = FakeGateway()
+        patcher = mock.patch('apps.payments.views.get_payment_gateway', return_value=self.gateway)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+
+    def create_intent(self, **headers):
+        return self.client.post(
+            reverse('payments:create-payment-intent'), {'order_id': self.order.pk}, content_type='application/json',
+            **headers
+        )
+
+    def test_client_key_reaches_gateway(self):
+        self.assertEqual(self.create_intent(HTTP_IDEMPOTENCY_KEY='paiement-1').status_code, 200)
+        # Clé libérée (réponse perdue, processus tué) : le nouvel essai réutilise la même clé chez Stripe
+        IdempotencyKey.objects.all().delete()
+        cache.clear()
+        self.create_intent(HTTP_IDEMPOTENCY_KEY='paiement-1')
+        first, second = [key for key, params in self.gateway.intents]
+        self.assertTrue(first.startswith('payment-intent:'))
+        self.assertEqual(first, second)
+        self.assertEqual(self.gateway.intents[0][1]['amount'], 2000)
+
+    def test_without_client_key_no_key_is_sent(self):
+        self.create_intent()
+        self.assertEqual(self.gateway.intents[0][0], None)
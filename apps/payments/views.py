@@ -1,25 +1,25 @@
+import json
 from rest_framework import generics, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 try:
     import stripe
-    stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
 except ImportError:
     stripe = None
 from .models import Payment, Refund, PaymentMethod
+from .gateway import PaymentGatewayError, get_payment_gateway
+from .services import OrderPaymentService, PaymentMethodService, StripeWebhookService, stripe_event_queue
 from .serializers import (
     PaymentSerializer, RefundSerializer, PaymentMethodSerializer,
     CreatePaymentSerializer, CreateRefundSerializer
 )
+from apps.core.idempotency import idempotent, provider_idempotency_key
 from apps.orders.models import Order
 
-# Configuration Stripe (déjà configuré dans l'import)
-
-
 class PaymentListView(generics.ListAPIView):
     """Vue pour lister les paiements de l'utilisateur"""
     
@@ -62,6 +62,7 @@ class PaymentMethodDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def create_payment_intent_view(request):
     """Vue pour créer un PaymentIntent Stripe"""
     
@@ -76,13 +77,9 @@ def create_payment_intent_view(request):
     # Récupérer la commande
     order = get_object_or_404(Order, id=order_id, user=request.user)
     
-    if not stripe:
-        return Response(
-            {'error': 'Stripe n\'est pas configuré'}, 
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
-    
     try:
+        gateway = get_payment_gateway()
+        
         # Créer le PaymentIntent Stripe
         intent_data = {
             'amount': int(order.total_amount * 100),  # Convertir en centimes
@@ -103,7 +100,9 @@ def create_payment_intent_view(request):
         if save_payment_method:
             intent_data['setup_future_usage'] = 'off_session'
         
-        payment_intent = stripe.PaymentIntent.create(**intent_data)
+        payment_intent = gateway.create_payment_intent(
+            idempotency_key=provider_idempotency_key(request, 'payment-intent'), **intent_data
+        )
         
         # Créer l'enregistrement de paiement
         payment = Payment.objects.create(
@@ -123,7 +122,7 @@ def create_payment_intent_view(request):
             'payment_intent_id': payment_intent.id
         })
         
-    except stripe.error.StripeError as e:
+    except PaymentGatewayError as e:
         return Response(
             {'error': f'Erreur Stripe: {str(e)}'}, 
             status=status.HTTP_400_BAD_REQUEST
@@ -137,15 +136,16 @@ def confirm_payment_view(request, payment_id):
     
     payment = get_object_or_404(Payment, id=payment_id, user=request.user)
     
-    if not stripe:
-        return Response(
-            {'error': 'Stripe n\'est pas configuré'}, 
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+    # Paiement déjà confirmé par webhook : inutile d'interroger Stripe
+    if payment.status == 'succeeded':
+        return Response({
+            'message': _('Paiement confirmé avec succès!'),
+            'payment': PaymentSerializer(payment).data
+        })
     
     try:
         # Récupérer le PaymentIntent depuis Stripe
-        payment_intent = stripe.PaymentIntent.retrieve(payment.stripe_payment_intent_id)
+        payment_intent = get_payment_gateway().retrieve_payment_intent(payment.stripe_payment_intent_id)
         
         if payment_intent.status == 'succeeded':
             # Mettre à jour le paiement
@@ -153,18 +153,8 @@ def confirm_payment_view(request, payment_id):
             payment.transaction_id = payment_intent.latest_charge
             payment.save()
             
-            # Mettre à jour la commande
-            payment.order.payment_status = 'paid'
-            payment.order.status = 'confirmed'
-            payment.order.save()
-            
-            # Ajouter à l'historique
-            from apps.orders.models import OrderStatusHistory
-            OrderStatusHistory.objects.create(
-                order=payment.order,
-                status='confirmed',
-                notes='Paiement confirmé'
-            )
+            # Mettre à jour la commande (stock sorti, historique)
+            OrderPaymentService.mark_paid(payment.order)
             
             return Response({
                 'message': _('Paiement confirmé avec succès!'),
@@ -176,7 +166,7 @@ def confirm_payment_view(request, payment_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-    except stripe.error.StripeError as e:
+    except PaymentGatewayError as e:
         return Response(
             {'error': f'Erreur Stripe: {str(e)}'}, 
             status=status.HTTP_400_BAD_REQUEST
@@ -205,15 +195,9 @@ def create_refund_view(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    if not stripe:
-        return Response(
-            {'error': 'Stripe n\'est pas configuré'}, 
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
-    
     try:
         # Créer le remboursement Stripe
-        refund = stripe.Refund.create(
+        refund = get_payment_gateway().create_refund(
             payment_intent=payment.stripe_payment_intent_id,
             amount=int(amount * 100),  # Convertir en centimes
             reason='requested_by_customer' if reason else None,
@@ -249,7 +233,7 @@ def create_refund_view(request):
             'refund': RefundSerializer(refund_obj).data
         })
         
-    except stripe.error.StripeError as e:
+    except PaymentGatewayError as e:
         return Response(
             {'error': f'Erreur Stripe: {str(e)}'}, 
             status=status.HTTP_400_BAD_REQUEST
@@ -259,7 +243,11 @@ def create_refund_view(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def payment_methods_view(request):
-    """Vue pour récupérer les méthodes de paiement Stripe de l'utilisateur"""
+    """Vue pour récupérer les cartes Stripe enregistrées de l'utilisateur
+    
+    Réponse au format PaymentMethodSerializer (id, type, is_default, card_last_four, card_brand,
+    card_exp_month, card_exp_year, created_at) et non plus les objets PaymentMethod de Stripe.
+    """
     
     if not request.user.stripe_customer_id:
         return Response({
@@ -267,34 +255,25 @@ def payment_methods_view(request):
             'message': 'Aucun client Stripe associé à ce compte.'
         })
     
-    if not stripe:
-        return Response({
-            'payment_methods': [],
-            'message': 'Stripe n\'est pas configuré.'
-        })
-    
+    # Copie locale tenue à jour par les webhooks ; Stripe n'est appelé que si elle n'a jamais été remplie
     try:
-        # Récupérer les méthodes de paiement depuis Stripe
-        payment_methods = stripe.PaymentMethod.list(
-            customer=request.user.stripe_customer_id,
-            type='card'
-        )
-        
-        return Response({
-            'payment_methods': payment_methods.data
-        })
-        
-    except stripe.error.StripeError as e:
+        payment_methods = PaymentMethodService.get_cards(request.user)
+    except PaymentGatewayError as e:
         return Response(
-            {'error': f'Erreur Stripe: {str(e)}'}, 
+            {'error': f'Erreur Stripe: {str(e)}'},
             status=status.HTTP_400_BAD_REQUEST
         )
+    
+    return Response({
+        'payment_methods': PaymentMethodSerializer(payment_methods, many=True).data
+    })
 
 
 @api_view(['POST'])
-@permission_classes([IsAuthenticated])
+@authentication_classes([])
+@permission_classes([AllowAny])
 def webhook_view(request):
-    """Vue pour traiter les webhooks Stripe"""
+    """Vue pour recevoir les webhooks Stripe (appliqués en arrière-plan)"""
     
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
@@ -304,37 +283,16 @@ def webhook_view(request):
         return Response({'error': 'Stripe n\'est pas configuré'}, status=400)
     
     try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, endpoint_secret
-        )
+        # Vérification de la signature seule : l'objet Event n'est pas construit dans la requête
+        stripe.WebhookSignature.verify_header(payload.decode('utf-8'), sig_header, endpoint_secret)
+        event = json.loads(payload)
     except ValueError:
         return Response({'error': 'Invalid payload'}, status=400)
     except stripe.error.SignatureVerificationError:
         return Response({'error': 'Invalid signature'}, status=400)
     
-    # Traiter les événements
-    if event['type'] == 'payment_intent.succeeded':
-        payment_intent = event['data']['object']
-        # Traiter le paiement réussi
-        try:
-            payment = Payment.objects.get(stripe_payment_intent_id=payment_intent['id'])
-            payment.status = 'succeeded'
-            payment.save()
-            
-            payment.order.payment_status = 'paid'
-            payment.order.save()
-        except Payment.DoesNotExist:
-            pass
-    
-    elif event['type'] == 'payment_intent.payment_failed':
-        payment_intent = event['data']['object']
-        # Traiter le paiement échoué
-        try:
-            payment = Payment.objects.get(stripe_payment_intent_id=payment_intent['id'])
-            payment.status = 'failed'
-            payment.failure_reason = payment_intent.get('last_payment_error', {}).get('message', '')
-            payment.save()
-        except Payment.DoesNotExist:
-            pass
+    # Enregistrement idempotent (par identifiant d'événement), traitement hors requête
+    event_id = StripeWebhookService.record_event(event)
+    stripe_event_queue.add(event_id)
     
     return Response({'status': 'success'})
@@ -11,10 +11,7 @@ class ProductFilter(django_filters.FilterSet):
     price_max = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
     
     # Filtres de catégorie
-    category = django_filters.ModelChoiceFilter(
-        queryset=Category.objects.filter(is_active=True),
-        field_name='category'
-    )
+    category = django_filters.CharFilter(method='filter_category')
     category_slug = django_filters.CharFilter(
         field_name='category__slug',
         lookup_expr='exact'
@@ -53,6 +50,15 @@ class ProductFilter(django_filters.FilterSet):
             'updated_at': ['gte', 'lte'],
         }
     
+    def filter_category(self, queryset, name, value):
+        """Filtrer par catégorie (slug ou identifiant), sous-catégories actives comprises"""
+        lookup = {'pk': value} if value.isdigit() else {'slug': value}
+        # Catégorie inconnue ou inactive : filtre ignoré
+        category = Category.objects.filter(is_active=True, **lookup).first()
+        if category is None:
+            return queryset
+        return queryset.filter(category__ancestor_links__ancestor=category, category__is_active=True)
+    
     def filter_in_stock(self, queryset, name, value):
         """Filtrer les produits en stock"""
         if value:
@@ -0,0 +1,47 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from apps.products.models import RATING_FIELDS, Product, ProductReview
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les agrégats de notes des produits et signale les écarts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Affiche les écarts sans les corriger')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        
+        # Histogramme des avis approuvés en une seule requête groupée
+        expected = defaultdict(lambda: dict.fromkeys(RATING_FIELDS, 0))
+        rows = ProductReview.objects.filter(is_approved=True).values('product_id', 'rating').annotate(
+            total=Count('id')
+        ).order_by()
+        for row in rows:
+            values = expected[row['product_id']]
+            values[f"rating_{row['rating']}_count"] = row['total']
+            values['rating_count'] += row['total']
+            values['rating_sum'] += row['rating'] * row['total']
+        
+        empty = dict.fromkeys(RATING_FIELDS, 0)
+        drifted = []
+        checked = 0
+        for product in Product.objects.only('id', *RATING_FIELDS).order_by('pk').iterator(chunk_size=batch_size):
+            checked += 1
+            values = expected.get(product.pk, empty)
+            if any(getattr(product, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(product, field, value)
+                drifted.append(product)
+        
+        self.stdout.write(f'{checked} produits vérifiés, {len(drifted)} en écart')
+        if options['dry_run'] or not drifted:
+            return
+        
+        with transaction.atomic():
+            Product.objects.bulk_update(drifted, RATING_FIELDS, batch_size=batch_size)
+        
+        self.stdout.write(self.style.SUCCESS(f'{len(drifted)} produits corrigés'))
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:38
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductReview = apps.get_model('products', 'ProductReview')
+    aggregates = {}
+    rows = ProductReview.objects.filter(is_approved=True).values('product_id', 'rating').annotate(
+        total=Count('id')
+    ).order_by()
+    for row in rows:
+        values = aggregates.setdefault(row['product_id'], {'rating_sum': 0, 'rating_count': 0})
+        values[f"rating_{row['rating']}_count"] = row['total']
+        values['rating_count'] += row['total']
+        values['rating_sum'] += row['rating'] * row['total']
+    for product_id, values in aggregates.items():
+        Product.objects.filter(pk=product_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='1 star count'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='2 stars count'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='3 stars count'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='4 stars count'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='5 stars count'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='rating count'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='rating sum'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
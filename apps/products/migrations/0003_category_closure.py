@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_category_closure(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    CategoryClosure = apps.get_model('products', 'CategoryClosure')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    links = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            links.append(CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth))
+            ancestor_id = parents.get(ancestor_id)
+            depth += 1
+    CategoryClosure.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(default=0, verbose_name='depth')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='products.category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='products.category')),
+            ],
+            options={
+                'verbose_name': 'Category Closure',
+                'verbose_name_plural': 'Category Closures',
+                'db_table': 'category_closure',
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='category_cl_descend_d00dc6_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_category_closure, migrations.RunPython.noop),
+    ]
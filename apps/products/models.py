@@ -1,10 +1,18 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Prefetch
 from django.utils.translation import gettext_lazy as _
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
 from apps.accounts.models import User
 
 
+CATEGORY_PRODUCT_COUNTS_CACHE_KEY = 'products:category_product_counts'
+# Agrégats des avis approuvés, écrits uniquement par expressions F() (signaux d'avis, rebuild_product_ratings)
+RATING_FIELDS = ['rating_sum', 'rating_count'] + [f'rating_{rating}_count' for rating in range(1, 6)]
+
+
 class Category(models.Model):
     """Catégories de produits"""
     
@@ -29,17 +37,120 @@ class Category(models.Model):
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'parent_id' in field_names:
+            instance._loaded_parent_id = instance.parent_id
+        if 'name' in field_names:
+            instance._loaded_name = instance.name
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        
+        is_new = self._state.adding
+        parent_changed = self.__dict__.get('_loaded_parent_id', -1) != self.parent_id
+        if not is_new and parent_changed:
+            self.validate_parent()
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                CategoryClosure.insert_node(self)
+            elif parent_changed:
+                CategoryClosure.move_subtree(self)
+        self._loaded_parent_id = self.parent_id
+    
+    def clean(self):
+        super().clean()
+        self.validate_parent()
+    
+    def validate_parent(self):
+        """Empêche les cycles : le parent ne peut pas être la catégorie ou l'un de ses descendants"""
+        if not self.pk or not self.parent_id:
+            return
+        if self.pk == self.parent_id or CategoryClosure.objects.filter(
+            ancestor_id=self.pk, descendant_id=self.parent_id
+        ).exists():
+            raise ValidationError({
+                'parent': _('Une catégorie ne peut pas être placée sous une de ses sous-catégories.')
+            })
     
     @property
     def full_path(self):
         """Retourne le chemin complet de la catégorie"""
-        if self.parent:
-            return f"{self.parent.full_path} > {self.name}"
-        return self.name
+        names = list(
+            Category.objects.filter(descendant_links__descendant=self)
+            .order_by('-descendant_links__depth')
+            .values_list('name', flat=True)
+        )
+        return ' > '.join(names) if names else self.name
+    
+    @classmethod
+    def published_product_counts(cls):
+        """Nombre de produits publiés par catégorie, sous-catégories incluses (mis en cache)"""
+        counts = cache.get(CATEGORY_PRODUCT_COUNTS_CACHE_KEY)
+        if counts is None:
+            rows = Product.objects.published().values_list(
+                'category__ancestor_links__ancestor_id'
+            ).annotate(total=Count('id')).order_by()
+            counts = dict(rows)
+            cache.set(CATEGORY_PRODUCT_COUNTS_CACHE_KEY, counts, 60 * 60)
+        return counts
+
+
+class CategoryClosure(models.Model):
+    """Table de fermeture de l'arbre des catégories (une ligne par couple ancêtre/descendant)"""
+    
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField(_('depth'), default=0)
+    
+    class Meta:
+        verbose_name = _('Category Closure')
+        verbose_name_plural = _('Category Closures')
+        db_table = 'category_closure'
+        unique_together = ['ancestor', 'descendant']
+        indexes = [
+            models.Index(fields=['descendant', 'depth']),
+        ]
+    
+    def __str__(self):
+        return f"{self.ancestor_id} > {self.descendant_id} ({self.depth})"
+    
+    @classmethod
+    def insert_node(cls, category):
+        """Ajoute une nouvelle catégorie sous les ancêtres de son parent"""
+        links = [cls(ancestor_id=category.pk, descendant_id=category.pk, depth=0)]
+        if category.parent_id:
+            ancestors = cls.objects.filter(descendant_id=category.parent_id).values_list('ancestor_id', 'depth')
+            links.extend(
+                cls(ancestor_id=ancestor_id, descendant_id=category.pk, depth=depth + 1)
+                for ancestor_id, depth in ancestors
+            )
+        cls.objects.bulk_create(links, ignore_conflicts=True)
+    
+    @classmethod
+    def move_subtree(cls, category):
+        """Rattache le sous-arbre d'une catégorie déplacée aux ancêtres de son nouveau parent"""
+        subtree = list(cls.objects.filter(ancestor_id=category.pk).values_list('descendant_id', 'depth'))
+        if not subtree:
+            subtree = [(category.pk, 0)]
+        subtree_ids = [descendant_id for descendant_id, _depth in subtree]
+        
+        cls.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+        
+        links = [cls(ancestor_id=category.pk, descendant_id=category.pk, depth=0)]
+        if category.parent_id:
+            ancestors = list(cls.objects.filter(descendant_id=category.parent_id).values_list('ancestor_id', 'depth'))
+            links.extend(
+                cls(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + depth + 1)
+                for ancestor_id, ancestor_depth in ancestors
+                for descendant_id, depth in subtree
+            )
+        cls.objects.bulk_create(links, ignore_conflicts=True)
 
 
 class Brand(models.Model):
@@ -65,12 +176,36 @@ class Brand(models.Model):
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'name' in field_names:
+            instance._loaded_name = instance.name
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
 
 
+class ProductQuerySet(models.QuerySet):
+    """QuerySet des produits"""
+    
+    def published(self):
+        return self.filter(status='published')
+    
+    def in_category(self, category):
+        """Produits de la catégorie et de toutes ses sous-catégories"""
+        return self.filter(category__ancestor_links__ancestor=category)
+    
+    def for_listing(self):
+        """Prépare les produits pour les listes (images en une seule requête groupée)"""
+        return self.select_related('category', 'brand').prefetch_related(
+            Prefetch('images', queryset=ProductImage.objects.order_by('-is_primary', 'sort_order', 'created_at'))
+        )
+
+
 class Product(models.Model):
     """Produits du catalogue"""
     
@@ -117,10 +252,21 @@ class Product(models.Model):
     meta_title = models.CharField(_('meta title'), max_length=200, blank=True)
     meta_description = models.TextField(_('meta description'), max_length=500, blank=True)
     
+    # Agrégats des avis approuvés (maintenus par ProductReview)
+    rating_sum = models.PositiveIntegerField(_('rating sum'), default=0, editable=False)
+    rating_count = models.PositiveIntegerField(_('rating count'), default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(_('1 star count'), default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(_('2 stars count'), default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(_('3 stars count'), default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(_('4 stars count'), default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(_('5 stars count'), default=0, editable=False)
+    
     # Métadonnées
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('updated at'), auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('Product')
         verbose_name_plural = _('Products')
@@ -138,6 +284,12 @@ class Product(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        # Une sauvegarde ordinaire n'écrase pas les agrégats d'avis modifiés depuis le chargement
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in RATING_FIELDS
+            ]
         super().save(*args, **kwargs)
     
     @property
@@ -160,6 +312,45 @@ class Product(models.Model):
         if self.compare_price and self.compare_price > self.price:
             return round(((self.compare_price - self.price) / self.compare_price) * 100, 2)
         return 0
+    
+    @property
+    def average_rating(self):
+        """Note moyenne des avis approuvés"""
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count, 1)
+    
+    @property
+    def rating_distribution(self):
+        """Répartition des avis approuvés par note"""
+        return [
+            {'rating': rating, 'count': getattr(self, f'rating_{rating}_count')}
+            for rating in range(1, 6)
+            if getattr(self, f'rating_{rating}_count')
+        ]
+    
+    @classmethod
+    def apply_rating_deltas(cls, product_id, deltas):
+        """Applique des variations {note: +n/-n} aux agrégats d'avis avec des expressions F()"""
+        updates = {}
+        for rating, delta in deltas.items():
+            if not delta:
+                continue
+            field = f'rating_{rating}_count'
+            updates[field] = F(field) + delta
+            updates['rating_sum'] = updates.get('rating_sum', F('rating_sum')) + rating * delta
+            updates['rating_count'] = updates.get('rating_count', F('rating_count')) + delta
+        if updates:
+            cls.objects.filter(pk=product_id).update(**updates)
+    
+    @property
+    def primary_image(self):
+        """Image principale (ou première image) en s'appuyant sur le cache de prefetch"""
+        images = list(self.images.all())
+        for image in images:
+            if image.is_primary:
+                return image
+        return images[0] if images else None
 
 
 class ProductImage(models.Model):
@@ -241,7 +432,12 @@ class ProductAttributeValue(models.Model):
 
 
 class ProductReview(models.Model):
-    """Avis sur les produits"""
+    """Avis sur les produits
+
+    Les agrégats de notes du produit suivent les save()/delete() d'avis (signaux) ; les écritures
+    par queryset (update, bulk_create, bulk_update) ne les mettent pas à jour : lancer ensuite
+    la commande rebuild_product_ratings.
+    """
     
     RATING_CHOICES = [
         (1, _('1 Star')),
@@ -272,4 +468,18 @@ class ProductReview(models.Model):
     
     def __str__(self):
         return f"{self.product.name} - {self.user.get_full_name()} ({self.rating}★)"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {'product_id', 'rating', 'is_approved'}.issubset(field_names):
+            instance._loaded_rating_state = instance.rating_state
+        return instance
+    
+    @property
+    def rating_state(self):
+        """(produit, note) si l'avis compte dans les agrégats, sinon None"""
+        if self.is_approved and self.rating:
+            return (self.product_id, self.rating)
+        return None
 
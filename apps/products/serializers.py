@@ -1,5 +1,4 @@
 from rest_framework import serializers
-from django.db.models import Avg
 from .models import (
     Category, Brand, Product, ProductImage, 
     ProductAttribute, ProductAttributeValue, ProductReview
@@ -21,12 +20,21 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'slug')
     
     def get_children(self, obj):
-        if obj.children.exists():
-            return CategorySerializer(obj.children.filter(is_active=True), many=True).data
-        return []
+        # L'arbre des catégories actives est chargé une seule fois par sérialisation
+        children_map = self.context.get('category_children')
+        if children_map is None:
+            children_map = {}
+            for category in Category.objects.filter(is_active=True):
+                children_map.setdefault(category.parent_id, []).append(category)
+            self.context['category_children'] = children_map
+        return CategorySerializer(children_map.get(obj.pk, []), many=True, context=self.context).data
     
     def get_product_count(self, obj):
-        return obj.products.filter(status='published').count()
+        product_counts = self.context.get('category_product_counts')
+        if product_counts is None:
+            product_counts = Category.published_product_counts()
+            self.context['category_product_counts'] = product_counts
+        return product_counts.get(obj.pk, 0)
 
 
 class BrandSerializer(serializers.ModelSerializer):
@@ -93,8 +101,8 @@ class ProductListSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     brand_name = serializers.CharField(source='brand.name', read_only=True)
     primary_image = serializers.SerializerMethodField()
-    average_rating = serializers.SerializerMethodField()
-    review_count = serializers.SerializerMethodField()
+    average_rating = serializers.ReadOnlyField()
+    review_count = serializers.IntegerField(source='rating_count', read_only=True)
     discount_percentage = serializers.ReadOnlyField()
     
     class Meta:
@@ -109,23 +117,10 @@ class ProductListSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'slug')
     
     def get_primary_image(self, obj):
-        primary_image = obj.images.filter(is_primary=True).first()
+        primary_image = obj.primary_image
         if primary_image:
             return ProductImageSerializer(primary_image).data
-        # Retourner la première image si aucune image primaire
-        first_image = obj.images.first()
-        if first_image:
-            return ProductImageSerializer(first_image).data
         return None
-    
-    def get_average_rating(self, obj):
-        avg_rating = obj.reviews.filter(is_approved=True).aggregate(
-            avg_rating=Avg('rating')
-        )['avg_rating']
-        return round(avg_rating, 1) if avg_rating else 0
-    
-    def get_review_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
 
 
 class ProductDetailSerializer(serializers.ModelSerializer):
@@ -136,8 +131,8 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     attribute_values = ProductAttributeValueSerializer(many=True, read_only=True)
     reviews = ProductReviewSerializer(many=True, read_only=True)
-    average_rating = serializers.SerializerMethodField()
-    review_count = serializers.SerializerMethodField()
+    average_rating = serializers.ReadOnlyField()
+    review_count = serializers.IntegerField(source='rating_count', read_only=True)
     discount_percentage = serializers.ReadOnlyField()
     
     class Meta:
@@ -152,15 +147,6 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             'is_in_stock', 'is_low_stock', 'created_at', 'updated_at'
         )
         read_only_fields = ('id', 'slug', 'created_at', 'updated_at')
-    
-    def get_average_rating(self, obj):
-        avg_rating = obj.reviews.filter(is_approved=True).aggregate(
-            avg_rating=Avg('rating')
-        )['avg_rating']
-        return round(avg_rating, 1) if avg_rating else 0
-    
-    def get_review_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
 
 
 class ProductCreateUpdateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,61 @@
+from collections import defaultdict
+from django.core.cache import cache
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import CATEGORY_PRODUCT_COUNTS_CACHE_KEY, Category, Product, ProductReview
+
+
+def _apply_rating_states(removed, added):
+    """Répercute le passage d'un état d'avis à un autre sur les agrégats produit"""
+    deltas = defaultdict(lambda: defaultdict(int))
+    if removed:
+        product_id, rating = removed
+        deltas[product_id][rating] -= 1
+    if added:
+        product_id, rating = added
+        deltas[product_id][rating] += 1
+    for product_id, product_deltas in deltas.items():
+        Product.apply_rating_deltas(product_id, product_deltas)
+
+
+@receiver(pre_save, sender=ProductReview)
+def remember_review_rating_state(sender, instance, raw=False, **kwargs):
+    """Récupère l'état initial d'un avis qui n'a pas été chargé depuis la base"""
+    if raw or instance.pk is None or '_loaded_rating_state' in instance.__dict__:
+        return
+    previous = ProductReview.objects.filter(pk=instance.pk).values_list(
+        'product_id', 'rating', 'is_approved'
+    ).first()
+    if previous and previous[2]:
+        instance._loaded_rating_state = (previous[0], previous[1])
+    else:
+        instance._loaded_rating_state = None
+
+
+@receiver(post_save, sender=ProductReview)
+def update_product_rating_on_save(sender, instance, created, raw=False, **kwargs):
+    """Met à jour les agrégats de notes lors de la création ou modification d'un avis"""
+    if raw:
+        return
+    previous = None if created else instance.__dict__.get('_loaded_rating_state')
+    current = instance.rating_state
+    if previous != current:
+        _apply_rating_states(previous, current)
+    instance._loaded_rating_state = current
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_product_rating_on_delete(sender, instance, **kwargs):
+    """Retire un avis supprimé des agrégats de notes"""
+    previous = instance.__dict__.get('_loaded_rating_state', instance.rating_state)
+    _apply_rating_states(previous, None)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_product_counts(sender, raw=False, **kwargs):
+    """Invalide le cache des nombres de produits par catégorie"""
+    if not raw:
+        cache.delete(CATEGORY_PRODUCT_COUNTS_CACHE_KEY)
@@ -0,0 +1,240 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from .models import (
+    Brand, Category, CategoryClosure, Product, ProductAttribute, ProductAttributeValue, ProductImage, ProductReview
+)
+
+
+User = get_user_model()
+
+
+class ProductListingQueryTests(TestCase):
+    """Nombre de requêtes des listes de produits, indépendant du nombre de produits affichés"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Montres', slug='montres')
+        cls.brand = Brand.objects.create(name='Silence', slug='silence')
+        cls.add_products(range(4))
+
+    @classmethod
+    def add_products(cls, numbers):
+        for number in numbers:
+            product = Product.objects.create(
+                name=f'Montre {number}', slug=f'montre-{number}', description='-', sku=f'MONTRE-{number}',
+                category=cls.category, brand=cls.brand, price=100 + number, status='published'
+            )
+            ProductImage.objects.create(product=product, image=f'products/montre-{number}.jpg', is_primary=True)
+            ProductImage.objects.create(product=product, image=f'products/montre-{number}-dos.jpg', sort_order=1)
+
+    def test_for_listing_loads_relations_in_two_queries(self):
+        with self.assertNumQueries(2):
+            for product in Product.objects.published().for_listing():
+                product.category.name
+                product.brand.name
+                self.assertTrue(product.primary_image.is_primary)
+
+    def test_listing_view_query_count_does_not_grow_with_products(self):
+        url = reverse('products:product-list')
+        # Premier rendu : création de l'enregistrement unique des informations du site
+        self.client.get(url)
+        # Produits avec catégorie et marque, images, informations du site, catégories du menu
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['products']), 4)
+
+        self.add_products(range(4, 12))
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['products']), 12)
+        self.assertContains(response, 'products/montre-11.jpg')
+
+    def test_api_list_query_count_does_not_grow_with_products(self):
+        url = reverse('products:product-list-api')
+        # À froid : page de produits avec catégorie et marque, images, nombre total
+        cache.clear()
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()['results']), 4)
+
+        self.add_products(range(4, 12))
+        cache.clear()
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()['results']), 12)
+
+    def test_api_detail_query_count_does_not_grow_with_relations(self):
+        product = Product.objects.get(slug='montre-0')
+        url = reverse('products:product-detail-api', kwargs={'slug': product.slug})
+
+        def add_relations(numbers):
+            for number in numbers:
+                ProductImage.objects.create(product=product, image=f'products/vue-{number}.jpg', sort_order=2 + number)
+                attribute = ProductAttribute.objects.create(name=f'Attribut {number}', slug=f'attribut-{number}')
+                ProductAttributeValue.objects.create(attribute=attribute, product=product, value=str(number))
+                user = User.objects.create_user(
+                    email=f'avis{number}@example.com', username=f'avis{number}', password='secret'
+                )
+                ProductReview.objects.create(
+                    product=product, user=user, rating=5, title='-', comment='-', is_approved=True
+                )
+
+        # À froid : produit avec catégorie, marque et vendeur ; images ; valeurs d'attributs et attributs ;
+        # avis, auteurs et profils ; arbre et comptes des catégories ; compte de la marque
+        add_relations(range(1))
+        cache.clear()
+        with self.assertNumQueries(10):
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()['reviews']), 1)
+
+        add_relations(range(1, 5))
+        cache.clear()
+        with self.assertNumQueries(10):
+            response = self.client.get(url)
+        data = response.json()
+        self.assertEqual((len(data['images']), len(data['attribute_values']), len(data['reviews'])), (7, 5, 5))
+
+
+class ProductRatingAggregateTests(TestCase):
+    """Agrégats des avis approuvés tenus à jour par les signaux d'avis"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Montres', slug='montres')
+        cls.product, cls.other = (
+            Product.objects.create(
+                name=name, slug=name.lower(), description='-', sku=name, category=category, price=10,
+                status='published'
+            )
+            for name in ('Montre', 'Bague')
+        )
+        cls.users = [
+            User.objects.create_user(
+                email=f'client{number}@example.com', username=f'client{number}', password='secret',
+                first_name='Client', last_name=str(number)
+            )
+            for number in range(3)
+        ]
+
+    def review(self, user, rating, is_approved=True, product=None):
+        return ProductReview.objects.create(
+            product=product or self.product, user=user, rating=rating, title='Avis', comment='-',
+            is_approved=is_approved
+        )
+
+    def assertRatings(self, product, count, total, distribution):
+        product.refresh_from_db()
+        self.assertEqual((product.rating_count, product.rating_sum), (count, total))
+        self.assertEqual([getattr(product, f'rating_{rating}_count') for rating in range(1, 6)], distribution)
+
+    def test_approval_rating_change_and_deletion(self):
+        review = self.review(self.users[0], 4, is_approved=False)
+        self.review(self.users[1], 5)
+        self.assertRatings(self.product, 1, 5, [0, 0, 0, 0, 1])
+
+        review.is_approved = True
+        review.save()
+        self.assertRatings(self.product, 2, 9, [0, 0, 0, 1, 1])
+
+        review.rating = 2
+        review.save()
+        self.assertRatings(self.product, 2, 7, [0, 1, 0, 0, 1])
+
+        review.product = self.other
+        review.save()
+        self.assertRatings(self.product, 1, 5, [0, 0, 0, 0, 1])
+        self.assertRatings(self.other, 1, 2, [0, 1, 0, 0, 0])
+
+        review.delete()
+        self.assertRatings(self.other, 0, 0, [0, 0, 0, 0, 0])
+
+    def test_review_saved_without_loading_uses_stored_state(self):
+        review = self.review(self.users[0], 3)
+        ProductReview(
+            pk=review.pk, product=self.product, user=self.users[0], rating=3, title='Avis', comment='-',
+            is_approved=False, created_at=review.created_at
+        ).save()
+        self.assertRatings(self.product, 0, 0, [0, 0, 0, 0, 0])
+
+    def test_product_save_keeps_ratings_written_meanwhile(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        self.review(self.users[0], 5)
+        stale.name = 'Montre or'
+        stale.save()
+        self.assertRatings(self.product, 1, 5, [0, 0, 0, 0, 1])
+        self.assertEqual(self.product.name, 'Montre or')
+
+    def test_rebuild_command_repairs_queryset_updates(self):
+        review = self.review(self.users[0], 4, is_approved=False)
+        # Les mises à jour par queryset ne passent pas par les signaux
+        ProductReview.objects.filter(pk=review.pk).update(is_approved=True)
+        self.assertRatings(self.product, 0, 0, [0, 0, 0, 0, 0])
+        out = io.StringIO()
+        call_command('rebuild_product_ratings', stdout=out)
+        self.assertIn('1 produits corrigés', out.getvalue())
+        self.assertRatings(self.product, 1, 4, [0, 0, 0, 1, 0])
+
+
+class CategoryTreeTests(TestCase):
+    """Table de fermeture des catégories et filtre de l'API par catégorie"""
+
+    def setUp(self):
+        self.jewellery = Category.objects.create(name='Bijoux', slug='bijoux')
+        self.rings = Category.objects.create(name='Bagues', slug='bagues', parent=self.jewellery)
+        self.wedding = Category.objects.create(name='Alliances', slug='alliances', parent=self.rings)
+
+    def links(self):
+        return set(CategoryClosure.objects.values_list('ancestor__slug', 'descendant__slug', 'depth'))
+
+    def test_insert_adds_links_to_every_ancestor(self):
+        self.assertEqual(self.links(), {
+            ('bijoux', 'bijoux', 0), ('bagues', 'bagues', 0), ('alliances', 'alliances', 0),
+            ('bijoux', 'bagues', 1), ('bagues', 'alliances', 1), ('bijoux', 'alliances', 2),
+        })
+
+    def test_move_relinks_the_whole_subtree(self):
+        gifts = Category.objects.create(name='Cadeaux', slug='cadeaux')
+        rings = Category.objects.get(pk=self.rings.pk)
+        rings.parent = gifts
+        rings.save()
+        self.assertEqual(self.links(), {
+            ('bijoux', 'bijoux', 0), ('cadeaux', 'cadeaux', 0), ('bagues', 'bagues', 0), ('alliances', 'alliances', 0),
+            ('cadeaux', 'bagues', 1), ('bagues', 'alliances', 1), ('cadeaux', 'alliances', 2),
+        })
+
+    def test_cycles_are_rejected(self):
+        jewellery = Category.objects.get(pk=self.jewellery.pk)
+        jewellery.parent = self.wedding
+        with self.assertRaises(ValidationError):
+            jewellery.save()
+        jewellery.parent = jewellery
+        with self.assertRaises(ValidationError):
+            jewellery.full_clean()
+        self.assertIsNone(Category.objects.get(pk=self.jewellery.pk).parent_id)
+
+    def test_api_category_filter(self):
+        watches = Category.objects.create(name='Montres', slug='montres')
+        hidden = Category.objects.create(name='Archives', slug='archives', parent=self.jewellery, is_active=False)
+        for slug, category in [('solitaire', self.wedding), ('chevaliere', self.rings), ('broche', hidden),
+                               ('montre', watches)]:
+            Product.objects.create(
+                name=slug, slug=slug, description='-', sku=slug, category=category, price=10, status='published'
+            )
+
+        def slugs(category):
+            response = self.client.get(reverse('products:product-list-api'), {'category': category})
+            return {product['slug'] for product in response.json()['results']}
+
+        # Sous-catégories actives à toute profondeur
+        self.assertEqual(slugs('bijoux'), {'solitaire', 'chevaliere'})
+        self.assertEqual(slugs('alliances'), {'solitaire'})
+        self.assertEqual(slugs(str(self.rings.pk)), {'solitaire', 'chevaliere'})
+        # Catégorie inconnue : filtre ignoré
+        self.assertEqual(slugs('inconnue'), {'solitaire', 'chevaliere', 'broche', 'montre'})
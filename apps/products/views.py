@@ -3,12 +3,14 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Avg, Count
+from django.db.models import Q
+from django.http import Http404
 from django.utils.translation import gettext_lazy as _
 from django.shortcuts import render, get_object_or_404
 from django.views.generic import ListView, DetailView, TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
+from apps.recommendations.services import BehaviorTrackingService, FrequentlyBoughtTogetherService
 from .models import (
     Category, Brand, Product, ProductImage, 
     ProductAttribute, ProductAttributeValue, ProductReview
@@ -19,6 +21,9 @@ from .serializers import (
     ProductAttributeSerializer, ProductReviewSerializer
 )
 from .filters import ProductFilter
+from apps.core.pagination import (
+    InvalidCursor, KeysetPagination, cached_count, cursor_url, paginate_keyset
+)
 
 
 class CategoryListView(generics.ListAPIView):
@@ -55,14 +60,15 @@ class BrandDetailView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class ProductListView(generics.ListAPIView):
+class ProductListAPIView(generics.ListAPIView):
     """Vue pour lister les produits"""
     
-    queryset = Product.objects.filter(status='published').select_related('category', 'brand')
+    queryset = Product.objects.published().for_listing()
     serializer_class = ProductListSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = ProductFilter
+    pagination_class = KeysetPagination
     search_fields = ['name', 'description', 'short_description', 'sku']
     ordering_fields = ['price', 'created_at', 'name']
     ordering = ['-created_at']
@@ -70,17 +76,7 @@ class ProductListView(generics.ListAPIView):
     def get_queryset(self):
         queryset = super().get_queryset()
         
-        # Filtrer par catégorie (incluant les sous-catégories)
-        category_slug = self.request.query_params.get('category')
-        if category_slug:
-            try:
-                category = Category.objects.get(slug=category_slug, is_active=True)
-                # Inclure les produits de cette catégorie et de ses sous-catégories
-                category_ids = [category.id]
-                category_ids.extend(category.children.filter(is_active=True).values_list('id', flat=True))
-                queryset = queryset.filter(category_id__in=category_ids)
-            except Category.DoesNotExist:
-                pass
+        # Catégorie (sous-catégories comprises) : voir ProductFilter.filter_category
         
         # Filtrer par marque
         brand_slug = self.request.query_params.get('brand')
@@ -107,10 +103,10 @@ class ProductListView(generics.ListAPIView):
         if featured and featured.lower() == 'true':
             queryset = queryset.filter(is_featured=True)
         
-        return queryset.prefetch_related('images')
+        return queryset
 
 
-class ProductDetailView(generics.RetrieveAPIView):
+class ProductDetailAPIView(generics.RetrieveAPIView):
     """Vue pour les détails d'un produit"""
     
     queryset = Product.objects.filter(status='published')
@@ -189,6 +185,7 @@ class ProductReviewListView(generics.ListAPIView):
     
     serializer_class = ProductReviewSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         product_slug = self.kwargs.get('product_slug')
@@ -209,13 +206,12 @@ def product_search_view(request):
         return Response({'products': [], 'message': _('Veuillez fournir un terme de recherche.')})
     
     # Recherche dans le nom, description et SKU
-    products = Product.objects.filter(
+    products = Product.objects.published().filter(
         Q(name__icontains=query) |
         Q(description__icontains=query) |
         Q(short_description__icontains=query) |
-        Q(sku__icontains=query),
-        status='published'
-    ).select_related('category', 'brand').prefetch_related('images')
+        Q(sku__icontains=query)
+    ).for_listing()
     
     serializer = ProductListSerializer(products, many=True)
     
@@ -231,10 +227,7 @@ def product_search_view(request):
 def featured_products_view(request):
     """Vue pour les produits en vedette"""
     
-    products = Product.objects.filter(
-        status='published',
-        is_featured=True
-    ).select_related('category', 'brand').prefetch_related('images')
+    products = Product.objects.published().filter(is_featured=True).for_listing()
     
     serializer = ProductListSerializer(products, many=True)
     
@@ -255,10 +248,9 @@ def related_products_view(request, product_slug):
         return Response({'error': _('Produit non trouvé.')}, status=status.HTTP_404_NOT_FOUND)
     
     # Produits de la même catégorie, excluant le produit actuel
-    related_products = Product.objects.filter(
-        category=product.category,
-        status='published'
-    ).exclude(id=product.id).select_related('category', 'brand').prefetch_related('images')[:8]
+    related_products = Product.objects.published().filter(
+        category=product.category
+    ).exclude(id=product.id).for_listing()[:8]
     
     serializer = ProductListSerializer(related_products, many=True)
     
@@ -278,12 +270,10 @@ def product_stats_view(request, product_slug):
     except Product.DoesNotExist:
         return Response({'error': _('Produit non trouvé.')}, status=status.HTTP_404_NOT_FOUND)
     
-    reviews = product.reviews.filter(is_approved=True)
-    
     stats = {
-        'total_reviews': reviews.count(),
-        'average_rating': reviews.aggregate(avg_rating=Avg('rating'))['avg_rating'] or 0,
-        'rating_distribution': reviews.values('rating').annotate(count=Count('rating')).order_by('rating'),
+        'total_reviews': product.rating_count,
+        'average_rating': product.average_rating,
+        'rating_distribution': product.rating_distribution,
         'total_sold': 0,  # À implémenter avec le modèle Order
         'in_stock': product.is_in_stock,
         'low_stock': product.is_low_stock,
@@ -301,13 +291,13 @@ class ProductListView(ListView):
     paginate_by = 12
     
     def get_queryset(self):
-        queryset = Product.objects.filter(status='published').select_related('category', 'brand').prefetch_related('images')
+        queryset = Product.objects.published().for_listing()
         
         # Filtrage par catégorie
         category_slug = self.kwargs.get('category_slug')
         if category_slug:
             category = get_object_or_404(Category, slug=category_slug, is_active=True)
-            queryset = queryset.filter(category=category)
+            queryset = queryset.in_category(category)
         
         # Filtrage par marque
         brand_slug = self.kwargs.get('brand_slug')
@@ -339,12 +329,27 @@ class ProductListView(ListView):
         
         return queryset
     
+    def paginate_queryset(self, queryset, page_size):
+        """Pagination par curseur : pas d'OFFSET, total mis en cache"""
+        try:
+            page = paginate_keyset(queryset, self.request.GET.get('cursor'), page_size)
+        except InvalidCursor:
+            raise Http404(_('Curseur invalide.'))
+        self.total_count = cached_count(queryset)
+        return None, page, page.object_list, page.has_other_pages()
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categories'] = Category.objects.filter(is_active=True, parent__isnull=True)
         context['brands'] = Brand.objects.filter(is_active=True)
         context['search_query'] = self.request.GET.get('search', '')
         context['sort_by'] = self.request.GET.get('sort', '')
+        
+        page = context['page_obj']
+        context['total_count'] = self.total_count
+        context['first_page_url'] = cursor_url(self.request, None)
+        context['next_page_url'] = cursor_url(self.request, page.next_cursor) if page.has_next() else None
+        context['previous_page_url'] = cursor_url(self.request, page.previous_cursor) if page.has_previous() else None
         return context
 
 
@@ -361,25 +366,25 @@ class ProductDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        product = self.get_object()
+        product = self.object
         
         # Produits similaires
-        context['related_products'] = Product.objects.filter(
-            category=product.category,
-            status='published'
-        ).exclude(id=product.id)[:4]
+        context['related_products'] = Product.objects.published().filter(
+            category=product.category
+        ).exclude(id=product.id).for_listing()[:4]
+        
+        # Vue enregistrée en différé, sans requête
+        BehaviorTrackingService.track_product_view(self.request.user, self.request.session.session_key, product)
+        
+        # Achetés ensemble : compagnons précalculés
+        context['bought_together'] = FrequentlyBoughtTogetherService.get_products([product.id], limit=4)
         
         # Avis du produit
         context['reviews'] = product.reviews.filter(is_approved=True).order_by('-created_at')[:10]
         
         # Statistiques des avis
-        reviews = product.reviews.filter(is_approved=True)
-        if reviews.exists():
-            context['avg_rating'] = reviews.aggregate(avg=Avg('rating'))['avg']
-            context['total_reviews'] = reviews.count()
-        else:
-            context['avg_rating'] = 0
-            context['total_reviews'] = 0
+        context['avg_rating'] = product.average_rating
+        context['total_reviews'] = product.rating_count
         
         return context
 
@@ -434,12 +439,11 @@ def product_search_view(request):
     products = []
     
     if query:
-        products = Product.objects.filter(
+        products = Product.objects.published().filter(
             Q(name__icontains=query) |
             Q(description__icontains=query) |
-            Q(sku__icontains=query),
-            status='published'
-        ).select_related('category', 'brand').prefetch_related('images')[:20]
+            Q(sku__icontains=query)
+        ).for_listing()[:20]
     
     context = {
         'query': query,
@@ -0,0 +1,149 @@
+import os
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+
+from apps.orders.models import Order, OrderItem
+
+
+# Paniers comptés : commandes expédiées ou livrées
+BASKET_STATUSES = ['shipped', 'delivered']
+# Relecture des commandes modifiées peu avant la dernière synchronisation (transactions encore ouvertes)
+SYNC_MARGIN = timedelta(minutes=5)
+
+
+class BasketCounts:
+    """Comptages des paniers : produits et paires non ordonnées (clé bas << 32 | haut), en tableaux triés"""
+
+    def __init__(self, order_ids=None, item_ids=None, item_counts=None, pair_keys=None, pair_counts=None,
+                 synced_at=None):
+        self.order_ids = _array(order_ids, np.int64)
+        self.item_ids = _array(item_ids, np.int64)
+        self.item_counts = _array(item_counts, np.int64)
+        self.pair_keys = _array(pair_keys, np.int64)
+        self.pair_counts = _array(pair_counts, np.int64)
+        # Horodatage (secondes) de la dernière lecture des commandes, None avant la première
+        self.synced_at = float(np.ravel(synced_at)[0]) if synced_at is not None else None
+        if not self.synced_at:
+            self.synced_at = None
+
+    @property
+    def baskets(self):
+        return len(self.order_ids)
+
+    def add_orders(self, order_ids, chunk_size=1000, max_basket_size=None):
+        """Compte les paniers de commandes non encore vues, lus par lots d'identifiants ; retourne les produits touchés"""
+        max_basket_size = max_basket_size or getattr(settings, 'RECOMMENDATION_FBT_MAX_BASKET_SIZE', 50)
+        order_ids = np.unique(np.asarray(order_ids, dtype=np.int64))
+        order_ids = order_ids[~np.isin(order_ids, self.order_ids)]
+        touched, pending_items, pending_pairs = [], [], []
+        pending = 0
+        for start in range(0, len(order_ids), chunk_size):
+            chunk = order_ids[start:start + chunk_size]
+            # Lignes des seules commandes du lot : mémoire bornée même si les identifiants sont dispersés
+            rows = np.array(OrderItem.objects.filter(
+                order_id__in=chunk.tolist()
+            ).order_by('order_id').values_list('order_id', 'product_id'), dtype=np.int64).reshape(-1, 2)
+            orders, products = rows[:, 0], rows[:, 1]
+            _baskets, starts, sizes = np.unique(orders, return_index=True, return_counts=True)
+
+            # Très gros paniers (commandes professionnelles) : coût quadratique, peu de signal
+            kept = sizes <= max_basket_size
+            items = products[np.repeat(kept, sizes)]
+            pending_items.append(items)
+            touched.append(items)
+            for size in np.unique(sizes[kept & (sizes > 1)]):
+                basket_items = products[starts[kept & (sizes == size)][:, None] + np.arange(size)]
+                left, right = np.triu_indices(size, 1)
+                low = np.minimum(basket_items[:, left], basket_items[:, right]).ravel()
+                high = np.maximum(basket_items[:, left], basket_items[:, right]).ravel()
+                pending_pairs.append((low << 32) | high)
+                pending += len(low)
+
+            # Fusion périodique : la mémoire reste proportionnelle au nombre de paires distinctes
+            if pending > 5000000:
+                self._merge(pending_items, pending_pairs)
+                pending_items, pending_pairs, pending = [], [], 0
+        self._merge(pending_items, pending_pairs)
+        self.order_ids = np.union1d(self.order_ids, order_ids)
+        return np.unique(np.concatenate(touched)) if touched else np.zeros(0, dtype=np.int64)
+
+    def _merge(self, items, pairs):
+        """Ajoute des occurrences en attente aux comptages triés"""
+        if items:
+            self.item_ids, self.item_counts = _add_counts(self.item_ids, self.item_counts, np.concatenate(items))
+        if pairs:
+            self.pair_keys, self.pair_counts = _add_counts(self.pair_keys, self.pair_counts, np.concatenate(pairs))
+
+    def companions(self, product_ids=None, top_n=None, min_baskets=None):
+        """Meilleurs compagnons par produit : (produit, compagnon, rang, paniers, confiance, lift)
+
+        Confiance = paniers communs / paniers du produit ; seules les paires de lift > 1 sont gardées.
+        """
+        top_n = top_n or getattr(settings, 'RECOMMENDATION_FBT_TOP_N', 10)
+        min_baskets = min_baskets or getattr(settings, 'RECOMMENDATION_FBT_MIN_BASKETS', 2)
+        keep = self.pair_counts >= min_baskets
+        low, high, counts = self.pair_keys[keep] >> 32, self.pair_keys[keep] & 0xFFFFFFFF, self.pair_counts[keep]
+        sources, targets, counts = np.concatenate([low, high]), np.concatenate([high, low]), np.concatenate([counts, counts])
+        if product_ids is not None:
+            keep = np.isin(sources, product_ids)
+            sources, targets, counts = sources[keep], targets[keep], counts[keep]
+
+        source_counts = self.item_counts[np.searchsorted(self.item_ids, sources)]
+        target_counts = self.item_counts[np.searchsorted(self.item_ids, targets)]
+        confidence = counts / source_counts
+        lift = counts * self.baskets / (source_counts * target_counts)
+        keep = lift > 1
+        sources, targets, counts, confidence, lift = (
+            array[keep] for array in (sources, targets, counts, confidence, lift)
+        )
+
+        order = np.lexsort((-lift, -confidence, sources))
+        sources, targets, counts, confidence, lift = (
+            array[order] for array in (sources, targets, counts, confidence, lift)
+        )
+        # Rang dans le groupe du produit source
+        group_starts = np.flatnonzero(np.r_[True, sources[1:] != sources[:-1]])
+        ranks = np.arange(len(sources)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(sources)]))
+        keep = ranks < top_n
+        return sources[keep], targets[keep], ranks[keep], counts[keep], confidence[keep], lift[keep]
+
+    def save(self, path):
+        """Écrit les comptages, remplacement atomique du fichier"""
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as state_file:
+            np.savez(
+                state_file, order_ids=self.order_ids, item_ids=self.item_ids, item_counts=self.item_counts,
+                pair_keys=self.pair_keys, pair_counts=self.pair_counts, synced_at=np.array([self.synced_at or 0.0])
+            )
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Relit les comptages ; fichier absent : comptages vides"""
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as state:
+            return cls(**{name: state[name] for name in state.files})
+
+
+def basket_order_ids(since=None):
+    """Identifiants des commandes dont le panier est compté, modifiées depuis since si donné"""
+    orders = Order.objects.filter(status__in=BASKET_STATUSES)
+    if since is not None:
+        orders = orders.filter(updated_at__gte=since - SYNC_MARGIN)
+    return np.fromiter(orders.values_list('id', flat=True).order_by().iterator(), dtype=np.int64)
+
+
+def _array(values, dtype):
+    return np.zeros(0, dtype=dtype) if values is None else np.asarray(values, dtype=dtype)
+
+
+def _add_counts(keys, counts, occurrences):
+    """Fusionne des occurrences brutes dans des comptages (clés triées, comptes)"""
+    new_keys, new_counts = np.unique(occurrences, return_counts=True)
+    merged_keys = np.concatenate([keys, new_keys])
+    merged_keys, inverse = np.unique(merged_keys, return_inverse=True)
+    merged_counts = np.bincount(inverse, weights=np.concatenate([counts, new_counts]), minlength=len(merged_keys))
+    return merged_keys, merged_counts.astype(np.int64)
@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Sum
+
+from apps.orders.models import OrderItem
+from apps.products.models import Product
+from .models import UserBehavior
+
+
+# Comportements retenus ; leur poids est celui enregistré par BehaviorTrackingService (vue 1, panier 2, achat 5)
+POSITIVE_BEHAVIORS = ['view', 'add_to_cart', 'add_to_wishlist', 'purchase']
+PURCHASE_WEIGHT = 5.0
+
+MODEL_MAGIC = b'SDITEM01'
+HEADER_SIZE = 32
+
+
+class ItemSimilarityModel:
+    """Voisins item-item en tableaux CSR, lus depuis un fichier projeté en mémoire partagé entre workers"""
+
+    def __init__(self, item_ids, indptr, neighbours, scores):
+        self.item_ids = item_ids
+        self.indptr = indptr
+        self.neighbours = neighbours
+        self.scores = scores
+        self.loaded_at = time.time()
+        self.checked_at = 0
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    @classmethod
+    def train(cls, top_k=None, shrink=None, block_size=2048):
+        """Entraîne le modèle : matrice utilisateurs x produits pondérée, cosinus item-item, top-k par produit"""
+        top_k = top_k or getattr(settings, 'RECOMMENDATION_ITEM_NEIGHBOURS', 50)
+        shrink = shrink if shrink is not None else getattr(settings, 'RECOMMENDATION_ITEM_SHRINK', 1.0)
+
+        users, items, weights = _interactions()
+        if not len(items):
+            return cls(*(np.zeros(size, dtype=dtype) for size, dtype in (
+                (0, np.int64), (1, np.int64), (0, np.int32), (0, np.float32)
+            )))
+        item_ids, item_index = np.unique(items, return_inverse=True)
+        user_ids, user_index = np.unique(users, return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (weights, (user_index, item_index)), shape=(len(user_ids), len(item_ids)), dtype=np.float32
+        )
+        # Interactions répétées amorties : dix vues ne valent pas dix fois une
+        matrix.data = np.log1p(matrix.data)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+        transposed = matrix.T.tocsr()
+
+        indptr = np.zeros(len(item_ids) + 1, dtype=np.int64)
+        neighbours, scores = [], []
+        for start in range(0, len(item_ids), block_size):
+            stop = min(start + block_size, len(item_ids))
+            block = (transposed[start:stop] @ matrix).tocsr()
+            # Diagonale du bloc : la colonne du produit est décalée du début du bloc
+            block.setdiag(0, k=start)
+            block.eliminate_zeros()
+            # Cosinus atténué : les paires vues par peu d'utilisateurs pèsent moins
+            rows = np.repeat(np.arange(start, stop), np.diff(block.indptr))
+            block.data /= norms[rows] * norms[block.indices] + shrink
+            for row in range(stop - start):
+                begin, end = block.indptr[row], block.indptr[row + 1]
+                row_scores, row_items = block.data[begin:end], block.indices[begin:end]
+                if end - begin > top_k:
+                    best = np.argpartition(row_scores, -top_k)[-top_k:]
+                    row_scores, row_items = row_scores[best], row_items[best]
+                order = np.argsort(-row_scores, kind='stable')
+                neighbours.append(row_items[order].astype(np.int32))
+                scores.append(row_scores[order].astype(np.float32))
+                indptr[start + row + 1] = indptr[start + row] + len(order)
+
+        return cls(
+            item_ids.astype(np.int64),
+            indptr,
+            np.concatenate(neighbours) if neighbours else np.zeros(0, dtype=np.int32),
+            np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+        )
+
+    def save(self, path):
+        """Écrit le modèle : en-tête puis tableaux bruts alignés, remplacement atomique du fichier"""
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as model_file:
+            model_file.write(MODEL_MAGIC)
+            model_file.write(np.array([len(self.item_ids), len(self.neighbours), 0], dtype=np.int64).tobytes())
+            for array, dtype in (
+                (self.item_ids, np.int64), (self.indptr, np.int64), (self.neighbours, np.int32), (self.scores, np.float32)
+            ):
+                model_file.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+                # Alignement sur 8 octets pour le tableau suivant
+                model_file.write(b'\0' * (-model_file.tell() % 8))
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Projette le fichier en mémoire sans copie : les pages sont partagées par les processus"""
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(buffer[:len(MODEL_MAGIC)]) != MODEL_MAGIC:
+            raise ValueError(f'Modèle de recommandation invalide : {path}')
+        item_count, neighbour_count, _reserved = np.frombuffer(buffer, dtype=np.int64, count=3, offset=len(MODEL_MAGIC))
+
+        arrays, offset = [], HEADER_SIZE
+        for dtype, count in ((np.int64, item_count), (np.int64, item_count + 1), (np.int32, neighbour_count), (np.float32, neighbour_count)):
+            arrays.append(np.frombuffer(buffer, dtype=dtype, count=int(count), offset=offset))
+            offset += int(count) * np.dtype(dtype).itemsize
+            offset += -offset % 8
+        model = cls(*arrays)
+        model.loaded_at = os.path.getmtime(path)
+        return model
+
+    def similar_items(self, product_id, limit=10):
+        """Voisins d'un produit : [(produit, score)]"""
+        position = np.searchsorted(self.item_ids, product_id)
+        if position >= len(self.item_ids) or self.item_ids[position] != product_id:
+            return []
+        begin, end = self.indptr[position], min(self.indptr[position + 1], self.indptr[position] + limit)
+        return list(zip(self.item_ids[self.neighbours[begin:end]].tolist(), self.scores[begin:end].tolist()))
+
+    def recommend(self, product_ids, weights, exclude=(), limit=10):
+        """Score des voisins des produits récents de l'utilisateur : somme des similarités pondérées"""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float32)
+        positions = np.searchsorted(self.item_ids, product_ids)
+        known = positions < len(self.item_ids)
+        known[known] = self.item_ids[positions[known]] == product_ids[known]
+        if not known.any():
+            return []
+
+        candidates, contributions = [], []
+        for position, weight in zip(positions[known], weights[known]):
+            begin, end = self.indptr[position], self.indptr[position + 1]
+            candidates.append(self.neighbours[begin:end])
+            contributions.append(self.scores[begin:end] * weight)
+        candidates, inverse = np.unique(np.concatenate(candidates), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(contributions)) / weights[known].sum()
+
+        candidate_ids = self.item_ids[candidates]
+        keep = ~np.isin(candidate_ids, np.concatenate([product_ids, np.asarray(list(exclude), dtype=np.int64)]))
+        candidate_ids, totals = candidate_ids[keep], totals[keep]
+        if len(totals) > limit:
+            best = np.argpartition(totals, -limit)[-limit:]
+            candidate_ids, totals = candidate_ids[best], totals[best]
+        order = np.argsort(-totals, kind='stable')
+        return list(zip(candidate_ids[order].tolist(), totals[order].tolist()))
+
+
+def _interactions():
+    """Triplets (utilisateur, produit, poids) : comportements additionnés, achats des commandes au poids d'un achat"""
+    product_type = ContentType.objects.get_for_model(Product)
+    behaviors = UserBehavior.objects.filter(
+        user__isnull=False, content_type=product_type, behavior_type__in=POSITIVE_BEHAVIORS
+    ).values_list('user_id', 'object_id').annotate(weight=Sum('weight')).order_by()
+    users, items, weights = [], [], []
+    for user_id, product_id, weight in behaviors.iterator(chunk_size=10000):
+        users.append(user_id)
+        items.append(product_id)
+        weights.append(weight)
+
+    # Achats passés sans comportement enregistré : la plus forte des deux valeurs est gardée
+    purchases = OrderItem.objects.filter(order__user__isnull=False).exclude(
+        order__status__in=['cancelled', 'refunded']
+    ).values_list('order__user_id', 'product_id').distinct().order_by()
+    tracked = dict(zip(zip(users, items), range(len(users))))
+    for user_id, product_id in purchases.iterator(chunk_size=10000):
+        position = tracked.get((user_id, product_id))
+        if position is None:
+            users.append(user_id)
+            items.append(product_id)
+            weights.append(PURCHASE_WEIGHT)
+        elif weights[position] < PURCHASE_WEIGHT:
+            weights[position] = PURCHASE_WEIGHT
+    return np.array(users, dtype=np.int64), np.array(items, dtype=np.int64), np.array(weights, dtype=np.float32)
+
+
+def user_history(user, limit=None):
+    """Produits récents de l'utilisateur et leur poids, en une requête sur l'index (user, behavior_type)"""
+    limit = limit or getattr(settings, 'RECOMMENDATION_RECENT_ITEMS', 50)
+    weights = {}
+    for product_id, weight in UserBehavior.objects.filter(
+        user=user, content_type=ContentType.objects.get_for_model(Product), behavior_type__in=POSITIVE_BEHAVIORS
+    ).order_by('-timestamp').values_list('object_id', 'weight')[:limit]:
+        weights[product_id] = weights.get(product_id, 0) + weight
+    return weights
+
+
+_model = None
+_lock = threading.Lock()
+
+
+def get_item_model():
+    """Modèle du processus, rechargé quand le fichier est remplacé (vérifié au plus toutes les minutes)"""
+    global _model
+    path = getattr(settings, 'RECOMMENDATION_ITEM_MODEL', '')
+    if not path:
+        return None
+    model = _model
+    if model is not None and time.time() - model.checked_at < getattr(
+        settings, 'RECOMMENDATION_MODEL_CHECK_SECONDS', 60
+    ):
+        return model
+    with _lock:
+        try:
+            modified_at = os.path.getmtime(path)
+        except OSError:
+            return _model
+        if _model is None or _model.loaded_at != modified_at:
+            _model = ItemSimilarityModel.load(path)
+        _model.checked_at = time.time()
+        return _model
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.recommendations.services import SimilarityService
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les produits similaires (plus proches voisins de chaque produit publié)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        written = SimilarityService.rebuild_similarities(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{written} similarités enregistrées'))
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.recommendations.collaborative import ItemSimilarityModel
+
+
+class Command(BaseCommand):
+    help = 'Entraîne le modèle item-item de filtrage collaboratif et écrit le fichier projeté en mémoire'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help='Fichier du modèle (RECOMMENDATION_ITEM_MODEL par défaut)')
+        parser.add_argument('--neighbours', type=int, default=None)
+        parser.add_argument('--shrink', type=float, default=None)
+
+    def handle(self, *args, **options):
+        path = options['output'] or getattr(settings, 'RECOMMENDATION_ITEM_MODEL', 'item_similarity.bin')
+        model = ItemSimilarityModel.train(top_k=options['neighbours'], shrink=options['shrink'])
+        model.save(path)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(model)} produits, {len(model.neighbours)} voisins enregistrés dans {path}'
+        ))
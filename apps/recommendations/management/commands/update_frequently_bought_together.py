@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from apps.recommendations.services import FrequentlyBoughtTogetherService
+
+
+class Command(BaseCommand):
+    help = 'Compte les paniers des nouvelles commandes et met à jour les produits achetés ensemble'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompte tous les paniers')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        written = FrequentlyBoughtTogetherService.rebuild(full=options['full'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{written} compagnons enregistrés'))
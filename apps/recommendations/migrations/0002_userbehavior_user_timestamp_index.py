@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userbehavior',
+            index=models.Index(fields=['user', '-timestamp'], name='recommendat_user_id_bc3703_idx'),
+        ),
+    ]
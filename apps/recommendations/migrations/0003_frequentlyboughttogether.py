@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_category_closure'),
+        ('recommendations', '0002_userbehavior_user_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FrequentlyBoughtTogether',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='rang')),
+                ('baskets', models.PositiveIntegerField(default=0, verbose_name='paniers communs')),
+                ('confidence', models.FloatField(default=0.0, verbose_name='confiance')),
+                ('lift', models.FloatField(default=0.0, verbose_name='lift')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='modifié le')),
+                ('companion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bought_together', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Produit acheté ensemble',
+                'verbose_name_plural': 'Produits achetés ensemble',
+                'ordering': ['product_id', 'rank'],
+                'unique_together': {('product', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:16
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0003_frequentlyboughttogether'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userbehavior',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='horodatage'),
+        ),
+    ]
@@ -1,11 +1,16 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
 User = get_user_model()
 
+RECOMMENDATIONS_CACHE_KEY = 'recommendations:user:{}:{}:{}'
+SIMILAR_PRODUCTS_CACHE_KEY = 'recommendations:similar:{}:{}'
+POPULAR_PRODUCTS_CACHE_KEY = 'recommendations:popular'
+
 
 class UserBehavior(models.Model):
     """Comportement utilisateur pour les recommandations"""
@@ -32,7 +37,8 @@ class UserBehavior(models.Model):
     behavior_type = models.CharField(_('type de comportement'), max_length=20, choices=BEHAVIOR_TYPES)
     weight = models.FloatField(_('poids'), default=1.0)  # Poids de l'action
     metadata = models.JSONField(_('métadonnées'), default=dict, blank=True)
-    timestamp = models.DateTimeField(_('horodatage'), auto_now_add=True)
+    # Heure de l'événement, fixée à la capture : l'écriture est différée
+    timestamp = models.DateTimeField(_('horodatage'), default=timezone.now)
     
     class Meta:
         verbose_name = _('Comportement utilisateur')
@@ -40,6 +46,7 @@ class UserBehavior(models.Model):
         ordering = ['-timestamp']
         indexes = [
             models.Index(fields=['user', 'behavior_type']),
+            models.Index(fields=['user', '-timestamp']),
             models.Index(fields=['session_key', 'behavior_type']),
             models.Index(fields=['content_type', 'object_id']),
             models.Index(fields=['timestamp']),
@@ -69,6 +76,28 @@ class ProductSimilarity(models.Model):
         return f"{self.product1.name} ~ {self.product2.name} ({self.similarity_score:.2f})"
 
 
+class FrequentlyBoughtTogether(models.Model):
+    """Meilleurs compagnons d'achat d'un produit, précalculés depuis les paniers"""
+    
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='bought_together')
+    companion = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField(_('rang'))
+    baskets = models.PositiveIntegerField(_('paniers communs'), default=0)
+    confidence = models.FloatField(_('confiance'), default=0.0)
+    lift = models.FloatField(_('lift'), default=0.0)
+    updated_at = models.DateTimeField(_('modifié le'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Produit acheté ensemble')
+        verbose_name_plural = _('Produits achetés ensemble')
+        # Index de lecture : les compagnons d'un produit dans l'ordre
+        unique_together = ['product', 'rank']
+        ordering = ['product_id', 'rank']
+    
+    def __str__(self):
+        return f"{self.product.name} + {self.companion.name} ({self.confidence:.2f})"
+
+
 class UserProfile(models.Model):
     """Profil utilisateur pour les recommandations"""
     
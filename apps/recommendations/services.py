@@ -1,14 +1,44 @@
 import math
 from collections import defaultdict
-from django.db.models import Q, Count, Avg, Sum
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.core.cache import cache
+from django.db.models import Q, Count, Avg, Sum, DecimalField, ExpressionWrapper, F
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
 from datetime import datetime, timedelta
+from decimal import Decimal
 from apps.products.models import Product, Category, Brand
-from apps.orders.models import Order, OrderItem
+from apps.orders.models import OrderItem
 from apps.cart.models import Cart, CartItem
 from apps.accounts.models import User
-from .models import UserBehavior, ProductSimilarity, UserProfile, Recommendation, RecommendationRule, RecommendationFeedback
+from apps.core.buffers import WriteBehindBuffer
+from .models import (
+    POPULAR_PRODUCTS_CACHE_KEY, RECOMMENDATIONS_CACHE_KEY, SIMILAR_PRODUCTS_CACHE_KEY, UserBehavior, ProductSimilarity,
+    FrequentlyBoughtTogether, UserProfile, Recommendation, RecommendationRule, RecommendationFeedback
+)
+from .baskets import BasketCounts, basket_order_ids
+from .collaborative import POSITIVE_BEHAVIORS, get_item_model, user_history
+from .similarity import load_product_features, top_neighbours
+
+
+# Poids des sources dans le mélange ; chaque source est d'abord ramenée à un score maximum de 1
+SOURCE_WEIGHTS = {
+    'collaborative': 1.0,
+    'frequently_bought_together': 0.9,
+    'content_based': 0.7,
+    'popularity': 0.3,
+}
+
+SOURCE_REASONS = {
+    'collaborative': "Recommandé par des utilisateurs similaires",
+    'frequently_bought_together': "Fréquemment acheté ensemble",
+    'content_based': "Produit similaire à vos consultations",
+    'popularity': "Produit populaire",
+}
 
 
 class RecommendationService:
@@ -16,256 +46,188 @@ class RecommendationService:
     
     @staticmethod
     def get_recommendations(user, limit=10, recommendation_types=None):
-        """Retourne les recommandations pour un utilisateur"""
-        if not user or not user.is_authenticated:
-            return RecommendationService._get_popular_products(limit)
-        
-        # Récupérer les recommandations existantes
-        recommendations = Recommendation.objects.filter(
-            user=user,
-            is_shown=False,
-            expires_at__isnull=True
-        ).select_related('product')
-        
-        if recommendation_types:
-            recommendations = recommendations.filter(recommendation_type__in=recommendation_types)
-        
-        recommendations = recommendations.order_by('-score')[:limit]
-        
-        # Si pas assez de recommandations, en générer de nouvelles
-        if len(recommendations) < limit:
-            new_recommendations = RecommendationService._generate_recommendations(user, limit - len(recommendations))
-            recommendations = list(recommendations) + new_recommendations
-        
-        return recommendations[:limit]
+        """Produits recommandés, en lecture seule : sources précalculées mélangées, liste mise en cache par utilisateur
+        
+        Chaque produit porte recommendation_type et recommendation_score ; les impressions sont écrites en différé.
+        """
+        authenticated = bool(user and user.is_authenticated)
+        types = [
+            source for source in SOURCE_WEIGHTS
+            if (not recommendation_types or source in recommendation_types) and (authenticated or source == 'popularity')
+        ]
+        cache_key = RECOMMENDATIONS_CACHE_KEY.format(user.pk if authenticated else 'anonymous', limit, ','.join(types))
+        products = cache.get(cache_key)
+        if products is None:
+            products = RecommendationService._recommend(user if authenticated else None, limit, types)
+            cache.set(cache_key, products, getattr(settings, 'RECOMMENDATION_CACHE_SECONDS', 300))
+        
+        if authenticated:
+            for product in products:
+                recommendation_impressions.add(
+                    (user.pk, product.id, product.recommendation_type, product.recommendation_score)
+                )
+        return products
     
     @staticmethod
-    def _get_popular_products(limit=10):
-        """Retourne les produits populaires"""
-        return Product.objects.filter(
-            status='published',
-            is_featured=True
-        ).order_by('-created_at')[:limit]
+    def get_similar_products(product_id, limit=10):
+        """Produits similaires à un produit : voisins de contenu et voisins collaboratifs mélangés, mis en cache"""
+        cache_key = SIMILAR_PRODUCTS_CACHE_KEY.format(product_id, limit)
+        products = cache.get(cache_key)
+        if products is None:
+            model = get_item_model()
+            products = RecommendationService._blend([
+                ('content_based', list(ProductSimilarity.objects.filter(
+                    product1_id=product_id
+                ).order_by('-similarity_score').values_list('product2_id', 'similarity_score')[:limit * 2])),
+                ('collaborative', model.similar_items(product_id, limit * 2) if model is not None else []),
+            ], limit, excluded={product_id})
+            cache.set(cache_key, products, getattr(settings, 'RECOMMENDATION_CACHE_SECONDS', 300))
+        return products
     
     @staticmethod
-    def _generate_recommendations(user, limit=10):
-        """Génère de nouvelles recommandations pour un utilisateur"""
-        recommendations = []
-        
-        # 1. Recommandations basées sur le contenu (produits similaires)
-        content_based = RecommendationService._get_content_based_recommendations(user, limit//3)
-        recommendations.extend(content_based)
-        
-        # 2. Recommandations collaboratives
-        collaborative = RecommendationService._get_collaborative_recommendations(user, limit//3)
-        recommendations.extend(collaborative)
-        
-        # 3. Recommandations basées sur la popularité
-        popularity = RecommendationService._get_popularity_recommendations(user, limit//3)
-        recommendations.extend(popularity)
-        
-        # 4. Recommandations "frequently bought together"
-        fbt = RecommendationService._get_frequently_bought_together(user, limit//3)
-        recommendations.extend(fbt)
-        
-        return recommendations[:limit]
+    def _recommend(user, limit, types):
+        """Candidats de chaque source demandée (trois fois la limite), mélangés ; produits déjà achetés exclus"""
+        wanted = limit * 3
+        history, purchased = {}, set()
+        if user is not None:
+            history = user_history(user)
+            purchased = set(OrderItem.objects.filter(order__user=user).exclude(
+                order__status__in=['cancelled', 'refunded']
+            ).values_list('product_id', flat=True))
+        
+        sources = {
+            'collaborative': lambda: RecommendationService._collaborative_candidates(history, wanted),
+            'frequently_bought_together': lambda: FrequentlyBoughtTogetherService.get_companions(purchased, wanted),
+            'content_based': lambda: RecommendationService._content_based_candidates(history, wanted),
+            'popularity': lambda: RecommendationService._popular_candidates()[:wanted],
+        }
+        return RecommendationService._blend([(source, sources[source]()) for source in types], limit, purchased)
     
     @staticmethod
-    def _get_content_based_recommendations(user, limit=5):
-        """Recommandations basées sur le contenu"""
-        # Récupérer les produits que l'utilisateur a vus/achetés
-        user_products = UserBehavior.objects.filter(
-            user=user,
-            behavior_type__in=['view', 'purchase', 'add_to_cart']
-        ).values_list('object_id', flat=True)
-        
-        if not user_products:
-            return []
-        
-        # Trouver des produits similaires
-        similar_products = ProductSimilarity.objects.filter(
-            product1_id__in=user_products,
-            similarity_score__gte=0.3
-        ).exclude(
-            product2_id__in=user_products
-        ).order_by('-similarity_score')[:limit]
-        
-        recommendations = []
-        for similarity in similar_products:
-            recommendation = Recommendation.objects.create(
-                user=user,
-                product=similarity.product2,
-                recommendation_type='content_based',
-                score=similarity.similarity_score,
-                reason=f"Produit similaire à {similarity.product1.name}"
-            )
-            recommendations.append(recommendation)
-        
-        return recommendations
+    def _blend(candidates, limit, excluded=()):
+        """Mélange pondéré de listes [(produit, score)], dédoublonnées ; produits lus en une requête
+        
+        Le type retenu pour un produit est celui de la source qui lui apporte le plus.
+        """
+        scores, origins = defaultdict(float), {}
+        for source, source_candidates in candidates:
+            best = max((score for _product_id, score in source_candidates), default=0) or 1
+            for product_id, score in source_candidates:
+                if product_id in excluded:
+                    continue
+                contribution = SOURCE_WEIGHTS[source] * score / best
+                scores[product_id] += contribution
+                if contribution > origins.get(product_id, (None, 0))[1]:
+                    origins[product_id] = (source, contribution)
+        
+        ranked = sorted(scores.items(), key=lambda candidate: -candidate[1])[:limit * 3]
+        # Lecture par clé primaire, disponibilité vérifiée en mémoire
+        products = Product.objects.order_by().in_bulk([product_id for product_id, _score in ranked])
+        recommended = []
+        for product_id, score in ranked:
+            product = products.get(product_id)
+            if product is None or product.status != 'published' or not product.is_in_stock:
+                continue
+            product.recommendation_type = origins[product_id][0]
+            product.recommendation_score = round(score, 4)
+            recommended.append(product)
+            if len(recommended) == limit:
+                break
+        return recommended
     
     @staticmethod
-    def _get_collaborative_recommendations(user, limit=5):
-        """Recommandations collaboratives"""
-        # Trouver des utilisateurs similaires
-        similar_users = RecommendationService._find_similar_users(user, limit=10)
-        
-        if not similar_users:
+    def _collaborative_candidates(history, limit):
+        """Voisins item-item des produits récents de l'utilisateur"""
+        model = get_item_model()
+        if model is None or not history:
             return []
-        
-        # Récupérer les produits que ces utilisateurs ont achetés
-        similar_user_ids = [u['user_id'] for u in similar_users]
-        
-        # Produits achetés par les utilisateurs similaires
-        purchased_products = UserBehavior.objects.filter(
-            user_id__in=similar_user_ids,
-            behavior_type='purchase'
-        ).values_list('object_id', flat=True)
-        
-        # Produits que l'utilisateur actuel n'a pas encore achetés
-        user_purchased = UserBehavior.objects.filter(
-            user=user,
-            behavior_type='purchase'
-        ).values_list('object_id', flat=True)
-        
-        recommended_product_ids = set(purchased_products) - set(user_purchased)
-        
-        recommendations = []
-        for product_id in list(recommended_product_ids)[:limit]:
-            try:
-                product = Product.objects.get(id=product_id, status='published')
-                recommendation = Recommendation.objects.create(
-                    user=user,
-                    product=product,
-                    recommendation_type='collaborative',
-                    score=0.7,  # Score par défaut
-                    reason="Recommandé par des utilisateurs similaires"
-                )
-                recommendations.append(recommendation)
-            except Product.DoesNotExist:
-                continue
-        
-        return recommendations
+        return model.recommend(list(history), list(history.values()), limit=limit)
     
     @staticmethod
-    def _get_popularity_recommendations(user, limit=5):
-        """Recommandations basées sur la popularité"""
-        # Produits populaires que l'utilisateur n'a pas encore vus
-        user_viewed = UserBehavior.objects.filter(
-            user=user,
-            behavior_type='view'
-        ).values_list('object_id', flat=True)
-        
-        popular_products = Product.objects.filter(
-            status='published'
-        ).exclude(
-            id__in=user_viewed
-        ).annotate(
-            popularity=Count('userbehavior')
-        ).order_by('-popularity')[:limit]
-        
-        recommendations = []
-        for product in popular_products:
-            recommendation = Recommendation.objects.create(
-                user=user,
-                product=product,
-                recommendation_type='popularity',
-                score=0.6,
-                reason="Produit populaire"
-            )
-            recommendations.append(recommendation)
-        
-        return recommendations
+    def _content_based_candidates(history, limit):
+        """Produits similaires aux produits récents, pondérés par l'intérêt porté à chacun"""
+        if not history:
+            return []
+        scores = defaultdict(float)
+        for product_id, similar_id, similarity in ProductSimilarity.objects.filter(
+            product1_id__in=list(history)
+        ).order_by().values_list('product1_id', 'product2_id', 'similarity_score'):
+            if similar_id not in history:
+                scores[similar_id] += similarity * history[product_id]
+        return sorted(scores.items(), key=lambda candidate: -candidate[1])[:limit]
     
     @staticmethod
-    def _get_frequently_bought_together(user, limit=5):
-        """Produits fréquemment achetés ensemble"""
-        # Récupérer les commandes de l'utilisateur
-        user_orders = Order.objects.filter(user=user, status__in=['completed', 'delivered'])
-        
-        if not user_orders.exists():
-            return []
-        
-        # Produits achetés par l'utilisateur
-        user_products = OrderItem.objects.filter(
-            order__in=user_orders
-        ).values_list('product_id', flat=True)
-        
-        # Trouver des produits fréquemment achetés avec ces produits
-        fbt_products = OrderItem.objects.filter(
-            order__in=Order.objects.filter(
-                orderitem__product_id__in=user_products
-            ).exclude(user=user)
-        ).exclude(
-            product_id__in=user_products
-        ).values('product_id').annotate(
-            frequency=Count('product_id')
-        ).order_by('-frequency')[:limit]
-        
-        recommendations = []
-        for item in fbt_products:
-            try:
-                product = Product.objects.get(id=item['product_id'], status='published')
-                recommendation = Recommendation.objects.create(
-                    user=user,
-                    product=product,
-                    recommendation_type='frequently_bought_together',
-                    score=0.8,
-                    reason="Fréquemment acheté ensemble"
-                )
-                recommendations.append(recommendation)
-            except Product.DoesNotExist:
-                continue
-        
-        return recommendations
+    def _popular_candidates(days=30, size=200):
+        """Produits les plus consultés des derniers jours (produits mis en avant à défaut), mis en cache"""
+        candidates = cache.get(POPULAR_PRODUCTS_CACHE_KEY)
+        if candidates is not None:
+            return candidates
+        
+        candidates = list(UserBehavior.objects.filter(
+            content_type=ContentType.objects.get_for_model(Product),
+            timestamp__gte=timezone.now() - timedelta(days=days)
+        ).values_list('object_id').annotate(popularity=Count('id')).order_by('-popularity')[:size])
+        if not candidates:
+            candidates = [
+                (product_id, 1.0) for product_id in Product.objects.filter(
+                    status='published', is_featured=True
+                ).order_by('-created_at').values_list('id', flat=True)[:size]
+            ]
+        cache.set(POPULAR_PRODUCTS_CACHE_KEY, candidates, getattr(settings, 'RECOMMENDATION_POPULAR_CACHE_SECONDS', 3600))
+        return candidates
     
     @staticmethod
-    def _find_similar_users(user, limit=10):
-        """Trouve des utilisateurs similaires"""
-        # Récupérer les produits que l'utilisateur a achetés
-        user_products = UserBehavior.objects.filter(
-            user=user,
-            behavior_type='purchase'
-        ).values_list('object_id', flat=True)
-        
-        if not user_products:
-            return []
-        
-        # Trouver d'autres utilisateurs qui ont acheté les mêmes produits
-        similar_users = UserBehavior.objects.filter(
-            behavior_type='purchase',
-            object_id__in=user_products
-        ).exclude(
-            user=user
-        ).values('user_id').annotate(
-            common_products=Count('object_id')
-        ).order_by('-common_products')[:limit]
-        
-        return list(similar_users)
+    def flush_impressions(records):
+        """Écrit un lot d'impressions : une recommandation par (utilisateur, produit, type), marquée affichée"""
+        latest = {}
+        for user_id, product_id, recommendation_type, score in records:
+            latest[(user_id, product_id, recommendation_type)] = score
+        Recommendation.objects.bulk_create([
+            Recommendation(
+                user_id=user_id,
+                product_id=product_id,
+                recommendation_type=recommendation_type,
+                score=score,
+                reason=SOURCE_REASONS[recommendation_type],
+                is_shown=True
+            )
+            for (user_id, product_id, recommendation_type), score in latest.items()
+        ], update_conflicts=True, unique_fields=['user', 'product', 'recommendation_type'], update_fields=[
+            'score', 'reason', 'is_shown'
+        ])
+
+
+recommendation_impressions = WriteBehindBuffer(
+    RecommendationService.flush_impressions,
+    max_size=getattr(settings, 'RECOMMENDATION_IMPRESSION_BUFFER_SIZE', 500),
+    interval=getattr(settings, 'RECOMMENDATION_IMPRESSION_FLUSH_SECONDS', 5),
+    name='recommendation-impressions'
+)
 
 
 class BehaviorTrackingService:
-    """Service pour le tracking du comportement utilisateur"""
+    """Service pour le tracking du comportement utilisateur : événements mis en tampon, écrits par lots"""
+    
+    # Préférences gardées par profil, les plus récentes en tête
+    PREFERENCES_SIZE = 10
     
     @staticmethod
     def track_behavior(user, session_key, content_object, behavior_type, weight=1.0, metadata=None):
-        """Enregistre un comportement utilisateur"""
-        content_type = ContentType.objects.get_for_model(content_object)
-        
-        behavior = UserBehavior.objects.create(
-            user=user,
-            session_key=session_key,
-            content_type=content_type,
-            object_id=content_object.id,
-            behavior_type=behavior_type,
-            weight=weight,
-            metadata=metadata or {}
-        )
-        
-        # Mettre à jour le profil utilisateur
-        if user and user.is_authenticated:
-            RecommendationService._update_user_profile(user, behavior_type, content_object)
-        
-        return behavior
+        """Enregistre un comportement utilisateur en différé, sans requête ; retourne False si l'événement est abandonné"""
+        # Tampon à moitié plein : les vues, nombreuses et peu informatives, sont abandonnées en premier
+        if behavior_type == 'view' and len(behavior_events) >= behavior_events.max_pending // 2:
+            return False
+        behavior_events.add((
+            user.pk if user is not None and user.is_authenticated else None,
+            session_key or '',
+            ContentType.objects.get_for_model(content_object).pk,
+            content_object.pk,
+            behavior_type,
+            weight,
+            metadata or {},
+            timezone.now()
+        ))
+        return True
     
     @staticmethod
     def track_product_view(user, session_key, product):
@@ -288,75 +250,147 @@ class BehaviorTrackingService:
         return BehaviorTrackingService.track_behavior(
             user, session_key, product, 'purchase', weight=5.0, metadata=metadata
         )
+    
+    @staticmethod
+    @transaction.atomic
+    def flush_behaviors(records):
+        """Écrit un lot de comportements puis met à jour les profils des utilisateurs concernés, en une transaction"""
+        UserBehavior.objects.bulk_create([
+            UserBehavior(
+                user_id=user_id,
+                session_key=session_key,
+                content_type_id=content_type_id,
+                object_id=object_id,
+                behavior_type=behavior_type,
+                weight=weight,
+                metadata=metadata,
+                timestamp=timestamp
+            )
+            for user_id, session_key, content_type_id, object_id, behavior_type, weight, metadata, timestamp in records
+        ])
+        BehaviorTrackingService._update_profiles(records)
+    
+    @staticmethod
+    def _update_profiles(records):
+        """Met à jour les profils d'un lot : profils verrouillés, compteurs incrémentés, préférences fusionnées"""
+        product_type_id = ContentType.objects.get_for_model(Product).pk
+        events = [
+            (user_id, object_id, behavior_type, metadata)
+            for user_id, _session_key, content_type_id, object_id, behavior_type, _weight, metadata, _timestamp in records
+            if user_id is not None and content_type_id == product_type_id
+        ]
+        if not events:
+            return
+        user_ids = {user_id for user_id, *_event in events}
+        products = {
+            product_id: (category_id, brand_id, price)
+            for product_id, category_id, brand_id, price in Product.objects.filter(
+                id__in={product_id for _user_id, product_id, *_event in events}
+            ).order_by().values_list('id', 'category_id', 'brand_id', 'price')
+        }
+        UserProfile.objects.bulk_create([UserProfile(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        # Verrou par utilisateur (dans l'ordre des identifiants) : deux lots ne fusionnent pas les mêmes préférences en même temps
+        profiles = {
+            user_id: [0, 0, Decimal('0'), categories, brands, price_min, price_max]
+            for user_id, categories, brands, price_min, price_max in UserProfile.objects.select_for_update().filter(
+                user_id__in=user_ids
+            ).order_by('user_id').values_list(
+                'user_id', 'preferred_categories', 'preferred_brands', 'price_range_min', 'price_range_max'
+            )
+        }
+        for user_id, product_id, behavior_type, metadata in events:
+            profile = profiles[user_id]
+            if behavior_type == 'view':
+                profile[0] += 1
+            elif behavior_type == 'purchase':
+                profile[1] += 1
+                profile[2] += Decimal(str(metadata.get('order_value') or 0))
+            if behavior_type in POSITIVE_BEHAVIORS and product_id in products:
+                category_id, brand_id, price = products[product_id]
+                profile[3] = BehaviorTrackingService._promote(profile[3], category_id)
+                if brand_id is not None:
+                    profile[4] = BehaviorTrackingService._promote(profile[4], brand_id)
+                profile[5] = min(price, profile[5]) if profile[5] is not None else price
+                profile[6] = max(price, profile[6]) if profile[6] is not None else price
+        
+        now = timezone.now()
+        for user_id, (views, purchases, spent, categories, brands, price_min, price_max) in profiles.items():
+            values = {
+                'total_views': F('total_views') + views,
+                'preferred_categories': categories,
+                'preferred_brands': brands,
+                'price_range_min': price_min,
+                'price_range_max': price_max,
+                'updated_at': now,
+            }
+            if purchases:
+                values.update(
+                    total_purchases=F('total_purchases') + purchases,
+                    total_spent=F('total_spent') + spent,
+                    average_order_value=ExpressionWrapper(
+                        (F('total_spent') + spent) / (F('total_purchases') + purchases), output_field=DecimalField()
+                    ),
+                )
+            UserProfile.objects.filter(user_id=user_id).update(**values)
+    
+    @staticmethod
+    def _promote(preferences, value):
+        """Place une préférence en tête de liste, taille bornée"""
+        return [value] + [item for item in preferences if item != value][:BehaviorTrackingService.PREFERENCES_SIZE - 1]
+
+
+behavior_events = WriteBehindBuffer(
+    BehaviorTrackingService.flush_behaviors,
+    max_size=getattr(settings, 'RECOMMENDATION_BEHAVIOR_BUFFER_SIZE', 1000),
+    interval=getattr(settings, 'RECOMMENDATION_BEHAVIOR_FLUSH_SECONDS', 2),
+    name='user-behavior'
+)
 
 
 class SimilarityService:
     """Service pour calculer la similarité entre produits"""
     
     @staticmethod
-    def calculate_product_similarity(product1, product2):
-        """Calcule la similarité entre deux produits"""
-        similarity_score = 0.0
-        
-        # Similarité basée sur la catégorie
-        if product1.category == product2.category:
-            similarity_score += 0.3
-        
-        # Similarité basée sur la marque
-        if product1.brand == product2.brand:
-            similarity_score += 0.2
-        
-        # Similarité basée sur le prix (plus le prix est proche, plus la similarité est élevée)
-        if product1.price and product2.price:
-            price_diff = abs(float(product1.price) - float(product2.price))
-            max_price = max(float(product1.price), float(product2.price))
-            if max_price > 0:
-                price_similarity = 1 - (price_diff / max_price)
-                similarity_score += price_similarity * 0.2
-        
-        # Similarité basée sur les tags/mots-clés
-        if hasattr(product1, 'tags') and hasattr(product2, 'tags'):
-            tags1 = set(product1.tags.all()) if product1.tags.exists() else set()
-            tags2 = set(product2.tags.all()) if product2.tags.exists() else set()
-            
-            if tags1 or tags2:
-                common_tags = tags1.intersection(tags2)
-                total_tags = tags1.union(tags2)
-                tag_similarity = len(common_tags) / len(total_tags) if total_tags else 0
-                similarity_score += tag_similarity * 0.3
-        
-        return min(similarity_score, 1.0)
+    def rebuild_similarities(batch_size=5000):
+        """Recalcule les plus proches voisins de chaque produit publié en produits matriciels par blocs"""
+        started = timezone.now()
+        written = SimilarityService._save(top_neighbours(load_product_features()), batch_size)
+        # Paires sorties du top-k et produits dépubliés
+        ProductSimilarity.objects.filter(similarity_type='content_based', updated_at__lt=started).delete()
+        return written
     
     @staticmethod
-    def update_product_similarities(product):
-        """Met à jour les similarités pour un produit"""
-        # Récupérer tous les autres produits
-        other_products = Product.objects.filter(
-            status='published'
-        ).exclude(id=product.id)
-        
-        for other_product in other_products:
-            similarity_score = SimilarityService.calculate_product_similarity(product, other_product)
-            
-            if similarity_score > 0.1:  # Seuil minimum
-                ProductSimilarity.objects.update_or_create(
-                    product1=product,
-                    product2=other_product,
-                    defaults={
-                        'similarity_score': similarity_score,
-                        'similarity_type': 'content_based'
-                    }
-                )
-                
-                # Créer aussi la relation inverse
-                ProductSimilarity.objects.update_or_create(
-                    product1=other_product,
-                    product2=product,
-                    defaults={
-                        'similarity_score': similarity_score,
-                        'similarity_type': 'content_based'
-                    }
+    def _save(neighbours, batch_size=5000):
+        """Écrit les voisins par lots, en insertion ou mise à jour sur (product1, product2)"""
+        written = 0
+        batch = []
+        for product_id, neighbour_ids, scores in neighbours:
+            batch.extend(
+                ProductSimilarity(
+                    product1_id=int(product_id),
+                    product2_id=int(neighbour_id),
+                    similarity_score=float(score),
+                    similarity_type='content_based'
                 )
+                for neighbour_id, score in zip(neighbour_ids, scores)
+            )
+            if len(batch) >= batch_size:
+                written += SimilarityService._upsert(batch)
+                batch = []
+        if batch:
+            written += SimilarityService._upsert(batch)
+        return written
+    
+    @staticmethod
+    def _upsert(similarities):
+        """Insère ou met à jour un lot de similarités en une requête"""
+        ProductSimilarity.objects.bulk_create(
+            similarities,
+            update_conflicts=True,
+            unique_fields=['product1', 'product2'],
+            update_fields=['similarity_score', 'similarity_type', 'updated_at']
+        )
+        return len(similarities)
     
     @staticmethod
     def get_similar_products(product, limit=5):
@@ -369,6 +403,94 @@ class SimilarityService:
         return [similarity.product2 for similarity in similarities]
 
 
+class FrequentlyBoughtTogetherService:
+    """Produits achetés ensemble : comptages des paniers et compagnons précalculés"""
+    
+    @staticmethod
+    def rebuild(full=False, batch_size=5000):
+        """Compte les paniers des commandes nouvelles et réécrit les compagnons des produits concernés
+        
+        Sans comptages enregistrés (ou avec full), tous les paniers sont recomptés. Le lift des produits
+        absents des nouveaux paniers n'est recalculé qu'au prochain recalcul complet.
+        """
+        path = getattr(settings, 'RECOMMENDATION_FBT_STATE', 'basket_counts.npz')
+        counts = BasketCounts() if full else BasketCounts.load(path)
+        complete = not counts.baskets
+        started = timezone.now()
+        # Seules les commandes modifiées depuis le dernier passage sont relues
+        since = datetime.fromtimestamp(counts.synced_at, tz=timezone.get_default_timezone()) if counts.synced_at else None
+        touched = counts.add_orders(basket_order_ids(since))
+        counts.synced_at = started.timestamp()
+        if not complete and not len(touched):
+            counts.save(path)
+            return 0
+        
+        product_ids = None if complete else touched
+        written = FrequentlyBoughtTogetherService._save(counts.companions(product_ids), product_ids, batch_size)
+        # Comptages enregistrés après la table : un échec relance le même lot
+        counts.save(path)
+        return written
+    
+    @staticmethod
+    @transaction.atomic
+    def _save(companions, product_ids, batch_size=5000):
+        """Remplace les compagnons des produits donnés (tous si None), insérés par lots"""
+        existing = np.fromiter(Product.objects.values_list('id', flat=True).order_by().iterator(), dtype=np.int64)
+        keep = np.isin(companions[0], existing) & np.isin(companions[1], existing)
+        rows = zip(*(array[keep].tolist() for array in companions))
+        
+        if product_ids is None:
+            FrequentlyBoughtTogether.objects.all().delete()
+        else:
+            for start in range(0, len(product_ids), batch_size):
+                FrequentlyBoughtTogether.objects.filter(
+                    product_id__in=product_ids[start:start + batch_size].tolist()
+                ).delete()
+        
+        written = 0
+        while True:
+            batch = [
+                FrequentlyBoughtTogether(
+                    product_id=product_id, companion_id=companion_id, rank=rank,
+                    baskets=baskets, confidence=confidence, lift=lift
+                )
+                for product_id, companion_id, rank, baskets, confidence, lift in islice(rows, batch_size)
+            ]
+            if not batch:
+                return written
+            FrequentlyBoughtTogether.objects.bulk_create(batch)
+            written += len(batch)
+    
+    @staticmethod
+    def get_companions(product_ids, limit=5, exclude=()):
+        """Compagnons d'un ensemble de produits (fiche, panier) en une lecture indexée : [(produit, score)]
+        
+        Le score additionne les confiances : un compagnon de plusieurs produits passe devant.
+        """
+        product_ids = set(product_ids)
+        scores = defaultdict(float)
+        for companion_id, confidence in FrequentlyBoughtTogether.objects.filter(
+            product_id__in=product_ids
+        ).order_by().values_list('companion_id', 'confidence'):
+            scores[companion_id] += confidence
+        excluded = product_ids | set(exclude)
+        return sorted(
+            ((product_id, score) for product_id, score in scores.items() if product_id not in excluded),
+            key=lambda companion: -companion[1]
+        )[:limit]
+    
+    @staticmethod
+    def get_products(product_ids, limit=5):
+        """Produits publiés achetés avec les produits donnés, dans l'ordre du score"""
+        companions = FrequentlyBoughtTogetherService.get_companions(product_ids, limit)
+        # Lecture par clé primaire, statut vérifié ensuite : un filtre sur status peut détourner l'index
+        products = Product.objects.order_by().for_listing().in_bulk([product_id for product_id, _score in companions])
+        return [
+            products[product_id] for product_id, _score in companions
+            if product_id in products and products[product_id].status == 'published'
+        ]
+
+
 class RecommendationFeedbackService:
     """Service pour gérer le feedback sur les recommandations"""
     
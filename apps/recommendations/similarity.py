@@ -0,0 +1,128 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+
+from apps.products.models import Product
+from apps.search.engine import stem, tokenize
+
+
+# Poids des composantes, comme l'ancien calcul paire par paire
+CATEGORY_WEIGHT = 0.3
+BRAND_WEIGHT = 0.2
+PRICE_WEIGHT = 0.2
+TEXT_WEIGHT = 0.3
+
+ProductFeatures = namedtuple('ProductFeatures', ['ids', 'categories', 'brands', 'log_prices', 'text', 'text_t'])
+
+
+def load_product_features(queryset=None, max_df=None):
+    """Charge une fois les caractéristiques des produits en tableaux : catégorie, marque, log-prix, TF-IDF"""
+    queryset = queryset if queryset is not None else Product.objects.filter(status='published')
+    max_df = max_df or getattr(settings, 'RECOMMENDATION_TEXT_MAX_DF', 0.05)
+
+    ids, categories, brands, log_prices = [], [], [], []
+    vocabulary, indices, counts, indptr = {}, [], [], [0]
+    for product_id, category_id, brand_id, price, name, short_description, description in queryset.order_by(
+        'id'
+    ).values_list(
+        'id', 'category_id', 'brand_id', 'price', 'name', 'short_description', 'description'
+    ).iterator(chunk_size=2000):
+        ids.append(product_id)
+        categories.append(category_id)
+        # Sans marque : code propre au produit, jamais égal à un autre
+        brands.append(brand_id if brand_id is not None else -len(ids))
+        log_prices.append(math.log(price) if price else math.nan)
+
+        # Le nom compte double
+        terms = {}
+        for weight, text in ((2, name), (1, short_description), (1, description)):
+            for token in tokenize(text):
+                term = vocabulary.setdefault(stem(token), len(vocabulary))
+                terms[term] = terms.get(term, 0) + weight
+        indices.extend(terms)
+        counts.extend(terms.values())
+        indptr.append(len(indices))
+
+    text = sparse.csr_matrix(
+        (np.array(counts, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(len(ids), len(vocabulary))
+    )
+    text = _tf_idf(text, max_df)
+    return ProductFeatures(
+        ids=np.array(ids, dtype=np.int64),
+        categories=np.array(categories, dtype=np.int64),
+        brands=np.array(brands, dtype=np.int64),
+        log_prices=np.array(log_prices, dtype=np.float32),
+        text=text,
+        text_t=text.T.tocsr()
+    )
+
+
+def _tf_idf(counts, max_df):
+    """TF-IDF sous-linéaire normalisé ; termes uniques ou trop fréquents écartés"""
+    documents = counts.shape[0]
+    document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+    # Un terme présent dans un seul produit ne rapproche rien ; trop fréquent, il densifie les produits matriciels
+    keep = (document_frequency >= 2) & (document_frequency <= max(2, max_df * documents))
+    idf = np.where(keep, np.log((1 + documents) / (1 + document_frequency)) + 1, 0).astype(np.float32)
+
+    tf_idf = counts.copy()
+    np.log(tf_idf.data, out=tf_idf.data)
+    tf_idf.data += 1
+    tf_idf.data *= idf[tf_idf.indices]
+    tf_idf.eliminate_zeros()
+    norms = np.sqrt(np.asarray(tf_idf.multiply(tf_idf).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags((1 / norms).astype(np.float32)) @ tf_idf
+
+
+def similarity_block(features, rows):
+    """Scores hors prix (lignes x tous les produits) : mêmes catégorie et marque, texte cosinus"""
+    scores = (features.text[rows] @ features.text_t).toarray()
+    scores *= TEXT_WEIGHT
+    np.add(scores, CATEGORY_WEIGHT, out=scores, where=features.categories[rows, None] == features.categories)
+    np.add(scores, BRAND_WEIGHT, out=scores, where=features.brands[rows, None] == features.brands)
+    return scores
+
+
+def price_similarity(features, row, columns):
+    """Rapport des prix min / max = exp(-|écart des log-prix|) ; prix inconnu : 0"""
+    similarity = np.exp(-np.abs(features.log_prices[columns] - features.log_prices[row]))
+    return np.nan_to_num(similarity, copy=False) * PRICE_WEIGHT
+
+
+def top_neighbours(features, top_k=None, min_score=None, block_size=None, product_ids=None):
+    """Produit par blocs de lignes : (produit, voisins, scores), au plus top_k voisins au-dessus du seuil"""
+    top_k = top_k or getattr(settings, 'RECOMMENDATION_SIMILAR_TOP_K', 20)
+    min_score = min_score if min_score is not None else getattr(settings, 'RECOMMENDATION_SIMILARITY_MIN_SCORE', 0.1)
+    block_size = block_size or getattr(settings, 'RECOMMENDATION_SIMILARITY_BLOCK_SIZE', 256)
+    rows = np.arange(len(features.ids)) if product_ids is None else np.flatnonzero(np.isin(features.ids, product_ids))
+    top_k = min(top_k, len(features.ids) - 1)
+    if top_k <= 0:
+        return
+
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        scores = similarity_block(features, block)
+        # Pas de similarité avec soi-même
+        scores[np.arange(len(block)), block] = -1
+        for row, row_scores in zip(block, scores):
+            # Le prix ajoute au plus PRICE_WEIGHT : seuls les produits à moins de PRICE_WEIGHT du k-ième
+            # score peuvent entrer dans le top-k (sélection sur les scores non nuls, sans les égalités à zéro)
+            positive = np.flatnonzero(row_scores > 0)
+            if len(positive) >= top_k:
+                cutoff = np.partition(row_scores[positive], -top_k)[-top_k] - PRICE_WEIGHT
+            else:
+                cutoff = 0
+            if cutoff > 0:
+                candidates = positive[row_scores[positive] >= cutoff]
+            else:
+                candidates = np.flatnonzero(row_scores >= 0)
+            totals = row_scores[candidates] + price_similarity(features, row, candidates)
+            best = np.argpartition(totals, -top_k)[-top_k:] if len(candidates) > top_k else np.arange(len(candidates))
+            best = best[np.argsort(-totals[best], kind='stable')]
+            best = best[totals[best] > min_score]
+            yield features.ids[row], features.ids[candidates[best]], totals[best]
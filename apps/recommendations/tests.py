@@ -0,0 +1,362 @@
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.cart.models import Cart
+from apps.orders.models import Order, OrderItem
+from apps.products.models import Brand, Category, Product
+from .baskets import BasketCounts, basket_order_ids
+from .collaborative import ItemSimilarityModel
+from .models import FrequentlyBoughtTogether, ProductSimilarity, UserBehavior, UserProfile
+from .services import (
+    BehaviorTrackingService, FrequentlyBoughtTogetherService, RecommendationService, behavior_events,
+    recommendation_impressions
+)
+
+
+User = get_user_model()
+
+
+class ItemSimilarityModelTests(TestCase):
+    """Entraînement du modèle item-item"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Montres', slug='montres')
+        cls.products = [
+            Product.objects.create(
+                name=f'Produit {index}', slug=f'produit-{index}', description='-', sku=f'SKU-{index}',
+                category=category, price=10, status='published'
+            )
+            for index in range(5)
+        ]
+        product_type = ContentType.objects.get_for_model(Product)
+        # Paniers : (0, 1, 2), (1, 2, 3), (2, 3, 4), (0, 4)
+        for index, basket in enumerate([(0, 1, 2), (1, 2, 3), (2, 3, 4), (0, 4)]):
+            user = User.objects.create_user(
+                email=f'client{index}@example.com', username=f'client{index}', password='secret',
+                first_name='Client', last_name=str(index)
+            )
+            UserBehavior.objects.bulk_create(
+                UserBehavior(user=user, content_type=product_type, object_id=cls.products[position].id,
+                             behavior_type='view', weight=1.0)
+                for position in basket
+            )
+
+    def test_small_blocks_match_single_block(self):
+        """Le découpage en blocs ne change ni les voisins ni les scores"""
+        reference = ItemSimilarityModel.train(block_size=2048)
+        blocked = ItemSimilarityModel.train(block_size=2)
+        for product in self.products:
+            expected = reference.similar_items(product.id, limit=10)
+            actual = blocked.similar_items(product.id, limit=10)
+            self.assertEqual([item for item, _score in actual], [item for item, _score in expected])
+            for (_item, score), (_expected_item, expected_score) in zip(actual, expected):
+                self.assertAlmostEqual(score, expected_score, places=5)
+
+    def test_product_is_not_its_own_neighbour(self):
+        model = ItemSimilarityModel.train(block_size=2)
+        for product in self.products:
+            neighbours = [item for item, _score in model.similar_items(product.id, limit=10)]
+            self.assertNotIn(product.id, neighbours)
+            self.assertTrue(neighbours)
+
+
+    def test_fixed_matrix_scores(self):
+        """Cosinus attendu calculé à la main : co-occurrences / racine du produit des effectifs"""
+        model = ItemSimilarityModel.train(block_size=2, shrink=0)
+        ids = [product.id for product in self.products]
+        # Le produit 2 ouvre le deuxième bloc : sa diagonale est décalée du début du bloc
+        scores = dict(model.similar_items(ids[2], limit=10))
+        expected = {ids[1]: 2 / 6 ** 0.5, ids[3]: 2 / 6 ** 0.5, ids[0]: 1 / 6 ** 0.5, ids[4]: 1 / 6 ** 0.5}
+        self.assertEqual(set(scores), set(expected))
+        for product_id, score in expected.items():
+            self.assertAlmostEqual(scores[product_id], score, places=5)
+        self.assertAlmostEqual(dict(model.similar_items(ids[3], limit=10))[ids[4]], 0.5, places=5)
+
+    def test_save_load_round_trip_and_recommend(self):
+        model = ItemSimilarityModel.train(block_size=2)
+        handle, path = tempfile.mkstemp(suffix='.bin')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        model.save(path)
+        loaded = ItemSimilarityModel.load(path)
+        self.assertEqual(len(loaded), len(self.products))
+        for product in self.products:
+            self.assertEqual(loaded.similar_items(product.id, limit=10), model.similar_items(product.id, limit=10))
+
+        ids = [product.id for product in self.products]
+        recommended = loaded.recommend([ids[0]], [1.0], exclude=[ids[4]], limit=10)
+        # Voisins du produit 0, sans lui-même ni les exclus, par score décroissant
+        self.assertEqual({item for item, _score in recommended}, {ids[1], ids[2]})
+        self.assertEqual([score for _item, score in recommended], sorted(
+            (score for _item, score in recommended), reverse=True
+        ))
+        self.assertEqual(len(loaded.recommend([ids[0], ids[2]], [1.0, 1.0], limit=1)), 1)
+        self.assertEqual(loaded.recommend([10 ** 9], [1.0]), [])
+
+
+class FrequentlyBoughtTogetherDisplayTests(TestCase):
+    """Compagnons précalculés affichés sur la fiche produit et le panier"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Bijoux', slug='bijoux')
+        cls.product, cls.companion, cls.draft = (
+            Product.objects.create(
+                name=name, slug=slug, description='-', sku=slug, category=category, price=10, status=status
+            )
+            for name, slug, status in [
+                ('Bague', 'bague', 'published'), ('Écrin', 'ecrin', 'published'), ('Chaîne', 'chaine', 'draft')
+            ]
+        )
+        FrequentlyBoughtTogether.objects.bulk_create([
+            FrequentlyBoughtTogether(product=cls.product, companion=cls.companion, rank=0, confidence=0.5, lift=2),
+            FrequentlyBoughtTogether(product=cls.product, companion=cls.draft, rank=1, confidence=0.4, lift=2),
+        ])
+        cls.user = User.objects.create_user(
+            email='client@example.com', username='client', password='secret', first_name='Client', last_name='Test'
+        )
+
+    def setUp(self):
+        # La fiche produit enregistre une vue : pas de thread d'écriture concurrent pendant le test
+        patcher = mock.patch.object(behavior_events, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(behavior_events._items.clear)
+
+    def test_product_page_lists_published_companions(self):
+        response = self.client.get(reverse('products:product-detail', args=[self.product.slug]))
+        self.assertEqual(list(response.context['bought_together']), [self.companion])
+        self.assertContains(response, 'Souvent achetés ensemble')
+        self.assertContains(response, reverse('products:product-detail', args=[self.companion.slug]))
+
+    def test_cart_page_lists_companions_of_cart_items(self):
+        Cart.objects.create(user=self.user).items.create(product=self.product, quantity=1)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('cart:cart'))
+        self.assertContains(response, 'Souvent achetés avec votre panier')
+        self.assertContains(response, reverse('products:product-detail', args=[self.companion.slug]))
+        self.assertNotContains(response, self.draft.name)
+
+
+class FrequentlyBoughtTogetherRebuildTests(TestCase):
+    """Comptage incrémental des paniers expédiés"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Bijoux', slug='bijoux')
+        cls.products = [
+            Product.objects.create(
+                name=f'Bijou {number}', slug=f'bijou-{number}', description='-', sku=f'BIJOU-{number}',
+                category=category, price=10, status='published'
+            )
+            for number in range(4)
+        ]
+        cls.user = User.objects.create_user(
+            email='client@example.com', username='client', password='secret', first_name='Client', last_name='Test'
+        )
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.npz')
+        os.close(handle)
+        os.remove(self.path)
+        self.addCleanup(lambda: os.path.exists(self.path) and os.remove(self.path))
+        settings_override = override_settings(RECOMMENDATION_FBT_STATE=self.path, RECOMMENDATION_FBT_MIN_BASKETS=1)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def order(self, positions, status='delivered'):
+        order = Order.objects.create(user=self.user, subtotal=0, total_amount=0, status=status)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.products[position], quantity=1, unit_price=10) for position in positions
+        ])
+        return order
+
+    def companions(self, position):
+        return set(FrequentlyBoughtTogether.objects.filter(product=self.products[position]).values_list(
+            'companion_id', flat=True
+        ))
+
+    def test_late_shipped_old_order_is_counted_incrementally(self):
+        late = self.order([2, 3], status='processing')
+        self.order([0, 1])
+        self.order([0, 1])
+        self.order([2])
+        FrequentlyBoughtTogetherService.rebuild()
+        self.assertEqual(self.companions(0), {self.products[1].pk})
+        self.assertEqual(self.companions(2), set())
+
+        # Seules les commandes modifiées depuis le dernier passage sont relues
+        counts = BasketCounts.load(self.path)
+        Order.objects.exclude(pk=late.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        late.status = 'shipped'
+        late.save()
+        since = timezone.now() - timedelta(seconds=1)
+        self.assertEqual(list(basket_order_ids(since)), [late.pk])
+
+        self.assertGreater(FrequentlyBoughtTogetherService.rebuild(), 0)
+        self.assertEqual(self.companions(2), {self.products[3].pk})
+        self.assertEqual(BasketCounts.load(self.path).baskets, counts.baskets + 1)
+
+    def test_rebuild_without_new_orders_writes_nothing(self):
+        self.order([0, 1])
+        FrequentlyBoughtTogetherService.rebuild()
+        self.assertEqual(FrequentlyBoughtTogetherService.rebuild(), 0)
+        self.assertIsNotNone(BasketCounts.load(self.path).synced_at)
+
+
+class BehaviorTrackingTests(TestCase):
+    """Événements mis en tampon puis agrégés dans les profils"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Montres', slug='montres')
+        cls.other_category = Category.objects.create(name='Bagues', slug='bagues')
+        cls.brand = Brand.objects.create(name='Silence', slug='silence')
+        cls.watch = Product.objects.create(
+            name='Montre', slug='montre', description='-', sku='MONTRE', category=cls.category, brand=cls.brand,
+            price=120, status='published'
+        )
+        cls.ring = Product.objects.create(
+            name='Bague', slug='bague', description='-', sku='BAGUE', category=cls.other_category, price=40,
+            status='published'
+        )
+        cls.user = User.objects.create_user(
+            email='client@example.com', username='client', password='secret', first_name='Client', last_name='Test'
+        )
+
+    def setUp(self):
+        behavior_events._items.clear()
+        self.addCleanup(behavior_events._items.clear)
+        # Pas de thread d'écriture : seuls les vidages explicites du test écrivent
+        patcher = mock.patch.object(behavior_events, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def flush(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            behavior_events.flush()
+
+    def test_tracking_is_buffered_without_queries(self):
+        ContentType.objects.get_for_model(Product)
+        with self.assertNumQueries(0):
+            self.assertTrue(BehaviorTrackingService.track_product_view(self.user, 'session', self.watch))
+        self.assertEqual(len(behavior_events), 1)
+        self.assertFalse(UserBehavior.objects.exists())
+        self.flush()
+        self.assertEqual(UserBehavior.objects.get().object_id, self.watch.pk)
+        self.assertEqual(len(behavior_events), 0)
+
+    def test_views_are_dropped_first_under_backpressure(self):
+        behavior_events._items.extend([None] * (behavior_events.max_pending // 2))
+        self.assertFalse(BehaviorTrackingService.track_product_view(self.user, 'session', self.watch))
+        self.assertTrue(BehaviorTrackingService.track_purchase(self.user, 'session', self.watch, order_value=120))
+
+    def test_profile_aggregates_batches(self):
+        BehaviorTrackingService.track_product_view(self.user, 'session', self.watch)
+        BehaviorTrackingService.track_purchase(self.user, 'session', self.watch, order_value=120)
+        BehaviorTrackingService.track_product_view(None, 'anonyme', self.ring)
+        self.flush()
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual((profile.total_views, profile.total_purchases), (1, 1))
+        self.assertEqual(profile.preferred_categories, [self.category.pk])
+        self.assertEqual(profile.preferred_brands, [self.brand.pk])
+
+        # Second lot : compteurs cumulés, préférences fusionnées avec les précédentes
+        BehaviorTrackingService.track_add_to_cart(self.user, 'session', self.ring)
+        BehaviorTrackingService.track_purchase(self.user, 'session', self.ring, order_value=40)
+        self.flush()
+        profile.refresh_from_db()
+        self.assertEqual((profile.total_views, profile.total_purchases), (1, 2))
+        self.assertEqual(profile.total_spent, Decimal('160'))
+        self.assertEqual(profile.average_order_value, Decimal('80'))
+        self.assertEqual(profile.preferred_categories, [self.other_category.pk, self.category.pk])
+        self.assertEqual(profile.preferred_brands, [self.brand.pk])
+        self.assertEqual((profile.price_range_min, profile.price_range_max), (Decimal('40'), Decimal('120')))
+        self.assertEqual(UserProfile.objects.count(), 1)
+
+
+@override_settings(RECOMMENDATION_ITEM_MODEL='')
+class RecommendationServiceTests(TestCase):
+    """Mélange des sources précalculées, en lecture seule sur le chemin de la requête"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Bijoux', slug='bijoux')
+        cls.products = [
+            Product.objects.create(
+                name=f'Bijou {number}', slug=f'bijou-{number}', description='-', sku=f'BIJOU-{number}',
+                category=category, price=10, status='draft' if number == 5 else 'published', track_inventory=False
+            )
+            for number in range(6)
+        ]
+        cls.user = User.objects.create_user(
+            email='client@example.com', username='client', password='secret', first_name='Client', last_name='Test'
+        )
+        UserBehavior.objects.create(
+            user=cls.user, content_type=ContentType.objects.get_for_model(Product), object_id=cls.products[0].pk,
+            behavior_type='view', weight=1.0
+        )
+        order = Order.objects.create(user=cls.user, subtotal=10, total_amount=10, status='delivered')
+        OrderItem.objects.create(order=order, product=cls.products[1], quantity=1, unit_price=10)
+        ProductSimilarity.objects.bulk_create([
+            ProductSimilarity(product1=cls.products[0], product2=cls.products[position], similarity_score=score)
+            for position, score in [(1, 0.9), (5, 0.95), (2, 0.8), (3, 0.4)]
+        ])
+
+    def setUp(self):
+        cache.clear()
+        recommendation_impressions._items.clear()
+        self.addCleanup(recommendation_impressions._items.clear)
+        patcher = mock.patch.object(recommendation_impressions, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ids(self, products):
+        return [product.pk for product in products]
+
+    def test_blend_sums_normalised_sources_and_keeps_strongest_origin(self):
+        first, second, third, draft = self.products[2], self.products[3], self.products[4], self.products[5]
+        blended = RecommendationService._blend([
+            ('content_based', [(first.pk, 0.8), (second.pk, 0.4), (draft.pk, 1.0)]),
+            ('popularity', [(second.pk, 10), (third.pk, 5)]),
+        ], limit=10, excluded={third.pk})
+        self.assertEqual(self.ids(blended), [second.pk, first.pk])
+        # 0,7 x 0,4 / 1 + 0,3 x 10 / 10
+        self.assertEqual(blended[0].recommendation_score, 0.58)
+        self.assertEqual(blended[0].recommendation_type, 'popularity')
+        self.assertEqual(blended[1].recommendation_type, 'content_based')
+
+    def test_purchased_and_unpublished_products_are_excluded(self):
+        recommended = RecommendationService.get_recommendations(
+            self.user, limit=10, recommendation_types=['content_based']
+        )
+        self.assertEqual(self.ids(recommended), [self.products[2].pk, self.products[3].pk])
+
+    def test_small_limit(self):
+        recommended = RecommendationService.get_recommendations(self.user, limit=1)
+        self.assertEqual(len(recommended), 1)
+        self.assertNotIn(self.products[1].pk, self.ids(recommended))
+
+    def test_request_path_does_not_write(self):
+        with CaptureQueriesContext(connection) as queries:
+            recommended = RecommendationService.get_recommendations(self.user, limit=5)
+        self.assertTrue(recommended)
+        self.assertTrue(all(query['sql'].lstrip().upper().startswith('SELECT') for query in queries))
+        # Impressions différées, liste servie depuis le cache ensuite
+        self.assertEqual(len(recommendation_impressions), len(recommended))
+        with self.assertNumQueries(0):
+            cached = RecommendationService.get_recommendations(self.user, limit=5)
+        self.assertEqual(self.ids(cached), self.ids(recommended))
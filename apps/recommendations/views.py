@@ -1,8 +1,11 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from django.views.generic import TemplateView
 from django.http import JsonResponse
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
+from apps.products.models import Product
+from .services import FrequentlyBoughtTogetherService, RecommendationService
 
 @method_decorator(login_required, name='dispatch')
 class UserRecommendationsView(TemplateView):
@@ -18,14 +21,46 @@ class SimilarProductsView(TemplateView):
 class FrequentlyBoughtTogetherView(TemplateView):
     """Vue des produits fréquemment achetés ensemble"""
     template_name = 'recommendations/frequently_bought_together.html'
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['product'] = get_object_or_404(Product, pk=self.kwargs['product_id'], status='published')
+        context['products'] = FrequentlyBoughtTogetherService.get_products([context['product'].id], limit=10)
+        return context
+
+def _limit(request, default=10, maximum=50):
+    """Nombre de résultats demandé (paramètre limit), borné"""
+    try:
+        return max(1, min(int(request.GET.get('limit', default)), maximum))
+    except ValueError:
+        return default
+
+def _product_data(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'slug': product.slug,
+        'price': str(product.price),
+        'url': reverse('products:product-detail', args=[product.slug]),
+        'type': product.recommendation_type,
+        'score': product.recommendation_score,
+    }
 
 def api_user_recommendations(request):
     """API pour les recommandations utilisateur"""
-    return JsonResponse({'recommendations': []})
+    products = RecommendationService.get_recommendations(
+        request.user, _limit(request), request.GET.getlist('type') or None
+    )
+    return JsonResponse({'recommendations': [_product_data(product) for product in products]})
 
 def api_similar_products(request):
     """API pour les produits similaires"""
-    return JsonResponse({'products': []})
+    try:
+        product_id = int(request.GET.get('product_id', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Paramètre product_id invalide'}, status=400)
+    products = RecommendationService.get_similar_products(product_id, _limit(request))
+    return JsonResponse({'products': [_product_data(product) for product in products]})
 
 def api_recommendation_feedback(request):
     """API pour le feedback des recommandations"""
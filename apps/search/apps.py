@@ -5,4 +5,6 @@ class SearchConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.search'
     verbose_name = 'Recherche'
-
+    
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,249 @@
+import os
+import pickle
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connection
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, Q
+
+from apps.products.models import Brand, Category, Product
+from apps.search.engine import TOKEN_RE, fold_accents
+from apps.search.models import SearchIndex, SearchSuggestion
+
+
+ENTRY_TYPES = ('popular', 'product', 'category', 'brand')
+MAX_TOP_K = 10
+# Au-delà de cette taille de plage, le top-k d'un préfixe est précalculé
+SCAN_LIMIT = 64
+MAX_WORD_STARTS = 6
+
+
+def normalize(text):
+    """Clé de comparaison : minuscules, sans accents ni ponctuation"""
+    return ' '.join(TOKEN_RE.findall(fold_accents(text or '')))
+
+
+def entry_keys(text):
+    """Clés d'une entrée : le texte complet puis à partir de chaque mot suivant"""
+    words = TOKEN_RE.findall(fold_accents(text or ''))
+    return {' '.join(words[start:]) for start in range(min(len(words), MAX_WORD_STARTS))}
+
+
+class PrefixIndex:
+    """Tableau trié de clés normalisées, interrogé par recherche dichotomique"""
+
+    def __init__(self):
+        self.keys = []
+        # identifiant -> (texte, poids, données complémentaires)
+        self.entries = {}
+        self._top = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def bulk_load(self, entries):
+        """Charge des entrées (identifiant, texte, poids, données)"""
+        for entry_id, text, weight, extra in entries:
+            self.entries[entry_id] = (text, weight, extra)
+            self.keys.extend((key, entry_id) for key in entry_keys(text))
+        self.keys.sort()
+        self._top.clear()
+        # Précalcule le top-k de tous les préfixes couvrant de larges plages
+        self._top_for('', 0, len(self.keys))
+
+    def upsert(self, entry_id, text, weight, extra=None):
+        """Ajoute ou met à jour une entrée"""
+        previous = self.entries.get(entry_id)
+        if previous is not None and previous[0] == text:
+            self.entries[entry_id] = (text, weight, extra)
+            self._forget(entry_keys(text))
+            return
+        self.remove(entry_id)
+        self.entries[entry_id] = (text, weight, extra)
+        keys = entry_keys(text)
+        for key in keys:
+            insort(self.keys, (key, entry_id))
+        self._forget(keys)
+
+    def remove(self, entry_id):
+        """Retire une entrée"""
+        previous = self.entries.pop(entry_id, None)
+        if previous is None:
+            return
+        keys = entry_keys(previous[0])
+        for key in keys:
+            position = bisect_left(self.keys, (key, entry_id))
+            if position < len(self.keys) and self.keys[position] == (key, entry_id):
+                del self.keys[position]
+        self._forget(keys)
+
+    def _forget(self, keys):
+        """Invalide les top-k mémorisés des préfixes touchés"""
+        if not self._top:
+            return
+        for key in keys:
+            for end in range(1, len(key) + 1):
+                self._top.pop(key[:end], None)
+
+    def complete(self, prefix, limit=MAX_TOP_K):
+        """Entrées les plus populaires dont un mot commence par le préfixe"""
+        if not prefix or limit <= 0:
+            return []
+        start = bisect_left(self.keys, (prefix,))
+        end = bisect_left(self.keys, (prefix + '\uffff',), start)
+        top = self._top_for(prefix, start, end)
+        return [(entry_id,) + self.entries[entry_id] for entry_id in top[:limit]]
+
+    def _top_for(self, prefix, start, end):
+        """Top-k d'une plage : parcours direct si elle est courte, sinon fusion des sous-préfixes"""
+        if end - start <= SCAN_LIMIT:
+            return self._rank({entry_id for _, entry_id in self.keys[start:end]})
+        top = self._top.get(prefix)
+        if top is not None:
+            return top
+
+        depth = len(prefix)
+        candidates = set()
+        position = start
+        # Les clés égales au préfixe sont triées en tête de plage
+        while position < end and len(self.keys[position][0]) == depth:
+            candidates.add(self.keys[position][1])
+            position += 1
+        while position < end:
+            child = prefix + self.keys[position][0][depth]
+            child_end = bisect_left(self.keys, (child + '\uffff',), position, end)
+            candidates.update(self._top_for(child, position, child_end))
+            position = child_end
+
+        top = self._top[prefix] = self._rank(candidates)
+        return top
+
+    def _rank(self, entry_ids):
+        return sorted(
+            entry_ids,
+            key=lambda entry_id: (-self.entries[entry_id][1], self.entries[entry_id][0])
+        )[:MAX_TOP_K]
+
+
+class AutocompleteIndex:
+    """Index d'autocomplétion : un index de préfixes par type de suggestion"""
+
+    def __init__(self):
+        self.indexes = {entry_type: PrefixIndex() for entry_type in ENTRY_TYPES}
+        self.built_at = time.time()
+
+    def complete(self, entry_type, query, limit):
+        return self.indexes[entry_type].complete(normalize(query), limit)
+
+    @classmethod
+    def build(cls):
+        """Construit l'index depuis la base (suggestions, produits, catégories, marques)"""
+        index = cls()
+        index.indexes['popular'].bulk_load(
+            (suggestion_id, query, count, None)
+            for suggestion_id, query, count in SearchSuggestion.objects.filter(
+                is_active=True
+            ).values_list('id', 'query', 'count').iterator()
+        )
+        index.indexes['product'].bulk_load(
+            (object_id, title, popularity, {'category': category, 'price': price})
+            for object_id, title, popularity, category, price in SearchIndex.objects.filter(
+                content_type=ContentType.objects.get_for_model(Product),
+                is_active=True
+            ).values_list('object_id', 'title', 'popularity_score', 'category', 'price').iterator()
+        )
+        product_counts = Category.published_product_counts()
+        index.indexes['category'].bulk_load(
+            (category_id, name, product_counts.get(category_id, 0), None)
+            for category_id, name in Category.objects.filter(is_active=True).values_list('id', 'name')
+        )
+        index.indexes['brand'].bulk_load(
+            (brand_id, name, total, None)
+            for brand_id, name, total in Brand.objects.filter(is_active=True).annotate(
+                total=Count('products', filter=Q(products__status='published'))
+            ).values_list('id', 'name', 'total')
+        )
+        return index
+
+    def save_snapshot(self, path):
+        """Sérialise l'index dans un fichier"""
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as snapshot:
+            pickle.dump(self, snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def load_snapshot(path):
+        """Recharge un index sérialisé par save_snapshot"""
+        with open(path, 'rb') as snapshot:
+            return pickle.load(snapshot)
+
+
+_index = None
+_refreshing = False
+_lock = threading.Lock()
+
+
+def _refresh_interval():
+    return getattr(settings, 'AUTOCOMPLETE_REFRESH_SECONDS', 300)
+
+
+def get_autocomplete_index():
+    """Retourne l'index du processus, rafraîchi en arrière-plan quand il vieillit"""
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = _load_index()
+    elif time.time() - _index.built_at >= _refresh_interval():
+        _schedule_refresh()
+    return _index
+
+
+def _load_index():
+    """Premier chargement : instantané sur disque si disponible, sinon la base"""
+    snapshot_path = getattr(settings, 'AUTOCOMPLETE_SNAPSHOT', '')
+    if snapshot_path and os.path.exists(snapshot_path):
+        index = AutocompleteIndex.load_snapshot(snapshot_path)
+        index.built_at = os.path.getmtime(snapshot_path)
+        return index
+    return AutocompleteIndex.build()
+
+
+def _schedule_refresh():
+    global _refreshing
+    with _lock:
+        if _refreshing:
+            return
+        _refreshing = True
+    threading.Thread(target=_refresh, daemon=True).start()
+
+
+def _refresh():
+    global _index, _refreshing
+    try:
+        index = AutocompleteIndex.build()
+        with _lock:
+            _index = index
+    finally:
+        _refreshing = False
+        connection.close()
+
+
+def update_entry(entry_type, entry_id, text, weight=None, extra=None, active=True):
+    """Met à jour une entrée de l'index du processus s'il est chargé (poids conservé si None)"""
+    index = _index
+    if index is None:
+        return
+    prefix_index = index.indexes[entry_type]
+    with _lock:
+        if not active:
+            prefix_index.remove(entry_id)
+            return
+        if weight is None:
+            previous = prefix_index.entries.get(entry_id)
+            weight = previous[1] if previous else 0
+        prefix_index.upsert(entry_id, text, weight, extra)
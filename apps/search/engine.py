@@ -0,0 +1,679 @@
+import math
+import re
+import heapq
+import threading
+import unicodedata
+import uuid
+from bisect import bisect_left, insort
+from collections import namedtuple
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.products.models import Product
+from apps.search.models import SearchIndex, SearchIndexUpdate
+
+
+DEFAULT_SEARCH_BACKEND = 'apps.search.engine.InMemorySearchBackend'
+INDEX_VERSION_CACHE_KEY = 'search:index_version'
+INDEX_GENERATION_CACHE_KEY = 'search:index_generation'
+# Marge de relecture du journal pour les transactions validées dans le désordre
+UPDATES_SETTLE_SECONDS = 60
+# Au-delà, un processus en retard recharge tout l'index plutôt que de rejouer le journal
+MAX_REPLAYED_UPDATES = 10000
+
+# Poids des champs pour BM25F
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'brand': 2.0,
+    'category': 1.5,
+    'keywords': 0.5,
+    'description': 1.0,
+}
+FIELDS = tuple(FIELD_WEIGHTS)
+
+PREFIX_BOOST = 0.8
+FUZZY_BOOST = 0.6
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 4
+MAX_PREFIX_SCAN = 500
+MAX_EXPANSIONS = 30
+
+STOP_WORDS = frozenset("""
+    a au aux avec ce ces d dans de des du elle en et il je l la le les leur
+    lui ma mais me mes n ne nos notre nous on ou par pas pour qu que qui s sa
+    se ses son sur ta te tes ton tu un une vos votre vous y
+    an and are as at be by for from in is it of on the this to with
+""".split())
+
+# Suffixes retirés par le racinisateur léger (français et anglais), du plus long au plus court
+SUFFIXES = (
+    ('issements', ''), ('issement', ''), ('atrices', ''), ('atrice', ''),
+    ('ateurs', ''), ('ateur', ''), ('ations', ''), ('ation', ''),
+    ('ements', ''), ('ement', ''), ('euses', ''), ('euse', ''),
+    ('ances', ''), ('ance', ''), ('ences', ''), ('ence', ''),
+    ('iques', ''), ('ique', ''), ('ables', ''), ('able', ''),
+    ('istes', ''), ('iste', ''), ('ismes', ''), ('isme', ''),
+    ('ments', ''), ('ment', ''), ('ness', ''), ('ings', ''), ('ing', ''),
+    ('eaux', 'eau'), ('aux', 'al'), ('ies', 'y'), ('ed', ''), ('ly', ''),
+)
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+WORD_RE = re.compile(r'[^\W_]+')
+
+SearchHit = namedtuple('SearchHit', ['object_id', 'score'])
+SearchResults = namedtuple('SearchResults', ['total', 'hits'])
+IndexedDocument = namedtuple(
+    'IndexedDocument', ['terms', 'lengths', 'popularity', 'category', 'brand', 'price']
+)
+
+
+def fold_accents(text):
+    """Passe le texte en minuscules sans accents"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+@lru_cache(maxsize=100000)
+def _fold_word(word):
+    return TOKEN_RE.findall(fold_accents(word))
+
+
+def tokenize(text):
+    """Découpe un texte en mots normalisés, sans mots vides"""
+    if not text:
+        return []
+    tokens = []
+    for word in WORD_RE.findall(text.lower()):
+        if word.isascii():
+            if word not in STOP_WORDS:
+                tokens.append(word)
+        else:
+            tokens.extend(token for token in _fold_word(word) if token not in STOP_WORDS)
+    return tokens
+
+
+def stem(token):
+    """Racinise un mot (suffixes courants, pluriel, féminin)"""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    for suffix, replacement in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)] + replacement
+            break
+    if len(token) > 3 and token[-1] in 'sx':
+        token = token[:-1]
+    if len(token) > 3 and token[-1] == 'e':
+        token = token[:-1]
+    return token
+
+
+def edit_distance(source, target, max_distance):
+    """Distance de Damerau-Levenshtein bornée (max_distance + 1 au-delà)"""
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+    previous_previous = None
+    previous = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        current = [i] + [0] * len(target)
+        for j in range(1, len(target) + 1):
+            cost = 0 if source[i - 1] == target[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and source[i - 1] == target[j - 2]
+                    and source[i - 2] == target[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+def _deletes(word):
+    """Variantes d'un mot privé d'une lettre"""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class InvertedIndex:
+    """Index inversé en mémoire avec classement BM25F
+
+    Lectures et écritures prennent le même verrou : une mise à jour ne modifie pas les listes
+    de postings pendant qu'une recherche les parcourt.
+    """
+
+    def __init__(self, field_weights=None, k1=1.2, b=0.75):
+        self.field_weights = field_weights or FIELD_WEIGHTS
+        self.k1 = k1
+        self.b = b
+        # terme -> {doc_id: tf pondéré et normalisé par la longueur des champs}
+        self.postings = {}
+        self.documents = {}
+        # forme de surface -> racine, pour les préfixes et les fautes de frappe
+        self.surfaces = {}
+        self._length_totals = dict.fromkeys(self.field_weights, 0)
+        self._length_docs = 0
+        self._sorted_surfaces = None
+        self._deletes_index = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add_document(self, document):
+        """Ajoute ou remplace un document"""
+        with self._lock:
+            self.remove_document(document['id'])
+            field_tokens = self._analyze(document)
+            self._account_lengths(field_tokens, 1)
+            self._insert(document, field_tokens)
+
+    def bulk_load(self, documents):
+        """Charge un lot de documents avec des longueurs moyennes exactes"""
+        with self._lock:
+            analyzed = []
+            for document in documents:
+                self.remove_document(document['id'])
+                field_tokens = self._analyze(document)
+                self._account_lengths(field_tokens, 1)
+                analyzed.append((document, field_tokens))
+            for document, field_tokens in analyzed:
+                self._insert(document, field_tokens)
+
+    def remove_document(self, doc_id):
+        """Retire un document de l'index"""
+        with self._lock:
+            entry = self.documents.pop(doc_id, None)
+            if entry is None:
+                return False
+            for term in entry.terms:
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self.postings[term]
+            for field, length in zip(self.field_weights, entry.lengths):
+                self._length_totals[field] -= length
+            self._length_docs -= 1
+            return True
+
+    def _analyze(self, document):
+        """Découpe chaque champ indexé d'un document"""
+        field_tokens = {}
+        for field in self.field_weights:
+            tokens = tokenize(document.get(field) or '')
+            for token in tokens:
+                if token not in self.surfaces:
+                    self._add_surface(token)
+            field_tokens[field] = [self.surfaces[token] for token in tokens]
+        return field_tokens
+
+    def _add_surface(self, token):
+        self.surfaces[token] = stem(token)
+        if self._sorted_surfaces is not None:
+            insort(self._sorted_surfaces, token)
+        if self._deletes_index is not None and len(token) >= MIN_FUZZY_LENGTH - 1:
+            for variant in _deletes(token):
+                self._deletes_index.setdefault(variant, set()).add(token)
+
+    def _account_lengths(self, field_tokens, sign):
+        for field, tokens in field_tokens.items():
+            self._length_totals[field] += sign * len(tokens)
+        self._length_docs += sign
+
+    def _insert(self, document, field_tokens):
+        frequencies = {}
+        for field, tokens in field_tokens.items():
+            if not tokens:
+                continue
+            average = self._length_totals[field] / max(self._length_docs, 1) or 1
+            norm = self.field_weights[field] / (1 - self.b + self.b * len(tokens) / average)
+            for term in tokens:
+                frequencies[term] = frequencies.get(term, 0.0) + norm
+
+        doc_id = document['id']
+        for term, frequency in frequencies.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+
+        price = document.get('price')
+        self.documents[doc_id] = IndexedDocument(
+            terms=tuple(frequencies),
+            lengths=tuple(len(field_tokens[field]) for field in self.field_weights),
+            popularity=float(document.get('popularity') or 0),
+            category=document.get('category') or '',
+            brand=document.get('brand') or '',
+            price=float(price) if price is not None else None,
+        )
+
+    def set_popularity(self, doc_id, popularity):
+        """Met à jour la popularité d'un document indexé"""
+        with self._lock:
+            entry = self.documents.get(doc_id)
+            if entry is not None:
+                self.documents[doc_id] = entry._replace(popularity=float(popularity))
+
+    def search(self, query, filters=None, limit=20, offset=0, popularity_weight=0.1):
+        """Recherche classée BM25F, combinée à la popularité"""
+        with self._lock:
+            matching, candidates = self._match(query)
+            ranked = []
+            for doc_id in candidates:
+                entry = self.documents[doc_id]
+                if filters and not self._matches_filters(entry, filters):
+                    continue
+                score = sum(scores.get(doc_id, 0.0) for scores in matching)
+                score *= 1 + popularity_weight * math.log1p(max(entry.popularity, 0))
+                ranked.append((score, doc_id))
+
+        top = heapq.nlargest(offset + limit, ranked)[offset:]
+        return SearchResults(len(ranked), [SearchHit(doc_id, score) for score, doc_id in top])
+
+    def match(self, query):
+        """Identifiants de tous les documents correspondant à la requête, sans classement"""
+        with self._lock:
+            return set(self._match(query)[1])
+
+    def _match(self, query):
+        """Scores par mot de la requête et documents retenus"""
+        tokens = tokenize(query)
+        if not tokens or not self.documents:
+            return [], []
+
+        term_scores = []
+        for position, token in enumerate(tokens):
+            expansions = self._expand(token, is_last=position == len(tokens) - 1)
+            if expansions:
+                term_scores.append(self._score_expansions(expansions))
+            else:
+                term_scores.append({})
+
+        # Tous les mots doivent correspondre ; à défaut, n'importe lequel
+        matching = [scores for scores in term_scores if scores]
+        if not matching:
+            return [], []
+        matching.sort(key=len)
+        candidates = [
+            doc_id for doc_id in matching[0]
+            if all(doc_id in scores for scores in matching[1:])
+        ]
+        if (not candidates or len(matching) < len(term_scores)) and len(term_scores) > 1:
+            candidates = set().union(*matching)
+        return matching, candidates
+
+    def _expand(self, token, is_last):
+        """Termes de l'index correspondant à un mot de la requête, avec leur bonus"""
+        expansions = {}
+        root = self.surfaces.get(token) or stem(token)
+        if root in self.postings:
+            expansions[root] = 1.0
+        if (is_last or not expansions) and len(token) >= MIN_PREFIX_LENGTH:
+            for term in self._prefix_terms(token):
+                expansions.setdefault(term, PREFIX_BOOST)
+        if not expansions and len(token) >= MIN_FUZZY_LENGTH:
+            for term in self._fuzzy_terms(token):
+                expansions.setdefault(term, FUZZY_BOOST)
+        return expansions
+
+    def _prefix_terms(self, prefix):
+        if self._sorted_surfaces is None:
+            self._sorted_surfaces = sorted(self.surfaces)
+        surfaces = self._sorted_surfaces
+        terms = set()
+        index = bisect_left(surfaces, prefix)
+        end = min(index + MAX_PREFIX_SCAN, len(surfaces))
+        while index < end and surfaces[index].startswith(prefix):
+            term = self.surfaces[surfaces[index]]
+            if term in self.postings:
+                terms.add(term)
+            index += 1
+        return self._most_frequent(terms)
+
+    def _fuzzy_terms(self, token):
+        if self._deletes_index is None:
+            self._deletes_index = {}
+            for surface in self.surfaces:
+                if len(surface) >= MIN_FUZZY_LENGTH - 1:
+                    for variant in _deletes(surface):
+                        self._deletes_index.setdefault(variant, set()).add(surface)
+
+        max_distance = 1 if len(token) < 8 else 2
+        variants = {token} | _deletes(token)
+        if max_distance == 2:
+            variants |= {second for first in list(variants) for second in _deletes(first)}
+
+        candidates = set()
+        for variant in variants:
+            if variant in self.surfaces:
+                candidates.add(variant)
+            candidates.update(self._deletes_index.get(variant, ()))
+
+        terms = set()
+        for candidate in candidates:
+            term = self.surfaces[candidate]
+            if term in self.postings and edit_distance(token, candidate, max_distance) <= max_distance:
+                terms.add(term)
+        return self._most_frequent(terms)
+
+    def _most_frequent(self, terms):
+        if len(terms) <= MAX_EXPANSIONS:
+            return terms
+        return heapq.nlargest(MAX_EXPANSIONS, terms, key=lambda term: len(self.postings[term]))
+
+    def _score_expansions(self, expansions):
+        """Score BM25 par document pour un mot de la requête"""
+        total_docs = len(self.documents)
+        k1 = self.k1
+        scores = {}
+        for term, boost in expansions.items():
+            postings = self.postings[term]
+            doc_freq = len(postings)
+            idf = math.log(1 + (total_docs - doc_freq + 0.5) / (doc_freq + 0.5)) * boost
+            for doc_id, frequency in postings.items():
+                score = idf * frequency * (k1 + 1) / (frequency + k1)
+                if score > scores.get(doc_id, 0.0):
+                    scores[doc_id] = score
+        return scores
+
+    @staticmethod
+    def _matches_filters(entry, filters):
+        if 'category' in filters and entry.category not in filters['category']:
+            return False
+        if 'brand' in filters and entry.brand not in filters['brand']:
+            return False
+        if 'price_min' in filters and (entry.price is None or entry.price < float(filters['price_min'])):
+            return False
+        if 'price_max' in filters and (entry.price is None or entry.price > float(filters['price_max'])):
+            return False
+        return True
+
+
+def document_from_search_index(search_index):
+    """Document indexable à partir d'une entrée SearchIndex"""
+    return {
+        'id': search_index.object_id,
+        'title': search_index.title,
+        'brand': search_index.brand,
+        'category': search_index.category,
+        'keywords': f"{search_index.keywords} {search_index.tags}",
+        'description': search_index.description,
+        'popularity': search_index.popularity_score,
+        'price': search_index.price,
+    }
+
+
+def document_from_product(product):
+    """Document indexable construit directement depuis un produit"""
+    return {
+        'id': product.id,
+        'title': product.name,
+        'brand': product.brand.name if product.brand else '',
+        'category': product.category.name if product.category else '',
+        'keywords': f"{product.sku} {product.meta_title}",
+        'description': f"{product.short_description} {product.description}",
+        'popularity': product.rating_count,
+        'price': product.price,
+    }
+
+
+def iter_documents(source=None, object_ids=None):
+    """Parcourt les documents à indexer (SearchIndex ou produits publiés), tous ou ceux des identifiants donnés"""
+    source = source or getattr(settings, 'SEARCH_INDEX_SOURCE', 'search_index')
+    if source == 'products':
+        products = Product.objects.published().select_related('category', 'brand')
+        if object_ids is not None:
+            products = products.filter(pk__in=object_ids)
+        for product in products.iterator(chunk_size=2000):
+            yield document_from_product(product)
+        return
+
+    content_type = ContentType.objects.get_for_model(Product)
+    entries = SearchIndex.objects.filter(content_type=content_type, is_active=True)
+    if object_ids is not None:
+        entries = entries.filter(object_id__in=object_ids)
+    for search_index in entries.iterator(chunk_size=2000):
+        yield document_from_search_index(search_index)
+
+
+class BaseSearchBackend:
+    """Interface commune des moteurs de recherche"""
+
+    def search(self, query, filters=None, limit=20, offset=0):
+        raise NotImplementedError
+
+    def match_ids(self, query):
+        """Identifiants de tous les résultats, pour les facettes"""
+        raise NotImplementedError
+
+    def index_document(self, document):
+        """Indexe ou réindexe un document"""
+        self.index_documents([document])
+
+    def remove_document(self, object_id):
+        """Retire un document de l'index"""
+        self.remove_documents([object_id])
+
+    def index_documents(self, documents):
+        """Indexe ou réindexe un lot de documents"""
+
+    def remove_documents(self, object_ids):
+        """Retire un lot de documents de l'index"""
+
+    def rebuild(self):
+        """Reconstruit l'index complet"""
+
+    def invalidate(self):
+        """Signale que l'index doit être rechargé depuis la base"""
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """Moteur en mémoire par processus
+
+    Les réindexations sont écrites dans le journal SearchIndexUpdate : les autres processus
+    rejouent les entrées qu'ils n'ont pas vues au lieu de recharger tout l'index. Seule une
+    réindexation complète (invalidate) ou un retard au-delà de la rétention du journal
+    provoque un rechargement.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.version = None
+        self.generation = None
+        # Dernière entrée du journal appliquée et date de la dernière synchronisation
+        self.position = 0
+        self.synced_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def popularity_weight(self):
+        return getattr(settings, 'SEARCH_POPULARITY_WEIGHT', 0.1)
+
+    def get_index(self):
+        shared = cache.get_many([INDEX_VERSION_CACHE_KEY, INDEX_GENERATION_CACHE_KEY])
+        version = shared.get(INDEX_VERSION_CACHE_KEY)
+        generation = shared.get(INDEX_GENERATION_CACHE_KEY)
+        if self.index is None or generation != self.generation or version != self.version:
+            with self._lock:
+                if self.index is None or generation != self.generation:
+                    self._load()
+                elif version != self.version and not self._replay():
+                    self._load()
+                self.version, self.generation = version, generation
+        return self.index
+
+    def _load(self):
+        """Recharge tout l'index depuis la base"""
+        now = timezone.now()
+        position = SearchIndexUpdate.objects.aggregate(last=Max('id'))['last'] or 0
+        index = InvertedIndex()
+        index.bulk_load(iter_documents())
+        self.index, self.position, self.synced_at = index, position, now
+
+    def _replay(self):
+        """Applique les entrées du journal non vues ; False si un rechargement complet est nécessaire"""
+        now = timezone.now()
+        if self.synced_at < now - timedelta(hours=getattr(settings, 'SEARCH_INDEX_UPDATES_RETENTION_HOURS', 24)):
+            return False
+        # Les entrées récentes sont relues : un identifiant plus ancien peut avoir été validé après un plus récent
+        updates = list(SearchIndexUpdate.objects.filter(
+            Q(id__gt=self.position) | Q(created_at__gte=self.synced_at - timedelta(seconds=UPDATES_SETTLE_SECONDS))
+        ).order_by('id').values_list('id', 'object_id', 'action')[:MAX_REPLAYED_UPDATES + 1])
+        if len(updates) > MAX_REPLAYED_UPDATES:
+            return False
+
+        actions = {object_id: action for _update_id, object_id, action in updates}
+        upserted = [object_id for object_id, action in actions.items() if action == 'upsert']
+        documents = list(iter_documents(object_ids=upserted)) if upserted else []
+        found = {document['id'] for document in documents}
+        for document in documents:
+            self.index.add_document(document)
+        for object_id in actions:
+            if object_id not in found:
+                self.index.remove_document(object_id)
+
+        if updates:
+            self.position = max(self.position, updates[-1][0])
+        self.synced_at = now
+        return True
+
+    def search(self, query, filters=None, limit=20, offset=0):
+        return self.get_index().search(
+            query, filters=filters, limit=limit, offset=offset,
+            popularity_weight=self.popularity_weight,
+        )
+
+    def match_ids(self, query):
+        return self.get_index().match(query)
+
+    def index_documents(self, documents):
+        if self.index is not None:
+            for document in documents:
+                self.index.add_document(document)
+        self._record([document['id'] for document in documents], 'upsert')
+
+    def remove_documents(self, object_ids):
+        if self.index is not None:
+            for object_id in object_ids:
+                self.index.remove_document(object_id)
+        self._record(object_ids, 'delete')
+
+    def rebuild(self):
+        self.invalidate()
+        return self.get_index()
+
+    def invalidate(self):
+        with self._lock:
+            self.index = None
+        cache.set(INDEX_GENERATION_CACHE_KEY, uuid.uuid4().hex, None)
+
+    def _record(self, object_ids, action):
+        """Journalise les documents modifiés et signale aux autres processus qu'ils sont en retard"""
+        SearchIndexUpdate.objects.bulk_create([
+            SearchIndexUpdate(object_id=object_id, action=action) for object_id in object_ids
+        ])
+        transaction.on_commit(lambda: cache.set(INDEX_VERSION_CACHE_KEY, uuid.uuid4().hex, None))
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Recherche plein texte PostgreSQL sur SearchIndex (tsvector pondéré stocké, index GIN, préfixes)"""
+
+    weights = (
+        ('title', 'A'),
+        ('brand', 'B'),
+        ('category', 'B'),
+        ('keywords', 'C'),
+        ('tags', 'C'),
+        ('description', 'D'),
+    )
+
+    @property
+    def config(self):
+        return getattr(settings, 'SEARCH_POSTGRES_CONFIG', 'french')
+
+    def search(self, query, filters=None, limit=20, offset=0):
+        from django.db.models import F
+        from django.db.models.functions import Ln
+        from django.contrib.postgres.search import SearchRank
+        from apps.search.services import SearchService
+
+        queryset, search_query = self._matching(query)
+        if queryset is None:
+            return SearchResults(0, [])
+        if filters:
+            queryset = SearchService._apply_filters(queryset, filters)
+
+        popularity_weight = getattr(settings, 'SEARCH_POPULARITY_WEIGHT', 0.1)
+        queryset = queryset.annotate(
+            score=SearchRank(F('search_document'), search_query)
+            * (1 + popularity_weight * Ln(F('popularity_score') + 1))
+        ).order_by('-score')
+        hits = [
+            SearchHit(object_id, score)
+            for object_id, score in queryset.values_list('object_id', 'score')[offset:offset + limit]
+        ]
+        return SearchResults(queryset.count(), hits)
+
+    def match_ids(self, query):
+        queryset, _ = self._matching(query)
+        if queryset is None:
+            return set()
+        return set(queryset.values_list('object_id', flat=True))
+
+    def index_documents(self, documents):
+        self._update_documents(object_id__in=[document['id'] for document in documents])
+
+    def rebuild(self):
+        self._update_documents()
+
+    def invalidate(self):
+        # Les entrées réécrites par lots (reindex) gardent leur ancien document
+        self.rebuild()
+
+    def document_vector(self):
+        """tsvector pondéré calculé à partir des colonnes de SearchIndex"""
+        from django.contrib.postgres.search import SearchVector
+
+        vector = None
+        for field, weight in self.weights:
+            field_vector = SearchVector(field, weight=weight, config=self.config)
+            vector = field_vector if vector is None else vector + field_vector
+        return vector
+
+    def _update_documents(self, **lookups):
+        """Recalcule en base le document stocké des entrées de produits"""
+        SearchIndex.objects.filter(
+            content_type=ContentType.objects.get_for_model(Product), **lookups
+        ).update(search_document=self.document_vector())
+
+    def _matching(self, query):
+        """Entrées SearchIndex correspondant à la requête (préfixes sur chaque mot, index GIN)"""
+        from django.contrib.postgres.search import SearchQuery
+
+        tokens = tokenize(query)
+        if not tokens:
+            return None, None
+
+        search_query = SearchQuery(
+            ' & '.join(f'{token}:*' for token in tokens), config=self.config, search_type='raw'
+        )
+        queryset = SearchIndex.objects.filter(
+            content_type=ContentType.objects.get_for_model(Product),
+            is_active=True,
+            search_document=search_query,
+        )
+        return queryset, search_query
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Retourne le moteur de recherche configuré (SEARCH_BACKEND)"""
+    global _backend
+    if _backend is None:
+        _backend = import_string(getattr(settings, 'SEARCH_BACKEND', DEFAULT_SEARCH_BACKEND))()
+    return _backend
@@ -0,0 +1,275 @@
+import threading
+import time
+import uuid
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils.translation import gettext_lazy as _
+
+from apps.products.models import Brand, Category, CategoryClosure, Product, ProductAttributeValue
+from apps.search.models import SearchFilter
+
+
+FACET_VERSION_CACHE_KEY = 'search:facet_version'
+ATTRIBUTE_PREFIX = 'attr_'
+
+PRICE_RANGES = [
+    {'key': '0-50', 'label': 'Moins de 50€', 'min': 0, 'max': 50},
+    {'key': '50-100', 'label': '50€ - 100€', 'min': 50, 'max': 100},
+    {'key': '100-200', 'label': '100€ - 200€', 'min': 100, 'max': 200},
+    {'key': '200-', 'label': 'Plus de 200€', 'min': 200, 'max': None},
+]
+
+AVAILABILITY_LABELS = {
+    'in_stock': _('En stock'),
+    'out_of_stock': _('Rupture de stock'),
+}
+
+DEFAULT_FACETS = [
+    ('category', _('Catégorie')),
+    ('brand', _('Marque')),
+    ('price', _('Gamme de prix')),
+    ('availability', _('Disponibilité')),
+]
+
+# Correspondance entre les types de SearchFilter et les facettes
+FILTER_TYPE_FACETS = {
+    'category': 'category',
+    'brand': 'brand',
+    'price_range': 'price',
+    'availability': 'availability',
+}
+
+FacetResult = namedtuple('FacetResult', ['total', 'mask', 'facets'])
+
+
+def price_range_key(price):
+    """Tranche de prix d'un montant"""
+    if price is None:
+        return None
+    for price_range in PRICE_RANGES:
+        if price >= price_range['min'] and (price_range['max'] is None or price < price_range['max']):
+            return price_range['key']
+    return None
+
+
+def build_mask(positions):
+    """Bitset (entier) dont les bits des positions données sont à 1"""
+    if not positions:
+        return 0
+    bits = bytearray((max(positions) >> 3) + 1)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class FacetIndex:
+    """Bitsets par valeur de facette sur les produits publiés"""
+
+    def __init__(self):
+        self.product_ids = []
+        self.positions = {}
+        # facette -> {valeur: bitset des produits}
+        self.facets = {}
+        # facette -> {valeur: libellé}
+        self.value_labels = {}
+        # facettes affichées, dans l'ordre : (nom, libellé)
+        self.layout = []
+        self.all_mask = 0
+        self.built_at = time.time()
+
+    @classmethod
+    def build(cls):
+        """Construit l'index en une requête par source (produits, catégories, marques, attributs)"""
+        index = cls()
+        postings = defaultdict(lambda: defaultdict(list))
+
+        rows = Product.objects.published().order_by('pk').values_list(
+            'pk', 'category_id', 'brand_id', 'price', 'track_inventory', 'quantity'
+        )
+        for position, (pk, category_id, brand_id, price, track_inventory, quantity) in enumerate(rows.iterator()):
+            index.product_ids.append(pk)
+            index.positions[pk] = position
+            postings['category'][category_id].append(position)
+            if brand_id:
+                postings['brand'][brand_id].append(position)
+            price_key = price_range_key(price)
+            if price_key:
+                postings['price'][price_key].append(position)
+            in_stock = not track_inventory or quantity > 0
+            postings['availability']['in_stock' if in_stock else 'out_of_stock'].append(position)
+        index.all_mask = build_mask(range(len(index.product_ids)))
+
+        # Une catégorie compte les produits de toutes ses sous-catégories
+        rolled_up = defaultdict(list)
+        direct = postings.pop('category', {})
+        links = CategoryClosure.objects.filter(ancestor__is_active=True).values_list('ancestor_id', 'descendant_id')
+        for ancestor_id, descendant_id in links:
+            rolled_up[ancestor_id].extend(direct.get(descendant_id, ()))
+        categories = Category.objects.filter(is_active=True).values_list('id', 'slug', 'name')
+        index._add_facet('category', {
+            slug: (name, rolled_up[category_id]) for category_id, slug, name in categories
+        })
+
+        brands = Brand.objects.filter(is_active=True).values_list('id', 'slug', 'name')
+        index._add_facet('brand', {
+            slug: (name, postings['brand'].get(brand_id, ())) for brand_id, slug, name in brands
+        })
+        index._add_facet('price', {
+            price_range['key']: (price_range['label'], postings['price'].get(price_range['key'], ()))
+            for price_range in PRICE_RANGES
+        })
+        index._add_facet('availability', {
+            key: (label, postings['availability'].get(key, ())) for key, label in AVAILABILITY_LABELS.items()
+        })
+
+        # Attributs filtrables : une facette par attribut, une valeur par texte distinct
+        attribute_names = {}
+        attribute_postings = defaultdict(lambda: defaultdict(list))
+        values = ProductAttributeValue.objects.filter(
+            attribute__is_filterable=True,
+            product__status='published'
+        ).values_list('attribute__slug', 'attribute__name', 'product_id', 'value')
+        for slug, name, product_id, value in values.iterator():
+            position = index.positions.get(product_id)
+            value = value.strip()
+            if position is None or not value:
+                continue
+            facet = f'{ATTRIBUTE_PREFIX}{slug}'
+            attribute_names[facet] = name
+            attribute_postings[facet][value].append(position)
+        for facet, value_postings in attribute_postings.items():
+            index._add_facet(facet, {value: (value, positions) for value, positions in value_postings.items()})
+
+        index.layout = index._load_layout(attribute_names)
+        return index
+
+    def _add_facet(self, facet, values):
+        self.facets[facet] = {value: build_mask(positions) for value, (_, positions) in values.items()}
+        self.value_labels[facet] = {value: label for value, (label, _) in values.items()}
+
+    def _load_layout(self, attribute_names):
+        """Facettes à afficher : celles de SearchFilter si configurées, sinon toutes"""
+        search_filters = SearchFilter.objects.filter(is_active=True).order_by('order', 'name')
+        layout = []
+        for search_filter in search_filters:
+            facet = FILTER_TYPE_FACETS.get(search_filter.filter_type)
+            if facet is None:
+                facet = f'{ATTRIBUTE_PREFIX}{search_filter.field_name}'
+            if facet in self.facets:
+                layout.append((facet, search_filter.display_name))
+        if layout:
+            return layout
+        return DEFAULT_FACETS + sorted(attribute_names.items(), key=lambda item: str(item[1]))
+
+    def mask_for(self, product_ids):
+        """Bitset d'un ensemble de produits (résultats de recherche par exemple)"""
+        positions = self.positions
+        return build_mask([positions[pk] for pk in product_ids if pk in positions])
+
+    def product_ids_for(self, mask):
+        """Identifiants des produits d'un bitset, dans l'ordre des identifiants"""
+        product_ids = []
+        data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+        for byte_index, byte in enumerate(data):
+            while byte:
+                low_bit = byte & -byte
+                product_ids.append(self.product_ids[(byte_index << 3) + low_bit.bit_length() - 1])
+                byte ^= low_bit
+        return product_ids
+
+    def compute(self, base_mask=None, selected=None):
+        """Compte les produits par valeur de facette ; chaque facette ignore sa propre sélection"""
+        base = self.all_mask if base_mask is None else base_mask & self.all_mask
+        selected = {facet: set(values) for facet, values in (selected or {}).items() if facet in self.facets and values}
+
+        selection_masks = {}
+        for facet, values in selected.items():
+            mask = 0
+            for value in values:
+                mask |= self.facets[facet].get(value, 0)
+            selection_masks[facet] = mask
+
+        result = base
+        for mask in selection_masks.values():
+            result &= mask
+
+        facets = []
+        for facet, label in self.layout:
+            scope = base
+            for other, mask in selection_masks.items():
+                if other != facet:
+                    scope &= mask
+            chosen = selected.get(facet, set())
+            values = []
+            for value, value_mask in self.facets[facet].items():
+                count = (scope & value_mask).bit_count()
+                if count or value in chosen:
+                    values.append({
+                        'value': value,
+                        'label': str(self.value_labels[facet][value]),
+                        'count': count,
+                        'selected': value in chosen,
+                    })
+            if facet not in ('price', 'availability'):
+                values.sort(key=lambda item: (-item['count'], item['label']))
+            facets.append({'name': facet, 'label': str(label), 'values': values})
+
+        return FacetResult(result.bit_count(), result, facets)
+
+    def parse_selection(self, params):
+        """Sélection à partir de paramètres de requête (valeurs répétées ou séparées par des virgules)"""
+        selected = {}
+        for facet in self.facets:
+            values = []
+            for raw in params.getlist(facet):
+                values.extend(value.strip() for value in raw.split(',') if value.strip())
+            if values:
+                selected[facet] = values
+        return selected
+
+
+_index = None
+_version = None
+_rebuilding = False
+_lock = threading.Lock()
+
+
+def get_facet_index():
+    """Index de facettes du processus ; invalidé ou trop ancien, il reste servi pendant sa reconstruction"""
+    global _index, _version
+    version = cache.get(FACET_VERSION_CACHE_KEY)
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index, _version = FacetIndex.build(), version
+    elif version != _version or time.time() - _index.built_at > getattr(settings, 'FACET_INDEX_MAX_AGE', 600):
+        _schedule_rebuild(version)
+    return _index
+
+
+def _schedule_rebuild(version):
+    global _rebuilding
+    with _lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+    threading.Thread(target=_rebuild, args=(version,), daemon=True).start()
+
+
+def _rebuild(version):
+    global _index, _version, _rebuilding
+    try:
+        index = FacetIndex.build()
+        with _lock:
+            _index, _version = index, version
+    finally:
+        _rebuilding = False
+        connection.close()
+
+
+def invalidate_facet_index():
+    """Signale à tous les processus que leurs facettes sont périmées"""
+    cache.set(FACET_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
@@ -0,0 +1,24 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.search.autocomplete import AutocompleteIndex
+
+
+class Command(BaseCommand):
+    help = "Construit l'index d'autocomplétion et l'enregistre comme instantané"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=getattr(settings, 'AUTOCOMPLETE_SNAPSHOT', ''))
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError('Indiquez --output ou définissez AUTOCOMPLETE_SNAPSHOT')
+        
+        started = time.monotonic()
+        index = AutocompleteIndex.build()
+        index.save_snapshot(options['output'])
+        
+        sizes = ', '.join(f'{len(prefix_index)} {entry_type}' for entry_type, prefix_index in index.indexes.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Instantané écrit dans {options["output"]} ({sizes}) en {time.monotonic() - started:.1f}s'
+        ))
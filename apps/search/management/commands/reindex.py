@@ -0,0 +1,65 @@
+import time
+from django.core.management.base import BaseCommand
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Max
+from apps.products.models import Product
+from apps.search.engine import get_search_backend
+from apps.search.facets import invalidate_facet_index
+from apps.search.models import SearchIndex, SearchIndexChange
+from apps.search.services import SearchIndexingService
+
+
+class Command(BaseCommand):
+    help = 'Réindexe le catalogue pour la recherche, par lots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--pending', action='store_true', help='Traite uniquement les modifications en attente')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        started = time.monotonic()
+        
+        if options['pending']:
+            processed = 0
+            while True:
+                count = SearchIndexingService.process_pending_changes(batch_size=chunk_size)
+                if not count:
+                    break
+                processed += count
+            self.stdout.write(self.style.SUCCESS(
+                f'{processed} modifications indexées en {time.monotonic() - started:.1f}s'
+            ))
+            return
+        
+        # Les modifications antérieures au parcours complet sont couvertes par celui-ci
+        covered_changes = SearchIndexChange.objects.aggregate(last=Max('id'))['last']
+        total = Product.objects.count()
+        products = Product.objects.select_related('category', 'brand').order_by('pk')
+        
+        indexed = 0
+        last_pk = 0
+        while True:
+            chunk = list(products.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            SearchIndexingService.upsert_products(chunk, sync_backend=False)
+            indexed += len(chunk)
+            last_pk = chunk[-1].pk
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{indexed}/{total} produits indexés ({indexed / max(elapsed, 1e-6):.0f} lignes/s)')
+        
+        stale = SearchIndex.objects.filter(
+            content_type=ContentType.objects.get_for_model(Product)
+        ).exclude(object_id__in=Product.objects.values('id'))
+        removed = stale.delete()[0]
+        
+        if covered_changes:
+            SearchIndexChange.objects.filter(id__lte=covered_changes).delete()
+        get_search_backend().invalidate()
+        invalidate_facet_index()
+        
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{indexed} produits indexés, {removed} entrées obsolètes supprimées en {elapsed:.1f}s'
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('product', 'Produit'), ('category', 'Catégorie'), ('brand', 'Marque')], max_length=20, verbose_name='source')),
+                ('object_id', models.PositiveIntegerField(verbose_name='identifiant')),
+                ('action', models.CharField(choices=[('upsert', 'Mise à jour'), ('delete', 'Suppression')], default='upsert', max_length=10, verbose_name='action')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='créé le')),
+            ],
+            options={
+                'verbose_name': 'Modification à indexer',
+                'verbose_name_plural': 'Modifications à indexer',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:41
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+def fill_search_documents(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.search import SearchVector
+    SearchIndex = apps.get_model('search', 'SearchIndex')
+    config = getattr(settings, 'SEARCH_POSTGRES_CONFIG', 'french')
+    weights = [('title', 'A'), ('brand', 'B'), ('category', 'B'), ('keywords', 'C'), ('tags', 'C'), ('description', 'D')]
+    vector = SearchVector(weights[0][0], weight=weights[0][1], config=config)
+    for field, weight in weights[1:]:
+        vector += SearchVector(field, weight=weight, config=config)
+    SearchIndex.objects.update(search_document=vector)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_search_index_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchindex',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='document de recherche'),
+        ),
+        migrations.AddIndex(
+            model_name='searchindex',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='search_sear_search__355327_gin'),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+    ]
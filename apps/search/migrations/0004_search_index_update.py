@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0003_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField(verbose_name='identifiant')),
+                ('action', models.CharField(choices=[('upsert', 'Mise à jour'), ('delete', 'Suppression')], max_length=10, verbose_name='action')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='créé le')),
+            ],
+            options={
+                'verbose_name': "Mise à jour de l'index",
+                'verbose_name_plural': "Mises à jour de l'index",
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 User = get_user_model()
 
@@ -27,6 +29,9 @@ class SearchIndex(models.Model):
     is_active = models.BooleanField(_('actif'), default=True)
     popularity_score = models.FloatField(_('score de popularité'), default=0.0)
     
+    # Document plein texte précalculé (PostgresSearchBackend)
+    search_document = SearchVectorField(_('document de recherche'), null=True, editable=False)
+    
     # Dates
     created_at = models.DateTimeField(_('créé le'), auto_now_add=True)
     updated_at = models.DateTimeField(_('modifié le'), auto_now=True)
@@ -40,12 +45,57 @@ class SearchIndex(models.Model):
             models.Index(fields=['category']),
             models.Index(fields=['brand']),
             models.Index(fields=['is_active', 'popularity_score']),
+            GinIndex(fields=['search_document']),
         ]
     
     def __str__(self):
         return f"{self.title} ({self.content_type.model})"
 
 
+class SearchIndexChange(models.Model):
+    """Modifications de catalogue en attente d'indexation"""
+    
+    SOURCE_CHOICES = [
+        ('product', _('Produit')),
+        ('category', _('Catégorie')),
+        ('brand', _('Marque')),
+    ]
+    
+    ACTION_CHOICES = [
+        ('upsert', _('Mise à jour')),
+        ('delete', _('Suppression')),
+    ]
+    
+    source = models.CharField(_('source'), max_length=20, choices=SOURCE_CHOICES)
+    object_id = models.PositiveIntegerField(_('identifiant'))
+    action = models.CharField(_('action'), max_length=10, choices=ACTION_CHOICES, default='upsert')
+    created_at = models.DateTimeField(_('créé le'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Modification à indexer')
+        verbose_name_plural = _('Modifications à indexer')
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.get_action_display()} {self.source} #{self.object_id}"
+
+
+class SearchIndexUpdate(models.Model):
+    """Journal des produits réindexés, rejoué par les autres processus sur leur index en mémoire"""
+
+    object_id = models.PositiveIntegerField(_('identifiant'))
+    action = models.CharField(_('action'), max_length=10, choices=SearchIndexChange.ACTION_CHOICES)
+    created_at = models.DateTimeField(_('créé le'), auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = _('Mise à jour de l\'index')
+        verbose_name_plural = _('Mises à jour de l\'index')
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.get_action_display()} #{self.object_id}"
+
+
 class SearchSuggestion(models.Model):
     """Suggestions de recherche populaires"""
     
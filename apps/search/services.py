@@ -1,11 +1,24 @@
+import logging
 import re
-from django.db.models import Q, F, Count, Avg
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, F, Count, Avg, Case, When, IntegerField
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
 from datetime import datetime, timedelta
 from apps.products.models import Product, Category, Brand
-from apps.search.models import SearchIndex, SearchSuggestion, SearchHistory, SearchAnalytics
-from apps.analytics.services import TrackingService
+from apps.search.models import (
+    SearchIndex, SearchIndexChange, SearchIndexUpdate, SearchSuggestion, SearchHistory, SearchAnalytics
+)
+from apps.search.engine import get_search_backend, document_from_search_index
+from apps.search.facets import PRICE_RANGES, get_facet_index, invalidate_facet_index
+from apps.search.autocomplete import get_autocomplete_index, update_entry as update_autocomplete_entry
+from apps.analytics.models import SearchQuery as AnalyticsSearchQuery
+from apps.core.buffers import WriteBehindBuffer
+from apps.core.pagination import KeysetPage, paginate_keyset
+
+logger = logging.getLogger(__name__)
 
 
 class SearchService:
@@ -13,52 +26,51 @@ class SearchService:
     
     @staticmethod
     def build_search_query(query, filters=None, user=None, session_key=None):
-        """Construit une requête de recherche complexe"""
+        """Construit une requête de recherche classée par pertinence"""
         if not query.strip():
-            return Product.objects.none()
-        
-        # Nettoyer la requête
-        clean_query = SearchService._clean_query(query)
-        
-        # Recherche dans l'index
-        search_terms = clean_query.split()
-        q_objects = Q()
+            return SearchIndex.objects.none()
         
-        for term in search_terms:
-            # Recherche dans le titre (poids élevé)
-            q_objects |= Q(title__icontains=term)
-            # Recherche dans la description
-            q_objects |= Q(description__icontains=term)
-            # Recherche dans les mots-clés
-            q_objects |= Q(keywords__icontains=term)
-            # Recherche dans les tags
-            q_objects |= Q(tags__icontains=term)
-            # Recherche dans la catégorie
-            q_objects |= Q(category__icontains=term)
-            # Recherche dans la marque
-            q_objects |= Q(brand__icontains=term)
+        # Recherche dans le moteur (BM25, préfixes, fautes de frappe)
+        results = SearchService.search(
+            query,
+            filters=filters,
+            limit=getattr(settings, 'SEARCH_MAX_RESULTS', 500)
+        )
         
-        # Filtrer par index actif
+        # Conserver l'ordre de pertinence du moteur
+        object_ids = [hit.object_id for hit in results.hits]
         search_results = SearchIndex.objects.filter(
-            q_objects,
-            is_active=True
-        ).select_related('content_object')
-        
-        # Appliquer les filtres
-        if filters:
-            search_results = SearchService._apply_filters(search_results, filters)
-        
-        # Trier par pertinence et popularité
-        search_results = search_results.order_by('-popularity_score', 'title')
-        
-        # Enregistrer la recherche
-        SearchService._log_search(query, filters, user, session_key, search_results.count())
+            content_type=ContentType.objects.get_for_model(Product),
+            object_id__in=object_ids
+        )
+        if object_ids:
+            search_results = search_results.annotate(
+                relevance_rank=Case(
+                    *[When(object_id=object_id, then=position) for position, object_id in enumerate(object_ids)],
+                    output_field=IntegerField()
+                )
+            ).order_by('relevance_rank')
         
-        # Mettre à jour les suggestions
-        SearchService._update_suggestions(query)
+        # Enregistrer la recherche (écrite plus tard, par lots)
+        SearchService._log_search(query, filters, user, session_key, results.total)
         
         return search_results
     
+    @staticmethod
+    def search(query, filters=None, limit=20, offset=0):
+        """Retourne les identifiants de produits classés et le nombre total de résultats"""
+        return get_search_backend().search(
+            SearchService._clean_query(query),
+            filters=filters,
+            limit=limit,
+            offset=offset
+        )
+    
+    @staticmethod
+    def match_ids(query):
+        """Identifiants de tous les produits correspondant à la requête"""
+        return get_search_backend().match_ids(SearchService._clean_query(query))
+    
     @staticmethod
     def _clean_query(query):
         """Nettoie la requête de recherche"""
@@ -92,29 +104,63 @@ class SearchService:
     
     @staticmethod
     def _log_search(query, filters, user, session_key, results_count):
-        """Enregistre la recherche dans l'historique"""
-        SearchHistory.objects.create(
-            user=user,
-            session_key=session_key,
-            query=query,
-            filters=filters or {},
-            results_count=results_count
-        )
-        
-        # Tracking analytics
-        TrackingService.track_search(None, query, results_count)
+        """Place la recherche dans le tampon d'écriture, sans requête SQL"""
+        search_log_buffer.add((
+            user.pk if getattr(user, 'is_authenticated', False) else None,
+            session_key or '',
+            query[:200],
+            filters or {},
+            results_count,
+        ))
+    
+    @staticmethod
+    @transaction.atomic
+    def flush_search_logs(records):
+        """Écrit un lot de recherches : historique, analytics et compteurs de suggestions (tout ou rien)"""
+        SearchHistory.objects.bulk_create([
+            SearchHistory(
+                user_id=user_id,
+                session_key=session_key,
+                query=query,
+                filters=filters,
+                results_count=results_count
+            )
+            for user_id, session_key, query, filters, results_count in records
+        ])
+        AnalyticsSearchQuery.objects.bulk_create([
+            AnalyticsSearchQuery(
+                user_id=user_id,
+                session_key=session_key,
+                query=query,
+                results_count=results_count
+            )
+            for user_id, session_key, query, filters, results_count in records
+        ])
+        SearchService._increment_suggestions(Counter(record[2].lower() for record in records))
     
     @staticmethod
-    def _update_suggestions(query):
-        """Met à jour les suggestions de recherche"""
-        suggestion, created = SearchSuggestion.objects.get_or_create(
-            query=query.lower(),
-            defaults={'count': 1}
+    def _increment_suggestions(counts):
+        """Incrémente les suggestions de façon atomique, une requête par incrément distinct"""
+        SearchSuggestion.objects.bulk_create(
+            [SearchSuggestion(query=query, count=0) for query in counts],
+            ignore_conflicts=True
         )
         
-        if not created:
-            suggestion.count += 1
-            suggestion.save()
+        queries_by_increment = defaultdict(list)
+        for query, increment in counts.items():
+            queries_by_increment[increment].append(query)
+        now = timezone.now()
+        for increment, queries in queries_by_increment.items():
+            SearchSuggestion.objects.filter(query__in=queries).update(
+                count=F('count') + increment,
+                last_used=now
+            )
+        
+        suggestions = SearchSuggestion.objects.filter(query__in=list(counts)).values_list(
+            'id', 'query', 'count', 'is_active'
+        )
+        for suggestion_id, query, count, is_active in suggestions:
+            update_autocomplete_entry('popular', suggestion_id, query, count, active=is_active)
     
     @staticmethod
     def get_suggestions(query, limit=10):
@@ -122,12 +168,7 @@ class SearchService:
         if len(query) < 2:
             return []
         
-        suggestions = SearchSuggestion.objects.filter(
-            query__icontains=query,
-            is_active=True
-        ).order_by('-count', '-last_used')[:limit]
-        
-        return [suggestion.query for suggestion in suggestions]
+        return [text for _, text, _, _ in get_autocomplete_index().complete('popular', query, limit)]
     
     @staticmethod
     def get_popular_searches(limit=10):
@@ -137,8 +178,8 @@ class SearchService:
         ).order_by('-count', '-last_used')[:limit]
     
     @staticmethod
-    def get_search_history(user=None, session_key=None, limit=10):
-        """Retourne l'historique de recherche"""
+    def get_search_history(user=None, session_key=None, limit=10, cursor=None):
+        """Retourne une page de l'historique de recherche (curseur pour la suite)"""
         queryset = SearchHistory.objects.all()
         
         if user:
@@ -146,43 +187,18 @@ class SearchService:
         elif session_key:
             queryset = queryset.filter(session_key=session_key)
         else:
-            return []
+            return KeysetPage([])
         
-        return queryset.order_by('-timestamp')[:limit]
+        return paginate_keyset(queryset.order_by('-timestamp'), cursor, limit)
     
     @staticmethod
     def index_product(product):
         """Indexe un produit pour la recherche"""
-        content_type = ContentType.objects.get_for_model(Product)
-        
-        # Créer ou mettre à jour l'index
-        search_index, created = SearchIndex.objects.get_or_create(
-            content_type=content_type,
-            object_id=product.id,
-            defaults={
-                'title': product.name,
-                'description': product.description,
-                'keywords': f"{product.name} {product.description} {product.sku}",
-                'category': product.category.name if product.category else '',
-                'brand': product.brand.name if product.brand else '',
-                'tags': ', '.join([tag.name for tag in getattr(product, 'tags', [])]),
-                'price': product.price,
-                'is_active': product.status == 'published',
-            }
+        SearchIndexingService.upsert_products([product])
+        return SearchIndex.objects.get(
+            content_type=ContentType.objects.get_for_model(Product),
+            object_id=product.id
         )
-        
-        if not created:
-            # Mettre à jour l'index existant
-            search_index.title = product.name
-            search_index.description = product.description
-            search_index.keywords = f"{product.name} {product.description} {product.sku}"
-            search_index.category = product.category.name if product.category else ''
-            search_index.brand = product.brand.name if product.brand else ''
-            search_index.price = product.price
-            search_index.is_active = product.status == 'published'
-            search_index.save()
-        
-        return search_index
     
     @staticmethod
     def update_popularity_score(product_id, increment=1):
@@ -231,70 +247,250 @@ class SearchService:
         }
 
 
+search_log_buffer = WriteBehindBuffer(
+    SearchService.flush_search_logs,
+    max_size=getattr(settings, 'SEARCH_LOG_BUFFER_SIZE', 500),
+    interval=getattr(settings, 'SEARCH_LOG_FLUSH_SECONDS', 5),
+    name='search-log'
+)
+
+
+class SearchIndexingService:
+    """Service pour l'indexation du catalogue par lots"""
+    
+    INDEXED_FIELDS = [
+        'title', 'description', 'keywords', 'category', 'brand', 'tags',
+        'price', 'is_active', 'updated_at',
+    ]
+    
+    @staticmethod
+    def record_changes(source, object_ids, action='upsert'):
+        """Enregistre des modifications de catalogue à indexer"""
+        SearchIndexChange.objects.bulk_create([
+            SearchIndexChange(source=source, object_id=object_id, action=action)
+            for object_id in object_ids
+        ])
+    
+    @staticmethod
+    def build_entry(product, content_type):
+        """Construit l'entrée d'index d'un produit"""
+        return SearchIndex(
+            content_type=content_type,
+            object_id=product.id,
+            title=product.name,
+            description=product.description,
+            keywords=f"{product.name} {product.description} {product.sku}",
+            category=product.category.name if product.category else '',
+            brand=product.brand.name if product.brand else '',
+            tags=', '.join([tag.name for tag in getattr(product, 'tags', [])]),
+            price=product.price,
+            is_active=product.status == 'published',
+        )
+    
+    @staticmethod
+    def upsert_products(products, sync_backend=True, batch_size=500):
+        """Insère ou met à jour les entrées d'index d'un lot de produits"""
+        content_type = ContentType.objects.get_for_model(Product)
+        entries = [SearchIndexingService.build_entry(product, content_type) for product in products]
+        if not entries:
+            return 0
+        
+        SearchIndex.objects.bulk_create(
+            entries,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['content_type', 'object_id'],
+            update_fields=SearchIndexingService.INDEXED_FIELDS
+        )
+        
+        if sync_backend:
+            SearchIndexingService.sync_backend([entry.object_id for entry in entries])
+        return len(entries)
+    
+    @staticmethod
+    def remove_products(product_ids, sync_backend=True):
+        """Supprime les entrées d'index de produits supprimés"""
+        if not product_ids:
+            return 0
+        deleted = SearchIndex.objects.filter(
+            content_type=ContentType.objects.get_for_model(Product),
+            object_id__in=product_ids
+        ).delete()[0]
+        if sync_backend:
+            SearchIndexingService.unindex_products(product_ids)
+        return deleted
+    
+    @staticmethod
+    def unindex_products(product_ids):
+        """Retire des produits du moteur de recherche et de l'autocomplétion"""
+        get_search_backend().remove_documents(product_ids)
+        for product_id in product_ids:
+            update_autocomplete_entry('product', product_id, '', 0, active=False)
+    
+    @staticmethod
+    def sync_backend(product_ids):
+        """Répercute les entrées d'index de produits dans le moteur de recherche"""
+        entries = SearchIndex.objects.filter(
+            content_type=ContentType.objects.get_for_model(Product),
+            object_id__in=product_ids
+        )
+        active, inactive = [], []
+        for entry in entries:
+            if entry.is_active:
+                active.append(document_from_search_index(entry))
+            else:
+                inactive.append(entry.object_id)
+            update_autocomplete_entry(
+                'product', entry.object_id, entry.title, entry.popularity_score,
+                {'category': entry.category, 'price': entry.price}, active=entry.is_active
+            )
+        
+        backend = get_search_backend()
+        if active:
+            backend.index_documents(active)
+        if inactive:
+            backend.remove_documents(inactive)
+    
+    @staticmethod
+    def process_pending_changes(batch_size=1000):
+        """Traite un lot de modifications en attente, retourne le nombre traité"""
+        with transaction.atomic():
+            changes = list(
+                SearchIndexChange.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size]
+            )
+            if not changes:
+                return 0
+            
+            product_ids, deleted_ids = set(), set()
+            related = {'category': set(), 'brand': set()}
+            for change in changes:
+                if change.source != 'product':
+                    related[change.source].add(change.object_id)
+                elif change.action == 'delete':
+                    deleted_ids.add(change.object_id)
+                    product_ids.discard(change.object_id)
+                else:
+                    product_ids.add(change.object_id)
+                    deleted_ids.discard(change.object_id)
+            
+            # Une marque ou catégorie renommée réindexe uniquement ses produits
+            products = list(Product.objects.select_related('category', 'brand').filter(
+                Q(pk__in=product_ids)
+                | Q(category_id__in=related['category'])
+                | Q(brand_id__in=related['brand'])
+            ))
+            deleted_ids |= product_ids - {product.pk for product in products}
+            
+            SearchIndexingService.upsert_products(products, sync_backend=False)
+            SearchIndexingService.remove_products(list(deleted_ids), sync_backend=False)
+            SearchIndexChange.objects.filter(id__in=[change.id for change in changes]).delete()
+        
+        SearchIndexingService.sync_backend([product.pk for product in products])
+        if deleted_ids:
+            SearchIndexingService.unindex_products(list(deleted_ids))
+        invalidate_facet_index()
+        return len(changes)
+    
+    @staticmethod
+    def prune_index_updates():
+        """Supprime les entrées du journal de réindexation plus anciennes que la rétention"""
+        cutoff = timezone.now() - timedelta(hours=getattr(settings, 'SEARCH_INDEX_UPDATES_RETENTION_HOURS', 24))
+        return SearchIndexUpdate.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
 class AutocompleteService:
     """Service pour l'autocomplétion"""
     
     @staticmethod
     def get_autocomplete_suggestions(query, limit=5):
-        """Retourne des suggestions d'autocomplétion"""
+        """Retourne des suggestions d'autocomplétion depuis l'index en mémoire"""
         if len(query) < 2:
             return []
         
+        index = get_autocomplete_index()
         suggestions = []
         
         # Suggestions basées sur les recherches populaires
-        popular_suggestions = SearchSuggestion.objects.filter(
-            query__icontains=query,
-            is_active=True
-        ).order_by('-count')[:limit//2]
-        
-        for suggestion in popular_suggestions:
+        for _, text, count, _ in index.complete('popular', query, limit // 2):
             suggestions.append({
-                'text': suggestion.query,
+                'text': text,
                 'type': 'popular',
-                'count': suggestion.count
+                'count': count
             })
         
         # Suggestions basées sur les noms de produits
-        product_suggestions = SearchIndex.objects.filter(
-            title__icontains=query,
-            is_active=True
-        ).order_by('-popularity_score')[:limit//2]
-        
-        for product in product_suggestions:
+        for _, title, _, extra in index.complete('product', query, limit // 2):
             suggestions.append({
-                'text': product.title,
+                'text': title,
                 'type': 'product',
-                'category': product.category,
-                'price': float(product.price) if product.price else None
+                'category': extra['category'],
+                'price': float(extra['price']) if extra['price'] else None
             })
         
-        # Suggestions basées sur les catégories
-        category_suggestions = SearchIndex.objects.filter(
-            category__icontains=query,
-            is_active=True
-        ).values('category').distinct()[:3]
-        
-        for category in category_suggestions:
-            if category['category']:
+        # Suggestions basées sur les catégories et les marques
+        for entry_type in ('category', 'brand'):
+            for _, name, _, _ in index.complete(entry_type, query, 3):
                 suggestions.append({
-                    'text': category['category'],
-                    'type': 'category'
+                    'text': name,
+                    'type': entry_type
                 })
         
         return suggestions[:limit]
     
     @staticmethod
     def get_quick_filters():
-        """Retourne les filtres rapides disponibles"""
+        """Retourne les filtres rapides disponibles, avec le nombre de produits"""
+        counts = {
+            facet['name']: {value['value']: value['count'] for value in facet['values']}
+            for facet in FacetService.get_facets().facets
+        }
+        categories = list(Category.objects.filter(is_active=True).values('name', 'slug'))
+        for category in categories:
+            category['count'] = counts.get('category', {}).get(category['slug'], 0)
+        brands = list(Brand.objects.filter(is_active=True).values('name', 'slug'))
+        for brand in brands:
+            brand['count'] = counts.get('brand', {}).get(brand['slug'], 0)
+        
         return {
-            'categories': list(Category.objects.filter(is_active=True).values('name', 'slug')),
-            'brands': list(Brand.objects.filter(is_active=True).values('name', 'slug')),
+            'categories': categories,
+            'brands': brands,
             'price_ranges': [
-                {'label': 'Moins de 50€', 'min': 0, 'max': 50},
-                {'label': '50€ - 100€', 'min': 50, 'max': 100},
-                {'label': '100€ - 200€', 'min': 100, 'max': 200},
-                {'label': 'Plus de 200€', 'min': 200, 'max': None},
+                {
+                    'label': price_range['label'],
+                    'min': price_range['min'],
+                    'max': price_range['max'],
+                    'count': counts.get('price', {}).get(price_range['key'], 0),
+                }
+                for price_range in PRICE_RANGES
             ]
         }
 
+
+class FacetService:
+    """Service pour les facettes de recherche et de listing"""
+    
+    @staticmethod
+    def get_facets(query=None, selected=None):
+        """Comptes par facette pour le catalogue ou les résultats d'une recherche"""
+        index = get_facet_index()
+        base_mask = None
+        if query and query.strip():
+            base_mask = index.mask_for(SearchService.match_ids(query))
+        return index.compute(base_mask, selected)
+    
+    @staticmethod
+    def get_facets_for_request(params):
+        """Facettes et produits retenus à partir des paramètres d'une requête (q, category, brand...)"""
+        index = get_facet_index()
+        result = FacetService.get_facets(params.get('q'), index.parse_selection(params))
+        return result, index
+
+
+def warm_search_indexes():
+    """Charge l'autocomplétion et les facettes au démarrage du worker, avant la première requête"""
+    try:
+        get_autocomplete_index()
+        get_facet_index()
+    except Exception:
+        # Base indisponible au démarrage : chargement différé à la première requête
+        logger.exception("Préchargement des index de recherche impossible")
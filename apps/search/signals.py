@@ -0,0 +1,40 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from apps.products.models import Brand, Category, Product
+from .autocomplete import update_entry as update_autocomplete_entry
+from .services import SearchIndexingService
+
+
+@receiver(post_save, sender=Product)
+def record_product_change(sender, instance, raw=False, **kwargs):
+    """Programme la réindexation d'un produit modifié"""
+    if not raw:
+        SearchIndexingService.record_changes('product', [instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def record_product_deletion(sender, instance, **kwargs):
+    """Programme le retrait d'un produit supprimé"""
+    SearchIndexingService.record_changes('product', [instance.pk], action='delete')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+def record_taxonomy_rename(sender, instance, created=False, raw=False, **kwargs):
+    """Programme la réindexation des produits d'une catégorie ou marque renommée"""
+    if raw or created:
+        return
+    if instance.__dict__.get('_loaded_name') != instance.name:
+        SearchIndexingService.record_changes(sender._meta.model_name, [instance.pk])
+        update_autocomplete_entry(
+            sender._meta.model_name, instance.pk, instance.name, active=instance.is_active
+        )
+    instance._loaded_name = instance.name
+
+
+@receiver(pre_delete, sender=Brand)
+def record_brand_deletion(sender, instance, **kwargs):
+    """Les produits d'une marque supprimée perdent leur marque sans signal"""
+    SearchIndexingService.record_changes(
+        'product', list(instance.products.values_list('id', flat=True))
+    )
@@ -0,0 +1,317 @@
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from apps.products.models import Brand, Category, Product
+from . import autocomplete
+from .engine import InMemorySearchBackend, InvertedIndex, PostgresSearchBackend
+from .facets import FacetIndex
+from .models import SearchIndex, SearchIndexChange, SearchIndexUpdate, SearchSuggestion
+from .services import SearchIndexingService, SearchService, warm_search_indexes
+
+
+class AutocompleteApiTests(TestCase):
+    """API d'autocomplétion servie par l'index en mémoire"""
+
+    @classmethod
+    def setUpTestData(cls):
+        SearchSuggestion.objects.create(query='montre or', count=12)
+        SearchSuggestion.objects.create(query='bague', count=3)
+        Category.objects.create(name='Montres', slug='montres')
+        Brand.objects.create(name='Montblanc', slug='montblanc')
+
+    def setUp(self):
+        autocomplete._index = None
+        self.addCleanup(setattr, autocomplete, '_index', None)
+
+    def test_results_come_from_index(self):
+        warm_search_indexes()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('search:api-autocomplete'), {'q': 'mon'})
+        results = response.json()['results']
+        self.assertIn({'text': 'montre or', 'type': 'popular', 'count': 12}, results)
+        self.assertIn({'text': 'Montres', 'type': 'category'}, results)
+        self.assertIn({'text': 'Montblanc', 'type': 'brand'}, results)
+        self.assertNotIn('bague', [result['text'] for result in results])
+
+    def test_short_query_returns_nothing(self):
+        response = self.client.get(reverse('search:api-autocomplete'), {'q': 'm'})
+        self.assertEqual(response.json(), {'results': []})
+
+
+class PostgresSearchBackendTests(TestCase):
+    """Requêtes plein texte sur le document stocké (index GIN)"""
+
+    def test_query_filters_stored_document(self):
+        queryset, _search_query = PostgresSearchBackend()._matching('montre or')
+        sql = str(queryset.query)
+        self.assertIn('"search_document" @@', sql)
+        self.assertNotIn('to_tsvector', sql)
+
+
+class IndexProductTests(TestCase):
+    """Indexation d'un produit à l'unité"""
+
+    def test_index_product_returns_entry(self):
+        category = Category.objects.create(name='Montres', slug='montres')
+        product = Product.objects.create(
+            name='Montre or', slug='montre-or', description='-', sku='MONTRE-OR', category=category, price=10,
+            status='published'
+        )
+        entry = SearchService.index_product(product)
+        self.assertEqual((entry.object_id, entry.title, entry.category), (product.id, 'Montre or', 'Montres'))
+        self.assertEqual([hit.object_id for hit in SearchService.search('montre').hits], [product.id])
+
+
+def document(doc_id, title, description='', brand='', category='', popularity=0, price=None):
+    return {
+        'id': doc_id, 'title': title, 'brand': brand, 'category': category, 'keywords': '',
+        'description': description, 'popularity': popularity, 'price': price,
+    }
+
+
+class InvertedIndexTests(SimpleTestCase):
+    """Classement BM25F, préfixes et fautes de frappe"""
+
+    def setUp(self):
+        self.index = InvertedIndex()
+        self.index.bulk_load([
+            document(1, 'Montre en or', 'Montre automatique', brand='Cartier', category='Montres', price=900),
+            document(2, 'Bracelet en cuir', 'Bracelet pour montre', category='Accessoires', price=40),
+            document(3, 'Collier argent', 'Collier fin', category='Bijoux', price=120),
+            document(4, 'Montres de poche', 'Montre ancienne', category='Montres', popularity=50, price=300),
+        ])
+
+    def ids(self, query, **options):
+        return [hit.object_id for hit in self.index.search(query, **options).hits]
+
+    def test_title_outranks_description(self):
+        ranked = self.ids('montre')
+        self.assertEqual(set(ranked), {1, 2, 4})
+        self.assertEqual(ranked[-1], 2)
+
+    def test_plural_and_accents_are_normalised(self):
+        self.assertEqual(set(self.ids('MONTRÉS')), {1, 2, 4})
+
+    def test_popularity_boosts_ranking(self):
+        first, second = self.ids('montre', popularity_weight=0)[:2]
+        self.index.set_popularity(second, 1000)
+        self.assertEqual(self.ids('montre', popularity_weight=0)[:2], [first, second])
+        self.assertEqual(self.ids('montre', popularity_weight=1)[0], second)
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.ids('montre or'), [1])
+
+    def test_last_word_matches_as_prefix(self):
+        self.assertEqual(self.ids('coll'), [3])
+        self.assertEqual(self.ids('brac'), [2])
+
+    def test_typos_are_tolerated(self):
+        self.assertEqual(self.ids('colier'), [3])
+        self.assertEqual(self.ids('bracelt'), [2])
+
+    def test_filters_and_total(self):
+        results = self.index.search('montre', filters={'category': ['Montres'], 'price_max': 500})
+        self.assertEqual((results.total, [hit.object_id for hit in results.hits]), (1, [4]))
+
+    def test_removed_document_no_longer_matches(self):
+        self.index.remove_document(3)
+        self.assertEqual(self.ids('collier'), [])
+        self.assertEqual(len(self.index), 3)
+
+    def test_updates_during_searches_are_safe(self):
+        errors = []
+
+        def write():
+            try:
+                for number in range(1000):
+                    self.index.add_document(document(100 + number, f'Montre série {number}'))
+                    self.index.remove_document(100 + number - 5)
+            except Exception as e:
+                errors.append(e)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            while writer.is_alive():
+                self.index.search('montre')
+                self.index.match('mont')
+        except Exception as e:
+            errors.append(e)
+        writer.join()
+        self.assertEqual(errors, [])
+
+
+class InMemorySearchBackendTests(TestCase):
+    """Index par processus tenu à jour par le journal de réindexation"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Montres', slug='montres')
+        cls.products = [
+            Product.objects.create(
+                name=name, slug=slug, description='-', sku=slug, category=category, price=10, status='published'
+            )
+            for name, slug in [('Montre or', 'montre-or'), ('Montre acier', 'montre-acier')]
+        ]
+        SearchIndexingService.upsert_products(cls.products, sync_backend=False)
+
+    def setUp(self):
+        cache.clear()
+        # Deux processus : l'un réindexe, l'autre sert les recherches
+        self.writer, self.reader = InMemorySearchBackend(), InMemorySearchBackend()
+
+    def ids(self, query):
+        return {hit.object_id for hit in self.reader.search(query).hits}
+
+    def reindex(self, product, **fields):
+        Product.objects.filter(pk=product.pk).update(**fields)
+        product.refresh_from_db()
+        SearchIndexingService.upsert_products([product], sync_backend=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.writer.index_document({'id': product.pk, 'title': product.name})
+
+    def test_other_process_replays_updates_without_reloading(self):
+        self.assertEqual(self.ids('montre'), {product.pk for product in self.products})
+        with mock.patch.object(InvertedIndex, 'bulk_load') as bulk_load:
+            self.reindex(self.products[0], name='Bague or')
+            self.assertEqual(self.ids('bague'), {self.products[0].pk})
+            self.assertEqual(self.ids('acier'), {self.products[1].pk})
+        bulk_load.assert_not_called()
+
+    def test_unpublished_product_is_removed_on_replay(self):
+        self.ids('montre')
+        self.reindex(self.products[1], status='draft')
+        self.assertEqual(self.ids('montre'), {self.products[0].pk})
+
+    def test_full_reindex_reloads_every_process(self):
+        self.ids('montre')
+        SearchIndex.objects.filter(object_id=self.products[1].pk).update(title='Collier')
+        self.writer.invalidate()
+        self.assertEqual(self.ids('collier'), {self.products[1].pk})
+
+    def test_old_updates_are_pruned(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.writer.remove_documents([self.products[0].pk])
+        SearchIndexUpdate.objects.update(created_at='2000-01-01T00:00:00Z')
+        self.assertEqual(SearchIndexingService.prune_index_updates(), 1)
+
+
+class SearchIndexChangeTests(TestCase):
+    """Modifications de catalogue enregistrées par les signaux puis appliquées à l'index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Montres', slug='montres')
+        cls.brand = Brand.objects.create(name='Silence', slug='silence')
+
+    def setUp(self):
+        cache.clear()
+
+    def changes(self):
+        return list(SearchIndexChange.objects.values_list('source', 'object_id', 'action'))
+
+    def create_product(self, slug='montre-or'):
+        return Product.objects.create(
+            name='Montre or', slug=slug, description='-', sku=slug, category=self.category, brand=self.brand,
+            price=10, status='published'
+        )
+
+    def process(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return SearchIndexingService.process_pending_changes()
+
+    def entry(self, product):
+        return SearchIndex.objects.get(object_id=product.pk)
+
+    def test_product_save_and_delete_are_recorded(self):
+        product = self.create_product()
+        product.name = 'Montre dorée'
+        product.save()
+        product_id = product.pk
+        product.delete()
+        self.assertEqual(self.changes(), [
+            ('product', product_id, 'upsert'), ('product', product_id, 'upsert'), ('product', product_id, 'delete')
+        ])
+
+    def test_only_taxonomy_renames_are_recorded(self):
+        category = Category.objects.get(pk=self.category.pk)
+        category.description = 'Toutes nos montres'
+        category.save()
+        self.assertEqual(self.changes(), [])
+
+        category.name = 'Horlogerie'
+        category.save()
+        brand = Brand.objects.get(pk=self.brand.pk)
+        brand.name = 'Silence d\'Or'
+        brand.save()
+        self.assertEqual(self.changes(), [
+            ('category', self.category.pk, 'upsert'), ('brand', self.brand.pk, 'upsert')
+        ])
+
+    def test_processing_upserts_and_removes_entries(self):
+        product, other = self.create_product(), self.create_product('montre-acier')
+        self.assertEqual(self.process(), 2)
+        self.assertEqual(self.entry(product).category, 'Montres')
+
+        category = Category.objects.get(pk=self.category.pk)
+        category.name = 'Horlogerie'
+        category.save()
+        other.delete()
+        self.assertEqual(self.process(), 2)
+        self.assertEqual(self.entry(product).category, 'Horlogerie')
+        self.assertFalse(SearchIndex.objects.filter(object_id=other.pk).exists())
+        self.assertEqual(self.changes(), [])
+        self.assertEqual(self.process(), 0)
+
+
+class FacetIndexTests(TestCase):
+    """Comptes des facettes : chaque facette ignore sa propre sélection"""
+
+    def counts(self, result, facet):
+        return {
+            value['value']: value['count']
+            for entry in result.facets if entry['name'] == facet for value in entry['values']
+        }
+
+    def test_empty_catalogue(self):
+        result = FacetIndex.build().compute()
+        self.assertEqual((result.total, result.mask), (0, 0))
+        self.assertEqual([entry['name'] for entry in result.facets], ['category', 'brand', 'price', 'availability'])
+        self.assertTrue(all(not entry['values'] for entry in result.facets))
+
+    def test_drill_down_counts(self):
+        jewellery = Category.objects.create(name='Bijoux', slug='bijoux')
+        rings = Category.objects.create(name='Bagues', slug='bagues', parent=jewellery)
+        watches = Category.objects.create(name='Montres', slug='montres')
+        first = Brand.objects.create(name='Atelier', slug='atelier')
+        second = Brand.objects.create(name='Maison', slug='maison')
+        products = [
+            Product.objects.create(
+                name=slug, slug=slug, description='-', sku=slug, category=category, brand=brand, price=price,
+                status='published'
+            )
+            for slug, category, brand, price in [
+                ('bague-or', rings, first, 40), ('bague-diamant', rings, second, 150), ('montre', watches, first, 80)
+            ]
+        ]
+        index = FacetIndex.build()
+
+        result = index.compute(selected={'brand': ['atelier']})
+        self.assertEqual(result.total, 2)
+        # Les sous-catégories comptent dans leur parent
+        self.assertEqual(self.counts(result, 'category'), {'bijoux': 1, 'bagues': 1, 'montres': 1})
+        self.assertEqual(self.counts(result, 'brand'), {'atelier': 2, 'maison': 1})
+
+        result = index.compute(selected={'brand': ['atelier'], 'category': ['bijoux']})
+        self.assertEqual(index.product_ids_for(result.mask), [products[0].pk])
+        self.assertEqual(self.counts(result, 'brand'), {'atelier': 1, 'maison': 1})
+        self.assertEqual(self.counts(result, 'price'), {'0-50': 1})
+
+        # Résultats d'une recherche comme base
+        result = index.compute(base_mask=index.mask_for([products[1].pk, products[2].pk]))
+        self.assertEqual(result.total, 2)
+        self.assertEqual(self.counts(result, 'price'), {'50-100': 1, '100-200': 1})
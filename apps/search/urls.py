@@ -11,6 +11,7 @@ urlpatterns = [
     # API pour l'autocomplétion
     path('api/suggestions/', views.api_search_suggestions, name='api-suggestions'),
     path('api/autocomplete/', views.api_autocomplete, name='api-autocomplete'),
+    path('api/facets/', views.api_facets, name='api-facets'),
     
     # Historique et analytics
     path('history/', views.SearchHistoryView.as_view(), name='search-history'),
@@ -3,6 +3,8 @@ from django.views.generic import TemplateView
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
+from django.conf import settings
+from .services import AutocompleteService, FacetService, SearchService
 
 @method_decorator(login_required, name='dispatch')
 class AdvancedSearchView(TemplateView):
@@ -26,8 +28,23 @@ class PopularSearchesView(TemplateView):
 
 def api_search_suggestions(request):
     """API pour les suggestions de recherche"""
-    return JsonResponse({'suggestions': []})
+    return JsonResponse({'suggestions': SearchService.get_suggestions(request.GET.get('q', '').strip())})
 
 def api_autocomplete(request):
-    """API pour l'autocomplétion"""
-    return JsonResponse({'results': []})
\ No newline at end of file
+    """API pour l'autocomplétion (recherches populaires, produits, catégories, marques)"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 20)
+    except ValueError:
+        limit = 10
+    return JsonResponse({
+        'results': AutocompleteService.get_autocomplete_suggestions(request.GET.get('q', '').strip(), limit)
+    })
+
+def api_facets(request):
+    """API des facettes (comptes par catégorie, marque, prix, stock et attributs)"""
+    result, index = FacetService.get_facets_for_request(request.GET)
+    return JsonResponse({
+        'total': result.total,
+        'facets': result.facets,
+        'product_ids': index.product_ids_for(result.mask)[:getattr(settings, 'SEARCH_MAX_RESULTS', 500)],
+    })
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+Benchmark de l'allocation multi-entrepôts (FulfillmentAllocator / reserve_orders) sur données synthétiques.
+
+Crée des zones de livraison, des entrepôts avec leurs routes, des produits stockés dans plusieurs
+entrepôts et des commandes en attente, puis réserve les commandes par lots comme reserve_pending_orders.
+Affiche le débit (commandes par minute), le nombre de requêtes, la répartition des expéditions par
+commande et vérifie la cohérence des niveaux de stock. Les données créées sont supprimées à la fin.
+
+Usage : DJANGO_SETTINGS_MODULE=silence_dor.settings python scripts/benchmark_fulfillment_allocation.py \
+    --orders 5000 --products 500 --warehouses 4 --batch-size 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+import django
+
+# Ajouter le répertoire du projet au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COUNTRIES = [('FR', 'France'), ('DE', 'Allemagne'), ('ES', 'Espagne'), ('IT', 'Italie')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=5000, help='Nombre de commandes en attente')
+    parser.add_argument('--products', type=int, default=500, help='Nombre de produits')
+    parser.add_argument('--warehouses', type=int, default=4, help="Nombre d'entrepôts")
+    parser.add_argument('--max-lines', type=int, default=4, help='Lignes par commande (maximum)')
+    parser.add_argument('--batch-size', type=int, default=500, help='Commandes par lot de réservation')
+    parser.add_argument('--seed', type=int, default=7)
+    options = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'silence_dor.settings')
+    django.setup()
+
+    from django.core.cache import cache
+    from django.db import connection
+    from django.db.models import Count, F
+    from django.test.utils import CaptureQueriesContext
+    from apps.accounts.models import Address, User
+    from apps.i18n.models import Country, ShippingZone
+    from apps.inventory.models import ZONE_RANKINGS_CACHE_KEY, StockLevel, StockReservation, Warehouse, WarehouseRoute
+    from apps.inventory.services import StockReservationService
+    from apps.orders.models import Order, OrderItem
+    from apps.products.models import Category, Product
+
+    random.seed(options.seed)
+    suffix = uuid.uuid4().hex[:6]
+    created_countries = []
+    zones, warehouses = [], []
+    user = category = None
+    try:
+        print(f"🔧 Données synthétiques ({suffix})...")
+        user = User.objects.create_user(
+            email=f'bench-{suffix}@example.com', username=f'bench-{suffix}', password=uuid.uuid4().hex,
+            first_name='Bench', last_name='Allocation'
+        )
+        addresses = []
+        for code, name in COUNTRIES:
+            country = Country.objects.filter(code=code).first()
+            if country is None:
+                country = Country.objects.create(code=code, name=name, native_name=name)
+                created_countries.append(country)
+            zone = ShippingZone.objects.create(name=f'Bench {suffix} {code}')
+            zone.countries.set([country])
+            zones.append(zone)
+            addresses.append(Address.objects.create(
+                user=user, type='shipping', first_name='Bench', last_name=code,
+                address_line_1='1 rue', city=name, postal_code='00000', country=country.name
+            ))
+
+        warehouses = Warehouse.objects.bulk_create([
+            Warehouse(
+                code=f'B{suffix}{number}'[:10], name=f'Bench {suffix} {number}', address='1 rue',
+                city='Ville', postal_code='00000', max_capacity=random.choice([None, 100000])
+            )
+            for number in range(options.warehouses)
+        ])
+        warehouses = list(Warehouse.objects.filter(code__startswith=f'B{suffix}'))
+        WarehouseRoute.objects.bulk_create([
+            WarehouseRoute(
+                warehouse=warehouse, shipping_zone=zone,
+                cost=Decimal(random.randint(300, 1500)) / 100, delivery_days=random.randint(1, 5)
+            )
+            for warehouse in warehouses for zone in zones
+        ])
+        cache.delete(ZONE_RANKINGS_CACHE_KEY)
+
+        category = Category.objects.create(name=f'Bench {suffix}', slug=f'bench-{suffix}')
+        Product.objects.bulk_create([
+            Product(
+                name=f'Bench {suffix} {number}', slug=f'bench-{suffix}-{number}', description='-',
+                sku=f'BENCH-{suffix}-{number}', category=category, price=10, status='published',
+                track_inventory=True
+            )
+            for number in range(options.products)
+        ], batch_size=1000)
+        product_ids = list(Product.objects.filter(category=category).values_list('id', flat=True))
+        # Chaque produit stocké dans un à tous les entrepôts, stock limité : une partie des commandes est scindée
+        StockLevel.objects.bulk_create([
+            StockLevel(product_id=product_id, warehouse=warehouse, current_stock=stock, available_stock=stock)
+            for product_id in product_ids
+            for warehouse in random.sample(warehouses, random.randint(1, len(warehouses)))
+            for stock in [random.randint(0, 30)]
+        ], batch_size=2000)
+
+        Order.objects.bulk_create([
+            Order(
+                user=user, billing_address=address, shipping_address=address,
+                order_number=f'BN{suffix}{number:07d}', subtotal=0, tax_amount=0, total_amount=0
+            )
+            for number in range(options.orders)
+            for address in [random.choice(addresses)]
+        ], batch_size=1000)
+        orders = Order.objects.filter(user=user).select_related('shipping_address').order_by('pk')
+        OrderItem.objects.bulk_create([
+            OrderItem(order_id=order_id, product_id=product_id, quantity=random.randint(1, 3), unit_price=10)
+            for order_id in orders.values_list('pk', flat=True)
+            for product_id in random.sample(product_ids, random.randint(1, options.max_lines))
+        ], batch_size=2000)
+        lines = OrderItem.objects.filter(order__user=user).count()
+        print(f"   {options.orders} commandes, {lines} lignes, {len(product_ids)} produits, {len(warehouses)} entrepôts")
+
+        print("⏱️  Réservation par lots...")
+        allocated = unserved = 0
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            last_pk = 0
+            while True:
+                batch = list(orders.filter(pk__gt=last_pk)[:options.batch_size])
+                if not batch:
+                    break
+                missing = len(StockReservationService.reserve_orders(batch))
+                allocated += len(batch) - missing
+                unserved += missing
+                last_pk = batch[-1].pk
+            elapsed = time.perf_counter() - started
+
+        shipments = Counter(
+            StockReservation.objects.filter(order__user=user).values('order_id').annotate(
+                warehouses=Count('stock_level__warehouse', distinct=True)
+            ).values_list('warehouses', flat=True)
+        )
+        inconsistent = StockLevel.objects.filter(product__category=category).exclude(
+            current_stock=F('available_stock') + F('reserved_stock')
+        ).count()
+        negative = StockLevel.objects.filter(product__category=category, available_stock__lt=0).count()
+
+        print(f"   Réservées : {allocated}, sans stock suffisant : {unserved} en {elapsed:.2f}s")
+        print(f"   Débit : {int(options.orders / elapsed * 60)} commandes/min, {len(queries)} requêtes")
+        print(f"   Expéditions par commande : {dict(sorted(shipments.items()))}")
+        checks = [
+            (inconsistent == 0, 'réservé + disponible = stock sur chaque niveau'),
+            (negative == 0, 'aucun stock disponible négatif'),
+        ]
+        for passed, label in checks:
+            print(f"{'✅' if passed else '❌'} {label}")
+        return 0 if all(passed for passed, _label in checks) else 1
+    finally:
+        if user is not None:
+            Order.objects.filter(user=user).delete()
+            user.delete()
+        if category is not None:
+            Product.objects.filter(category=category).delete()
+            category.delete()
+        Warehouse.objects.filter(pk__in=[warehouse.pk for warehouse in warehouses]).delete()
+        ShippingZone.objects.filter(pk__in=[zone.pk for zone in zones]).delete()
+        Country.objects.filter(pk__in=[country.pk for country in created_countries]).delete()
+        cache.delete(ZONE_RANKINGS_CACHE_KEY)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
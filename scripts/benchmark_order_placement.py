@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+Benchmark de la création de commande : OrderPlacementService.place_order contre l'ancien chemin ligne par ligne.
+
+L'ancien chemin est reproduit tel qu'il était dans OrderCreateSerializer.create : deux lectures d'adresse,
+une insertion par ligne, coupon lu puis sauvegardé, sauvegarde finale de la commande, historique et
+suppression des lignes du panier une à une. Le service réserve en plus le stock de chaque ligne.
+Affiche, par taille de panier, le nombre de requêtes et la latence médiane. Les données créées sont
+supprimées à la fin.
+
+Usage : DJANGO_SETTINGS_MODULE=silence_dor.settings python scripts/benchmark_order_placement.py \
+    --lines 1 10 50 --runs 15
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+
+# Ajouter le répertoire du projet au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lines', type=int, nargs='+', default=[1, 10, 50], help='Tailles de panier')
+    parser.add_argument('--runs', type=int, default=15, help='Commandes par mesure')
+    options = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'silence_dor.settings')
+    django.setup()
+
+    from django.db import connection, transaction
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+    from apps.accounts.models import Address, User
+    from apps.cart.models import Cart, CartItem
+    from apps.inventory.models import StockLevel, Warehouse
+    from apps.orders.models import Coupon, Order, OrderCoupon, OrderItem, OrderStatusHistory
+    from apps.orders.services import OrderPlacementService
+    from apps.products.models import Category, Product
+
+    suffix = uuid.uuid4().hex[:6]
+    user = User.objects.create_user(
+        email=f'bench-{suffix}@example.com', username=f'bench-{suffix}', password=uuid.uuid4().hex,
+        first_name='Bench', last_name='Commande'
+    )
+    address = Address.objects.create(
+        user=user, type='shipping', first_name='Bench', last_name='Commande',
+        address_line_1='1 rue de la Paix', city='Paris', postal_code='75002'
+    )
+    category = Category.objects.create(name=f'Bench {suffix}', slug=f'bench-{suffix}')
+    Product.objects.bulk_create([
+        Product(
+            name=f'Bench {suffix} {number}', slug=f'bench-{suffix}-{number}', description='-',
+            sku=f'BENCH-{suffix}-{number}', category=category, price=Decimal('19.90'), status='published',
+            track_inventory=True, quantity=1000000
+        )
+        for number in range(max(options.lines))
+    ])
+    products = list(Product.objects.filter(category=category).order_by('pk'))
+    warehouse = Warehouse.objects.create(
+        code=f'B{suffix}', name=f'Bench {suffix}', address='1 rue', city='Paris', postal_code='75002'
+    )
+    StockLevel.objects.bulk_create([
+        StockLevel(product=product, warehouse=warehouse, current_stock=1000000, available_stock=1000000)
+        for product in products
+    ])
+    coupon = Coupon.objects.create(
+        code=f'BENCH-{suffix}', type='percentage', value=10,
+        valid_from=timezone.now() - timedelta(days=1), valid_until=timezone.now() + timedelta(days=1)
+    )
+    cart = Cart.objects.create(user=user)
+
+    def fill(size):
+        CartItem.objects.filter(cart=cart).delete()
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=2) for product in products[:size]])
+
+    def legacy():
+        with transaction.atomic():
+            billing_address = Address.objects.get(id=address.id, user=user)
+            shipping_address = Address.objects.get(id=address.id, user=user)
+            order = Order.objects.create(
+                user=user, billing_address=billing_address, shipping_address=shipping_address,
+                subtotal=0, total_amount=0
+            )
+            subtotal = Decimal('0')
+            for cart_item in cart.items.all():
+                OrderItem.objects.create(
+                    order=order, product=cart_item.product, quantity=cart_item.quantity,
+                    unit_price=cart_item.product.price
+                )
+                subtotal += cart_item.product.price * cart_item.quantity
+            legacy_coupon = Coupon.objects.get(code=coupon.code, is_active=True)
+            discount_amount = legacy_coupon.calculate_discount(subtotal)
+            OrderCoupon.objects.create(order=order, coupon=legacy_coupon, discount_amount=discount_amount)
+            legacy_coupon.used_count += 1
+            legacy_coupon.save()
+            order.subtotal = subtotal
+            order.discount_amount = discount_amount
+            order.total_amount = subtotal - discount_amount
+            order.save()
+            OrderStatusHistory.objects.create(order=order, status='pending', notes='Commande créée', created_by=user)
+            for cart_item in cart.items.all():
+                cart_item.delete()
+
+    def service():
+        OrderPlacementService.place_order(user, address.id, address.id, cart=cart, coupon_code=coupon.code)
+
+    def measure(placement, size):
+        timings = []
+        for _run in range(options.runs):
+            fill(size)
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                placement()
+                timings.append((time.perf_counter() - started) * 1000)
+        return len(queries), statistics.median(timings)
+
+    try:
+        print(f"⏱️  Création de commande, médiane sur {options.runs} commandes")
+        for size in options.lines:
+            legacy_queries, legacy_ms = measure(legacy, size)
+            service_queries, service_ms = measure(service, size)
+            print(
+                f"   {size:>3} lignes : ancien chemin {legacy_queries} requêtes, {legacy_ms:.1f} ms ; "
+                f"service {service_queries} requêtes, {service_ms:.1f} ms ({legacy_ms / service_ms:.1f}x)"
+            )
+        return 0
+    finally:
+        Order.objects.filter(user=user).delete()
+        coupon.delete()
+        warehouse.delete()
+        Product.objects.filter(category=category).delete()
+        category.delete()
+        user.delete()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
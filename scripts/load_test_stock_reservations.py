@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Test de charge des réservations de stock : des centaines de commandes simultanées sur un seul produit.
+
+Vérifie qu'aucune commande n'est acceptée au-delà du stock (pas de survente) et que les compteurs
+du niveau de stock restent cohérents avec les réservations actives.
+
+Usage : DJANGO_SETTINGS_MODULE=silence_dor.settings python scripts/load_test_stock_reservations.py \
+    --checkouts 300 --stock 50 --workers 50
+
+Sur SQLite, qui sérialise les écritures, prévoir un délai d'attente de verrou (OPTIONS['timeout']).
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+# Ajouter le répertoire du projet au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--checkouts', type=int, default=300, help='Nombre de commandes simultanées')
+    parser.add_argument('--stock', type=int, default=50, help='Stock initial du produit')
+    parser.add_argument('--workers', type=int, default=50, help='Nombre de threads')
+    options = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'silence_dor.settings')
+    django.setup()
+
+    from django.db import connection
+    from django.db.models import Sum
+    from apps.accounts.models import Address, User
+    from apps.inventory.models import StockLevel, StockReservation, Warehouse
+    from apps.orders.models import Order
+    from apps.orders.services import OrderPlacementError, OrderPlacementService
+    from apps.products.models import Category, Product
+
+    suffix = uuid.uuid4().hex[:8]
+    user = User.objects.create_user(
+        email=f'charge-{suffix}@example.com', username=f'charge-{suffix}', password=uuid.uuid4().hex,
+        first_name='Test', last_name='Charge'
+    )
+    address = Address.objects.create(
+        user=user, type='shipping', first_name='Test', last_name='Charge',
+        address_line_1='1 rue de la Paix', city='Paris', postal_code='75002'
+    )
+    category = Category.objects.create(name=f'Charge {suffix}', slug=f'charge-{suffix}')
+    product = Product.objects.create(
+        name=f'Produit charge {suffix}', slug=f'produit-charge-{suffix}', description='-', sku=f'CHARGE-{suffix}',
+        category=category, price=10, status='published', track_inventory=True, quantity=options.stock
+    )
+    warehouse = Warehouse.objects.create(
+        code=f'CH{suffix}'[:10], name=f'Charge {suffix}', address='1 rue', city='Paris', postal_code='75002'
+    )
+    level = StockLevel.objects.create(product=product, warehouse=warehouse, current_stock=options.stock)
+
+    def checkout(_number):
+        try:
+            OrderPlacementService.place_order(user, address.pk, address.pk, lines=[(product.pk, 1)])
+            return 'accepted'
+        except OrderPlacementError:
+            return 'refused'
+        except Exception as e:
+            return f'error: {e}'
+        finally:
+            connection.close()
+
+    try:
+        print(f"🔍 {options.checkouts} commandes simultanées, stock {options.stock}, {options.workers} threads")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options.workers) as executor:
+            outcomes = list(executor.map(checkout, range(options.checkouts)))
+        elapsed = time.perf_counter() - started
+
+        accepted = outcomes.count('accepted')
+        refused = outcomes.count('refused')
+        errors = [outcome for outcome in outcomes if outcome.startswith('error')]
+        level.refresh_from_db()
+        reserved = StockReservation.objects.filter(product=product, status='active').aggregate(
+            total=Sum('quantity')
+        )['total'] or 0
+
+        print(f"   Acceptées : {accepted}, refusées : {refused}, erreurs : {len(errors)} ({elapsed:.2f}s)")
+        print(f"   Stock : {level.current_stock}, réservé : {level.reserved_stock}, disponible : {level.available_stock}")
+        for error in sorted(set(errors))[:5]:
+            print(f"   {error}")
+
+        checks = [
+            (accepted <= options.stock, 'pas plus de commandes acceptées que de stock'),
+            (level.available_stock >= 0, 'stock disponible jamais négatif'),
+            (level.reserved_stock == reserved == accepted, 'réservé = réservations actives = commandes acceptées'),
+            (level.reserved_stock + level.available_stock == level.current_stock, 'réservé + disponible = stock'),
+            (errors or accepted == min(options.stock, options.checkouts), 'tout le stock vendu (sans erreur de base)'),
+        ]
+        for passed, label in checks:
+            print(f"{'✅' if passed else '❌'} {label}")
+        return 0 if all(passed for passed, _label in checks) else 1
+    finally:
+        Order.objects.filter(user=user).delete()
+        level.delete()
+        warehouse.delete()
+        product.delete()
+        category.delete()
+        user.delete()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,4 @@
+# Application Celery chargée avec Django : @shared_task s'y rattache
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
@@ -15,3 +15,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'silence_dor.settings')
 
 application = get_asgi_application()
 
+# Index de recherche en mémoire chargés au démarrage du worker plutôt qu'à la première requête
+from apps.search.services import warm_search_indexes  # noqa: E402
+
+warm_search_indexes()
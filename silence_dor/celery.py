@@ -0,0 +1,13 @@
+"""
+Application Celery de Silence d'Or : tâches des applications et tâches périodiques (CELERY_BEAT_SCHEDULE).
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'silence_dor.settings')
+
+app = Celery('silence_dor')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
+from corsheaders.defaults import default_headers
 try:
     from decouple import config
 except ImportError:
@@ -216,6 +218,8 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['idempotent-replayed']
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -230,6 +234,76 @@ DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@silence-dor.c
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+STRIPE_WEBHOOK_PROCESS_SECONDS = config('STRIPE_WEBHOOK_PROCESS_SECONDS', default=1, cast=float)
+STRIPE_EVENT_MAX_ATTEMPTS = config('STRIPE_EVENT_MAX_ATTEMPTS', default=8, cast=int)
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='')
+STRIPE_CONNECT_TIMEOUT = config('STRIPE_CONNECT_TIMEOUT', default=3, cast=float)
+STRIPE_READ_TIMEOUT = config('STRIPE_READ_TIMEOUT', default=10, cast=float)
+STRIPE_MAX_NETWORK_RETRIES = config('STRIPE_MAX_NETWORK_RETRIES', default=2, cast=int)
+PAYMENT_GATEWAY = config('PAYMENT_GATEWAY', default='apps.payments.gateway.StripeGateway')
+
+# Search Configuration
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='apps.search.engine.InMemorySearchBackend')
+SEARCH_INDEX_SOURCE = config('SEARCH_INDEX_SOURCE', default='search_index')
+SEARCH_POPULARITY_WEIGHT = config('SEARCH_POPULARITY_WEIGHT', default=0.1, cast=float)
+SEARCH_MAX_RESULTS = config('SEARCH_MAX_RESULTS', default=500, cast=int)
+AUTOCOMPLETE_REFRESH_SECONDS = config('AUTOCOMPLETE_REFRESH_SECONDS', default=300, cast=int)
+AUTOCOMPLETE_SNAPSHOT = config('AUTOCOMPLETE_SNAPSHOT', default='')
+# Vidage des tampons d'écriture différée à l'arrêt du processus (désactivé pendant les tests)
+WRITE_BEHIND_FLUSH_AT_EXIT = config('WRITE_BEHIND_FLUSH_AT_EXIT', default='test' not in sys.argv, cast=bool)
+SEARCH_LOG_BUFFER_SIZE = config('SEARCH_LOG_BUFFER_SIZE', default=500, cast=int)
+SEARCH_LOG_FLUSH_SECONDS = config('SEARCH_LOG_FLUSH_SECONDS', default=5, cast=float)
+FACET_INDEX_MAX_AGE = config('FACET_INDEX_MAX_AGE', default=600, cast=int)
+SEARCH_INDEX_UPDATES_RETENTION_HOURS = config('SEARCH_INDEX_UPDATES_RETENTION_HOURS', default=24, cast=int)
+
+# Inventory Configuration
+STOCK_RESERVATION_TTL_MINUTES = config('STOCK_RESERVATION_TTL_MINUTES', default=15, cast=int)
+STOCK_SNAPSHOT_SETTLE_SECONDS = config('STOCK_SNAPSHOT_SETTLE_SECONDS', default=60, cast=int)
+ZONE_RANKINGS_CACHE_SECONDS = config('ZONE_RANKINGS_CACHE_SECONDS', default=300, cast=int)
+FORECAST_HISTORY_DAYS = config('FORECAST_HISTORY_DAYS', default=730, cast=int)
+FORECAST_REVIEW_DAYS = config('FORECAST_REVIEW_DAYS', default=7, cast=int)
+FORECAST_SERVICE_LEVEL = config('FORECAST_SERVICE_LEVEL', default=0.95, cast=float)
+FORECAST_DEFAULT_LEAD_TIME_DAYS = config('FORECAST_DEFAULT_LEAD_TIME_DAYS', default=7, cast=int)
+
+# Tâches périodiques (celery beat)
+CELERY_BEAT_SCHEDULE = {
+    # Réservations de stock expirées rendues au stock disponible
+    'release-expired-stock-reservations': {
+        'task': 'apps.automation.tasks.release_expired_stock_reservations',
+        'schedule': config('STOCK_RESERVATION_RELEASE_SECONDS', default=60, cast=float),
+    },
+    # Événements Stripe en attente d'un nouvel essai (paiement pas encore enregistré, erreur)
+    'process-stripe-events': {
+        'task': 'apps.automation.tasks.process_stripe_events',
+        'schedule': config('STRIPE_EVENT_RETRY_SECONDS', default=30, cast=float),
+    },
+}
+
+# Recommendations Configuration
+RECOMMENDATION_SIMILAR_TOP_K = config('RECOMMENDATION_SIMILAR_TOP_K', default=20, cast=int)
+RECOMMENDATION_SIMILARITY_MIN_SCORE = config('RECOMMENDATION_SIMILARITY_MIN_SCORE', default=0.1, cast=float)
+RECOMMENDATION_SIMILARITY_BLOCK_SIZE = config('RECOMMENDATION_SIMILARITY_BLOCK_SIZE', default=256, cast=int)
+RECOMMENDATION_TEXT_MAX_DF = config('RECOMMENDATION_TEXT_MAX_DF', default=0.05, cast=float)
+RECOMMENDATION_ITEM_MODEL = config('RECOMMENDATION_ITEM_MODEL', default=str(BASE_DIR / 'item_similarity.bin'))
+RECOMMENDATION_ITEM_NEIGHBOURS = config('RECOMMENDATION_ITEM_NEIGHBOURS', default=50, cast=int)
+RECOMMENDATION_ITEM_SHRINK = config('RECOMMENDATION_ITEM_SHRINK', default=1.0, cast=float)
+RECOMMENDATION_RECENT_ITEMS = config('RECOMMENDATION_RECENT_ITEMS', default=50, cast=int)
+RECOMMENDATION_MODEL_CHECK_SECONDS = config('RECOMMENDATION_MODEL_CHECK_SECONDS', default=60, cast=int)
+RECOMMENDATION_FBT_STATE = config('RECOMMENDATION_FBT_STATE', default=str(BASE_DIR / 'basket_counts.npz'))
+RECOMMENDATION_FBT_TOP_N = config('RECOMMENDATION_FBT_TOP_N', default=10, cast=int)
+RECOMMENDATION_FBT_MIN_BASKETS = config('RECOMMENDATION_FBT_MIN_BASKETS', default=2, cast=int)
+RECOMMENDATION_FBT_MAX_BASKET_SIZE = config('RECOMMENDATION_FBT_MAX_BASKET_SIZE', default=50, cast=int)
+RECOMMENDATION_CACHE_SECONDS = config('RECOMMENDATION_CACHE_SECONDS', default=300, cast=int)
+RECOMMENDATION_POPULAR_CACHE_SECONDS = config('RECOMMENDATION_POPULAR_CACHE_SECONDS', default=3600, cast=int)
+RECOMMENDATION_IMPRESSION_BUFFER_SIZE = config('RECOMMENDATION_IMPRESSION_BUFFER_SIZE', default=500, cast=int)
+RECOMMENDATION_IMPRESSION_FLUSH_SECONDS = config('RECOMMENDATION_IMPRESSION_FLUSH_SECONDS', default=5, cast=float)
+RECOMMENDATION_BEHAVIOR_BUFFER_SIZE = config('RECOMMENDATION_BEHAVIOR_BUFFER_SIZE', default=1000, cast=int)
+RECOMMENDATION_BEHAVIOR_FLUSH_SECONDS = config('RECOMMENDATION_BEHAVIOR_FLUSH_SECONDS', default=2, cast=float)
+
+# Idempotency Configuration
+IDEMPOTENCY_KEY_TTL_HOURS = config('IDEMPOTENCY_KEY_TTL_HOURS', default=24, cast=int)
+IDEMPOTENCY_WAIT_SECONDS = config('IDEMPOTENCY_WAIT_SECONDS', default=10, cast=float)
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=60, cast=int)
 
 # Django Allauth
 SITE_ID = 1
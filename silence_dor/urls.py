@@ -15,6 +15,7 @@ urlpatterns = [
     path('accounts/', include('apps.accounts.urls')),
     path('orders/', include('apps.orders.urls')),
     path('cart/', include('apps.cart.urls')),
+    path('payments/', include('apps.payments.urls')),
     
     # Nouvelles fonctionnalit�s avanc�es
     path('analytics/', include('apps.analytics.urls')),
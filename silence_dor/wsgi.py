@@ -13,4 +13,9 @@ from django.core.wsgi import get_wsgi_application
 # Configuration pour la production
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'silence_dor.settings_production')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Index de recherche en mémoire chargés au démarrage du worker plutôt qu'à la première requête
+from apps.search.services import warm_search_indexes  # noqa: E402
+
+warm_search_indexes()